@@ -27,9 +27,12 @@ import copy
 import errno
 import logging
 import re
+from collections import deque
 from datetime import datetime
 
 # Import 3rd-party libs
+import tornado.concurrent
+import tornado.ioloop
 
 
 # Import salt libs
@@ -56,6 +59,8 @@ import salt.ext.six as six
 # pylint: disable=import-error
 try:
     import zmq
+    import zmq.eventloop.ioloop
+    import zmq.eventloop.zmqstream
     HAS_ZMQ = True
 except ImportError:
     HAS_ZMQ = False
@@ -140,6 +145,8 @@ class LocalClient(object):
                 self.opts['transport'],
                 opts=self.opts,
                 listen=False)
+        # The event tag filters added for each job published, keyed by jid
+        self._job_filters = {}
         self.utils = salt.loader.utils(self.opts)
         self.functions = salt.loader.minion_mods(self.opts, utils=self.utils)
         self.returners = salt.loader.returners(self.opts, self.functions)
@@ -207,6 +214,7 @@ class LocalClient(object):
                                 arg=[jid],
                                 expr_form=tgt_type,
                                 timeout=timeout,
+                                listen=True,
                                )
 
         if 'jid' in pub_data:
@@ -260,11 +268,14 @@ class LocalClient(object):
             timeout=None,
             jid='',
             kwarg=None,
+            listen=False,
             **kwargs):
         '''
         Asynchronously send a command to connected minions
 
         Prep the job directory and publish a command to any targeted minions.
+        Pass ``listen=True`` to collect the returns through this client, see
+        :py:meth:`pub`.
 
         :return: A dictionary of (validated) ``pub_data`` or an empty
             dictionary on failure. The ``pub_data`` contains the job ID and a
@@ -286,6 +297,7 @@ class LocalClient(object):
                 ret,
                 jid=jid,
                 timeout=self._get_timeout(timeout),
+                listen=listen,
                 **kwargs)
         except SaltClientError:
             # Re-raise error with specific message
@@ -539,6 +551,7 @@ class LocalClient(object):
                                 ret,
                                 timeout,
                                 jid,
+                                listen=True,
                                 **kwargs)
 
         if not pub_data:
@@ -589,6 +602,7 @@ class LocalClient(object):
             expr_form,
             ret,
             timeout,
+            listen=True,
             **kwargs)
 
         if not pub_data:
@@ -652,17 +666,18 @@ class LocalClient(object):
             expr_form,
             ret,
             timeout,
+            listen=True,
             **kwargs)
 
         if not pub_data:
             yield pub_data
         else:
-            for fn_ret in self.get_iter_returns(pub_data['jid'],
-                                                pub_data['minions'],
-                                                timeout=self._get_timeout(timeout),
-                                                tgt=tgt,
-                                                tgt_type=expr_form,
-                                                **kwargs):
+            for fn_ret in self.get_collected_returns(pub_data['jid'],
+                                                     pub_data['minions'],
+                                                     timeout=self._get_timeout(timeout),
+                                                     tgt=tgt,
+                                                     tgt_type=expr_form,
+                                                     **kwargs):
                 if not fn_ret:
                     continue
                 yield fn_ret
@@ -707,6 +722,7 @@ class LocalClient(object):
             expr_form,
             ret,
             timeout,
+            listen=True,
             **kwargs)
 
         if not pub_data:
@@ -743,6 +759,7 @@ class LocalClient(object):
             expr_form,
             ret,
             timeout,
+            listen=True,
             **kwargs)
 
         if not pub_data:
@@ -856,6 +873,7 @@ class LocalClient(object):
         try:
             if self.returners['{0}.get_load'.format(self.opts['master_job_cache'])](jid) == {}:
                 log.warning('jid does not exist')
+                self._remove_job_filters(jid)
                 yield {}
                 # stop the iteration, since the jid is invalid
                 raise StopIteration()
@@ -881,122 +899,224 @@ class LocalClient(object):
                 jid, minions, datetime.fromtimestamp(timeout_at).time()
             )
         )
-        while True:
-            # Process events until timeout is reached or all minions have returned
-            for raw in ret_iter:
-                # if we got None, then there were no events
-                if raw is None:
-                    break
-                if 'minions' in raw.get('data', {}):
-                    minions.update(raw['data']['minions'])
-                    continue
-                if 'return' not in raw['data']:
-                    continue
-                if kwargs.get('raw', False):
-                    found.add(raw['data']['id'])
-                    yield raw
-                else:
-                    found.add(raw['data']['id'])
-                    ret = {raw['data']['id']: {'ret': raw['data']['return']}}
-                    if 'out' in raw['data']:
-                        ret[raw['data']['id']]['out'] = raw['data']['out']
-                    if 'retcode' in raw['data']:
-                        ret[raw['data']['id']]['retcode'] = raw['data']['retcode']
-                    if kwargs.get('_cmd_meta', False):
-                        ret[raw['data']['id']].update(raw['data'])
-                    log.debug('jid {0} return from {1}'.format(jid, raw['data']['id']))
-                    yield ret
-
-            # if we have all of the returns (and we aren't a syndic), no need for anything fancy
-            if len(found.intersection(minions)) >= len(minions) and not self.opts['order_masters']:
-                # All minions have returned, break out of the loop
-                log.debug('jid {0} found all minions {1}'.format(jid, found))
-                break
-            elif len(found.intersection(minions)) >= len(minions) and self.opts['order_masters']:
-                if len(found) >= len(minions) and len(minions) > 0 and time.time() > gather_syndic_wait:
-                    # There were some minions to find and we found them
-                    # However, this does not imply that *all* masters have yet responded with expected minion lists.
-                    # Therefore, continue to wait up to the syndic_wait period (calculated in gather_syndic_wait) to see
-                    # if additional lower-level masters deliver their lists of expected
-                    # minions.
-                    break
-            # If we get here we may not have gathered the minion list yet. Keep waiting
-            # for all lower-level masters to respond with their minion lists
-
-            # let start the timeouts for all remaining minions
-
-            for id_ in minions - found:
-                # if we have a new minion in the list, make sure it has a timeout
-                if id_ not in minion_timeouts:
-                    minion_timeouts[id_] = time.time() + timeout
-
-            # if the jinfo has timed out and some minions are still running the job
-            # re-do the ping
-            if time.time() > timeout_at and minions_running:
-                # since this is a new ping, no one has responded yet
-                jinfo = self.gather_job_info(jid, tgt, tgt_type)
-                minions_running = False
-                # if we weren't assigned any jid that means the master thinks
-                # we have nothing to send
-                if 'jid' not in jinfo:
-                    jinfo_iter = []
-                else:
-                    jinfo_iter = self.get_returns_no_block('salt/job/{0}'.format(jinfo['jid']))
-                timeout_at = time.time() + self.opts['gather_job_timeout']
-                # if you are a syndic, wait a little longer
-                if self.opts['order_masters']:
-                    timeout_at += self.opts.get('syndic_wait', 1)
-
-            # check for minions that are running the job still
-            for raw in jinfo_iter:
-                # if there are no more events, lets stop waiting for the jinfo
-                if raw is None:
+        # The find_job jobs published to check on this one
+        find_jids = []
+        try:
+            while True:
+                # Process events until timeout is reached or all minions have returned
+                for raw in ret_iter:
+                    # if we got None, then there were no events
+                    if raw is None:
+                        break
+                    if 'minions' in raw.get('data', {}):
+                        minions.update(raw['data']['minions'])
+                        continue
+                    if 'return' not in raw['data']:
+                        continue
+                    if kwargs.get('raw', False):
+                        found.add(raw['data']['id'])
+                        yield raw
+                    else:
+                        found.add(raw['data']['id'])
+                        ret = {raw['data']['id']: {'ret': raw['data']['return']}}
+                        if 'out' in raw['data']:
+                            ret[raw['data']['id']]['out'] = raw['data']['out']
+                        if 'retcode' in raw['data']:
+                            ret[raw['data']['id']]['retcode'] = raw['data']['retcode']
+                        if kwargs.get('_cmd_meta', False):
+                            ret[raw['data']['id']].update(raw['data'])
+                        log.debug('jid {0} return from {1}'.format(jid, raw['data']['id']))
+                        yield ret
+
+                # if we have all of the returns (and we aren't a syndic), no need for anything fancy
+                if len(found.intersection(minions)) >= len(minions) and not self.opts['order_masters']:
+                    # All minions have returned, break out of the loop
+                    log.debug('jid {0} found all minions {1}'.format(jid, found))
                     break
+                elif len(found.intersection(minions)) >= len(minions) and self.opts['order_masters']:
+                    if len(found) >= len(minions) and len(minions) > 0 and time.time() > gather_syndic_wait:
+                        # There were some minions to find and we found them
+                        # However, this does not imply that *all* masters have yet responded with expected minion lists.
+                        # Therefore, continue to wait up to the syndic_wait period (calculated in gather_syndic_wait) to see
+                        # if additional lower-level masters deliver their lists of expected
+                        # minions.
+                        break
+                # If we get here we may not have gathered the minion list yet. Keep waiting
+                # for all lower-level masters to respond with their minion lists
 
-                # TODO: move to a library??
-                if 'minions' in raw.get('data', {}):
-                    minions.update(raw['data']['minions'])
-                    continue
-                if 'syndic' in raw.get('data', {}):
-                    minions.update(raw['syndic'])
-                    continue
-                if 'return' not in raw.get('data', {}):
-                    continue
-
-                # if the job isn't running there anymore... don't count
-                if raw['data']['return'] == {}:
-                    continue
+                # let start the timeouts for all remaining minions
 
-                # if we didn't originally target the minion, lets add it to the list
-                if raw['data']['id'] not in minions:
-                    minions.add(raw['data']['id'])
-                # update this minion's timeout, as long as the job is still running
-                minion_timeouts[raw['data']['id']] = time.time() + timeout
-                # a minion returned, so we know its running somewhere
-                minions_running = True
-
-            # if we have hit gather_job_timeout (after firing the job) AND
-            # if we have hit all minion timeouts, lets call it
-            now = time.time()
-            # if we have finished waiting, and no minions are running the job
-            # then we need to see if each minion has timedout
-            done = (now > timeout_at) and not minions_running
-            if done:
-                # if all minions have timeod out
                 for id_ in minions - found:
-                    if now < minion_timeouts[id_]:
-                        done = False
+                    # if we have a new minion in the list, make sure it has a timeout
+                    if id_ not in minion_timeouts:
+                        minion_timeouts[id_] = time.time() + timeout
+
+                # if the jinfo has timed out and some minions are still running the job
+                # re-do the ping
+                if time.time() > timeout_at and minions_running:
+                    # since this is a new ping, no one has responded yet
+                    jinfo = self.gather_job_info(jid, tgt, tgt_type)
+                    minions_running = False
+                    # if we weren't assigned any jid that means the master thinks
+                    # we have nothing to send
+                    if 'jid' not in jinfo:
+                        jinfo_iter = []
+                    else:
+                        find_jids.append(jinfo['jid'])
+                        jinfo_iter = self.get_returns_no_block('salt/job/{0}'.format(jinfo['jid']))
+                    timeout_at = time.time() + self.opts['gather_job_timeout']
+                    # if you are a syndic, wait a little longer
+                    if self.opts['order_masters']:
+                        timeout_at += self.opts.get('syndic_wait', 1)
+
+                # check for minions that are running the job still
+                for raw in jinfo_iter:
+                    # if there are no more events, lets stop waiting for the jinfo
+                    if raw is None:
                         break
-            if done:
-                break
 
-            # don't spin
-            if block:
-                time.sleep(0.01)
-            else:
-                yield
+                    # TODO: move to a library??
+                    if 'minions' in raw.get('data', {}):
+                        minions.update(raw['data']['minions'])
+                        continue
+                    if 'syndic' in raw.get('data', {}):
+                        minions.update(raw['syndic'])
+                        continue
+                    if 'return' not in raw.get('data', {}):
+                        continue
+
+                    # if the job isn't running there anymore... don't count
+                    if raw['data']['return'] == {}:
+                        continue
+
+                    # if we didn't originally target the minion, lets add it to the list
+                    if raw['data']['id'] not in minions:
+                        minions.add(raw['data']['id'])
+                    # update this minion's timeout, as long as the job is still running
+                    minion_timeouts[raw['data']['id']] = time.time() + timeout
+                    # a minion returned, so we know its running somewhere
+                    minions_running = True
+
+                # if we have hit gather_job_timeout (after firing the job) AND
+                # if we have hit all minion timeouts, lets call it
+                now = time.time()
+                # if we have finished waiting, and no minions are running the job
+                # then we need to see if each minion has timedout
+                done = (now > timeout_at) and not minions_running
+                if done:
+                    # if all minions have timeod out
+                    for id_ in minions - found:
+                        if now < minion_timeouts[id_]:
+                            done = False
+                            break
+                if done:
+                    break
+
+                # don't spin
+                if block:
+                    time.sleep(0.01)
+                else:
+                    yield
+            if expect_minions:
+                for minion in list((minions - found)):
+                    yield {minion: {'failed': True}}
+        finally:
+            self._remove_job_filters(jid)
+            for find_jid in find_jids:
+                self._remove_job_filters(find_jid)
+
+    def get_collected_returns(
+            self,
+            jid,
+            minions,
+            timeout=None,
+            tgt='*',
+            tgt_type='glob',
+            expect_minions=False,
+            batch_size=100,
+            **kwargs):
+        '''
+        Watch the event system with a ReturnCollector and return job data as
+        it comes in, like get_iter_returns. The events are processed as they
+        arrive instead of polling for them, and the jid is not looked up in
+        the job cache, it has to be the one of a job just published.
+
+        :returns: all of the information for the JID
+        '''
+        if self.opts['transport'] == 'raet' or not HAS_ZMQ:
+            for ret in self.get_iter_returns(jid,
+                                             minions,
+                                             timeout=timeout,
+                                             tgt=tgt,
+                                             tgt_type=tgt_type,
+                                             expect_minions=expect_minions,
+                                             **kwargs):
+                yield ret
+            return
+
+        io_loop = zmq.eventloop.ioloop.ZMQIOLoop()
+        batches = deque()
+
+        def deliver(batch):
+            batches.append(batch)
+            io_loop.stop()
+
+        find_jids = []
+
+        def find_job(jid_):
+            jinfo = self.gather_job_info(jid_, tgt, tgt_type)
+            if 'jid' in jinfo:
+                find_jids.append(jinfo['jid'])
+            return jinfo
+
+        collector = ReturnCollector(
+            self.opts,
+            jid,
+            minions,
+            deliver,
+            find_job=find_job,
+            timeout=self.opts['timeout'] if timeout is None else timeout,
+            batch_size=batch_size,
+            io_loop=io_loop,
+            raw=kwargs.get('raw', False),
+            cmd_meta=kwargs.get('_cmd_meta', False))
+        collector.future.add_done_callback(lambda future: io_loop.stop())
+
+        def handle_recv(raw):
+            mtag, sep, mdata = raw[0].partition(salt.utils.event.TAGEND)
+            subscribed = any(match_func(mtag, tag)
+                             for tag, match_func in self.event.pending_tags)
+            if not collector.wants(mtag) and not subscribed:
+                return
+            data = self.event.serial.loads(mdata)
+            if not collector.handle_event(mtag, data) and subscribed:
+                # Keep it for get_event, like it does itself
+                self.event.pending_events.append({'data': data, 'tag': mtag})
+
+        # Returns read from the bus while waiting for another job
+        self.event.pending_events = [
+            evt for evt in self.event.pending_events
+            if not collector.handle_event(evt['tag'], evt['data'])]
+        stream = zmq.eventloop.zmqstream.ZMQStream(self.event.sub, io_loop=io_loop)
+        stream.on_recv(handle_recv)
+        collector.start()
+        try:
+            while True:
+                while batches:
+                    for ret in batches.popleft():
+                        yield ret
+                if collector.future.done():
+                    break
+                io_loop.start()
+        finally:
+            collector.stop()
+            stream.stop_on_recv()
+            io_loop.close()
+            self._remove_job_filters(jid)
+            for find_jid in find_jids:
+                self._remove_job_filters(find_jid)
         if expect_minions:
-            for minion in list((minions - found)):
+            for minion in list(collector.outstanding):
                 yield {minion: {'failed': True}}
 
     def get_returns(
@@ -1055,6 +1175,7 @@ class LocalClient(object):
                 )
                 break
             time.sleep(0.01)
+        self._remove_job_filters(jid)
         return ret
 
     def get_full_returns(self, jid, minions, timeout=None):
@@ -1217,6 +1338,7 @@ class LocalClient(object):
                                 }
                 break
             time.sleep(0.01)
+        self._remove_job_filters(jid)
         return ret
 
     def get_cli_event_returns(
@@ -1247,13 +1369,13 @@ class LocalClient(object):
         connected_minions = None
         return_count = 0
 
-        for ret in self.get_iter_returns(jid,
-                                         minions,
-                                         timeout=timeout,
-                                         tgt=tgt,
-                                         tgt_type=tgt_type,
-                                         expect_minions=(verbose or show_timeout)
-                                         ):
+        for ret in self.get_collected_returns(jid,
+                                              minions,
+                                              timeout=timeout,
+                                              tgt=tgt,
+                                              tgt_type=tgt_type,
+                                              expect_minions=(verbose or show_timeout)
+                                              ):
             return_count = return_count + 1
             if progress:
                 for id_, min_ret in six.iteritems(ret):
@@ -1311,6 +1433,7 @@ class LocalClient(object):
                 ret[raw['id']]['out'] = raw['out']
             yield ret
             time.sleep(0.02)
+        self._remove_job_filters(jid)
 
     def _prep_pub(self,
                   tgt,
@@ -1388,6 +1511,7 @@ class LocalClient(object):
             ret='',
             jid='',
             timeout=5,
+            listen=False,
             **kwargs):
         '''
         Take the required arguments and publish the given command.
@@ -1403,6 +1527,11 @@ class LocalClient(object):
             arg:
                 The arg option needs to be a tuple of arguments to pass
                 to the calling function, if left blank
+            listen:
+                Whether the returns of the job are collected through the
+                event interface of this client. With client_event_filter
+                the tag filters of the job are only added then, and removed
+                once its returns are collected.
         Returns:
             jid:
                 A string, as returned by the publisher, which is the job
@@ -1420,53 +1549,90 @@ class LocalClient(object):
             )
             raise SaltClientError
 
-        payload_kwargs = self._prep_pub(
-                tgt,
-                fun,
-                arg,
-                expr_form,
-                ret,
-                jid,
-                timeout,
-                **kwargs)
-
-        master_uri = 'tcp://' + salt.utils.ip_bracket(self.opts['interface']) + \
-                     ':' + str(self.opts['ret_port'])
-        channel = salt.transport.Channel.factory(self.opts,
-                                                 crypt='clear',
-                                                 master_uri=master_uri)
+        if (listen and self.opts.get('client_event_filter') and
+                self.opts['transport'] != 'raet'):
+            # Have the publisher only send the events of the jobs published
+            # here, the filters must be in place before the job can return
+            if not jid:
+                jid = salt.utils.jid.gen_jid()
+            self._add_job_filters(jid)
 
         try:
-            payload = channel.send(payload_kwargs, timeout=timeout)
-        except SaltReqTimeoutError:
-            raise SaltReqTimeoutError(
-                'Salt request timed out. The master is not responding. '
-                'If this error persists after verifying the master is up, '
-                'worker_threads may need to be increased.'
-            )
+            payload_kwargs = self._prep_pub(
+                    tgt,
+                    fun,
+                    arg,
+                    expr_form,
+                    ret,
+                    jid,
+                    timeout,
+                    **kwargs)
+
+            master_uri = 'tcp://' + salt.utils.ip_bracket(self.opts['interface']) + \
+                         ':' + str(self.opts['ret_port'])
+            channel = salt.transport.Channel.factory(self.opts,
+                                                     crypt='clear',
+                                                     master_uri=master_uri)
 
-        if not payload:
-            # The master key could have changed out from under us! Regen
-            # and try again if the key has changed
-            key = self.__read_master_key()
-            if key == self.key:
-                return payload
-            self.key = key
-            payload_kwargs['key'] = self.key
-            payload = channel.send(payload_kwargs)
+            try:
+                payload = channel.send(payload_kwargs, timeout=timeout)
+            except SaltReqTimeoutError:
+                raise SaltReqTimeoutError(
+                    'Salt request timed out. The master is not responding. '
+                    'If this error persists after verifying the master is up, '
+                    'worker_threads may need to be increased.'
+                )
 
-        error = payload.pop('error', None)
-        if error is not None:
-            raise PublishError(error)
+            if not payload:
+                # The master key could have changed out from under us! Regen
+                # and try again if the key has changed
+                key = self.__read_master_key()
+                if key == self.key:
+                    self._remove_job_filters(jid)
+                    return payload
+                self.key = key
+                payload_kwargs['key'] = self.key
+                payload = channel.send(payload_kwargs)
+
+            error = payload.pop('error', None)
+            if error is not None:
+                raise PublishError(error)
+
+            if not payload:
+                self._remove_job_filters(jid)
+                return payload
 
-        if not payload:
-            return payload
+            # We have the payload, let's get rid of the channel fast(GC'ed faster)
+            del channel
 
-        # We have the payload, let's get rid of the channel fast(GC'ed faster)
-        del channel
+            return {'jid': payload['load']['jid'],
+                    'minions': payload['load']['minions']}
+        except Exception:
+            # The job was not published, nothing returns for it
+            self._remove_job_filters(jid)
+            raise
 
-        return {'jid': payload['load']['jid'],
-                'minions': payload['load']['minions']}
+    def _add_job_filters(self, jid):
+        '''
+        Have the event publisher only send the events of the job jid, on top
+        of the ones of the other jobs being waited on
+        '''
+        prefixes = ['salt/job/{0}'.format(jid),
+                    # The tag of the old style events is the bare jid
+                    jid]
+        if self.opts.get('order_masters'):
+            prefixes.append('syndic/')
+        for prefix in prefixes:
+            self.event.add_tag_filter(prefix)
+        self._job_filters.setdefault(jid, []).extend(prefixes)
+
+    def _remove_job_filters(self, jid):
+        '''
+        Remove the event tag filters of the job jid, once its returns are no
+        longer waited on
+        '''
+        for prefix in self._job_filters.pop(jid, ()):
+            self.event.remove_tag_filter(prefix)
 
     def __del__(self):
         # This IS really necessary!
@@ -1477,6 +1643,193 @@ class LocalClient(object):
             del self.event
 
 
+class ReturnCollector(object):
+    '''
+    Collect the returns of a job from the events of the master on a tornado
+    IOLoop.
+
+    Events are handed to the collector with handle_event. The returns of the
+    job are passed to callback in lists of up to batch_size returns, in the
+    format yielded by LocalClient.get_iter_returns. The minions which did not
+    return yet are kept in a set. Once it is empty, or once timeout seconds
+    after start the find_job callable, which publishes saltutil.find_job for
+    the job, finds none of them still running it, future is done.
+    '''
+    # Deliver the returns at most this many seconds after they came in, even
+    # if there are less than batch_size of them
+    BATCH_WAIT = 0.05
+
+    def __init__(self,
+                 opts,
+                 jid,
+                 minions,
+                 callback,
+                 find_job=None,
+                 timeout=None,
+                 batch_size=1,
+                 io_loop=None,
+                 raw=False,
+                 cmd_meta=False):
+        self.opts = opts
+        self.jid = jid
+        self.minions = set(minions)
+        self.outstanding = set(self.minions)
+        self.callback = callback
+        self.find_job = find_job
+        self.timeout = opts['timeout'] if timeout is None else timeout
+        self.batch_size = batch_size
+        self.io_loop = io_loop or tornado.ioloop.IOLoop.current()
+        self.raw = raw
+        self.cmd_meta = cmd_meta
+        self.future = tornado.concurrent.Future()
+        self.batch = []
+        self._tag = 'salt/job/{0}/'.format(jid)
+        self._syndic_tag = '/{0}'.format(jid)
+        # The tag of the returns of the last saltutil.find_job, and whether
+        # they showed minions still running the job
+        self._find_tag = None
+        self._running = False
+        self._syndic_wait_at = 0
+        self._flush_handle = None
+        self._timeout_handle = None
+
+    def start(self):
+        '''
+        Start the timeouts of the job
+        '''
+        if self.opts.get('order_masters'):
+            # Give the syndics time to report the minions below them
+            self._syndic_wait_at = time.time() + self.opts['syndic_wait']
+        self._timeout_handle = self.io_loop.call_later(self.timeout, self._check_running)
+        if not self.outstanding:
+            self._check_done()
+
+    def stop(self):
+        '''
+        Stop collecting the returns, without completing the future
+        '''
+        for handle in (self._flush_handle, self._timeout_handle):
+            if handle is not None:
+                self.io_loop.remove_timeout(handle)
+        self._flush_handle = self._timeout_handle = None
+
+    def wants(self, tag):
+        '''
+        Return whether the event with this tag is of interest, which allows
+        not decoding the data of the other events
+        '''
+        if self.future.done():
+            return False
+        if tag.startswith(self._tag):
+            return True
+        if self._find_tag is not None and tag.startswith(self._find_tag):
+            return True
+        return tag.startswith('syndic/') and self._syndic_tag in tag
+
+    def handle_event(self, tag, data):
+        '''
+        Take an event of the master, return whether it was of interest
+        '''
+        if not self.wants(tag) or not isinstance(data, dict):
+            return False
+        if 'minions' in data:
+            # The minions targeted below a syndic
+            new = set(data['minions']) - self.minions
+            self.minions.update(new)
+            self.outstanding.update(new)
+        elif 'return' not in data or 'id' not in data:
+            return False
+        elif tag.startswith(self._tag):
+            self._add_return(tag, data)
+        elif data['return']:
+            # The job is still running on this minion
+            self._running = True
+            if data['id'] not in self.minions:
+                self.minions.add(data['id'])
+                self.outstanding.add(data['id'])
+        return True
+
+    def _add_return(self, tag, data):
+        id_ = data['id']
+        self.outstanding.discard(id_)
+        if self.raw:
+            ret = {'data': data, 'tag': tag}
+        else:
+            ret = {id_: {'ret': data['return']}}
+            if 'out' in data:
+                ret[id_]['out'] = data['out']
+            if 'retcode' in data:
+                ret[id_]['retcode'] = data['retcode']
+            if self.cmd_meta:
+                ret[id_].update(data)
+        log.debug('jid {0} return from {1}'.format(self.jid, id_))
+        self.batch.append(ret)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self.io_loop.call_later(self.BATCH_WAIT, self.flush)
+        if not self.outstanding:
+            self._check_done()
+
+    def flush(self):
+        '''
+        Pass the returns collected so far to the callback
+        '''
+        if self._flush_handle is not None:
+            self.io_loop.remove_timeout(self._flush_handle)
+            self._flush_handle = None
+        if self.batch:
+            batch = self.batch
+            self.batch = []
+            self.callback(batch)
+
+    def _check_done(self):
+        '''
+        Finish once every minion returned, but not before the syndics had
+        the time to report their minions
+        '''
+        wait = self._syndic_wait_at - time.time()
+        if wait > 0:
+            if self._timeout_handle is not None:
+                self.io_loop.remove_timeout(self._timeout_handle)
+            self._timeout_handle = self.io_loop.call_later(wait, self._check_running)
+            return
+        log.debug('jid {0} found all minions {1}'.format(self.jid, self.minions))
+        self._finish()
+
+    def _check_running(self):
+        '''
+        Look for minions still running the job once the timeout passed
+        '''
+        self._timeout_handle = None
+        if self.future.done():
+            return
+        if not self.outstanding:
+            self._check_done()
+            return
+        if self._find_tag is not None and not self._running:
+            # None of the minions which did not return is running the job
+            self._finish()
+            return
+        pub_data = self.find_job(self.jid) if self.find_job else {}
+        if not pub_data or 'jid' not in pub_data:
+            # The master thinks nothing is running the job
+            self._finish()
+            return
+        self._find_tag = 'salt/job/{0}/'.format(pub_data['jid'])
+        self._running = False
+        wait = self.opts['gather_job_timeout']
+        if self.opts.get('order_masters'):
+            wait += self.opts.get('syndic_wait', 1)
+        self._timeout_handle = self.io_loop.call_later(wait, self._check_running)
+
+    def _finish(self):
+        self.stop()
+        self.flush()
+        if not self.future.done():
+            self.future.set_result(self.outstanding)
+
+
 class FunctionWrapper(dict):
     '''
     Create a function wrapper that looks like the functions dict on the minion
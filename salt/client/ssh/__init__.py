@@ -22,6 +22,7 @@ import uuid
 import tempfile
 import binascii
 import sys
+import threading
 
 # Import salt libs
 import salt.client.ssh.shell
@@ -47,6 +48,10 @@ from salt.utils import is_windows
 # Import 3rd-party libs
 import salt.ext.six as six
 from salt.ext.six.moves import input  # pylint: disable=import-error,redefined-builtin
+from salt.ext.six.moves import queue  # pylint: disable=import-error
+import tornado.gen
+import tornado.ioloop
+import tornado.locks
 
 try:
     import zmq
@@ -250,6 +255,7 @@ class SSH(object):
                                              python2_bin=self.opts['python2_bin'],
                                              python3_bin=self.opts['python3_bin'])
         self.mods = mod_data(self.fsclient)
+        self._wfuncs = None
 
     def get_pubkey(self):
         '''
@@ -352,23 +358,140 @@ class SSH(object):
         ret = {'id': single.id}
         stdout, stderr, retcode = single.run()
         # This job is done, yield
+        ret['ret'] = self._parse_ret(stdout, stderr, retcode)
+        que.put(ret)
+
+    def _parse_ret(self, stdout, stderr, retcode):
+        '''
+        Return the return of a target from the output of its routine
+        '''
         try:
             data = salt.utils.find_json(stdout)
             if len(data) < 2 and 'local' in data:
-                ret['ret'] = data['local']
-            else:
-                ret['ret'] = {
-                    'stdout': stdout,
-                    'stderr': stderr,
-                    'retcode': retcode,
-                }
+                return data['local']
         except Exception:
-            ret['ret'] = {
-                'stdout': stdout,
-                'stderr': stderr,
-                'retcode': retcode,
-            }
-        que.put(ret)
+            pass
+        return {
+            'stdout': stdout,
+            'stderr': stderr,
+            'retcode': retcode,
+        }
+
+    @tornado.gen.coroutine
+    def handle_routine_async(self, que, host, slots):
+        '''
+        Run the routine of a target on the current tornado IOLoop, put a dict
+        on the queue and release its slot
+        '''
+        try:
+            single = Single(
+                    copy.deepcopy(self.opts),
+                    self.opts['argv'],
+                    host,
+                    mods=self.mods,
+                    fsclient=self.fsclient,
+                    thin=self.thin,
+                    wfuncs=self.get_wfuncs(),
+                    **self.targets[host])
+            stdout, stderr, retcode = yield single.run_async()
+            que.put({single.id: self._parse_ret(stdout, stderr, retcode)})
+        except Exception as exc:
+            error = ('Target \'{0}\' did not return any data, probably due '
+                     'to an error: {1}').format(host, exc)
+            log.error(error, exc_info_on_loglevel=logging.DEBUG)
+            que.put({host: error})
+        finally:
+            slots.release()
+
+    def get_wfuncs(self):
+        '''
+        Return the wrapper functions, loaded once for all the targets
+        '''
+        if self._wfuncs is None:
+            self._wfuncs = salt.loader.ssh_wrapper(
+                self.opts,
+                None,
+                {'master_opts': self.opts, 'fileclient': self.fsclient})
+        return self._wfuncs
+
+    def use_event_loop(self, mine=False):
+        '''
+        Return True if the targets are driven from a single tornado IOLoop.
+        This needs ssh_event_loop and commands running without a terminal or
+        a password prompt. Wrapper functions and the mine run salt on the
+        master and use a process per target.
+        '''
+        if not self.opts.get('ssh_event_loop', False) or mine:
+            return False
+        if not self.opts.get('raw_shell', False):
+            fun = self.opts['argv'][0] if self.opts['argv'] else ''
+            if fun in self.get_wfuncs():
+                return False
+        for host in self.targets:
+            for default in self.defaults:
+                if default not in self.targets[host]:
+                    self.targets[host][default] = self.defaults[default]
+            if self.targets[host].get('tty') \
+                    or self.targets[host].get('passwd'):
+                log.debug(
+                    'Target \'{0}\' needs a terminal or a password, using a '
+                    'process per target'.format(host)
+                )
+                return False
+        return True
+
+    def handle_ssh_loop(self):
+        '''
+        Execute the routines of all targets from a single tornado IOLoop,
+        running in a thread, and yield the returns as they come in. The ssh
+        and scp commands of up to ssh_loop_max_hosts targets run at the same
+        time, their output read from non-blocking pipes.
+        '''
+        que = queue.Queue()
+        thread = threading.Thread(target=self._run_loop, args=(que,))
+        thread.daemon = True
+        thread.start()
+        while True:
+            try:
+                # Wake up once in a while, a blocking get cannot be
+                # interrupted
+                ret = que.get(True, 1)
+            except queue.Empty:
+                continue
+            if ret is None:
+                break
+            yield ret
+        thread.join()
+
+    def _run_loop(self, que):
+        '''
+        Run the IOLoop driving the targets, put None on the queue once they
+        all returned
+        '''
+        io_loop = tornado.ioloop.IOLoop()
+        try:
+            io_loop.run_sync(lambda: self._drive_targets(que))
+        except Exception as exc:
+            log.error(
+                'Exception \'{0}\' caught while driving the targets'.format(exc),
+                exc_info_on_loglevel=logging.DEBUG
+            )
+        finally:
+            io_loop.close()
+            que.put(None)
+
+    @tornado.gen.coroutine
+    def _drive_targets(self, que):
+        '''
+        Start the routine of each target once a slot is free
+        '''
+        slots = tornado.locks.Semaphore(
+            self.opts.get('ssh_loop_max_hosts', 256))
+        routines = []
+        for host in self.targets:
+            yield slots.acquire()
+            routines.append(self.handle_routine_async(que, host, slots))
+        yield routines
 
     def handle_ssh(self, mine=False):
         '''
@@ -383,6 +506,10 @@ class SSH(object):
         init = False
         if not self.targets:
             raise salt.exceptions.SaltClientError('No matching targets found in roster.')
+        if self.use_event_loop(mine):
+            for ret in self.handle_ssh_loop():
+                yield ret
+            return
         while True:
             if len(running) < self.opts.get('ssh_max_procs', 25) and not init:
                 try:
@@ -611,6 +738,7 @@ class Single(object):
             mine=False,
             minion_opts=None,
             identities_only=False,
+            wfuncs=None,
             **kwargs):
         # Get mine setting and mine_functions if defined in kwargs (from roster)
         self.mine = mine
@@ -671,7 +799,9 @@ class Single(object):
         self.target = kwargs
         self.target.update(args)
         self.serial = salt.payload.Serial(opts)
-        self.wfuncs = salt.loader.ssh_wrapper(opts, None, self.context)
+        if wfuncs is None:
+            wfuncs = salt.loader.ssh_wrapper(opts, None, self.context)
+        self.wfuncs = wfuncs
         self.shell = salt.client.ssh.shell.Shell(opts, **args)
         self.thin = thin if thin else salt.utils.thin.thin_path(opts['cachedir'])
 
@@ -717,6 +847,30 @@ class Single(object):
             )
         return True
 
+    @tornado.gen.coroutine
+    def deploy_async(self):
+        '''
+        Deploy salt-thin on the current tornado IOLoop
+        '''
+        yield self.shell.send_async(
+            self.thin,
+            os.path.join(self.thin_dir, 'salt-thin.tgz'),
+        )
+        yield self.deploy_ext_async()
+        raise tornado.gen.Return(True)
+
+    @tornado.gen.coroutine
+    def deploy_ext_async(self):
+        '''
+        Deploy the ext_mods tarball on the current tornado IOLoop
+        '''
+        if self.mods.get('file'):
+            yield self.shell.send_async(
+                self.mods['file'],
+                os.path.join(self.thin_dir, 'salt-ext_mods.tgz'),
+            )
+        raise tornado.gen.Return(True)
+
     def run(self, deploy_attempted=False):
         '''
         Execute the routine, the routine can be either:
@@ -743,6 +897,19 @@ class Single(object):
 
         return stdout, stderr, retcode
 
+    def run_async(self):
+        '''
+        Execute a raw shell command or a remote Salt command like run, with
+        non-blocking commands on the current tornado IOLoop. The returned
+        future resolves to (stdout, stderr, retcode).
+
+        Wrapper functions run salt on the master and are not supported.
+        '''
+        if self.opts.get('raw_shell', False):
+            cmd_str = ' '.join([self._escape_arg(arg) for arg in self.argv])
+            return self.shell.exec_cmd_async(cmd_str)
+        return self.cmd_block_async()
+
     def run_wfunc(self):
         '''
         Execute a wrapper function
@@ -986,10 +1153,48 @@ ARGS = {9}\n'''.format(self.minion_config,
         5. split SHIM results from command results
         6. return command results
         '''
+        steps = self._cmd_steps()
+        step, arg = next(steps)
+        while step != 'return':
+            if step == 'shim':
+                result = self.shim_cmd(arg)
+            elif step == 'deploy':
+                result = self.deploy()
+            else:
+                result = self.deploy_ext()
+            step, arg = steps.send(result)
+        return arg
+
+    @tornado.gen.coroutine
+    def cmd_block_async(self):
+        '''
+        Run the steps of cmd_block with non-blocking commands on the current
+        tornado IOLoop, the returned future resolves to
+        (stdout, stderr, retcode)
+        '''
+        steps = self._cmd_steps()
+        step, arg = next(steps)
+        while step != 'return':
+            if step == 'shim':
+                result = yield self.shell.exec_cmd_async(arg)
+            elif step == 'deploy':
+                result = yield self.deploy_async()
+            else:
+                result = yield self.deploy_ext_async()
+            step, arg = steps.send(result)
+        raise tornado.gen.Return(arg)
+
+    def _cmd_steps(self):
+        '''
+        Generate the steps of cmd_block. Each step is a tuple of an action and
+        its argument: ('shim', cmd_str) runs the shim, ('deploy', None) and
+        ('deploy_ext', None) deploy salt-thin and the ext_mods, and the result
+        of the action is sent back. The last step is ('return', result).
+        '''
         self.argv = _convert_args(self.argv)
-        log.debug('Performing shimmed, blocking command as follows:\n{0}'.format(' '.join(self.argv)))
+        log.debug('Performing shimmed command as follows:\n{0}'.format(' '.join(self.argv)))
         cmd_str = self._cmd_str()
-        stdout, stderr, retcode = self.shim_cmd(cmd_str)
+        stdout, stderr, retcode = yield 'shim', cmd_str
 
         log.trace('STDOUT {1}\n{0}'.format(stdout, self.target['host']))
         log.trace('STDERR {1}\n{0}'.format(stderr, self.target['host']))
@@ -998,16 +1203,18 @@ ARGS = {9}\n'''.format(self.minion_config,
         error = self.categorize_shim_errors(stdout, stderr, retcode)
         if error:
             if error == 'Undefined SHIM state':
-                self.deploy()
-                stdout, stderr, retcode = self.shim_cmd(cmd_str)
+                yield 'deploy', None
+                stdout, stderr, retcode = yield 'shim', cmd_str
                 if not re.search(RSTR_RE, stdout) or not re.search(RSTR_RE, stderr):
                     # If RSTR is not seen in both stdout and stderr then there
                     # was a thin deployment problem.
-                    return 'ERROR: Failure deploying thin, undefined state: {0}'.format(stdout), stderr, retcode
+                    yield 'return', ('ERROR: Failure deploying thin, undefined state: {0}'.format(stdout), stderr, retcode)
+                    return
                 stdout = re.split(RSTR_RE, stdout, 1)[1].strip()
                 stderr = re.split(RSTR_RE, stderr, 1)[1].strip()
             else:
-                return 'ERROR: {0}'.format(error), stderr, retcode
+                yield 'return', ('ERROR: {0}'.format(error), stderr, retcode)
+                return
 
         # FIXME: this discards output from ssh_shim if the shim succeeds.  It should
         # always save the shim output regardless of shim success or failure.
@@ -1028,33 +1235,36 @@ ARGS = {9}\n'''.format(self.minion_config,
             shim_command = re.split(r'\r?\n', stdout, 1)[0].strip()
             log.debug('SHIM retcode({0}) and command: {1}'.format(retcode, shim_command))
             if 'deploy' == shim_command and retcode == salt.defaults.exitcodes.EX_THIN_DEPLOY:
-                self.deploy()
-                stdout, stderr, retcode = self.shim_cmd(cmd_str)
+                yield 'deploy', None
+                stdout, stderr, retcode = yield 'shim', cmd_str
                 if not re.search(RSTR_RE, stdout) or not re.search(RSTR_RE, stderr):
                     if not self.tty:
                         # If RSTR is not seen in both stdout and stderr then there
                         # was a thin deployment problem.
-                        return 'ERROR: Failure deploying thin: {0}\n{1}'.format(stdout, stderr), stderr, retcode
+                        yield 'return', ('ERROR: Failure deploying thin: {0}\n{1}'.format(stdout, stderr), stderr, retcode)
+                        return
                     elif not re.search(RSTR_RE, stdout):
                         # If RSTR is not seen in stdout with tty, then there
                         # was a thin deployment problem.
-                        return 'ERROR: Failure deploying thin: {0}\n{1}'.format(stdout, stderr), stderr, retcode
+                        yield 'return', ('ERROR: Failure deploying thin: {0}\n{1}'.format(stdout, stderr), stderr, retcode)
+                        return
                 stdout = re.split(RSTR_RE, stdout, 1)[1].strip()
                 if self.tty:
                     stderr = ''
                 else:
                     stderr = re.split(RSTR_RE, stderr, 1)[1].strip()
             elif 'ext_mods' == shim_command:
-                self.deploy_ext()
-                stdout, stderr, retcode = self.shim_cmd(cmd_str)
+                yield 'deploy_ext', None
+                stdout, stderr, retcode = yield 'shim', cmd_str
                 if not re.search(RSTR_RE, stdout) or not re.search(RSTR_RE, stderr):
                     # If RSTR is not seen in both stdout and stderr then there
                     # was a thin deployment problem.
-                    return 'ERROR: Failure deploying ext_mods: {0}'.format(stdout), stderr, retcode
+                    yield 'return', ('ERROR: Failure deploying ext_mods: {0}'.format(stdout), stderr, retcode)
+                    return
                 stdout = re.split(RSTR_RE, stdout, 1)[1].strip()
                 stderr = re.split(RSTR_RE, stderr, 1)[1].strip()
 
-        return stdout, stderr, retcode
+        yield 'return', (stdout, stderr, retcode)
 
     def categorize_shim_errors(self, stdout, stderr, retcode):
         if re.search(RSTR_RE, stdout) and stdout != RSTR+'\n':
@@ -1252,17 +1462,22 @@ def ssh_version():
             ['ssh', '-V'],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE).communicate()
+    return _parse_ssh_version(ret[1])
+
+
+def _parse_ssh_version(output):
+    '''
+    Return the version in the output of ``ssh -V`` as a tuple of integers,
+    OpenSSH_6.7p1 being (6, 7, 1)
+    '''
     try:
-        version_parts = ret[1].split(b',')[0].split(b'_')[1]
-        parts = []
-        for part in version_parts:
-            try:
-                parts.append(int(part))
-            except ValueError:
-                return tuple(parts)
-        return tuple(parts)
+        version = output.split(b',')[0].split(b'_')[1]
     except IndexError:
         return (2, 0)
+    match = re.match(br'(\d+)(?:\.(\d+))?(?:p(\d+))?', version)
+    if match is None:
+        return (2, 0)
+    return tuple(int(part) for part in match.groups() if part is not None)
 
 
 def _convert_args(args):
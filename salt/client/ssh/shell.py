@@ -18,6 +18,10 @@ import salt.utils
 import salt.utils.nb_popen
 import salt.utils.vt
 
+# Import 3rd-party libs
+import tornado.gen
+import tornado.process
+
 log = logging.getLogger(__name__)
 
 SSH_PASSWORD_PROMPT_RE = re.compile(r'(?:.*)[Pp]assword(?: for .*)?:', re.M)
@@ -115,19 +119,50 @@ class Shell(object):
             options.append('User={0}'.format(self.user))
         if self.identities_only:
             options.append('IdentitiesOnly=yes')
+        options.extend(self._control_opts())
 
         ret = []
         for option in options:
             ret.append('-o {0} '.format(option))
         return ''.join(ret)
 
+    def _control_opts(self):
+        '''
+        Return the options multiplexing the ssh and scp commands run against
+        the host over a single connection, kept open by its ControlMaster for
+        ssh_control_persist seconds after the last of them, so that following
+        commands and salt-ssh runs do not connect again
+        '''
+        if not self.opts.get('ssh_multiplex', False):
+            return []
+        control_dir = os.path.join(self.opts['cachedir'], 'ssh_control')
+        if not os.path.isdir(control_dir):
+            try:
+                os.makedirs(control_dir, 0o700)
+            except OSError:
+                # Created by another command in the meantime
+                pass
+        ssh_version = self.opts.get('_ssh_version', (0,))
+        # The path of a unix socket is limited to about 100 bytes, %C is a
+        # hash of the connection
+        if ssh_version >= (6, 7):
+            control_name = '%C'
+        else:
+            control_name = '%r@%h:%p'
+        options = ['ControlMaster=auto',
+                   'ControlPath={0}'.format(
+                       os.path.join(control_dir, control_name))]
+        if ssh_version >= (5, 6):
+            options.append('ControlPersist={0}'.format(
+                self.opts.get('ssh_control_persist', 60)))
+        return options
+
     def _passwd_opts(self):
         '''
         Return options to pass to ssh
         '''
-        # TODO ControlMaster does not work without ControlPath
-        # user could take advantage of it if they set ControlPath in their
-        # ssh config.  Also, ControlPersist not widely available.
+        # ControlMaster only shares the connection with a ControlPath, which
+        # is set when ssh_multiplex is on
         options = ['ControlMaster=auto',
                    'StrictHostKeyChecking=no',
                    ]
@@ -155,6 +190,10 @@ class Shell(object):
             options.append('User={0}'.format(self.user))
         if self.identities_only:
             options.append('IdentitiesOnly=yes')
+        control_opts = self._control_opts()
+        if control_opts:
+            options.remove('ControlMaster=auto')
+            options.extend(control_opts)
 
         ret = []
         for option in options:
@@ -203,9 +242,10 @@ class Shell(object):
             stdout, stderr, retcode = self._run_cmd(self._copy_id_str_new())
         return stdout, stderr, retcode
 
-    def _cmd_str(self, cmd, ssh='ssh'):
+    def _cmd_str(self, cmd, ssh='ssh', batch=False):
         '''
-        Return the cmd string to execute
+        Return the cmd string to execute, a command in batch mode fails
+        instead of asking for a password
         '''
 
         # TODO: if tty, then our SSH_SHIM cannot be supplied from STDIN Will
@@ -219,6 +259,8 @@ class Shell(object):
             opts = self._passwd_opts()
         if self.priv:
             opts = self._key_opts()
+        if batch:
+            opts += '-o BatchMode=yes '
         return "{0} {1} {2} {3} {4}".format(
                 ssh,
                 '' if ssh == 'scp' else self.host,
@@ -324,6 +366,56 @@ class Shell(object):
 
         return self._run_cmd(cmd)
 
+    def exec_cmd_async(self, cmd):
+        '''
+        Execute a remote command on the current tornado IOLoop, the returned
+        future resolves to (stdout, stderr, retcode)
+        '''
+        cmd = self._cmd_str(cmd, batch=True)
+        if 'decode("base64")' in cmd:
+            log.debug('Executing SHIM command. Command logged to TRACE')
+            log.trace('Executing command: {0}'.format(cmd))
+        else:
+            log.debug('Executing command: {0}'.format(cmd))
+        return self._run_cmd_async(cmd)
+
+    def send_async(self, local, remote):
+        '''
+        scp a file or files to a remote system on the current tornado IOLoop
+        '''
+        cmd = '{0} {1}:{2}'.format(local, self.host, remote)
+        cmd = self._cmd_str(cmd, ssh='scp', batch=True)
+        log.debug('Executing command: {0}'.format(cmd))
+        return self._run_cmd_async(cmd)
+
+    @tornado.gen.coroutine
+    def _run_cmd_async(self, cmd):
+        '''
+        Execute a shell command reading its output from non-blocking pipes.
+        Nothing can be answered to prompts, the command must run in batch
+        mode.
+        '''
+        with salt.utils.fopen(os.devnull, 'rb') as devnull:
+            proc = tornado.process.Subprocess(
+                cmd,
+                shell=True,
+                stdin=devnull,
+                stdout=tornado.process.Subprocess.STREAM,
+                stderr=tornado.process.Subprocess.STREAM,
+            )
+        try:
+            stdout, stderr = yield [proc.stdout.read_until_close(),
+                                    proc.stderr.read_until_close()]
+        except Exception:
+            proc.proc.kill()
+            proc.proc.wait()
+            raise
+        # Both pipes are closed, the command is exiting. The exit callbacks of
+        # tornado need a SIGCHLD handler, which can only be set in the main
+        # thread.
+        retcode = proc.proc.wait()
+        raise tornado.gen.Return((stdout, stderr, retcode))
+
     def _run_cmd(self, cmd, key_accept=False, passwd_retries=3):
         '''
         Execute a shell command via VT. This is blocking and assumes that ssh
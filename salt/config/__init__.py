@@ -152,6 +152,9 @@ VALID_OPTS = {
     # A flag indicating that a highstate run should immediately cease if a failure occurs.
     'failhard': bool,
 
+    # The number of states with parallel set which may run at the same time
+    'state_concurrency': int,
+
     # A flag to indicate that highstate runs should force refresh the modules prior to execution
     'autoload_dynamic_modules': bool,
 
@@ -234,6 +237,15 @@ VALID_OPTS = {
     # Whether or not processes should be forked when needed. The altnerative is to use threading.
     'multiprocessing': bool,
 
+    # The number of pre-forked processes which run the jobs of a minion, 0 disables the pool
+    'job_pool_size': int,
+
+    # The number of jobs a job pool worker runs before it is replaced
+    'job_pool_max_jobs': int,
+
+    # Replace a job pool worker once its resident memory grows over this many megabytes
+    'job_pool_max_rss': int,
+
     # Schedule a mine update every n number of seconds
     'mine_interval': int,
 
@@ -246,6 +258,12 @@ VALID_OPTS = {
     # The chunk size to use when streaming files with the file server
     'file_buffer_size': int,
 
+    # The number of file server chunks a minion asks for in a single request when fetching a file
+    'file_transfer_window': int,
+
+    # The size from which a changed file already in the minion's cache is updated with a delta
+    'file_delta_min_size': int,
+
     # The TCP port on which minion events should be published if ipc_mode is TCP
     'tcp_pub_port': int,
 
@@ -301,6 +319,12 @@ VALID_OPTS = {
     # Tell the loader to attempt to import *.zip archives
     'enable_zip_modules': bool,
 
+    # Tell the loader to keep an index of the module files in the cachedir
+    'loader_index': bool,
+
+    # Tell the loader to cache the results of __virtual__ in the cachedir
+    'virtual_cache': bool,
+
     # Tell the client to show minions that have timed out
     'show_timeout': bool,
 
@@ -388,6 +412,9 @@ VALID_OPTS = {
     # Events matching a tag in this list should never be sent to an event returner.
     'event_return_blacklist': list,
 
+    # Only have the master event publisher send a LocalClient the events of the jobs it published
+    'client_event_filter': bool,
+
     # This pidfile to write out to when a deamon starts
     'pidfile': str,
 
@@ -459,6 +486,16 @@ VALID_OPTS = {
     'gitfs_env_whitelist': list,
     'gitfs_env_blacklist': list,
     'gitfs_ssl_verify': bool,
+
+    # The number of remotes gitfs and git_pillar fetch at the same time
+    'gitfs_fetch_workers': int,
+    'git_pillar_fetch_workers': int,
+
+    # Keep an in-memory index of the blobs of the gitfs environments
+    'gitfs_blob_index': bool,
+
+    # Serve gitfs files from the git object store instead of the cache
+    'gitfs_serve_blobs': bool,
     'hgfs_remotes': list,
     'hgfs_mountpoint': str,
     'hgfs_root': str,
@@ -494,6 +531,18 @@ VALID_OPTS = {
     # encountering duplicate values
     'pillar_source_merging_strategy': str,
 
+    # Cache the compiled pillar of each minion on the master
+    'pillar_cache': bool,
+
+    # The number of seconds a compiled pillar is served from the pillar cache
+    'pillar_cache_ttl': int,
+
+    # Where the pillar cache is kept, either 'disk' or 'memory'
+    'pillar_cache_backend': str,
+
+    # Encrypt the pillar cache on disk with the master AES key
+    'pillar_cache_encrypt': bool,
+
     # How to merge multiple top files from multiple salt environments
     # (saltenvs); can be 'merge' or 'same'
     'top_file_merging_strategy': str,
@@ -525,6 +574,9 @@ VALID_OPTS = {
     'fileserver_ignoresymlinks': bool,
     'fileserver_limit_traversal': bool,
 
+    # Keep the file lists and the mtime map of the file_roots up to date incrementally
+    'roots_watch': bool,
+
     # The number of open files a daemon is allowed to have open. Frequently needs to be increased
     # higher than the system default in order to account for the way zeromq consumes file handles.
     'max_open_files': int,
@@ -556,12 +608,30 @@ VALID_OPTS = {
     # Specify whether the master should store end times for jobs as returns come in
     'job_cache_store_endtime': bool,
 
+    # Keep an index of the jobs in the local job cache, so that jobs can be listed and cleaned out
+    # without reading every job in the cache
+    'job_cache_index': bool,
+
+    # The number of minion returns each master worker queues up to be written to the job cache in
+    # the background. Set to 0 to write every return before the worker handles the next request.
+    'job_cache_queue_size': int,
+
+    # The largest number of queued minion returns written to the job cache at once
+    'job_cache_batch_size': int,
+
+    # The number of seconds between the job cache queue stats events fired by each master worker
+    'job_cache_stats_interval': int,
+
     # The minion data cache is a cache of information about the minions stored on the master.
     # This information is primarily the pillar and grains data. The data is cached in the master
     # cachedir under the name of the minion and used to predetermine what minions are expected to
     # reply from executions.
     'minion_data_cache': bool,
 
+    # Keep an in-memory index of the minion data cache in the master workers so that grain and
+    # pillar targets don't have to load the cached data of every minion.
+    'minion_data_cache_index': bool,
+
     # The number of seconds between AES key rotations on the master
     'publish_session': int,
 
@@ -577,6 +647,12 @@ VALID_OPTS = {
     # The queue size for workers in the reactor
     'reactor_worker_hwm': int,
 
+    # The number of processes rendering reactions in the reactor
+    'reactor_render_workers': int,
+
+    # The number of seconds between the stats events of the reactor workers
+    'reactor_stats_interval': int,
+
     'serial': str,
     'search': str,
 
@@ -670,6 +746,9 @@ VALID_OPTS = {
     # The length that the syndic event queue must hit before events are popped off and forwarded
     'syndic_jid_forward_cache_hwm': int,
 
+    # The most bytes of job returns the syndic forwards to the master in a single message
+    'syndic_forward_batch_size': int,
+
     'ssh_passwd': str,
     'ssh_port': str,
     'ssh_sudo': bool,
@@ -679,6 +758,16 @@ VALID_OPTS = {
     'ssh_scan_timeout': float,
     'ssh_identities_only': bool,
 
+    # Share one connection to each host between the commands of salt-ssh and
+    # keep it open for ssh_control_persist seconds
+    'ssh_multiplex': bool,
+    'ssh_control_persist': int,
+
+    # Drive the salt-ssh targets from a single event loop, with at most
+    # ssh_loop_max_hosts of them at a time
+    'ssh_event_loop': bool,
+    'ssh_loop_max_hosts': int,
+
     # Enable ioflo verbose logging. Warning! Very verbose!
     'ioflo_verbose': int,
 
@@ -777,6 +866,7 @@ DEFAULT_MINION_OPTS = {
     'backup_mode': '',
     'renderer': 'yaml_jinja',
     'failhard': False,
+    'state_concurrency': 4,
     'autoload_dynamic_modules': True,
     'environment': None,
     'pillarenv': None,
@@ -831,6 +921,10 @@ DEFAULT_MINION_OPTS = {
     'gitfs_env_whitelist': [],
     'gitfs_env_blacklist': [],
     'gitfs_ssl_verify': False,
+    'gitfs_fetch_workers': 1,
+    'git_pillar_fetch_workers': 1,
+    'gitfs_blob_index': False,
+    'gitfs_serve_blobs': False,
     'hash_type': 'md5',
     'disable_modules': [],
     'disable_returners': [],
@@ -848,10 +942,15 @@ DEFAULT_MINION_OPTS = {
     'auto_accept': True,
     'autosign_timeout': 120,
     'multiprocessing': _DFLT_MULTIPROCESSING_MODE,
+    'job_pool_size': 0,
+    'job_pool_max_jobs': 100,
+    'job_pool_max_rss': 0,
     'mine_interval': 60,
     'ipc_mode': _DFLT_IPC_MODE,
     'ipv6': False,
     'file_buffer_size': 262144,
+    'file_transfer_window': 4,
+    'file_delta_min_size': 1048576,
     'tcp_pub_port': 4510,
     'tcp_pull_port': 4511,
     'log_file': os.path.join(salt.syspaths.LOGS_DIR, 'minion'),
@@ -867,6 +966,8 @@ DEFAULT_MINION_OPTS = {
     'ext_job_cache': '',
     'cython_enable': False,
     'enable_zip_modules': False,
+    'loader_index': False,
+    'virtual_cache': False,
     'state_verbose': True,
     'state_output': 'full',
     'state_output_diff': False,
@@ -1003,6 +1104,10 @@ DEFAULT_MASTER_OPTS = {
     'gitfs_env_whitelist': [],
     'gitfs_env_blacklist': [],
     'gitfs_ssl_verify': False,
+    'gitfs_fetch_workers': 1,
+    'git_pillar_fetch_workers': 1,
+    'gitfs_blob_index': False,
+    'gitfs_serve_blobs': False,
     'hgfs_remotes': [],
     'hgfs_mountpoint': '',
     'hgfs_root': '',
@@ -1030,6 +1135,10 @@ DEFAULT_MASTER_OPTS = {
     'pillar_opts': False,
     'pillar_safe_render_error': True,
     'pillar_source_merging_strategy': 'smart',
+    'pillar_cache': False,
+    'pillar_cache_ttl': 3600,
+    'pillar_cache_backend': 'disk',
+    'pillar_cache_encrypt': False,
     'ping_on_rotate': False,
     'peer': {},
     'preserve_minion_cache': False,
@@ -1051,6 +1160,7 @@ DEFAULT_MASTER_OPTS = {
     'fileserver_followsymlinks': True,
     'fileserver_ignoresymlinks': False,
     'fileserver_limit_traversal': False,
+    'roots_watch': False,
     'max_open_files': 100000,
     'hash_type': 'md5',
     'conf_file': os.path.join(salt.syspaths.CONFIG_DIR, 'master'),
@@ -1058,6 +1168,7 @@ DEFAULT_MASTER_OPTS = {
     'auto_accept': False,
     'renderer': 'yaml_jinja',
     'failhard': False,
+    'state_concurrency': 4,
     'state_top': 'top.sls',
     'state_top_saltenv': None,
     'master_tops': {},
@@ -1066,7 +1177,12 @@ DEFAULT_MASTER_OPTS = {
     'ext_job_cache': '',
     'master_job_cache': 'local_cache',
     'job_cache_store_endtime': False,
+    'job_cache_index': True,
+    'job_cache_queue_size': 0,
+    'job_cache_batch_size': 100,
+    'job_cache_stats_interval': 60,
     'minion_data_cache': True,
+    'minion_data_cache_index': False,
     'enforce_mine_cache': False,
     'ipc_mode': _DFLT_IPC_MODE,
     'ipv6': False,
@@ -1089,10 +1205,13 @@ DEFAULT_MASTER_OPTS = {
     'reactor_refresh_interval': 60,
     'reactor_worker_threads': 10,
     'reactor_worker_hwm': 10000,
+    'reactor_render_workers': 0,
+    'reactor_stats_interval': 60,
     'event_return': '',
     'event_return_queue': 0,
     'event_return_whitelist': [],
     'event_return_blacklist': [],
+    'client_event_filter': False,
     'serial': 'msgpack',
     'state_verbose': True,
     'state_output': 'full',
@@ -1105,6 +1224,7 @@ DEFAULT_MASTER_OPTS = {
     'loop_interval': 60,
     'nodegroups': {},
     'cython_enable': False,
+    'loader_index': False,
     'enable_gpu_grains': False,
     # XXX: Remove 'key_logfile' support in 2014.1.0
     'key_logfile': os.path.join(salt.syspaths.LOGS_DIR, 'key'),
@@ -1135,6 +1255,7 @@ DEFAULT_MASTER_OPTS = {
     'syndic_event_forward_timeout': 0.5,
     'syndic_max_event_process_time': 0.5,
     'syndic_jid_forward_cache_hwm': 100,
+    'syndic_forward_batch_size': 1048576,
     'ssh_passwd': '',
     'ssh_port': '22',
     'ssh_sudo': False,
@@ -1143,6 +1264,10 @@ DEFAULT_MASTER_OPTS = {
     'ssh_scan_ports': '22',
     'ssh_scan_timeout': 0.01,
     'ssh_identities_only': False,
+    'ssh_multiplex': False,
+    'ssh_control_persist': 60,
+    'ssh_event_loop': False,
+    'ssh_loop_max_hosts': 256,
     'master_floscript': os.path.join(FLO_DIR, 'master.flo'),
     'worker_floscript': os.path.join(FLO_DIR, 'worker.flo'),
     'maintenance_floscript': os.path.join(FLO_DIR, 'maint.flo'),
@@ -45,6 +45,11 @@ import tornado.gen
 
 log = logging.getLogger(__name__)
 
+# Private keys loaded by get_rsa_key(), keyed by path
+_RSA_KEYS = {}
+# Public keys of accepted minions loaded by get_minion_pub(), keyed by path
+_MINION_PUBS = {}
+
 
 def dropfile(cachedir, user=None):
     '''
@@ -111,13 +116,67 @@ def gen_keys(keydir, keyname, keysize, user=None):
     return priv
 
 
+def get_rsa_key(path):
+    '''
+    Read a RSA private key off the disk. The parsed key is cached for the life
+    of the process, so the key file is only read once for each path.
+
+    :param str path: The path to the PEM encoded private key
+
+    :return: The RSA key object
+    '''
+    if path not in _RSA_KEYS:
+        log.debug('salt.crypt.get_rsa_key: Loading private key')
+        with salt.utils.fopen(path) as f:
+            _RSA_KEYS[path] = RSA.importKey(f.read())
+    return _RSA_KEYS[path]
+
+
+def get_minion_pub(pki_dir, id_):
+    '''
+    Return the parsed public key of an accepted minion.
+
+    Parsed keys are cached for the life of the process. A cached key is only
+    reused while the accepted key file still has the same inode, size and
+    mtime, so accepting, rejecting or deleting the key (which moves or
+    removes the file) invalidates the cached entry.
+
+    :param str pki_dir: The pki_dir of the master
+    :param str id_: A minion ID
+
+    :return: The RSA public key object, or None if the key cannot be parsed
+
+    :raises: OSError or IOError if the key of the minion is not accepted
+    '''
+    pub_path = os.path.join(pki_dir, 'minions', id_)
+    try:
+        stat = os.stat(pub_path)
+    except OSError:
+        _MINION_PUBS.pop(pub_path, None)
+        raise
+    sig = (stat.st_ino, stat.st_size, stat.st_mtime)
+    cached = _MINION_PUBS.get(pub_path)
+    if cached is not None and cached[0] == sig:
+        return cached[1]
+
+    with salt.utils.fopen(pub_path, 'r') as fp_:
+        minion_pub = fp_.read()
+    try:
+        pub = RSA.importKey(minion_pub)
+    except (ValueError, IndexError, TypeError) as err:
+        log.error('Unable to load public key "{0}": {1}'
+                  .format(pub_path, err))
+        _MINION_PUBS.pop(pub_path, None)
+        return None
+    _MINION_PUBS[pub_path] = (sig, pub)
+    return pub
+
+
 def sign_message(privkey_path, message):
     '''
     Use Crypto.Signature.PKCS1_v1_5 to sign a message. Returns the signature.
     '''
-    log.debug('salt.crypt.sign_message: Loading private key')
-    with salt.utils.fopen(privkey_path) as f:
-        key = RSA.importKey(f.read())
+    key = get_rsa_key(privkey_path)
     log.debug('salt.crypt.sign_message: Signing message.')
     signer = PKCS1_v1_5.new(key)
     return signer.sign(SHA.new(message))
@@ -1092,6 +1151,22 @@ class SAuth(AsyncAuth):
         sys.exit(42)
 
 
+def _compare_digest(a, b):
+    '''
+    Compare two digests in constant time
+    '''
+    if len(a) != len(b):
+        return False
+    result = 0
+    for zipped_x, zipped_y in zip(a, b):
+        result |= ord(zipped_x) ^ ord(zipped_y)
+    return result == 0
+
+
+# Added in python 2.7.7
+_compare_digest = getattr(hmac, 'compare_digest', _compare_digest)
+
+
 class Crypticle(object):
     '''
     Authenticated encryption class
@@ -1109,6 +1184,18 @@ class Crypticle(object):
         self.keys = self.extract_keys(self.key_string, key_size)
         self.key_size = key_size
         self.serial = salt.payload.Serial(opts)
+        # Keyed once, copied for every message
+        self._hmac = hmac.new(self.keys[1], digestmod=hashlib.sha256)
+
+    # hmac objects cannot be pickled, rebuild it on the other side
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_hmac']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._hmac = hmac.new(self.keys[1], digestmod=hashlib.sha256)
 
     @classmethod
     def generate_key_string(cls, key_size=192):
@@ -1125,36 +1212,35 @@ class Crypticle(object):
         '''
         encrypt data with AES-CBC and sign it with HMAC-SHA256
         '''
-        aes_key, hmac_key = self.keys
+        aes_key = self.keys[0]
         pad = self.AES_BLOCK_SIZE - len(data) % self.AES_BLOCK_SIZE
-        data = data + pad * chr(pad)
         iv_bytes = os.urandom(self.AES_BLOCK_SIZE)
         cypher = AES.new(aes_key, AES.MODE_CBC, iv_bytes)
-        data = iv_bytes + cypher.encrypt(data)
-        sig = hmac.new(hmac_key, data, hashlib.sha256).digest()
-        return data + sig
+        data = cypher.encrypt(data + pad * chr(pad))
+        mac = self._hmac.copy()
+        mac.update(iv_bytes)
+        mac.update(data)
+        return b''.join((iv_bytes, data, mac.digest()))
 
     def decrypt(self, data):
         '''
         verify HMAC-SHA256 signature and decrypt data with AES-CBC
         '''
-        aes_key, hmac_key = self.keys
-        sig = data[-self.SIG_SIZE:]
-        data = data[:-self.SIG_SIZE]
-        mac_bytes = hmac.new(hmac_key, data, hashlib.sha256).digest()
-        if len(mac_bytes) != len(sig):
+        aes_key = self.keys[0]
+        if len(data) < self.AES_BLOCK_SIZE + self.SIG_SIZE:
             log.debug('Failed to authenticate message')
             raise AuthenticationError('message authentication failed')
-        result = 0
-        for zipped_x, zipped_y in zip(mac_bytes, sig):
-            result |= ord(zipped_x) ^ ord(zipped_y)
-        if result != 0:
+        # Slice the signed part without copying it
+        view = memoryview(data)
+        end = len(data) - self.SIG_SIZE
+        mac = self._hmac.copy()
+        mac.update(view[:end])
+        if not _compare_digest(mac.digest(), data[end:]):
             log.debug('Failed to authenticate message')
             raise AuthenticationError('message authentication failed')
         iv_bytes = data[:self.AES_BLOCK_SIZE]
-        data = data[self.AES_BLOCK_SIZE:]
         cypher = AES.new(aes_key, AES.MODE_CBC, iv_bytes)
-        data = cypher.decrypt(data)
+        data = cypher.decrypt(data[self.AES_BLOCK_SIZE:end])
         return data[:-ord(data[-1])]
 
     def dumps(self, obj):
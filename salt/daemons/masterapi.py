@@ -421,6 +421,7 @@ class RemoteFuncs(object):
         self._serve_file = fs_.serve_file
         self._file_hash = fs_.file_hash
         self._file_list = fs_.file_list
+        self._file_manifest = fs_.file_manifest
         self._file_list_emptydirs = fs_.file_list_emptydirs
         self._dir_list = fs_.dir_list
         self._symlink_list = fs_.symlink_list
@@ -717,14 +718,17 @@ class RemoteFuncs(object):
             datap = os.path.join(cdir, 'data.p')
             tmpfh, tmpfname = tempfile.mkstemp(dir=cdir)
             os.close(tmpfh)
+            cache_data = self.serial.dumps(
+                {'grains': load['grains'],
+                 'pillar': data})
             with salt.utils.fopen(tmpfname, 'w+b') as fp_:
-                fp_.write(
-                        self.serial.dumps(
-                            {'grains': load['grains'],
-                             'pillar': data})
-                            )
+                fp_.write(cache_data)
             # On Windows, os.rename will fail if the destination file exists.
             salt.utils.atomicfile.atomic_rename(tmpfname, datap)
+            if self.ckminions.data_index is not None:
+                # Index the data as it will be read back from the cache
+                self.ckminions.data_index.add(
+                    load['id'], self.serial.loads(cache_data))
         return data
 
     def _minion_event(self, load):
@@ -803,6 +807,18 @@ class RemoteFuncs(object):
                 ret['out'] = load['out']
             self._return(ret)
 
+    def _syndic_returns(self, load):
+        '''
+        Receive the returns of several jobs forwarded in one message by a
+        syndic
+        '''
+        if not isinstance(load.get('returns'), list):
+            return None
+        for ret in load['returns']:
+            if isinstance(ret, dict):
+                self._syndic_return(ret)
+        return True
+
     def minion_runner(self, load):
         '''
         Execute a runner from a minion, return the runner's function data
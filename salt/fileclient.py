@@ -10,6 +10,7 @@ import logging
 import hashlib
 import os
 import shutil
+import tempfile
 
 # Import salt libs
 from salt.exceptions import (
@@ -22,6 +23,8 @@ import salt.payload
 import salt.transport
 import salt.fileserver
 import salt.utils
+import salt.utils.atomicfile
+import salt.utils.delta
 import salt.utils.files
 import salt.utils.templates
 import salt.utils.url
@@ -30,6 +33,7 @@ import salt.utils.http
 from salt.utils.openstack.swift import SaltSwift
 
 # pylint: disable=no-name-in-module,import-error
+import salt.ext.six as six
 import salt.ext.six.moves.BaseHTTPServer as BaseHTTPServer
 from salt.ext.six.moves.urllib.error import HTTPError, URLError
 from salt.ext.six.moves.urllib.parse import urlparse, urlunparse
@@ -191,10 +195,34 @@ class Client(object):
             saltenv = env
 
         ret = []
+        manifest = self.file_manifest(saltenv)
+        if manifest:
+            for path in sorted(manifest):
+                ret.append(self._cache_manifest_file(path, saltenv, manifest[path]))
+            return ret
         for path in self.file_list(saltenv):
             ret.append(self.cache_file(salt.utils.url.create(path), saltenv))
         return ret
 
+    def file_manifest(self, saltenv='base', prefix=''):
+        '''
+        Return a dict of the files of an environment to their hash, hash type
+        and size, or an empty dict if the file server cannot send it
+        '''
+        return {}
+
+    def _cache_manifest_file(self, path, saltenv, info):
+        '''
+        Cache a file listed in a file manifest, the file is only fetched if
+        the cached copy does not match the size and hash in the manifest
+        '''
+        dest = salt.utils.path_join(self.opts['cachedir'], 'files', saltenv, path)
+        if (os.path.isfile(dest) and
+                info.get('size') in (None, os.path.getsize(dest)) and
+                salt.utils.get_hash(dest, info['hash_type']) == info['hsum']):
+            return dest
+        return self.cache_file(salt.utils.url.create(path), saltenv)
+
     def cache_dir(self, path, saltenv='base', include_empty=False,
                   include_pat=None, exclude_pat=None, env=None):
         '''
@@ -225,12 +253,17 @@ class Client(object):
             )
         )
         # go through the list of all files finding ones that are in
-        # the target directory and caching them
-        for fn_ in self.file_list(saltenv):
+        # the target directory and caching them, the manifest lets the files
+        # which did not change be skipped without asking the master for each
+        manifest = self.file_manifest(saltenv, path)
+        for fn_ in sorted(manifest) if manifest else self.file_list(saltenv):
             if fn_.strip() and fn_.startswith(path):
                 if salt.utils.check_include_exclude(
                         fn_, include_pat, exclude_pat):
-                    fn_ = self.cache_file(salt.utils.url.create(fn_), saltenv)
+                    if manifest:
+                        fn_ = self._cache_manifest_file(fn_, saltenv, manifest[fn_])
+                    else:
+                        fn_ = self.cache_file(salt.utils.url.create(fn_), saltenv)
                     if fn_:
                         ret.append(fn_)
 
@@ -1015,6 +1048,14 @@ class RemoteClient(Client):
                     )
                 )
                 return dest2check
+            min_size = self.opts.get('file_delta_min_size', 0)
+            if min_size and os.path.getsize(dest2check) >= min_size:
+                if self._get_file_delta(path, saltenv, dest2check, hash_server, gzip):
+                    log.info(
+                        'Fetching file from saltenv \'{0}\', ** done ** '
+                        'updated cached copy \'{1}\''.format(saltenv, path)
+                    )
+                    return dest2check
 
         log.debug(
             'Fetching file from saltenv \'{0}\', ** attempting ** '
@@ -1029,6 +1070,11 @@ class RemoteClient(Client):
         if gzip:
             gzip = int(gzip)
             load['gzip'] = gzip
+        window = self.opts.get('file_transfer_window', 1)
+        if window > 1:
+            # Ask for several chunks per round trip, older masters ignore
+            # this and keep sending one chunk per request
+            load['window'] = window
 
         fn_ = None
         if dest:
@@ -1074,11 +1120,27 @@ class RemoteClient(Client):
                         if os.path.isdir(dest):
                             salt.utils.rm_rf(dest)
                         fn_ = salt.utils.fopen(dest, 'wb+')
+                eof = data.get('eof', False)
                 if data.get('gzip', None):
                     data = salt.utils.gzip_util.uncompress(data['data'])
                 else:
                     data = data['data']
                 fn_.write(data)
+                if eof:
+                    # The master read to the end of the file, so there is no
+                    # need to ask it for an empty chunk. Verify the download
+                    # once against the hash fetched before it started.
+                    fn_.flush()
+                    d_tries += 1
+                    hsum = salt.utils.get_hash(
+                        dest, hash_server.get('hash_type', 'md5'))
+                    if hsum != hash_server.get('hsum') and d_tries < 3:
+                        log.warn('Bad download of file {0}, attempt {1} '
+                                 'of 3'.format(path, d_tries))
+                        fn_.seek(0)
+                        fn_.truncate()
+                        continue
+                    break
             except (TypeError, KeyError) as e:
                 transport_tries += 1
                 log.error('Data transport is broken, got: {0}, type: {1}, '
@@ -1103,6 +1165,54 @@ class RemoteClient(Client):
 
         return dest
 
+    def _get_file_delta(self, path, saltenv, cached, hash_server, gzip=None):
+        '''
+        Update the cached copy of a file with only the parts of it which
+        changed on the master. Returns False, leaving the cached copy alone,
+        if the master cannot send deltas or the rebuilt file does not match
+        the hash of the file on the master.
+        '''
+        load = {'path': self._check_proto(path),
+                'saltenv': saltenv,
+                'cmd': '_serve_file',
+                'loc': 0,
+                'delta': salt.utils.delta.signatures(cached)}
+        if gzip:
+            load['gzip'] = int(gzip)
+        window = self.opts.get('file_transfer_window', 1)
+        if window > 1:
+            load['window'] = window
+        size = load['delta']['block_size']
+
+        fd_, tmp = tempfile.mkstemp(prefix='.', dir=os.path.dirname(cached))
+        try:
+            with salt.utils.fopen(cached, 'rb') as old:
+                with os.fdopen(fd_, 'wb') as new:
+                    while True:
+                        data = self.channel.send(load)
+                        if not isinstance(data, dict) or 'delta' not in data:
+                            # Older masters send the first chunk of the file
+                            return False
+                        ops = data['delta']
+                        if data.get('gzip', None):
+                            ops = [op_ if isinstance(op_, six.integer_types)
+                                   else salt.utils.gzip_util.uncompress(op_)
+                                   for op_ in ops]
+                        salt.utils.delta.patch(ops, old, new, size)
+                        if data['eof']:
+                            break
+                        load['loc'] = data['loc']
+                        load['delta']['expect'] = data['expect']
+            hsum = salt.utils.get_hash(tmp, hash_server.get('hash_type', 'md5'))
+            if hsum != hash_server.get('hsum'):
+                log.warn('Bad delta of file {0}, fetching all of it'.format(path))
+                return False
+            salt.utils.atomicfile.atomic_rename(tmp, cached)
+            return True
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
     def file_list(self, saltenv='base', prefix='', env=None):
         '''
         List the files on the master
@@ -1123,6 +1233,20 @@ class RemoteClient(Client):
 
         return self.channel.send(load)
 
+    def file_manifest(self, saltenv='base', prefix=''):
+        '''
+        Return the hash, hash type and size of the files on the master, or an
+        empty dict if the master does not support file manifests
+        '''
+        load = {'saltenv': saltenv,
+                'prefix': prefix,
+                'cmd': '_file_manifest'}
+        ret = self.channel.send(load)
+        # Older masters answer False to unknown requests
+        if not isinstance(ret, dict):
+            return {}
+        return ret
+
     def file_list_emptydirs(self, saltenv='base', prefix='', env=None):
         '''
         List the empty dirs on the master
@@ -15,7 +15,10 @@ import time
 # Import salt libs
 import salt.loader
 import salt.utils
+import salt.utils.delta
+import salt.utils.gzip_util
 import salt.utils.locales
+import salt.utils.url
 
 # Import 3rd-party libs
 import salt.ext.six as six
@@ -171,14 +174,15 @@ def check_env_cache(opts, env_cache):
     return None
 
 
-def generate_mtime_map(path_map):
+def generate_mtime_map(path_map, followlinks=False):
     '''
-    Generate a dict of filename -> mtime
+    Generate a dict of filename -> mtime, the files in symlinked directories
+    are only included with followlinks
     '''
     file_map = {}
     for saltenv, path_list in six.iteritems(path_map):
         for path in path_list:
-            for directory, dirnames, filenames in os.walk(path):
+            for directory, dirnames, filenames in os.walk(path, followlinks=followlinks):
                 for item in filenames:
                     try:
                         file_path = os.path.join(directory, item)
@@ -272,6 +276,81 @@ def is_file_ignored(opts, fname):
     return False
 
 
+# The most chunks of file_buffer_size bytes served for one request
+MAX_WINDOW = 32
+
+
+def read_chunk(path, load, opts):
+    '''
+    Return the data of a serve_file request for path, starting at the loc of
+    the load, and compressed if the load asks for it.
+
+    A client passing a window gets that many chunks of file_buffer_size bytes
+    in one reply, read from the file opened once, and eof set once the end of
+    the file was reached. A client not passing it gets a single chunk, as
+    before, and a client talking to an older master does not get eof, which
+    is how it knows to fall back to a chunk per request.
+
+    A client passing the block signatures of its cached copy of the file as
+    delta gets the operations rebuilding the file from its copy instead, see
+    :mod:`salt.utils.delta`.
+    '''
+    with salt.utils.fopen(path, 'rb') as fp_:
+        return read_fp_chunk(fp_, load, opts)
+
+
+def read_fp_chunk(fp_, load, opts):
+    '''
+    Return the data of a serve_file request read from the file object fp_,
+    which can also be an in-memory buffer, see read_chunk
+    '''
+    ret = {}
+    size = opts['file_buffer_size']
+    window = load.get('window')
+    if window:
+        size *= max(1, min(int(window), MAX_WINDOW))
+    if load.get('delta'):
+        if salt.utils.delta.valid_signatures(load['delta']):
+            return _read_delta(fp_, load, size)
+        # The client falls back to fetching all of the file when it does
+        # not get a delta
+        log.warning('Invalid block signatures in the serve_file request '
+                    'for {0}, sending the file'.format(load.get('path')))
+    fp_.seek(load['loc'])
+    data = fp_.read(size)
+    if window:
+        ret['eof'] = fp_.tell() >= salt.utils.delta.file_size(fp_)
+    gzip = load.get('gzip', None)
+    if gzip and data:
+        data = salt.utils.gzip_util.compress(data, gzip)
+        ret['gzip'] = gzip
+    ret['data'] = data
+    return ret
+
+
+def _read_delta(fp_, load, size):
+    '''
+    Return the delta of a serve_file request from a client sending the block
+    signatures of its copy of the file, with at most size bytes of literal
+    data
+    '''
+    ret = {}
+    ops, ret['loc'], ret['expect'], ret['eof'] = salt.utils.delta.diff(
+        fp_,
+        load['loc'],
+        load['delta'],
+        size,
+        load['delta'].get('expect', 0))
+    gzip = load.get('gzip', None)
+    if gzip:
+        ops = [op_ if isinstance(op_, six.integer_types)
+               else salt.utils.gzip_util.compress(op_, gzip)
+               for op_ in ops]
+        ret['gzip'] = gzip
+    ret['delta'] = ops
+    return ret
+
+
 class Fileserver(object):
     '''
     Create a fileserver wrapper object that wraps the fileserver functions and
@@ -281,6 +360,8 @@ class Fileserver(object):
     def __init__(self, opts):
         self.opts = opts
         self.servers = salt.loader.fileserver(opts, opts['fileserver_backend'])
+        # (saltenv, prefix, backends) -> (stamp, manifest)
+        self._manifests = {}
 
     def _gen_back(self, back):
         '''
@@ -561,6 +642,61 @@ class Fileserver(object):
             ret = [f for f in ret if f.startswith(prefix)]
         return sorted(ret)
 
+    def file_manifest(self, load):
+        '''
+        Return a dict of the files of an environment, limited to the ones
+        starting with an optional prefix, to their hash, hash type and size,
+        so a client can tell which of its cached files changed in a single
+        request.
+
+        A manifest is kept until one of the backends writes its file list
+        cache again, which they do when updated and when the cache expires.
+        Manifests including backends without a file list cache are not kept.
+        '''
+        if 'saltenv' not in load:
+            return {}
+        saltenv = load['saltenv']
+        back = self._gen_back(load.get('fsbackend', None))
+        files = self.file_list({'saltenv': saltenv,
+                                'prefix': load.get('prefix', ''),
+                                'fsbackend': back})
+        stamp = []
+        for fsb in back:
+            list_cache = os.path.join(
+                self.opts['cachedir'], 'file_lists', fsb, '{0}.p'.format(saltenv))
+            try:
+                stamp.append(os.path.getmtime(list_cache))
+            except OSError:
+                stamp = None
+                break
+        key = (saltenv, load.get('prefix', ''), tuple(back))
+        if stamp is not None and key in self._manifests:
+            cached_stamp, manifest = self._manifests[key]
+            if cached_stamp == stamp:
+                return manifest
+
+        manifest = {}
+        for path in files:
+            fnd = self.find_file(path, saltenv, back)
+            fstr = '{0}.file_hash'.format(fnd.get('back'))
+            if fstr not in self.servers:
+                continue
+            hsum = self.servers[fstr]({'path': path, 'saltenv': saltenv}, fnd)
+            if not isinstance(hsum, dict) or 'hsum' not in hsum:
+                continue
+            manifest[path] = {'hsum': hsum['hsum'],
+                              'hash_type': hsum['hash_type'],
+                              'size': None}
+            # Some backends, like s3fs, do not find a local path, gitfs can
+            # serve files straight from git
+            if 'size' in fnd:
+                manifest[path]['size'] = fnd['size']
+            elif os.path.isabs(fnd['path']) and os.path.isfile(fnd['path']):
+                manifest[path]['size'] = os.path.getsize(fnd['path'])
+        if stamp is not None:
+            self._manifests[key] = (stamp, manifest)
+        return manifest
+
     def file_list_emptydirs(self, load):
         '''
         List all emptydirs in the given environment
@@ -19,16 +19,37 @@ from __future__ import absolute_import
 
 # Import python libs
 import os
+import time
 import logging
 
 # Import salt libs
 import salt.fileserver
+import salt.payload
 import salt.utils
+import salt.utils.atomicfile
+import salt.utils.inotify
 from salt.utils.event import tagify
 import salt.ext.six as six
 
 log = logging.getLogger(__name__)
 
+# Touched by the roots watcher on each update, see roots_watch
+WATCH_HEARTBEAT = '.watch'
+# The events which change the listing or the mtimes of a directory
+WATCH_MASK = (salt.utils.inotify.IN_ATTRIB |
+              salt.utils.inotify.IN_CLOSE_WRITE |
+              salt.utils.inotify.IN_CREATE |
+              salt.utils.inotify.IN_DELETE |
+              salt.utils.inotify.IN_DELETE_SELF |
+              salt.utils.inotify.IN_MODIFY |
+              salt.utils.inotify.IN_MOVE_SELF |
+              salt.utils.inotify.IN_MOVED_FROM |
+              salt.utils.inotify.IN_MOVED_TO |
+              salt.utils.inotify.IN_ONLYDIR)
+
+# The watcher of the file_roots, kept between updates
+_WATCHER = None
+
 
 def find_file(path, saltenv='base', env=None, **kwargs):
     '''
@@ -99,14 +120,9 @@ def serve_file(load, fnd):
     if not fnd['path']:
         return ret
     ret['dest'] = fnd['rel']
-    gzip = load.get('gzip', None)
-    with salt.utils.fopen(os.path.normpath(fnd['path']), 'rb') as fp_:
-        fp_.seek(load['loc'])
-        data = fp_.read(__opts__['file_buffer_size'])
-        if gzip and data:
-            data = salt.utils.gzip_util.compress(data, gzip)
-            ret['gzip'] = gzip
-        ret['data'] = data
+    ret.update(salt.fileserver.read_chunk(os.path.normpath(fnd['path']),
+                                          load,
+                                          __opts__))
     return ret
 
 
@@ -123,48 +139,355 @@ def update():
         # Hash file won't exist if no files have yet been served up
         pass
 
+    if __opts__.get('roots_watch', False):
+        _watch_update()
+        return
+
     mtime_map_path = os.path.join(__opts__['cachedir'], 'roots/mtime_map')
     # data to send on event
     data = {'changed': False,
             'backend': 'roots'}
 
-    old_mtime_map = {}
     # if you have an old map, load that
+    old_mtime_map = _read_mtime_map(mtime_map_path)
+
+    # generate the new map
+    new_mtime_map = salt.fileserver.generate_mtime_map(
+        __opts__['file_roots'],
+        followlinks=__opts__.get('fileserver_followsymlinks', True))
+
+    # compare the maps, set changed to the return value
+    data['changed'] = salt.fileserver.diff_mtime_map(old_mtime_map, new_mtime_map)
+
+    # write out the new map
+    _write_mtime_map(mtime_map_path, new_mtime_map)
+
+    if __opts__.get('fileserver_events', False):
+        _fire_update_event(data)
+
+
+def _read_mtime_map(mtime_map_path):
+    '''
+    Read the mtime map written by the last update
+    '''
+    mtime_map = {}
     if os.path.exists(mtime_map_path):
         with salt.utils.fopen(mtime_map_path, 'r') as fp_:
             for line in fp_:
                 try:
                     file_path, mtime = line.split(':', 1)
-                    old_mtime_map[file_path] = mtime
+                    mtime_map[file_path] = mtime
                 except ValueError:
                     # Document the invalid entry in the log
                     log.warning('Skipped invalid cache mtime entry in {0}: {1}'
                                 .format(mtime_map_path, line))
+    return mtime_map
 
-    # generate the new map
-    new_mtime_map = salt.fileserver.generate_mtime_map(__opts__['file_roots'])
 
-    # compare the maps, set changed to the return value
-    data['changed'] = salt.fileserver.diff_mtime_map(old_mtime_map, new_mtime_map)
-
-    # write out the new map
+def _write_mtime_map(mtime_map_path, mtime_map):
+    '''
+    Write out the mtime map
+    '''
     mtime_map_path_dir = os.path.dirname(mtime_map_path)
     if not os.path.exists(mtime_map_path_dir):
         os.makedirs(mtime_map_path_dir)
     with salt.utils.fopen(mtime_map_path, 'w') as fp_:
-        for file_path, mtime in six.iteritems(new_mtime_map):
+        for file_path, mtime in six.iteritems(mtime_map):
             fp_.write('{file_path}:{mtime}\n'.format(file_path=file_path,
                                                      mtime=mtime))
 
-    if __opts__.get('fileserver_events', False):
-        # if there is a change, fire an event
-        event = salt.utils.event.get_event(
-                'master',
-                __opts__['sock_dir'],
-                __opts__['transport'],
-                opts=__opts__,
-                listen=False)
-        event.fire_event(data, tagify(['roots', 'update'], prefix='fileserver'))
+
+def _fire_update_event(data):
+    '''
+    Fire the fileserver/roots/update event
+    '''
+    event = salt.utils.event.get_event(
+            'master',
+            __opts__['sock_dir'],
+            __opts__['transport'],
+            opts=__opts__,
+            listen=False)
+    event.fire_event(data, tagify(['roots', 'update'], prefix='fileserver'))
+
+
+def _watch_update():
+    '''
+    Update the mtime map and the file lists from the roots watcher, the
+    caches are only written and the event only fired when something changed
+    '''
+    global _WATCHER
+    mtime_map_path = os.path.join(__opts__['cachedir'], 'roots/mtime_map')
+    if _WATCHER is None or _WATCHER.file_roots != __opts__['file_roots']:
+        if _WATCHER is not None:
+            _WATCHER.close()
+        _WATCHER = _RootsWatcher(__opts__)
+        changed = salt.fileserver.diff_mtime_map(
+            _read_mtime_map(mtime_map_path), _WATCHER.mtime_map())
+        saltenvs = list(__opts__['file_roots'])
+    else:
+        saltenvs = _WATCHER.refresh()
+        changed = bool(saltenvs)
+
+    if changed:
+        _write_mtime_map(mtime_map_path, _WATCHER.mtime_map())
+    list_cachedir = os.path.join(__opts__['cachedir'], 'file_lists/roots')
+    if not os.path.isdir(list_cachedir):
+        os.makedirs(list_cachedir)
+    serial = salt.payload.Serial(__opts__)
+    for saltenv in saltenvs:
+        list_cache = os.path.join(list_cachedir, '{0}.p'.format(saltenv))
+        with salt.utils.atomicfile.atomic_open(list_cache, 'w+b') as fp_:
+            fp_.write(serial.dumps(_WATCHER.file_lists(saltenv)))
+    with salt.utils.fopen(os.path.join(list_cachedir, WATCH_HEARTBEAT), 'w'):
+        pass
+
+    if changed and __opts__.get('fileserver_events', False):
+        _fire_update_event({'changed': True, 'backend': 'roots'})
+
+
+class _RootsWatcher(object):
+    '''
+    Keep the mtime map and the file lists of the file_roots up to date
+    incrementally, see :conf_master:`roots_watch`
+
+    Every directory is scanned once, after that only the directories inotify
+    reports changes in are scanned again. Without inotify, or when it runs out
+    of watches, every directory is scanned on each refresh, which still avoids
+    writing out the caches when nothing changed.
+    '''
+    def __init__(self, opts):
+        self.opts = opts
+        self.file_roots = opts['file_roots']
+        self.followlinks = opts['fileserver_followsymlinks']
+        # Scanned directories: path -> (files, subdirs). files maps the names
+        # of the files to (mtime, is_link), the mtime of dangling symlinks is
+        # None. subdirs maps the names of the directories to whether they are
+        # walked, symlinked directories are only walked with followsymlinks.
+        self.dirs = {}
+        # Watched directories, keyed by watch descriptor
+        self.watches = {}
+        self.inotify = None
+        if salt.utils.inotify.available():
+            try:
+                self.inotify = salt.utils.inotify.Inotify()
+            except OSError as exc:
+                log.warning('Unable to set up inotify, the file_roots will '
+                            'be polled: {0}'.format(exc))
+        self.changed = False
+        for path in self._roots():
+            self._add_tree(path)
+
+    def close(self):
+        '''
+        Stop watching the file_roots
+        '''
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def _roots(self):
+        '''
+        Return the directories of all the environments
+        '''
+        roots = set()
+        for path_list in six.itervalues(self.file_roots):
+            roots.update(path_list)
+        return roots
+
+    def _scan(self, path):
+        '''
+        List a directory, return None if it cannot be listed
+        '''
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return None
+        files = {}
+        subdirs = {}
+        for name in names:
+            full = os.path.join(path, name)
+            is_link = os.path.islink(full)
+            if os.path.isdir(full):
+                subdirs[name] = self.followlinks or not is_link
+                continue
+            try:
+                mtime = os.path.getmtime(full)
+            except OSError:
+                # dangling symlink
+                mtime = None
+            files[name] = (mtime, is_link)
+        return files, subdirs
+
+    def _watch(self, path):
+        '''
+        Watch a directory, fall back to polling when inotify fails
+        '''
+        if self.inotify is None:
+            return
+        try:
+            wd = self.inotify.add_watch(path, WATCH_MASK)
+        except OSError as exc:
+            log.warning('Unable to watch {0}, the file_roots will be polled '
+                        'from now on: {1}'.format(path, exc))
+            self.close()
+            self.watches = {}
+            return
+        self.watches.setdefault(wd, set()).add(path)
+
+    def _add_tree(self, path):
+        '''
+        Scan and watch a directory and the directories below it
+        '''
+        stack = [path]
+        while stack:
+            dirpath = stack.pop()
+            if dirpath in self.dirs:
+                continue
+            # Watch first, so that no change made during the scan is missed
+            self._watch(dirpath)
+            entry = self._scan(dirpath)
+            if entry is None:
+                continue
+            self.dirs[dirpath] = entry
+            self.changed = True
+            for name, walk in six.iteritems(entry[1]):
+                if walk:
+                    stack.append(os.path.join(dirpath, name))
+
+    def _drop_tree(self, path):
+        '''
+        Forget a directory and the directories below it
+        '''
+        prefix = os.path.join(path, '')
+        for dirpath in [x for x in self.dirs
+                        if x == path or x.startswith(prefix)]:
+            del self.dirs[dirpath]
+            self.changed = True
+        for wd, paths in list(six.iteritems(self.watches)):
+            for dirpath in [x for x in paths
+                            if x == path or x.startswith(prefix)]:
+                paths.discard(dirpath)
+            if not paths:
+                del self.watches[wd]
+                if self.inotify is not None:
+                    self.inotify.rm_watch(wd)
+
+    def _refresh_dir(self, path):
+        '''
+        Scan a known directory again
+        '''
+        old = self.dirs.get(path)
+        if old is None:
+            return
+        entry = self._scan(path)
+        if entry is None:
+            self._drop_tree(path)
+            return
+        if entry == old:
+            return
+        self.dirs[path] = entry
+        self.changed = True
+        for name, walk in six.iteritems(old[1]):
+            if walk and not entry[1].get(name):
+                self._drop_tree(os.path.join(path, name))
+        for name, walk in six.iteritems(entry[1]):
+            if walk:
+                self._add_tree(os.path.join(path, name))
+
+    def _dirty(self):
+        '''
+        Return the directories inotify reported changes in, or None if every
+        directory needs to be scanned again
+        '''
+        if self.inotify is None:
+            return None
+        dirty = set()
+        for wd, mask, _, _ in self.inotify.read():
+            if mask & salt.utils.inotify.IN_Q_OVERFLOW:
+                log.debug('inotify queue overflowed, scanning the file_roots')
+                return None
+            dirty.update(self.watches.get(wd, ()))
+        return dirty
+
+    def refresh(self):
+        '''
+        Apply the changes made since the last refresh, return the
+        environments whose files changed
+        '''
+        self.changed = False
+        dirty = self._dirty()
+        if dirty is None:
+            dirty = list(self.dirs)
+        changed_dirs = set()
+        for path in dirty:
+            self.changed = False
+            self._refresh_dir(path)
+            if self.changed:
+                changed_dirs.add(path)
+        for path in self._roots():
+            if path not in self.dirs and os.path.isdir(path):
+                self._add_tree(path)
+                changed_dirs.add(path)
+        saltenvs = []
+        for saltenv, path_list in six.iteritems(self.file_roots):
+            for dirpath in changed_dirs:
+                if any(dirpath == root or dirpath.startswith(os.path.join(root, ''))
+                       for root in path_list):
+                    saltenvs.append(saltenv)
+                    break
+        return saltenvs
+
+    def mtime_map(self):
+        '''
+        Return the mtime of every file, like
+        :func:`salt.fileserver.generate_mtime_map`
+        '''
+        ret = {}
+        for dirpath, (files, _) in six.iteritems(self.dirs):
+            for name, (mtime, _) in six.iteritems(files):
+                if mtime is not None:
+                    ret[os.path.join(dirpath, name)] = mtime
+        return ret
+
+    def file_lists(self, saltenv):
+        '''
+        Return the file lists of an environment, like :func:`_file_lists`
+        '''
+        ret = {
+            'files': [],
+            'dirs': [],
+            'empty_dirs': [],
+            'links': []
+        }
+        local = self.opts.get('file_client', 'remote') == 'local' and os.path.sep == '\\'
+        for path in self.file_roots.get(saltenv, []):
+            stack = [path]
+            while stack:
+                root = stack.pop()
+                if root not in self.dirs:
+                    continue
+                files, subdirs = self.dirs[root]
+                dir_rel_fn = os.path.relpath(root, path)
+                if local:
+                    dir_rel_fn = dir_rel_fn.replace('\\', '/')
+                ret['dirs'].append(dir_rel_fn)
+                if not subdirs and not files:
+                    if not salt.fileserver.is_file_ignored(self.opts, dir_rel_fn):
+                        ret['empty_dirs'].append(dir_rel_fn)
+                for fname, (_, is_link) in six.iteritems(files):
+                    if is_link:
+                        ret['links'].append(fname)
+                    if self.opts['fileserver_ignoresymlinks'] and is_link:
+                        continue
+                    rel_fn = os.path.relpath(os.path.join(root, fname), path)
+                    if not salt.fileserver.is_file_ignored(self.opts, rel_fn):
+                        if local:
+                            rel_fn = rel_fn.replace('\\', '/')
+                        ret['files'].append(rel_fn)
+                for name, walk in six.iteritems(subdirs):
+                    if walk:
+                        stack.append(os.path.join(root, name))
+        return ret
 
 
 def file_hash(load, fnd):
@@ -263,6 +586,10 @@ def _file_lists(load, form):
             log.critical('Unable to make cachedir {0}'.format(list_cachedir))
             return []
     list_cache = os.path.join(list_cachedir, '{0}.p'.format(load['saltenv']))
+    if __opts__.get('roots_watch', False):
+        ret = _watched_file_lists(list_cachedir, list_cache)
+        if ret is not None:
+            return ret.get(form, [])
     w_lock = os.path.join(list_cachedir, '.{0}.w'.format(load['saltenv']))
     cache_match, refresh_cache, save_cache = \
         salt.fileserver.check_file_list_cache(
@@ -315,6 +642,25 @@ def _file_lists(load, form):
     return []
 
 
+def _watched_file_lists(list_cachedir, list_cache):
+    '''
+    Return the file lists kept up to date by the roots watcher, or None if
+    the watcher has not updated them recently
+    '''
+    try:
+        age = time.time() - os.path.getmtime(
+            os.path.join(list_cachedir, WATCH_HEARTBEAT))
+    except OSError:
+        return None
+    if age > 3 * __opts__.get('loop_interval', 60):
+        return None
+    try:
+        with salt.utils.fopen(list_cache, 'rb') as fp_:
+            return salt.payload.Serial(__opts__).load(fp_)
+    except (IOError, OSError):
+        return None
+
+
 def file_list(load):
     '''
     Return a list of all files on the file server in a specified
@@ -214,8 +214,6 @@ def serve_file(load, fnd):
     if 'path' not in fnd or 'bucket' not in fnd:
         return ret
 
-    gzip = load.get('gzip', None)
-
     # get the saltenv/path file from the cache
     cached_file_path = _get_cached_file_name(
             fnd['bucket'],
@@ -224,13 +222,7 @@ def serve_file(load, fnd):
 
     ret['dest'] = _trim_env_off_path([fnd['path']], load['saltenv'])[0]
 
-    with salt.utils.fopen(cached_file_path, 'rb') as fp_:
-        fp_.seek(load['loc'])
-        data = fp_.read(__opts__['file_buffer_size'])
-        if gzip and data:
-            data = salt.utils.gzip_util.compress(data, gzip)
-            ret['gzip'] = gzip
-        ret['data'] = data
+    ret.update(salt.fileserver.read_chunk(cached_file_path, load, __opts__))
     return ret
 
 
@@ -11,8 +11,10 @@ from __future__ import absolute_import
 import os
 import imp
 import sys
+import glob
 import salt
 import time
+import hashlib
 import logging
 import inspect
 import tempfile
@@ -26,6 +28,9 @@ from salt.utils.decorators import Depends
 import salt.utils.lazy
 import salt.utils.event
 import salt.utils.odict
+import salt.utils.atomicfile
+import salt.payload
+import salt.version
 
 # Solve the Chicken and egg problem where grains need to run before any
 # of the modules are loaded and are generally available for any usage.
@@ -42,6 +47,23 @@ log = logging.getLogger(__name__)
 SALT_BASE_PATH = os.path.abspath(os.path.dirname(salt.__file__))
 LOADED_BASE_NAME = 'salt.loaded'
 
+# Bumped whenever the format of the loader index changes
+LOADER_INDEX_VERSION = 1
+# Loader indexes read by this process: path -> (dir mtimes, file mapping)
+_LOADER_INDEXES = {}
+
+# Bumped whenever the format of the __virtual__ cache changes
+VIRTUAL_CACHE_VERSION = 2
+# __virtual__ caches read by this process: path -> (file stamp, entries)
+_VIRTUAL_CACHES = {}
+# The seconds a loader waits before writing out the __virtual__ results found
+# by more lazy loads, the results found by loading all modules are written
+# right away
+VIRTUAL_CACHE_WRITE_INTERVAL = 10
+# The data a cached __virtual__ result depends on: module global -> name in
+# the cache
+_VIRTUAL_DEPS = {'__grains__': 'grains', '__opts__': 'opts', '__pillar__': 'pillar'}
+
 # Because on the cloud drivers we do `from salt.cloud.libcloudfuncs import *`
 # which simplifies code readability, it adds some unsupported functions into
 # the driver's module scope.
@@ -839,6 +861,112 @@ class FilterDictWrapper(MutableMapping):
                 yield key.replace(self.suffix, '')
 
 
+def _dir_mtime(path):
+    '''
+    Return the mtime of a directory, or None if it does not exist
+    '''
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _config_mtimes(opts):
+    '''
+    Return the paths and mtimes of the config file of opts and of the files
+    it includes, sorted by path
+    '''
+    conf_file = opts.get('conf_file')
+    if not conf_file:
+        return []
+    paths = [conf_file]
+    for include in (opts.get('default_include'), opts.get('include')):
+        if not include:
+            continue
+        if isinstance(include, six.string_types):
+            include = [include]
+        for path in include:
+            path = os.path.expanduser(path)
+            if not os.path.isabs(path):
+                path = os.path.join(os.path.dirname(conf_file), path)
+            paths.extend(glob.glob(path))
+    return [[path, _dir_mtime(path)] for path in sorted(set(paths))]
+
+
+def clear_virtual_cache(opts):
+    '''
+    Remove the cached __virtual__ results, so that every module is checked
+    again the next time it is loaded
+    '''
+    _VIRTUAL_CACHES.clear()
+    if not opts.get('cachedir'):
+        return
+    cache_dir = os.path.join(opts['cachedir'], 'loader')
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith('virtual.'):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+class _ReadRecorder(dict):
+    '''
+    A copy of the grains, opts or pillar data which records the keys a
+    __virtual__ function reads
+    '''
+    def __init__(self, data):
+        super(_ReadRecorder, self).__init__(data)
+        self.read = set()
+        self.read_all = False
+
+    def __getitem__(self, key):
+        self.read.add(key)
+        return super(_ReadRecorder, self).__getitem__(key)
+
+    def __contains__(self, key):
+        self.read.add(key)
+        return super(_ReadRecorder, self).__contains__(key)
+
+    def get(self, key, default=None):
+        self.read.add(key)
+        return super(_ReadRecorder, self).get(key, default)
+
+    def __iter__(self):
+        self.read_all = True
+        return super(_ReadRecorder, self).__iter__()
+
+    def _read_all(name):  # pylint: disable=no-self-argument
+        def wrapper(self, *args, **kwargs):
+            self.read_all = True
+            return getattr(super(_ReadRecorder, self), name)(*args, **kwargs)
+        wrapper.__name__ = name
+        return wrapper
+
+    keys = _read_all('keys')
+    values = _read_all('values')
+    items = _read_all('items')
+    copy = _read_all('copy')
+    if six.PY2:
+        iterkeys = _read_all('iterkeys')
+        itervalues = _read_all('itervalues')
+        iteritems = _read_all('iteritems')
+    del _read_all
+
+
+def _read_hash(data, keys):
+    '''
+    Return a hash of the values of the given keys of data
+    '''
+    return hashlib.sha1(repr(
+        [(key, key in data, data.get(key)) for key in sorted(keys)]
+    ).encode('utf-8')).hexdigest()
+
+
 class LazyLoader(salt.utils.lazy.LazyDict):
     '''
     Goals here:
@@ -889,6 +1017,12 @@ class LazyLoader(salt.utils.lazy.LazyDict):
 
         self.disabled = set(self.opts.get('disable_{0}s'.format(self.tag), []))
 
+        # __virtual__ results found by this loader which are not yet written
+        # to the virtual cache
+        self._virtual_cache_path = self._get_virtual_cache_path()
+        self._virtual_new = {}
+        self._virtual_written = 0
+
         self.refresh_file_mapping()
 
         super(LazyLoader, self).__init__()  # late init the lazy loader
@@ -970,9 +1104,27 @@ class LazyLoader(salt.utils.lazy.LazyDict):
 
         # create mapping of filename (without suffix) to (path, suffix)
         self.file_mapping = {}
+        index_path = self._index_path()
+        if index_path is None or not self._read_index(index_path):
+            dir_mtimes = self._map_files(suffix_order)
+            if index_path is not None:
+                self._write_index(index_path, dir_mtimes)
 
+        for smod in self.static_modules:
+            f_noext = smod.split('.')[-1]
+            self.file_mapping[f_noext] = (smod, '.o')
+        # file names by the virtual name cached for them, built when needed
+        self._virtual_names = None
+
+    def _map_files(self, suffix_order):
+        '''
+        Fill the file mapping from the module dirs, return the mtimes of the
+        directories which were listed
+        '''
+        dir_mtimes = {}
         for mod_dir in self.module_dirs:
             files = []
+            dir_mtimes[mod_dir] = _dir_mtime(mod_dir)
             try:
                 files = os.listdir(mod_dir)
             except OSError:
@@ -998,6 +1150,7 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                     # if its a directory, lets allow us to load that
                     if ext == '':
                         # is there something __init__?
+                        dir_mtimes[fpath] = _dir_mtime(fpath)
                         subfiles = os.listdir(fpath)
                         sub_path = None
                         for suffix in suffix_order:
@@ -1018,9 +1171,190 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                             self.file_mapping[f_noext] = (fpath, ext)
                 except OSError:
                     continue
-        for smod in self.static_modules:
-            f_noext = smod.split('.')[-1]
-            self.file_mapping[f_noext] = (smod, '.o')
+        return dir_mtimes
+
+    def _index_path(self):
+        '''
+        Return the path of the loader index for the module dirs, suffixes and
+        disabled modules of this loader, or None if the index is not used
+        '''
+        if not self.opts.get('loader_index', False) or not self.opts.get('cachedir'):
+            return None
+        key = repr((LOADER_INDEX_VERSION,
+                    salt.version.__version__,
+                    self.tag,
+                    list(self.module_dirs),
+                    sorted(self.suffix_map),
+                    sorted(self.disabled)))
+        return os.path.join(self.opts['cachedir'],
+                            'loader',
+                            '{0}.{1}.p'.format(self.tag,
+                                               hashlib.sha1(key).hexdigest()))
+
+    def _read_index(self, index_path):
+        '''
+        Fill the file mapping from the loader index, return False if there is
+        no index or any of the directories it was built from changed
+        '''
+        index = _LOADER_INDEXES.get(index_path)
+        if index is None:
+            try:
+                with salt.utils.fopen(index_path, 'rb') as fp_:
+                    data = salt.payload.Serial(self.opts).load(fp_)
+                index = (data['dir_mtimes'],
+                         dict((name, tuple(val))
+                              for name, val in six.iteritems(data['file_mapping'])))
+            except Exception:
+                return False
+        dir_mtimes, file_mapping = index
+        for path, mtime in six.iteritems(dir_mtimes):
+            if _dir_mtime(path) != mtime:
+                _LOADER_INDEXES.pop(index_path, None)
+                return False
+        _LOADER_INDEXES[index_path] = index
+        self.file_mapping.update(file_mapping)
+        return True
+
+    def _write_index(self, index_path, dir_mtimes):
+        '''
+        Write the loader index
+        '''
+        # A directory changed again in the same second would go unnoticed
+        recent = time.time() - 2
+        if any(mtime is not None and mtime > recent
+               for mtime in six.itervalues(dir_mtimes)):
+            return
+        index = (dir_mtimes, dict(self.file_mapping))
+        try:
+            if not os.path.isdir(os.path.dirname(index_path)):
+                os.makedirs(os.path.dirname(index_path))
+            with salt.utils.atomicfile.atomic_open(index_path, 'w+b') as fp_:
+                fp_.write(salt.payload.Serial(self.opts).dumps(
+                    {'dir_mtimes': index[0], 'file_mapping': index[1]}))
+        except (IOError, OSError) as exc:
+            log.debug('Unable to write the loader index {0}: {1}'.format(
+                index_path, exc))
+            return
+        _LOADER_INDEXES[index_path] = index
+
+    def _get_virtual_cache_path(self):
+        '''
+        Return the path of the cache of __virtual__ results of this loader,
+        or None if the cache is not used
+        '''
+        if not self.virtual_enable or not self.opts.get('virtual_cache', False) \
+                or not self.opts.get('cachedir'):
+            return None
+        return os.path.join(self.opts['cachedir'],
+                            'loader',
+                            'virtual.{0}.p'.format(self.tag))
+
+    def _virtual_cache_key(self):
+        '''
+        Return what the whole virtual cache depends on besides the module
+        files and grains: its format, the salt version and the minion config
+        files, including the ones in minion.d
+        '''
+        return [VIRTUAL_CACHE_VERSION,
+                salt.version.__version__,
+                _config_mtimes(self.opts)]
+
+    def _read_virtual_cache(self):
+        '''
+        Return the cached __virtual__ results by module path
+        '''
+        try:
+            stat = os.stat(self._virtual_cache_path)
+        except OSError:
+            _VIRTUAL_CACHES.pop(self._virtual_cache_path, None)
+            return {}
+        stamp = (stat.st_ino, stat.st_mtime, stat.st_size)
+        cached = _VIRTUAL_CACHES.get(self._virtual_cache_path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        entries = {}
+        try:
+            with salt.utils.fopen(self._virtual_cache_path, 'rb') as fp_:
+                data = salt.payload.Serial(self.opts).load(fp_)
+            if data['key'] == self._virtual_cache_key():
+                entries = data['entries']
+        except Exception:
+            pass
+        _VIRTUAL_CACHES[self._virtual_cache_path] = (stamp, entries)
+        return entries
+
+    def _write_virtual_cache(self):
+        '''
+        Add the __virtual__ results found by this loader to the virtual cache
+        '''
+        if not self._virtual_new:
+            return
+        # Start over from the file, another process may have cleared it
+        entries = dict(self._read_virtual_cache())
+        entries.update(self._virtual_new)
+        self._virtual_new = {}
+        self._virtual_written = time.time()
+        try:
+            if not os.path.isdir(os.path.dirname(self._virtual_cache_path)):
+                os.makedirs(os.path.dirname(self._virtual_cache_path))
+            with salt.utils.atomicfile.atomic_open(self._virtual_cache_path, 'w+b') as fp_:
+                fp_.write(salt.payload.Serial(self.opts).dumps(
+                    {'key': self._virtual_cache_key(), 'entries': entries}))
+        except (IOError, OSError, TypeError) as exc:
+            log.debug('Unable to write the virtual cache {0}: {1}'.format(
+                self._virtual_cache_path, exc))
+
+    def _virtual_file_hash(self, fpath, suffix):
+        '''
+        Return the hash of a module file for the virtual cache, or None if the
+        results of the module are not cached
+        '''
+        if self._virtual_cache_path is None or suffix in ('', '.o'):
+            return None
+        try:
+            return salt.utils.get_hash(fpath, 'sha1')
+        except (IOError, OSError):
+            return None
+
+    def _cached_virtual(self, fpath, file_hash):
+        '''
+        Return the cached __virtual__ result of a module if it is still valid
+        for the module file and the grains, opts and pillar data it read,
+        otherwise None
+        '''
+        entry = self._read_virtual_cache().get(fpath)
+        if entry is None or entry['hash'] != file_hash:
+            return None
+        sources = self._virtual_sources()
+        for name, (keys, digest) in six.iteritems(entry['deps']):
+            data = sources[name]
+            if _read_hash(data, data if keys is None else keys) != digest:
+                return None
+        return entry
+
+    def _virtual_sources(self):
+        '''
+        Return the data cached __virtual__ results depend on, by their name
+        in the cache
+        '''
+        return {'grains': self._grains,
+                'opts': self.opts,
+                'pillar': self._pillar}
+
+    def _iter_virtual_names(self, mod_name):
+        '''
+        Iterate over the files which were last loaded as mod_name
+        '''
+        if self._virtual_cache_path is None:
+            return []
+        if self._virtual_names is None:
+            entries = self._read_virtual_cache()
+            self._virtual_names = {}
+            for name, (fpath, _) in six.iteritems(self.file_mapping):
+                entry = entries.get(fpath)
+                if entry is not None and entry['virtual']:
+                    self._virtual_names.setdefault(entry['virtual'], []).append(name)
+        return self._virtual_names.get(mod_name, [])
 
     def clear(self):
         '''
@@ -1064,6 +1398,10 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         if mod_name in self.file_mapping:
             yield mod_name
 
+        # did a module load under this name before?
+        for k in self._iter_virtual_names(mod_name):
+            yield k
+
         # do we have a partial match?
         for k in self.file_mapping:
             if mod_name in k:
@@ -1091,6 +1429,19 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         mod = None
         fpath, suffix = self.file_mapping[name]
         self.loaded_files.add(name)
+        file_hash = None
+        if self.virtual_enable:
+            file_hash = self._virtual_file_hash(fpath, suffix)
+        if file_hash is not None:
+            cached = self._cached_virtual(fpath, file_hash)
+            # A module whose __virtual__ failed with the same file and grains
+            # is not imported again. A module which loaded is, its
+            # __virtual__ may set up the module.
+            if cached is not None and not cached['virtual']:
+                log.trace('Skipping {0}.{1}, its __virtual__ result is cached: '
+                          '{2}'.format(self.tag, name, cached['error']))
+                self.missing_modules[name] = cached['error']
+                return False
         try:
             sys.path.append(os.path.dirname(fpath))
             if suffix == '.pyx':
@@ -1196,10 +1547,41 @@ class LazyLoader(salt.utils.lazy.LazyDict):
         # if virtual modules are enabled, we need to look for the
         # __virtual__() function inside that module and run it.
         if self.virtual_enable:
-            (virtual_ret, module_name, virtual_err) = self.process_virtual(
-                mod,
-                module_name,
-            )
+            recorders = {}
+            if file_hash is not None:
+                for global_name in _VIRTUAL_DEPS:
+                    recorders[global_name] = (getattr(mod, global_name),
+                                              _ReadRecorder(getattr(mod, global_name)))
+                    setattr(mod, global_name, recorders[global_name][1])
+            try:
+                (virtual_ret, module_name, virtual_err) = self.process_virtual(
+                    mod,
+                    module_name,
+                )
+            finally:
+                for global_name, (data, _) in six.iteritems(recorders):
+                    setattr(mod, global_name, data)
+            deps = {}
+            sources = self._virtual_sources()
+            for global_name, (data, recorder) in six.iteritems(recorders):
+                if dict.__ne__(recorder, data):
+                    # __virtual__ changed the data, its result is not cached
+                    data.clear()
+                    data.update(recorder)
+                    deps = None
+                elif deps is not None:
+                    # Hashed like _cached_virtual checks it
+                    name = _VIRTUAL_DEPS[global_name]
+                    keys = None if recorder.read_all else sorted(recorder.read)
+                    deps[name] = [
+                        keys,
+                        _read_hash(sources[name], sources[name] if keys is None else keys)]
+            if recorders and deps is not None:
+                self._virtual_new[fpath] = {
+                    'hash': file_hash,
+                    'deps': deps,
+                    'virtual': module_name if virtual_ret is True else False,
+                    'error': virtual_err}
             if virtual_err is not None:
                 log.debug('Error loading {0}.{1}: {2}'.format(self.tag,
                                                               module_name,
@@ -1311,6 +1693,10 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                     reloaded = True
                 continue
 
+        # Lazy loads write their results out together
+        if self._virtual_new and \
+                time.time() - self._virtual_written >= VIRTUAL_CACHE_WRITE_INTERVAL:
+            self._write_virtual_cache()
         return ret
 
     def _load_all(self):
@@ -1322,6 +1708,8 @@ class LazyLoader(salt.utils.lazy.LazyDict):
                 continue
             self._load_module(name)
 
+        if self._virtual_new:
+            self._write_virtual_cache()
         self.loaded = True
 
     def _apply_outputter(self, func, mod):
@@ -12,13 +12,13 @@ import re
 import sys
 import time
 import errno
+import signal
 import logging
 import tempfile
 import traceback
 
 # Import third party libs
 import zmq
-from Crypto.PublicKey import RSA
 # pylint: disable=import-error,no-name-in-module,redefined-builtin
 import salt.ext.six as six
 from salt.ext.six.moves import range
@@ -260,8 +260,14 @@ class Maintenance(MultiprocessingProcess):
         Update git pillar
         '''
         try:
+            changed = False
             for pillar in self.git_pillar:
-                pillar.update()
+                # Only the new git_pillar code reports whether anything changed
+                if pillar.update() and isinstance(pillar, salt.utils.gitfs.GitPillar):
+                    changed = True
+            if changed and self.opts.get('pillar_cache', False):
+                log.debug('git_pillar changed, clearing the pillar cache')
+                salt.pillar.clear_pillar_cache(self.opts)
         except Exception as exc:
             log.error(
                 'Exception \'{0}\' caught while updating git_pillar'
@@ -784,7 +790,24 @@ class MWorker(MultiprocessingProcess):
             )
         self.aes_funcs = AESFuncs(self.opts)
         salt.utils.reinit_crypto()
-        self.__bind()
+        if self.aes_funcs.return_queue is not None:
+            # Stop serving requests on SIGTERM and write the queued returns
+            # to the job cache before exiting
+            signal.signal(signal.SIGTERM, self._handle_signals)
+        try:
+            self.__bind()
+        finally:
+            if self.aes_funcs.return_queue is not None:
+                self.aes_funcs.return_queue.close()
+
+    def _handle_signals(self, signum, sigframe):
+        '''
+        Stop the IOLoop of the worker
+        '''
+        io_loop = getattr(self, 'io_loop', None)
+        if io_loop is None:
+            sys.exit(salt.defaults.exitcodes.EX_OK)
+        io_loop.add_callback_from_signal(io_loop.stop)
 
 
 # TODO: rename? No longer tied to "AES", just "encrypted" or "private" requests
@@ -816,6 +839,16 @@ class AESFuncs(object):
             rend=False)
         self.__setup_fileserver()
         self.masterapi = salt.daemons.masterapi.RemoteFuncs(opts)
+        # Compiled pillar data, keyed by minion id, saltenv and pillarenv
+        self.pillar_cache = None
+        if self.opts.get('pillar_cache', False):
+            self.pillar_cache = salt.pillar.PillarCache(
+                self.opts,
+                aes_key=lambda: SMaster.secrets['aes']['secret'].value)
+        # Returns are written to the job cache in batches in the background
+        self.return_queue = None
+        if self.opts.get('job_cache_queue_size', 0) > 0:
+            self.return_queue = salt.utils.job.ReturnQueue(self.opts, self.mminion)
 
     def __setup_fileserver(self):
         '''
@@ -825,6 +858,7 @@ class AESFuncs(object):
         self._serve_file = self.fs_.serve_file
         self._file_hash = self.fs_.file_hash
         self._file_list = self.fs_.file_list
+        self._file_manifest = self.fs_.file_manifest
         self._file_list_emptydirs = self.fs_.file_list_emptydirs
         self._dir_list = self.fs_.dir_list
         self._symlink_list = self.fs_.symlink_list
@@ -843,22 +877,8 @@ class AESFuncs(object):
         '''
         if not salt.utils.verify.valid_id(self.opts, id_):
             return False
-        pub_path = os.path.join(self.opts['pki_dir'], 'minions', id_)
-        with salt.utils.fopen(pub_path, 'r') as fp_:
-            minion_pub = fp_.read()
-        tmp_pub = salt.utils.mkstemp()
-        with salt.utils.fopen(tmp_pub, 'w+') as fp_:
-            fp_.write(minion_pub)
-
-        pub = None
+        pub = salt.crypt.get_minion_pub(self.opts['pki_dir'], id_)
         try:
-            with salt.utils.fopen(tmp_pub) as fp_:
-                pub = RSA.importKey(fp_.read())
-        except (ValueError, IndexError, TypeError) as err:
-            log.error('Unable to load temporary public key "{0}": {1}'
-                      .format(tmp_pub, err))
-        try:
-            os.remove(tmp_pub)
             if salt.crypt.public_decrypt(pub, token) == 'salt':
                 return True
         except ValueError as err:
@@ -1151,17 +1171,30 @@ class AESFuncs(object):
             return False
         load['grains']['id'] = load['id']
 
-        pillar_dirs = {}
-        pillar = salt.pillar.Pillar(
-            self.opts,
-            load['grains'],
-            load['id'],
-            load.get('saltenv', load.get('env')),
-            ext=load.get('ext'),
-            pillar=load.get('pillar_override', {}),
-            pillarenv=load.get('pillarenv'))
-        data = pillar.compile_pillar(pillar_dirs=pillar_dirs)
-        self.fs_.update_opts()
+        saltenv = load.get('saltenv', load.get('env'))
+        data = None
+        if self.pillar_cache is not None:
+            fingerprint = self.pillar_cache.fingerprint(
+                load['grains'], load.get('pillar_override', {}), load.get('ext'))
+            data = self.pillar_cache.get(
+                load['id'], saltenv, load.get('pillarenv'), fingerprint)
+        if data is None:
+            started = time.time()
+            pillar_dirs = {}
+            pillar = salt.pillar.Pillar(
+                self.opts,
+                load['grains'],
+                load['id'],
+                saltenv,
+                ext=load.get('ext'),
+                pillar=load.get('pillar_override', {}),
+                pillarenv=load.get('pillarenv'))
+            data = pillar.compile_pillar(pillar_dirs=pillar_dirs)
+            self.fs_.update_opts()
+            if self.pillar_cache is not None:
+                self.pillar_cache.store(
+                    load['id'], saltenv, load.get('pillarenv'), fingerprint,
+                    data, started)
         if self.opts.get('minion_data_cache', False):
             cdir = os.path.join(self.opts['cachedir'], 'minions', load['id'])
             if not os.path.isdir(cdir):
@@ -1169,14 +1202,17 @@ class AESFuncs(object):
             datap = os.path.join(cdir, 'data.p')
             tmpfh, tmpfname = tempfile.mkstemp(dir=cdir)
             os.close(tmpfh)
+            cache_data = self.serial.dumps(
+                {'grains': load['grains'],
+                 'pillar': data})
             with salt.utils.fopen(tmpfname, 'w+b') as fp_:
-                fp_.write(
-                    self.serial.dumps(
-                        {'grains': load['grains'],
-                         'pillar': data})
-                    )
+                fp_.write(cache_data)
             # On Windows, os.rename will fail if the destination file exists.
             salt.utils.atomicfile.atomic_rename(tmpfname, datap)
+            if self.ckminions.data_index is not None:
+                # Index the data as it will be read back from the cache
+                self.ckminions.data_index.add(
+                    load['id'], self.serial.loads(cache_data))
         return data
 
     def _minion_event(self, load):
@@ -1215,9 +1251,12 @@ class AESFuncs(object):
         '''
         try:
             salt.utils.job.store_job(
-                self.opts, load, event=self.event, mminion=self.mminion)
+                self.opts, load, event=self.event, mminion=self.mminion,
+                return_queue=self.return_queue)
         except salt.exceptions.SaltCacheError:
             log.error('Could not store job information for load: {0}'.format(load))
+        if self.return_queue is not None:
+            self.return_queue.fire_stats(self.event)
 
     def _syndic_return(self, load):
         '''
@@ -1258,6 +1297,21 @@ class AESFuncs(object):
                 ret['out'] = load['out']
             self._return(ret)
 
+    def _syndic_returns(self, load):
+        '''
+        Receive the returns of several jobs forwarded in one message by a
+        syndic
+
+        :param dict load: The syndic payload, with the loads of
+                          ``_syndic_return`` in ``returns``
+        '''
+        if not isinstance(load.get('returns'), list):
+            return None
+        for ret in load['returns']:
+            if isinstance(ret, dict):
+                self._syndic_return(ret)
+        return True
+
     def minion_runner(self, clear_load):
         '''
         Execute a runner from a minion, return the runner's function data
@@ -1464,6 +1518,11 @@ class ClearFuncs(object):
         self.wheel_ = salt.wheel.Wheel(opts)
         # Make a masterapi object
         self.masterapi = salt.daemons.masterapi.LocalFuncs(opts, key)
+        # Keep the publish channels around so their sockets are reused
+        self.channels = [
+            salt.transport.server.PubServerChannel.factory(chan_opts)
+            for transport, chan_opts in iter_transport_opts(self.opts)
+        ]
 
     def process_token(self, tok, fun, auth_type):
         '''
@@ -2031,6 +2090,9 @@ class ClearFuncs(object):
         if jid is None:
             return {}
         payload = self._prep_pub(minions, jid, clear_load, extra)
+        # The transports target the minions the target was resolved to here,
+        # they do not pass the list on to the minions
+        payload['minions'] = minions
 
         # Send it!
         self._send_pub(payload)
@@ -2072,9 +2134,18 @@ class ClearFuncs(object):
         '''
         Take a load and send it across the network to connected minions
         '''
-        for transport, opts in iter_transport_opts(self.opts):
-            chan = salt.transport.server.PubServerChannel.factory(opts)
-            chan.publish(load)
+        for chan in self.channels:
+            future = chan.publish_async(load)
+            future.add_done_callback(self._log_pub_failure)
+
+    @staticmethod
+    def _log_pub_failure(future):
+        '''
+        Log publications which could not be handed to the publisher
+        '''
+        exc = future.exception()
+        if exc is not None:
+            log.error('Failed to send publication: {0}'.format(exc))
 
     def _prep_pub(self, minions, jid, clear_load, extra):
         '''
@@ -83,6 +83,7 @@ import salt.utils
 import salt.utils.jid
 import salt.pillar
 import salt.utils.args
+import salt.utils.cache
 import salt.utils.event
 import salt.utils.minions
 import salt.utils.schedule
@@ -328,6 +329,156 @@ def load_args_and_kwargs(func, args, data=None, ignore_invalid=False):
     return _args, _kwargs
 
 
+class JobWorkerPool(object):
+    '''
+    A pool of pre-forked processes which run the jobs of the minion
+
+    The workers are forked from the minion with its modules already loaded,
+    so a job does not pay for the fork and the module setup. Jobs are only
+    handed to idle workers, when every worker is busy the minion starts a
+    process for the job as usual.
+    '''
+    def __init__(self, opts, target):
+        self.opts = opts
+        self.target = target
+        self.size = opts.get('job_pool_size', 0)
+        self.max_jobs = opts.get('job_pool_max_jobs', 0)
+        self.max_rss = opts.get('job_pool_max_rss', 0) * 1024 * 1024
+        self.workers = []
+        self.state = None
+
+    def run(self, data, state=None):
+        '''
+        Hand a job to an idle worker, return False if there is none
+
+        When state is not the one the workers were forked with, e.g. the
+        minion reloaded its modules, the workers are replaced.
+        '''
+        if state is not self.state:
+            self.retire()
+            self.state = state
+        self.reap()
+        active = [worker for worker in self.workers if not worker['retire']]
+        for _ in range(self.size - len(active)):
+            self._spawn()
+        for worker in self.workers:
+            if worker['busy'] or worker['retire']:
+                continue
+            try:
+                worker['conn'].send(data)
+            except (IOError, OSError):
+                worker['retire'] = True
+                continue
+            worker['busy'] = True
+            return True
+        return False
+
+    def retire(self):
+        '''
+        Stop the workers once they are done with their current job
+        '''
+        for worker in self.workers:
+            worker['retire'] = True
+        self.reap()
+
+    def reap(self):
+        '''
+        Collect the workers which finished a job and drop the dead ones
+        '''
+        for worker in list(self.workers):
+            try:
+                while worker['conn'].poll():
+                    # A worker reports whether it is recycling itself
+                    # after every job
+                    worker['busy'] = False
+                    if worker['conn'].recv():
+                        worker['retire'] = True
+            except (EOFError, IOError, OSError):
+                worker['busy'] = False
+                worker['retire'] = True
+            if worker['retire'] and not worker['busy'] and not worker['stopped']:
+                worker['stopped'] = True
+                try:
+                    worker['conn'].send(None)
+                except (IOError, OSError):
+                    pass
+            if not worker['process'].is_alive():
+                worker['process'].join()
+                worker['conn'].close()
+                self.workers.remove(worker)
+
+    def close(self):
+        '''
+        Stop the workers, busy workers finish their job first
+        '''
+        self.retire()
+        for worker in self.workers:
+            worker['conn'].close()
+        self.workers = []
+
+    def _spawn(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=self._work,
+                                          args=(child_conn, parent_conn))
+        process.start()
+        child_conn.close()
+        self.workers.append({'process': process,
+                             'conn': parent_conn,
+                             'busy': False,
+                             'retire': False,
+                             'stopped': False})
+
+    def _rss(self):
+        '''
+        Return the resident memory of this process in bytes
+        '''
+        if HAS_PSUTIL:
+            return psutil.Process(os.getpid()).memory_info()[0]
+        if HAS_RESOURCE:
+            # This is the peak, in kilobytes on Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return 0
+
+    def _work(self, conn, parent_conn):
+        '''
+        Run the jobs sent by the minion until told to stop or recycled
+        '''
+        # Only the minion may hold the other ends of the pipes, or the
+        # workers would never see it go away
+        parent_conn.close()
+        for worker in self.workers:
+            worker['conn'].close()
+        self.workers = []
+        salt.utils.appendproctitle('JobWorker')
+        title = None
+        if salt.utils.HAS_SETPROCTITLE:
+            title = salt.utils.setproctitle.getproctitle()
+        jobs = 0
+        while True:
+            try:
+                data = conn.recv()
+            except (EOFError, IOError):
+                break
+            if data is None:
+                break
+            try:
+                self.target(data)
+            except Exception:
+                log.error('Job {0} failed in the job pool'.format(data.get('jid')),
+                          exc_info=True)
+            if title is not None:
+                salt.utils.setproctitle.setproctitle(title)
+            jobs += 1
+            recycle = bool(self.max_jobs and jobs >= self.max_jobs) or \
+                bool(self.max_rss and self._rss() > self.max_rss)
+            try:
+                conn.send(recycle)
+            except (IOError, OSError):
+                break
+            if recycle:
+                break
+
+
 class MinionBase(object):
     def __init__(self, opts):
         self.opts = opts
@@ -683,6 +834,10 @@ class Minion(MinionBase):
         self._running = None
         self.win_proc = []
         self.loaded_base_name = loaded_base_name
+        self.job_pool = None
+        if opts.get('job_pool_size', 0) > 0 and opts['multiprocessing'] \
+                and not salt.utils.is_windows():
+            self.job_pool = JobWorkerPool(opts, self._run_pooled_job)
 
         if io_loop is None:
             zmq.eventloop.ioloop.install()
@@ -958,6 +1113,9 @@ class Minion(MinionBase):
         # python needs to be able to reconstruct the reference on the other
         # side.
         instance = self
+        if self.job_pool is not None and \
+                self.job_pool.run(data, state=self.functions):
+            return
         if self.opts['multiprocessing']:
             if sys.platform.startswith('win'):
                 # let python reconstruct the minion on the other side if we're
@@ -978,6 +1136,27 @@ class Minion(MinionBase):
         else:
             self.win_proc.append(process)
 
+    def _run_pooled_job(self, data):
+        '''
+        Run a job in a worker of the job pool
+        '''
+        if isinstance(data['fun'], tuple) or isinstance(data['fun'], list):
+            target = Minion._thread_multi_return
+        else:
+            target = Minion._thread_return
+        # The worker is already apart from the minion, do not daemonize it
+        opts = dict(self.opts, multiprocessing=False)
+        try:
+            target(self, opts, data)
+        finally:
+            # The worker outlives the job, do not leave it in saltutil.running
+            fn_ = os.path.join(self.proc_dir, data['jid'])
+            if os.path.isfile(fn_):
+                try:
+                    os.remove(fn_)
+                except (OSError, IOError):
+                    pass
+
     @classmethod
     def _thread_return(cls, minion_instance, opts, data):
         '''
@@ -1228,7 +1407,6 @@ class Minion(MinionBase):
         Return the data from the executed command to the master server
         '''
         jid = ret.get('jid', ret.get('__jid__'))
-        fun = ret.get('fun', ret.get('__fun__'))
         if self.opts['multiprocessing']:
             fn_ = os.path.join(self.proc_dir, jid)
             if os.path.isfile(fn_):
@@ -1239,6 +1417,38 @@ class Minion(MinionBase):
                     pass
         log.info('Returning information for job: {0}'.format(jid))
         channel = salt.transport.Channel.factory(self.opts)
+        load = self._return_load(ret, ret_cmd)
+        if self.opts['cache_jobs']:
+            # Local job cache has been enabled
+            fn_ = os.path.join(
+                self.opts['cachedir'],
+                'minion_jobs',
+                load['jid'],
+                'return.p')
+            jdir = os.path.dirname(fn_)
+            if not os.path.isdir(jdir):
+                os.makedirs(jdir)
+            salt.utils.fopen(fn_, 'w+b').write(self.serial.dumps(ret))
+        try:
+            ret_val = channel.send(load, timeout=timeout)
+        except SaltReqTimeoutError:
+            msg = ('The minion failed to return the job information for job '
+                   '{0}. This is often due to the master being shut down or '
+                   'overloaded. If the master is running consider increasing '
+                   'the worker_threads value.').format(jid)
+            log.warn(msg)
+            return ''
+
+        log.trace('ret_val = {0}'.format(ret_val))
+        return ret_val
+
+    def _return_load(self, ret, ret_cmd='_return'):
+        '''
+        Return the load sending the data from the executed command to the
+        master server
+        '''
+        jid = ret.get('jid', ret.get('__jid__'))
+        fun = ret.get('fun', ret.get('__fun__'))
         if ret_cmd == '_syndic_return':
             load = {'cmd': ret_cmd,
                     'id': self.opts['id'],
@@ -1275,29 +1485,7 @@ class Minion(MinionBase):
             else:
                 if isinstance(oput, six.string_types):
                     load['out'] = oput
-        if self.opts['cache_jobs']:
-            # Local job cache has been enabled
-            fn_ = os.path.join(
-                self.opts['cachedir'],
-                'minion_jobs',
-                load['jid'],
-                'return.p')
-            jdir = os.path.dirname(fn_)
-            if not os.path.isdir(jdir):
-                os.makedirs(jdir)
-            salt.utils.fopen(fn_, 'w+b').write(self.serial.dumps(ret))
-        try:
-            ret_val = channel.send(load, timeout=timeout)
-        except SaltReqTimeoutError:
-            msg = ('The minion failed to return the job information for job '
-                   '{0}. This is often due to the master being shut down or '
-                   'overloaded. If the master is running consider increasing '
-                   'the worker_threads value.').format(jid)
-            log.warn(msg)
-            return ''
-
-        log.trace('ret_val = {0}'.format(ret_val))
-        return ret_val
+        return load
 
     def _state_run(self):
         '''
@@ -1625,6 +1813,10 @@ class Minion(MinionBase):
         # Add an extra fallback in case a forked process leaks through
         multiprocessing.active_children()
 
+        # Drop the job pool workers which were killed or recycled
+        if self.job_pool is not None:
+            self.job_pool.reap()
+
         # Cleanup Windows threads
         if not salt.utils.is_windows():
             return
@@ -1776,6 +1968,9 @@ class Minion(MinionBase):
         Tear down the minion
         '''
         self._running = False
+        if getattr(self, 'job_pool', None) is not None:
+            self.job_pool.close()
+            self.job_pool = None
         if hasattr(self, 'pub_channel'):
             self.pub_channel.on_recv(None)
             del self.pub_channel
@@ -1787,6 +1982,23 @@ class Minion(MinionBase):
         self.destroy()
 
 
+def _syndic_forward_load(syndic, jid):
+    '''
+    Return the load of the job jid which the syndic forwards with its first
+    returns, or an empty dict once it was forwarded
+    '''
+    if jid in syndic.jid_forward_cache:
+        load = syndic.jid_forward_cache[jid]
+    else:
+        # Not published through this syndic, or published too long ago
+        fstr = '{0}.get_load'.format(syndic.opts['master_job_cache'])
+        load = syndic.mminion.returners[fstr](jid)
+    # Only need to forward each load once. Don't hit the disk for every
+    # minion return!
+    syndic.jid_forward_cache[jid] = None
+    return load or {}
+
+
 class Syndic(Minion):
     '''
     Make a Syndic minion, this minion will use the minion keys on the
@@ -1800,7 +2012,12 @@ class Syndic(Minion):
         opts['loop_interval'] = 1
         super(Syndic, self).__init__(opts, **kwargs)
         self.mminion = salt.minion.MasterMinion(opts)
-        self.jid_forward_cache = set()
+        # The loads of the jobs published by the higher level master, None
+        # once they were forwarded with the first returns
+        self.jid_forward_cache = salt.utils.cache.LRUCache(
+            opts['syndic_jid_forward_cache_hwm'])
+        # False once the master turned out not to take batches of returns
+        self.batch_returns = True
 
     def _handle_decoded_payload(self, data):
         '''
@@ -1811,6 +2028,10 @@ class Syndic(Minion):
         data['to'] = int(data.get('to', self.opts['timeout'])) - 1
         # Only forward the command if it didn't originate from ourselves
         if data.get('master_id', 0) != self.opts.get('master_id', 1):
+            if data.get('jid') and data['jid'] not in self.jid_forward_cache:
+                # Keep the load to forward it with the returns, which saves
+                # reading it back from the job cache
+                self.jid_forward_cache[data['jid']] = dict(data)
             self.syndic_cmd(data)
 
     def syndic_cmd(self, data):
@@ -1933,24 +2154,11 @@ class Syndic(Minion):
             if 'jid' not in event['data']:
                 # Not a job return
                 return
-            jdict = self.jids.setdefault(event['tag'], {})
+            jdict = self.jids.setdefault(event['data']['jid'], {})
             if not jdict:
                 jdict['__fun__'] = event['data'].get('fun')
                 jdict['__jid__'] = event['data']['jid']
-                jdict['__load__'] = {}
-                fstr = '{0}.get_load'.format(self.opts['master_job_cache'])
-                # Only need to forward each load once. Don't hit the disk
-                # for every minion return!
-                if event['data']['jid'] not in self.jid_forward_cache:
-                    jdict['__load__'].update(
-                        self.mminion.returners[fstr](event['data']['jid'])
-                        )
-                    self.jid_forward_cache.add(event['data']['jid'])
-                    if len(self.jid_forward_cache) > self.opts['syndic_jid_forward_cache_hwm']:
-                        # Pop the oldest jid from the cache
-                        tmp = sorted(list(self.jid_forward_cache))
-                        tmp.pop(0)
-                        self.jid_forward_cache = set(tmp)
+                jdict['__load__'] = _syndic_forward_load(self, event['data']['jid'])
             if 'master_id' in event['data']:
                 # __'s to make sure it doesn't print out on the master cli
                 jdict['__master_id__'] = event['data']['master_id']
@@ -1966,12 +2174,53 @@ class Syndic(Minion):
             self._fire_master(events=self.raw_events,
                               pretag=tagify(self.opts['id'], base='syndic'),
                               )
-        for jid in self.jids:
-            self._return_pub(self.jids[jid],
-                             '_syndic_return',
-                             timeout=self._return_retry_timer())
+        if self.jids:
+            self._return_pubs(list(self.jids.values()),
+                              timeout=self._return_retry_timer())
         self._reset_event_aggregation()
 
+    def _return_pubs(self, rets, timeout=60):
+        '''
+        Forward the returns of several jobs to the master, batched in messages
+        of at most syndic_forward_batch_size bytes
+        '''
+        max_size = self.opts.get('syndic_forward_batch_size', 0)
+        batches = []
+        batch = []
+        size = 0
+        for ret in rets:
+            load = self._return_load(ret, '_syndic_return')
+            if max_size:
+                load_size = len(self.serial.dumps(load))
+                if batch and size + load_size > max_size:
+                    batches.append(batch)
+                    batch = []
+                    size = 0
+                size += load_size
+            batch.append(load)
+        if batch:
+            batches.append(batch)
+
+        channel = salt.transport.Channel.factory(self.opts)
+        for batch in batches:
+            try:
+                if max_size and self.batch_returns:
+                    ret_val = channel.send({'cmd': '_syndic_returns',
+                                            'id': self.opts['id'],
+                                            'returns': batch},
+                                           timeout=timeout)
+                    if ret_val is not False:
+                        continue
+                    log.info('The master does not take batches of syndic '
+                             'returns, forwarding them one job at a time')
+                    self.batch_returns = False
+                for load in batch:
+                    channel.send(load, timeout=timeout)
+            except SaltReqTimeoutError:
+                log.warn('The syndic failed to forward the returns of {0} '
+                         'jobs. This is often due to the master being shut '
+                         'down or overloaded.'.format(len(batch)))
+
     def destroy(self):
         '''
         Tear down the syndic minion
@@ -2022,7 +2271,8 @@ class MultiSyndic(MinionBase):
         self.max_auth_wait = self.opts['acceptance_wait_time_max']
 
         self._has_master = threading.Event()
-        self.jid_forward_cache = set()
+        self.jid_forward_cache = salt.utils.cache.LRUCache(
+            opts['syndic_jid_forward_cache_hwm'])
 
         if io_loop is None:
             zmq.eventloop.ioloop.install()
@@ -2056,6 +2306,9 @@ class MultiSyndic(MinionBase):
                                 io_loop=self.io_loop,
                                 )
                 yield syndic.connect_master()
+                # The syndics keep the loads of the jobs they publish for the
+                # returns forwarded here
+                syndic.jid_forward_cache = self.jid_forward_cache
                 # set up the syndic to handle publishes (specifically not event forwarding)
                 syndic.tune_in_no_block()
                 log.info('Syndic successfully connected to {0}'.format(opts['master']))
@@ -2172,24 +2425,11 @@ class MultiSyndic(MinionBase):
                 log.debug('Return recieved with matching master_id, not forwarding')
                 return
 
-            jdict = self.jids.setdefault(event['tag'], {})
+            jdict = self.jids.setdefault(event['data']['jid'], {})
             if not jdict:
                 jdict['__fun__'] = event['data'].get('fun')
                 jdict['__jid__'] = event['data']['jid']
-                jdict['__load__'] = {}
-                fstr = '{0}.get_load'.format(self.opts['master_job_cache'])
-                # Only need to forward each load once. Don't hit the disk
-                # for every minion return!
-                if event['data']['jid'] not in self.jid_forward_cache:
-                    jdict['__load__'].update(
-                        self.mminion.returners[fstr](event['data']['jid'])
-                        )
-                    self.jid_forward_cache.add(event['data']['jid'])
-                    if len(self.jid_forward_cache) > self.opts['syndic_jid_forward_cache_hwm']:
-                        # Pop the oldest jid from the cache
-                        tmp = sorted(list(self.jid_forward_cache))
-                        tmp.pop(0)
-                        self.jid_forward_cache = set(tmp)
+                jdict['__load__'] = _syndic_forward_load(self, event['data']['jid'])
             if 'master_id' in event['data']:
                 # __'s to make sure it doesn't print out on the master cli
                 jdict['__master_id__'] = event['data']['master_id']
@@ -2212,11 +2452,14 @@ class MultiSyndic(MinionBase):
                                       'timeout': self.SYNDIC_EVENT_TIMEOUT,
                                       },
                               )
-        for jid, jid_ret in self.jids.items():
-            self._call_syndic('_return_pub',
-                              args=(jid_ret, '_syndic_return'),
+        masters = {}
+        for jid_ret in six.itervalues(self.jids):
+            masters.setdefault(jid_ret.get('__master_id__'), []).append(jid_ret)
+        for master_id, rets in six.iteritems(masters):
+            self._call_syndic('_return_pubs',
+                              args=(rets,),
                               kwargs={'timeout': self.SYNDIC_EVENT_TIMEOUT},
-                              master_id=jid_ret.get('__master_id__'),
+                              master_id=master_id,
                               )
 
         self._reset_event_aggregation()
@@ -43,6 +43,7 @@ import salt.state
 import salt.client
 import salt.client.ssh.client
 import salt.config
+import salt.loader
 import salt.runner
 import salt.utils
 import salt.utils.process
@@ -161,6 +162,8 @@ def _sync(form, saltenv=None):
         mod_file = os.path.join(__opts__['cachedir'], 'module_refresh')
         with salt.utils.fopen(mod_file, 'a+') as ofile:
             ofile.write('')
+    # What was synced may change which modules load
+    salt.loader.clear_virtual_cache(__opts__)
     if form == 'grains' and \
        __opts__.get('grains_cache') and \
        os.path.isfile(os.path.join(__opts__['cachedir'], 'grains.cache.p')):
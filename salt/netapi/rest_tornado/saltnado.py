@@ -215,7 +215,6 @@ ioloop.install()
 import salt.netapi
 import salt.utils
 import salt.utils.event
-from salt.utils.event import tagify
 import salt.client
 import salt.runner
 import salt.auth
@@ -309,6 +308,9 @@ class EventListener(object):
         # map of future -> timeout_callback
         self.timeout_map = {}
 
+        # request_obj -> set of salt.client.ReturnCollector
+        self.collector_map = defaultdict(set)
+
         self.stream = zmqstream.ZMQStream(
             self.event.sub,
             io_loop=tornado.ioloop.IOLoop.current(),
@@ -319,6 +321,10 @@ class EventListener(object):
         '''
         Remove all futures that were waiting for request `request` since it is done waiting
         '''
+        for collector in self.collector_map.pop(request, ()):
+            collector.stop()
+            if not collector.future.done():
+                collector.future.set_exception(TimeoutException())
         if request not in self.request_map:
             return
         for tag, future in self.request_map[request]:
@@ -362,6 +368,24 @@ class EventListener(object):
 
         return future
 
+    def add_collector(self, request, collector):
+        '''
+        Hand the events to a salt.client.ReturnCollector until it is done
+        '''
+        # if the request finished, no reason to collect the returns, since we
+        # can't send them back to the client
+        if request._finished:
+            collector.future.set_exception(TimeoutException())
+            return
+        self.collector_map[request].add(collector)
+
+        def remove_collector(future):
+            self.collector_map[request].discard(collector)
+            if not self.collector_map[request]:
+                del self.collector_map[request]
+        collector.future.add_done_callback(remove_collector)
+        collector.start()
+
     def _timeout_future(self, tag, future):
         '''
         Timeout a specific future
@@ -378,18 +402,28 @@ class EventListener(object):
         '''
         Callback for events on the event sub socket
         '''
-        mtag, data = self.event.unpack(raw[0], self.event.serial)
+        mtag, sep, mdata = raw[0].partition(salt.utils.event.TAGEND)
+        collectors = [collector
+                      for collectors in six.itervalues(self.collector_map)
+                      for collector in collectors
+                      if collector.wants(mtag)]
+        prefixes = [tag_prefix for tag_prefix in self.tag_map if mtag.startswith(tag_prefix)]
+        if not collectors and not prefixes:
+            # Don't decode the events nobody waits for
+            return
+        data = self.event.serial.loads(mdata)
+        for collector in collectors:
+            collector.handle_event(mtag, data)
         # see if we have any futures that need this info:
-        for tag_prefix, futures in six.iteritems(self.tag_map):
-            if mtag.startswith(tag_prefix):
-                for future in futures:
-                    if future.done():
-                        continue
-                    future.set_result({'data': data, 'tag': mtag})
-                    self.tag_map[tag_prefix].remove(future)
-                    if future in self.timeout_map:
-                        tornado.ioloop.IOLoop.current().remove_timeout(self.timeout_map[future])
-                        del self.timeout_map[future]
+        for tag_prefix in prefixes:
+            for future in list(self.tag_map[tag_prefix]):
+                if future.done():
+                    continue
+                future.set_result({'data': data, 'tag': mtag})
+                self.tag_map[tag_prefix].remove(future)
+                if future in self.timeout_map:
+                    tornado.ioloop.IOLoop.current().remove_timeout(self.timeout_map[future])
+                    del self.timeout_map[future]
 
 
 # TODO: move to a utils function within salt-- the batching stuff is a bit tied together
@@ -990,110 +1024,31 @@ class SaltAPIHandler(BaseSaltAPIHandler, SaltClientsMixIn):  # pylint: disable=W
         if 'jid' not in pub_data:
             raise tornado.gen.Return('No minions matched the target. No command was sent, no jid was assigned.')
 
-        # seed minions_remaining with the pub_data
-        minions_remaining = pub_data['minions']
-
-        syndic_min_wait = None
-        if self.application.opts['order_masters']:
-            syndic_min_wait = tornado.gen.sleep(self.application.opts['syndic_wait'])
+        def add_returns(batch):
+            for ret in batch:
+                for id_, min_ret in six.iteritems(ret):
+                    chunk_ret[id_] = min_ret['ret']
 
-        job_not_running = self.job_not_running(pub_data['jid'],
-                                               chunk['tgt'],
-                                               f_call['kwargs']['expr_form'],
-                                               minions_remaining=minions_remaining
-                                               )
+        def find_job(jid):
+            return self.saltclients['local'](chunk['tgt'],
+                                             'saltutil.find_job',
+                                             [jid],
+                                             expr_form=f_call['kwargs']['expr_form'])
 
-        # if we have a min_wait, do that
-        if syndic_min_wait is not None:
-            yield syndic_min_wait
         # we are completed when either all minions return or the job isn't running anywhere
-        chunk_ret = yield self.all_returns(pub_data['jid'],
-                                           finish_futures=[job_not_running],
-                                           minions_remaining=minions_remaining,
-                                           )
+        collector = salt.client.ReturnCollector(self.application.opts,
+                                                pub_data['jid'],
+                                                pub_data['minions'],
+                                                add_returns,
+                                                find_job=find_job,
+                                                timeout=f_call['kwargs'].get('timeout'),
+                                                batch_size=100,
+                                                io_loop=tornado.ioloop.IOLoop.current())
+        self.application.event_listener.add_collector(self, collector)
+        yield collector.future
 
         raise tornado.gen.Return(chunk_ret)
 
-    @tornado.gen.coroutine
-    def all_returns(self,
-                    jid,
-                    finish_futures=None,
-                    minions_remaining=None,
-                    ):
-        '''
-        Return a future which will complete once all returns are completed
-        (according to minions_remaining), or one of the passed in "finish_futures" completes
-        '''
-        if finish_futures is None:
-            finish_futures = []
-        if minions_remaining is None:
-            minions_remaining = []
-
-        ret_tag = tagify([jid, 'ret'], 'job')
-        chunk_ret = {}
-        while True:
-            ret_event = self.application.event_listener.get_event(self,
-                                                      tag=ret_tag,
-                                                      )
-            f = yield Any([ret_event] + finish_futures)
-            if f in finish_futures:
-                raise tornado.gen.Return(chunk_ret)
-            event = f.result()
-            chunk_ret[event['data']['id']] = event['data']['return']
-            # its possible to get a return that wasn't in the minion_remaining list
-            try:
-                minions_remaining.remove(event['data']['id'])
-            except ValueError:
-                pass
-            if len(minions_remaining) == 0:
-                raise tornado.gen.Return(chunk_ret)
-
-    @tornado.gen.coroutine
-    def job_not_running(self,
-                  jid,
-                  tgt,
-                  tgt_type,
-                  minions_remaining=None,
-                  ):
-        '''
-        Return a future which will complete once jid (passed in) is no longer
-        running on tgt
-        '''
-        if minions_remaining is None:
-            minions_remaining = []
-
-        ping_pub_data = self.saltclients['local'](tgt,
-                                                  'saltutil.find_job',
-                                                  [jid],
-                                                  expr_form=tgt_type)
-        ping_tag = tagify([ping_pub_data['jid'], 'ret'], 'job')
-
-        minion_running = False
-        while True:
-            try:
-                event = yield self.application.event_listener.get_event(self,
-                                                                        tag=ping_tag,
-                                                                        timeout=self.application.opts['gather_job_timeout'],
-                                                                        )
-            except TimeoutException:
-                if not minion_running:
-                    raise tornado.gen.Return(True)
-                else:
-                    ping_pub_data = self.saltclients['local'](tgt,
-                                                              'saltutil.find_job',
-                                                              [jid],
-                                                              expr_form=tgt_type)
-                    ping_tag = tagify([ping_pub_data['jid'], 'ret'], 'job')
-                    minion_running = False
-                    continue
-            # Minions can return, we want to see if the job is running...
-            if event['data'].get('return', {}) == {}:
-                continue
-            minion_running = True
-            id_ = event['data']['id']
-            if id_ not in minions_remaining:
-                minions_remaining.append(event['data']['id'])
-
     @tornado.gen.coroutine
     def _disbatch_local_async(self, chunk):
         '''
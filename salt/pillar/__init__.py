@@ -7,6 +7,11 @@ Render the pillar data
 from __future__ import absolute_import
 import copy
 import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
 import collections
 import logging
 
@@ -15,8 +20,12 @@ import salt.loader
 import salt.fileclient
 import salt.minion
 import salt.crypt
+import salt.payload
 import salt.transport
+import salt.utils
+import salt.utils.atomicfile
 import salt.utils.url
+import salt.utils.verify
 from salt.exceptions import SaltClientError
 from salt.template import compile_template
 from salt.utils.dictupdate import merge
@@ -30,6 +39,11 @@ import tornado.gen
 
 log = logging.getLogger(__name__)
 
+# The compiled pillar cache, in the master cachedir
+PILLAR_CACHE_DIR = 'pillar_cache'
+# Holds the time the cache of all minions, or of one minion, was invalidated
+INVALIDATED = '.invalidated'
+
 
 def get_pillar(opts, grains, id_, saltenv=None, ext=None, env=None, funcs=None,
                pillar=None, pillarenv=None):
@@ -711,3 +725,193 @@ class AsyncPillar(Pillar):
     def compile_pillar(self, ext=True, pillar_dirs=None):
         ret = super(AsyncPillar, self).compile_pillar(ext=ext, pillar_dirs=pillar_dirs)
         raise tornado.gen.Return(ret)
+
+
+def _mark_invalidated(path):
+    '''
+    Record the current time in the invalidation marker at path
+    '''
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    tmpfh, tmpfname = tempfile.mkstemp(dir=dirname)
+    os.close(tmpfh)
+    with salt.utils.fopen(tmpfname, 'w') as fp_:
+        fp_.write(repr(time.time()))
+    # Renaming gives the marker a new inode, so readers notice the change
+    salt.utils.atomicfile.atomic_rename(tmpfname, path)
+
+
+def clear_pillar_cache(opts, minion_ids=None):
+    '''
+    Invalidate the compiled pillar cache of the master, for every minion or
+    only for the passed minion ids
+
+    Every master worker notices the invalidation the next time it looks up
+    the pillar of a minion.
+    '''
+    cachedir = os.path.join(opts['cachedir'], PILLAR_CACHE_DIR)
+    if minion_ids is None:
+        if os.path.isdir(cachedir):
+            shutil.rmtree(cachedir, ignore_errors=True)
+        _mark_invalidated(os.path.join(cachedir, INVALIDATED))
+        return True
+    for minion_id in minion_ids:
+        if not salt.utils.verify.valid_id(opts, minion_id):
+            continue
+        minion_dir = os.path.join(cachedir, minion_id)
+        if os.path.isdir(minion_dir):
+            shutil.rmtree(minion_dir, ignore_errors=True)
+        _mark_invalidated(os.path.join(minion_dir, INVALIDATED))
+    return True
+
+
+class PillarCache(object):
+    '''
+    Cache the compiled pillar of minions on the master
+
+    Entries are keyed by minion id, saltenv and pillarenv and are only used
+    while the grains, pillar override and ext of the request are the ones the
+    pillar was compiled with. Entries expire after ``pillar_cache_ttl``
+    seconds, or when they are invalidated with :func:`clear_pillar_cache`.
+
+    The ``memory`` backend keeps the entries in the process, the ``disk``
+    backend shares them between the master workers through the cachedir.
+    With ``pillar_cache_encrypt`` the entries on disk are encrypted with the
+    key returned by ``aes_key``, entries written with an older key are
+    treated as missing.
+    '''
+    def __init__(self, opts, aes_key=None):
+        self.opts = opts
+        self.ttl = opts.get('pillar_cache_ttl', 3600)
+        self.backend = opts.get('pillar_cache_backend', 'disk')
+        self.cachedir = os.path.join(opts['cachedir'], PILLAR_CACHE_DIR)
+        self.serial = salt.payload.Serial(opts)
+        self.aes_key = None
+        if opts.get('pillar_cache_encrypt', False):
+            self.aes_key = aes_key
+        self._memory = {}
+        # Invalidation times, keyed by marker path
+        self._markers = {}
+
+    def fingerprint(self, grains, pillar_override=None, ext=None):
+        '''
+        Return a digest of the request data the pillar is compiled from, or
+        None if it cannot be computed
+        '''
+        try:
+            data = json.dumps([grains, pillar_override, ext],
+                              sort_keys=True,
+                              default=repr)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            return None
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, id_, saltenv, pillarenv, fingerprint):
+        '''
+        Return the cached pillar, or None if there is no valid entry
+        '''
+        if fingerprint is None:
+            return None
+        if self.backend == 'memory':
+            entry = self._memory.get((id_, saltenv, pillarenv))
+        else:
+            entry = self._read(self._path(id_, saltenv, pillarenv))
+        if entry is None:
+            return None
+        if entry['fingerprint'] != fingerprint:
+            return None
+        if time.time() - entry['created'] > self.ttl:
+            return None
+        if entry['created'] <= self._invalidated(id_):
+            return None
+        return entry['pillar']
+
+    def store(self, id_, saltenv, pillarenv, fingerprint, pillar, created):
+        '''
+        Cache a pillar, ``created`` is the time its compilation started
+        '''
+        if fingerprint is None:
+            return
+        entry = {'created': created,
+                 'fingerprint': fingerprint,
+                 'pillar': pillar}
+        if self.backend == 'memory':
+            self._memory[(id_, saltenv, pillarenv)] = entry
+            return
+        path = self._path(id_, saltenv, pillarenv)
+        try:
+            self._write(path, entry)
+        except (IOError, OSError) as exc:
+            log.warning(
+                'Unable to write the pillar cache of {0}: {1}'.format(id_, exc)
+            )
+
+    def _path(self, id_, saltenv, pillarenv):
+        '''
+        Return the path of the cache file of a minion pillar
+        '''
+        name = hashlib.sha1(repr((saltenv, pillarenv))).hexdigest()
+        return os.path.join(self.cachedir, id_, '{0}.p'.format(name))
+
+    def _read(self, path):
+        '''
+        Read an entry from disk
+        '''
+        if not os.path.isfile(path):
+            return None
+        try:
+            with salt.utils.fopen(path, 'rb') as fp_:
+                data = fp_.read()
+            if self.aes_key is not None:
+                return salt.crypt.Crypticle(self.opts, self.aes_key()).loads(data)
+            return self.serial.loads(data)
+        except Exception as exc:
+            log.debug('Unable to read pillar cache {0}: {1}'.format(path, exc))
+            return None
+
+    def _write(self, path, entry):
+        '''
+        Write an entry to disk
+        '''
+        if self.aes_key is not None:
+            data = salt.crypt.Crypticle(self.opts, self.aes_key()).dumps(entry)
+        else:
+            data = self.serial.dumps(entry)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        tmpfh, tmpfname = tempfile.mkstemp(dir=dirname)
+        os.close(tmpfh)
+        with salt.utils.fopen(tmpfname, 'w+b') as fp_:
+            fp_.write(data)
+        salt.utils.atomicfile.atomic_rename(tmpfname, path)
+
+    def _invalidated(self, id_):
+        '''
+        Return the last time the cache of the minion was invalidated
+        '''
+        return max(self._marker(os.path.join(self.cachedir, INVALIDATED)),
+                   self._marker(os.path.join(self.cachedir, id_, INVALIDATED)))
+
+    def _marker(self, path):
+        '''
+        Return the time held by an invalidation marker, the parsed time is
+        reused while the marker file is unchanged
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._markers.pop(path, None)
+            return 0
+        sig = (stat.st_ino, stat.st_size, stat.st_mtime)
+        cached = self._markers.get(path)
+        if cached is not None and cached[0] == sig:
+            return cached[1]
+        try:
+            with salt.utils.fopen(path, 'r') as fp_:
+                value = float(fp_.read().strip())
+        except (IOError, ValueError):
+            value = stat.st_mtime
+        self._markers[path] = (sig, value)
+        return value
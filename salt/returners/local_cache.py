@@ -13,6 +13,7 @@ import shutil
 import time
 import hashlib
 import bisect
+import threading
 
 # Import salt libs
 import salt.payload
@@ -22,6 +23,11 @@ import salt.exceptions
 
 # Import 3rd-party libs
 import salt.ext.six as six
+try:
+    import sqlite3
+    HAS_SQLITE3 = True
+except ImportError:
+    HAS_SQLITE3 = False
 
 
 log = logging.getLogger(__name__)
@@ -36,6 +42,20 @@ RETURN_P = 'return.p'
 OUT_P = 'out.p'
 # endtime is the end time for a job, not stored as msgpack
 ENDTIME = 'endtime'
+# the job index, kept next to the jobs directory
+INDEX_DB = 'jobs_index.db'
+# present while the job index holds every job of the jobs directory, removed
+# whenever a job is written without adding it to the index
+INDEX_BUILT = 'jobs_index.built'
+# the fields of the load stored in the job index
+INDEX_FIELDS = ('fun', 'arg', 'tgt', 'tgt_type', 'user', 'metadata')
+
+# Open connections to the job index, keyed by pid, thread and path
+_INDEX_CONNS = {}
+_INDEX_LOCK = threading.Lock()
+# The pids and cache directories which already invalidated the job index
+# while it is turned off
+_INDEX_CHECKED = set()
 
 
 def _job_dir():
@@ -79,6 +99,200 @@ def _walk_through(job_dir):
             yield jid, job, t_path, final
 
 
+def _use_index():
+    '''
+    Return True if the job index should be kept
+    '''
+    return HAS_SQLITE3 and __opts__.get('job_cache_index', False)
+
+
+def _index_conn():
+    '''
+    Return a connection to the job index, creating the index if needed
+    '''
+    path = os.path.join(__opts__['cachedir'], INDEX_DB)
+    key = (os.getpid(), threading.current_thread().ident, path)
+    if key not in _INDEX_CONNS:
+        _index_prune()
+        conn = sqlite3.connect(path, timeout=30)
+        # The index can always be rebuilt from the jobs directory, so there is
+        # no need to wait for every write to hit the disk
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS jobs ('
+                         'jid TEXT PRIMARY KEY, ctime REAL, fun TEXT, job BLOB)')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_ctime ON jobs (ctime)')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta ('
+                         'key TEXT PRIMARY KEY, value TEXT)')
+        with _INDEX_LOCK:
+            _INDEX_CONNS[key] = conn
+    return _INDEX_CONNS[key]
+
+
+def _index_prune():
+    '''
+    Close the connections to the job index of the threads which are gone, and
+    forget the ones inherited from the parent process
+    '''
+    pid = os.getpid()
+    idents = set(thread.ident for thread in threading.enumerate())
+    with _INDEX_LOCK:
+        for key in list(_INDEX_CONNS):
+            if key[0] != pid:
+                del _INDEX_CONNS[key]
+            elif key[1] not in idents:
+                try:
+                    _INDEX_CONNS.pop(key).close()
+                except sqlite3.Error:
+                    pass
+
+
+def _index_ready():
+    '''
+    Return a connection to the job index if it is in use and holds every job
+    of the jobs directory, otherwise return None
+    '''
+    if not _use_index():
+        return None
+    if not os.path.isfile(os.path.join(__opts__['cachedir'], INDEX_BUILT)):
+        return None
+    try:
+        return _index_conn()
+    except sqlite3.Error as exc:
+        log.warning('Unable to read the job index: {0}'.format(exc))
+        return None
+
+
+def _index_invalidate():
+    '''
+    Mark the job index as missing jobs, so that it is rebuilt by the next
+    cleanup of the old jobs. This happens when a job is written while the
+    index is turned off, or could not be added to it.
+    '''
+    try:
+        os.remove(os.path.join(__opts__['cachedir'], INDEX_BUILT))
+    except OSError as exc:
+        if exc.errno != errno.ENOENT:
+            log.error('Unable to invalidate the job index: {0}'.format(exc))
+
+
+def _index_job(load):
+    '''
+    Return the part of a load which is kept in the job index
+    '''
+    job = {}
+    for field in INDEX_FIELDS:
+        if field in load:
+            job[field] = load[field]
+    if 'metadata' not in job and 'metadata' in load.get('kwargs', {}):
+        job['metadata'] = load['kwargs']['metadata']
+    return job
+
+
+def _index_add(jid, load=None, ctime=None):
+    '''
+    Add a job to the job index, ``load`` is only passed once it is known
+    '''
+    if not _use_index():
+        # Nothing adds the marker back while the index is turned off, so it
+        # only needs to be removed once by each process
+        key = (os.getpid(), __opts__['cachedir'])
+        if key not in _INDEX_CHECKED:
+            _INDEX_CHECKED.add(key)
+            if os.path.isfile(os.path.join(__opts__['cachedir'], INDEX_BUILT)):
+                _index_invalidate()
+        return
+    if ctime is None:
+        ctime = time.time()
+    try:
+        conn = _index_conn()
+        with conn:
+            conn.execute('INSERT OR IGNORE INTO jobs (jid, ctime) VALUES (?, ?)',
+                         (jid, ctime))
+            if load is not None:
+                serial = salt.payload.Serial(__opts__)
+                conn.execute(
+                    'UPDATE jobs SET fun = ?, job = ? WHERE jid = ?',
+                    (load.get('fun'),
+                     sqlite3.Binary(serial.dumps(_index_job(load))),
+                     jid))
+    except sqlite3.Error as exc:
+        log.warning('Unable to add job {0} to the job index: {1}'.format(jid, exc))
+        _index_invalidate()
+
+
+def _index_rows(rows):
+    '''
+    Yield the jid and load of the jobs in the job index rows
+    '''
+    serial = salt.payload.Serial(__opts__)
+    for jid, job in rows:
+        yield str(jid), serial.loads(bytes(job))
+
+
+def rebuild_index():
+    '''
+    Rebuild the job index from the jobs directory. This happens on its own
+    the first time the old jobs are cleaned out, but needs to be done by hand
+    if the jobs directory was changed without keeping the index up to date.
+
+    .. versionadded:: Boron
+    '''
+    if not _use_index():
+        return False
+    _index_invalidate()
+    conn = _index_conn()
+    serial = salt.payload.Serial(__opts__)
+    with conn:
+        conn.execute('DELETE FROM jobs')
+
+    job_dir = _job_dir()
+    if os.path.isdir(job_dir):
+        for top in os.listdir(job_dir):
+            t_path = os.path.join(job_dir, top)
+            rows = []
+            for final in os.listdir(t_path):
+                f_path = os.path.join(t_path, final)
+                jid_file = os.path.join(f_path, 'jid')
+                load_path = os.path.join(f_path, LOAD_P)
+                job = None
+                if os.path.isfile(load_path):
+                    try:
+                        with salt.utils.fopen(load_path, 'rb') as fp_:
+                            job = serial.load(fp_)
+                    except Exception as exc:
+                        log.warning('Unable to read {0}: {1}'.format(load_path, exc))
+                if os.path.isfile(jid_file):
+                    with salt.utils.fopen(jid_file, 'rb') as fp_:
+                        jid = fp_.read().strip()
+                    ctime = os.stat(jid_file).st_ctime
+                elif job is not None and 'jid' in job:
+                    jid = job['jid']
+                    ctime = os.stat(load_path).st_ctime
+                else:
+                    # No jid file means corrupted cache entry, scrub it
+                    shutil.rmtree(f_path)
+                    continue
+                if job is None:
+                    rows.append((jid, ctime, None, None))
+                else:
+                    rows.append((jid, ctime, job.get('fun'),
+                                 sqlite3.Binary(serial.dumps(_index_job(job)))))
+            with conn:
+                # Jobs added while rebuilding are already up to date
+                conn.executemany(
+                    'INSERT OR IGNORE INTO jobs (jid, ctime, fun, job) '
+                    'VALUES (?, ?, ?, ?)',
+                    rows)
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                     ('swept', str(time.time())))
+    with salt.utils.fopen(os.path.join(__opts__['cachedir'], INDEX_BUILT), 'w'):
+        pass
+    return True
+
+
 #TODO: add to returner docs-- this is a new one
 def prep_jid(nocache=False, passed_jid=None, recurse_count=0):
     '''
@@ -122,6 +336,7 @@ def prep_jid(nocache=False, passed_jid=None, recurse_count=0):
         recurse_count += recurse_count
         return prep_jid(passed_jid=jid, nocache=nocache)
 
+    _index_add(jid)
     return jid
 
 
@@ -139,6 +354,46 @@ def returner(load):
     if os.path.exists(os.path.join(jid_dir, 'nocache')):
         return
 
+    return _write_return(serial, jid_dir, load)
+
+
+def save_many(loads):
+    '''
+    Return a batch of minion returns to the local job cache, and return the
+    number of them which could not be stored
+
+    .. versionadded:: Boron
+    '''
+    serial = salt.payload.Serial(__opts__)
+    jid_dirs = {}
+    failed = 0
+    for load in loads:
+        # One bad return must not keep the rest of the batch from being stored
+        try:
+            if load['jid'] == 'req':
+                load['jid'] = prep_jid(nocache=load.get('nocache', False))
+            if load['jid'] not in jid_dirs:
+                jid_dir = _jid_dir(load['jid'])
+                if os.path.exists(os.path.join(jid_dir, 'nocache')):
+                    jid_dir = None
+                jid_dirs[load['jid']] = jid_dir
+            if jid_dirs[load['jid']] is not None:
+                _write_return(serial, jid_dirs[load['jid']], load)
+        except Exception as exc:
+            failed += 1
+            log.error(
+                'Could not store the return of {0} for job {1}: {2}'.format(
+                    load.get('id'), load.get('jid'), exc
+                ),
+                exc_info_on_loglevel=logging.DEBUG
+            )
+    return failed
+
+
+def _write_return(serial, jid_dir, load):
+    '''
+    Write the return of a minion to the job directory
+    '''
     hn_dir = os.path.join(jid_dir, load['id'])
 
     try:
@@ -199,6 +454,8 @@ def save_load(jid, clear_load):
             )
     except IOError as exc:
         log.warning('Could not write job invocation cache file: {0}'.format(exc))
+    else:
+        _index_add(jid, clear_load)
 
     # if you have a tgt, save that for the UI etc
     if 'tgt' in clear_load:
@@ -276,7 +533,13 @@ def get_jids():
     Return a dict mapping all job ids to job information
     '''
     ret = {}
-    for jid, job, _, _ in _walk_through(_job_dir()):
+    conn = _index_ready()
+    if conn is not None:
+        jobs = _index_rows(conn.execute(
+            'SELECT jid, job FROM jobs WHERE job IS NOT NULL'))
+    else:
+        jobs = ((jid, job) for jid, job, _, _ in _walk_through(_job_dir()))
+    for jid, job in jobs:
         ret[jid] = salt.utils.jid.format_jid_instance(jid, job)
 
         if __opts__.get('job_cache_store_endtime'):
@@ -293,6 +556,17 @@ def get_jids_filter(count, filter_find_job=True):
     :param int count: show not more than the count of most recent jobs
     :param bool filter_find_jobs: filter out 'saltutil.find_job' jobs
     '''
+    conn = _index_ready()
+    if conn is not None:
+        query = 'SELECT jid, job FROM jobs WHERE job IS NOT NULL'
+        if filter_find_job:
+            query += ' AND (fun IS NULL OR fun != \'saltutil.find_job\')'
+        query += ' ORDER BY jid DESC LIMIT ?'
+        ret = [salt.utils.jid.format_jid_instance_ext(jid, job)
+               for jid, job in _index_rows(conn.execute(query, (count,)))]
+        ret.reverse()
+        return ret
+
     keys = []
     ret = []
     for jid, job, _, _ in _walk_through(_job_dir()):
@@ -314,26 +588,59 @@ def clean_old_jobs():
     '''
     Clean out the old jobs from the job cache
     '''
+    if _use_index() and _index_ready() is None:
+        rebuild_index()
+    conn = _index_ready()
+    if conn is not None:
+        if __opts__['keep_jobs'] != 0:
+            cur = time.time()
+            expire = cur - __opts__['keep_jobs'] * 3600
+            jids = [row[0] for row in conn.execute(
+                'SELECT jid FROM jobs WHERE ctime < ?', (expire,))]
+            for jid in jids:
+                shutil.rmtree(_jid_dir(str(jid)), ignore_errors=True)
+            with conn:
+                conn.execute('DELETE FROM jobs WHERE ctime < ?', (expire,))
+            # The index does not know about directories without a jid file,
+            # such as the ones update_endtime creates, walk the jobs
+            # directory for them once every keep_jobs hours
+            row = conn.execute('SELECT value FROM meta WHERE key = ?',
+                               ('swept',)).fetchone()
+            if row is None or float(row[0]) < expire:
+                _clean_job_dir(cur)
+                with conn:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                        ('swept', str(cur)))
+        return
+
     if __opts__['keep_jobs'] != 0:
-        cur = time.time()
-        jid_root = _job_dir()
+        _clean_job_dir(time.time())
 
-        if not os.path.exists(jid_root):
-            return
 
-        for top in os.listdir(jid_root):
-            t_path = os.path.join(jid_root, top)
-            for final in os.listdir(t_path):
-                f_path = os.path.join(t_path, final)
-                jid_file = os.path.join(f_path, 'jid')
-                if not os.path.isfile(jid_file):
-                    # No jid file means corrupted cache entry, scrub it
+def _clean_job_dir(cur):
+    '''
+    Remove the jobs older than keep_jobs hours, and the directories without a
+    jid file, from the jobs directory
+    '''
+    jid_root = _job_dir()
+
+    if not os.path.exists(jid_root):
+        return
+
+    for top in os.listdir(jid_root):
+        t_path = os.path.join(jid_root, top)
+        for final in os.listdir(t_path):
+            f_path = os.path.join(t_path, final)
+            jid_file = os.path.join(f_path, 'jid')
+            if not os.path.isfile(jid_file):
+                # No jid file means corrupted cache entry, scrub it
+                shutil.rmtree(f_path)
+            else:
+                jid_ctime = os.stat(jid_file).st_ctime
+                hours_difference = (cur - jid_ctime) / 3600.0
+                if hours_difference > __opts__['keep_jobs']:
                     shutil.rmtree(f_path)
-                else:
-                    jid_ctime = os.stat(jid_file).st_ctime
-                    hours_difference = (cur - jid_ctime) / 3600.0
-                    if hours_difference > __opts__['keep_jobs']:
-                        shutil.rmtree(f_path)
 
 
 def update_endtime(jid, time):
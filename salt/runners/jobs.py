@@ -445,6 +445,26 @@ def last_run(ext_source=None,
         return False
 
 
+def rebuild_index():
+    '''
+    Rebuild the job index of the master job cache from the cached jobs
+
+    .. versionadded:: Boron
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run jobs.rebuild_index
+    '''
+    mminion = salt.minion.MasterMinion(__opts__)
+
+    fun = '{0}.rebuild_index'.format(__opts__['master_job_cache'])
+    if fun not in mminion.returners:
+        raise salt.exceptions.NotImplemented('\'{0}\' returner function not implemented yet.'.format(fun))
+    return mminion.returners[fun]()
+
+
 def _get_returner(returner_types):
     '''
     Helper to iterate over returner_types and pick the first one
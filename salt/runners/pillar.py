@@ -93,3 +93,25 @@ def show_pillar(minion='*', **kwargs):
 
     compiled_pillar = pillar.compile_pillar()
     return compiled_pillar
+
+
+def clear_cache(tgt=None, expr_form='glob'):
+    '''
+    Clear the compiled pillar cache of the master (see
+    :conf_master:`pillar_cache`), for all minions or only for the targeted
+    minions
+
+    .. versionadded:: Boron
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run pillar.clear_cache
+        salt-run pillar.clear_cache 'web*'
+    '''
+    if tgt is None:
+        return salt.pillar.clear_pillar_cache(__opts__)
+    minions = salt.utils.minions.CkMinions(__opts__).check_minions(tgt, expr_form)
+    salt.pillar.clear_pillar_cache(__opts__, minions)
+    return minions
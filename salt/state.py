@@ -18,10 +18,12 @@ import os
 import sys
 import copy
 import site
+import time
 import fnmatch
 import logging
 import datetime
 import traceback
+import multiprocessing
 import re
 
 # Import salt libs
@@ -88,6 +90,7 @@ STATE_RUNTIME_KEYWORDS = frozenset([
     'reload_grains',
     'reload_pillar',
     'fire_event',
+    'parallel',
     'saltenv',
     'use',
     'use_in',
@@ -129,6 +132,10 @@ def split_low_tag(tag):
             'fun': fun}
 
 
+# The characters which make a requisite a glob for fnmatch
+_GLOB_CHARS = re.compile(r'[*?[]')
+
+
 def _gen_tag(low):
     '''
     Generate the running dict tag string from the low data structure
@@ -172,14 +179,52 @@ def state_args(id_, state, high):
     return args
 
 
-def find_name(name, state, high):
+def _index_arg(index, nid, state, arg):
+    '''
+    Add an argument of a state to a name index
+    '''
+    if not isinstance(arg, dict) or len(arg) != 1:
+        return
+    try:
+        nids = index['names'].setdefault((state, arg[next(iter(arg))]), [])
+    except TypeError:
+        # Lists and dicts can not be the name of anything
+        return
+    if nid not in nids:
+        nids.append(nid)
+
+
+def index_names(high):
     '''
-    Scan high data for the id referencing the given name
+    Index the ids of the high data by the values of their arguments, for
+    find_name
+    '''
+    index = {'order': {}, 'names': {}}
+    for ind, nid in enumerate(high):
+        index['order'][nid] = ind
+        if not isinstance(high[nid], dict):
+            continue
+        for state, run in six.iteritems(high[nid]):
+            if not isinstance(run, list):
+                continue
+            for arg in run:
+                _index_arg(index, nid, state, arg)
+    return index
+
+
+def find_name(name, state, high, index=None):
+    '''
+    Scan high data for the id referencing the given name, the scan is
+    skipped when an index made by index_names is passed
     '''
     ext_id = ''
     if name in high:
         ext_id = name
     else:
+        if index is not None:
+            ext_id = _find_indexed_name(name, state, high, index)
+            if ext_id:
+                return ext_id
         # We need to scan for the name
         for nid in high:
             if state in high[nid]:
@@ -196,6 +241,31 @@ def find_name(name, state, high):
     return ext_id
 
 
+def _find_indexed_name(name, state, high, index):
+    '''
+    Return the last id of the high data referencing the given name according
+    to the index, or an empty string
+    '''
+    try:
+        nids = index['names'].get((state, name), ())
+    except TypeError:
+        return ''
+    found = []
+    for nid in nids:
+        # The high data may have changed since it was indexed
+        if not isinstance(high.get(nid), dict) or \
+                not isinstance(high[nid].get(state), list):
+            continue
+        for arg in high[nid][state]:
+            if isinstance(arg, dict) and len(arg) == 1 \
+                    and arg[next(iter(arg))] == name:
+                found.append(nid)
+                break
+    if not found:
+        return ''
+    return max(found, key=lambda nid: index['order'].get(nid, -1))
+
+
 def format_log(ret):
     '''
     Format the state into a log message
@@ -628,6 +698,11 @@ class State(object):
         self.active = set()
         self.mod_init = set()
         self.pre = {}
+        # States running in separate processes: tag -> (low, process, pipe,
+        # run_num, length of the chunks)
+        self.parallel = {}
+        # The chunks the requisite index was built for, and the index
+        self._chunk_index = (None, 0, None)
         self.__run_num = 0
         self.jid = jid
         self.instance_id = str(id(self))
@@ -827,6 +902,8 @@ class State(object):
         Refresh all the modules
         '''
         log.debug('Refreshing modules...')
+        # The installed software may have changed which modules load
+        salt.loader.clear_virtual_cache(self.opts)
         if self.opts['grains'].get('os') != 'MacOS':
             # In case a package has been installed into the current python
             # process 'site-packages', the 'site' module needs to be reloaded in
@@ -1249,6 +1326,7 @@ class State(object):
         if '__extend__' not in high:
             return high, errors
         ext = high.pop('__extend__')
+        index = index_names(high)
         for ext_chunk in ext:
             for name, body in six.iteritems(ext_chunk):
                 if name not in high:
@@ -1256,7 +1334,7 @@ class State(object):
                         x for x in body if not x.startswith('__')
                     )
                     # Check for a matching 'name' override in high data
-                    id_ = find_name(name, state_type, high)
+                    id_ = find_name(name, state_type, high, index)
                     if id_:
                         name = id_
                     else:
@@ -1277,6 +1355,9 @@ class State(object):
                         continue
                     if state not in high[name]:
                         high[name][state] = run
+                        if isinstance(run, list):
+                            for arg in run:
+                                _index_arg(index, name, state, arg)
                         continue
                     # high[name][state] is extended by run, both are lists
                     for arg in run:
@@ -1299,13 +1380,16 @@ class State(object):
                                     # otherwise, its not a requisite and we are just extending (replacing)
                                     else:
                                         high[name][state][hind] = arg
+                                        _index_arg(index, name, state, arg)
                                     update = True
                                 if (argfirst == 'name' and
                                     next(iter(high[name][state][hind])) == 'names'):
                                     # If names are overwritten by name use the name
                                     high[name][state][hind] = arg
+                                    _index_arg(index, name, state, arg)
                         if not update:
                             high[name][state].append(arg)
+                            _index_arg(index, name, state, arg)
         return high, errors
 
     def apply_exclude(self, high):
@@ -1371,6 +1455,7 @@ class State(object):
                     ]))
         extend = {}
         errors = []
+        index = index_names(high)
         for id_, body in six.iteritems(high):
             if not isinstance(body, dict):
                 continue
@@ -1467,7 +1552,7 @@ class State(object):
                                             )
                                 if key == 'prereq':
                                     # Add prerequired to prereqs
-                                    ext_id = find_name(name, _state, high)
+                                    ext_id = find_name(name, _state, high, index)
                                     if not ext_id:
                                         continue
                                     if ext_id not in extend:
@@ -1481,7 +1566,7 @@ class State(object):
                                 if key == 'use_in':
                                     # Add the running states args to the
                                     # use_in states
-                                    ext_id = find_name(name, _state, high)
+                                    ext_id = find_name(name, _state, high, index)
                                     if not ext_id:
                                         continue
                                     ext_args = state_args(ext_id, _state, high)
@@ -1507,7 +1592,7 @@ class State(object):
                                 if key == 'use':
                                     # Add the use state's args to the
                                     # running state
-                                    ext_id = find_name(name, _state, high)
+                                    ext_id = find_name(name, _state, high, index)
                                     if not ext_id:
                                         continue
                                     loc_args = state_args(id_, state, high)
@@ -1712,27 +1797,187 @@ class State(object):
         '''
         running = {}
         for low in chunks:
+            self.reconcile_parallel(running)
             if '__FAILHARD__' in running:
-                running.pop('__FAILHARD__')
-                return running
+                break
             tag = _gen_tag(low)
             if tag not in running:
                 running = self.call_chunk(low, running, chunks)
                 if self.check_failhard(low, running):
-                    return running
+                    break
             self.active = set()
+        # Whatever was started in a separate process is let to finish
+        self.wait_parallel(running)
+        running.pop('__FAILHARD__', None)
         return running
 
+    def index_chunks(self, chunks):
+        '''
+        Return the index of the chunks by state, id, name and sls used to
+        look up requisites, it is only built again for a new list of chunks
+        '''
+        if self._chunk_index[0] is chunks and self._chunk_index[1] == len(chunks):
+            return self._chunk_index[2]
+        index = {'state': {}, 'id': {}, 'name': {}, 'sls': {}}
+        for pos, chunk in enumerate(chunks):
+            try:
+                index['state'].setdefault(chunk['state'], []).append(pos)
+                index['id'].setdefault(
+                    (chunk['state'], chunk['__id__']), []).append(pos)
+                index['name'].setdefault(
+                    (chunk['state'], chunk['name']), []).append(pos)
+                if '__sls__' in chunk:
+                    index['sls'].setdefault(chunk['__sls__'], []).append(pos)
+            except TypeError:
+                # Not hashable, only found by the fallback scan
+                continue
+        self._chunk_index = (chunks, len(chunks), index)
+        return index
+
+    def find_requisites(self, req, chunks):
+        '''
+        Return the chunks matched by a requisite, in the order of the chunks
+        '''
+        req_key = next(iter(req))
+        req_val = req[req_key]
+        if req_val is None:
+            return []
+        # fnmatch ignores the case on Windows, and globs need a scan
+        exact = isinstance(req_val, six.string_types) \
+            and not _GLOB_CHARS.search(req_val) \
+            and not salt.utils.is_windows()
+        index = self.index_chunks(chunks)
+        if req_key == 'sls':
+            # Allow requisite tracking of entire sls files
+            if exact:
+                positions = index['sls'].get(req_val, [])
+            else:
+                positions = [pos for pos, chunk in enumerate(chunks)
+                             if fnmatch.fnmatch(chunk['__sls__'], req_val)]
+        elif exact:
+            positions = sorted(set(index['id'].get((req_key, req_val), [])).union(
+                index['name'].get((req_key, req_val), [])))
+        else:
+            positions = [pos for pos in index['state'].get(req_key, [])
+                         if fnmatch.fnmatch(chunks[pos]['name'], req_val) or
+                         fnmatch.fnmatch(chunks[pos]['__id__'], req_val)]
+        return [chunks[pos] for pos in positions]
+
     def check_failhard(self, low, running):
         '''
         Check if the low data chunk should send a failhard signal
         '''
         tag = _gen_tag(low)
+        if tag in self.parallel:
+            # Checked again once the state is done
+            return False
         if (low.get('failhard', False) or self.opts['failhard']
                 and tag in running):
             return not running[tag]['result']
         return False
 
+    def _run_parallel(self, low):
+        '''
+        Return True if the low chunk can run in a separate process
+        '''
+        if not low.get('parallel') or salt.utils.is_windows():
+            return False
+        if self.opts.get('state_concurrency', 4) < 2:
+            return False
+        # Prereqs run the same state twice, in test mode first
+        for key in ('prereq', 'prerequired', '__prereq__', '__prerequired__'):
+            if low.get(key):
+                return False
+        return True
+
+    def call_parallel(self, low, chunks, running):
+        '''
+        Start the state in a separate process and return a placeholder for
+        its return, the return is filled in by reconcile_parallel
+        '''
+        while len(self.parallel) >= self.opts.get('state_concurrency', 4):
+            self.reconcile_parallel(running)
+            if len(self.parallel) >= self.opts.get('state_concurrency', 4):
+                time.sleep(0.01)
+        tag = _gen_tag(low)
+        parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+        proc = multiprocessing.Process(
+            target=self._call_parallel_target,
+            args=(low, chunks, running, child_conn))
+        proc.start()
+        child_conn.close()
+        log.info('Started state [{0}] in process {1}'.format(low['name'], proc.pid))
+        # The run number is taken now to keep the order of the returns
+        self.parallel[tag] = (low, proc, parent_conn, self.__run_num, len(chunks))
+        self.__run_num += 1
+        return {'name': low['name'],
+                'result': None,
+                'changes': {},
+                'comment': 'Started in a separate process',
+                '__sls__': low['__sls__'],
+                '__id__': low['__id__']}
+
+    def _call_parallel_target(self, low, chunks, running, conn):
+        '''
+        Run a state in the process started by call_parallel and send its
+        return back
+        '''
+        ret = self.call(low, chunks, running)
+        try:
+            conn.send(ret)
+        except Exception:
+            conn.send({'name': low['name'],
+                       'result': False,
+                       'changes': {},
+                       'comment': 'The return of the state could not be '
+                                  'sent back: {0}'.format(traceback.format_exc()),
+                       '__id__': low['__id__']})
+        conn.close()
+
+    def reconcile_parallel(self, running, tags=None):
+        '''
+        Put the returns of the finished parallel states into running, return
+        True if none of the states in tags, or any state, is still running
+        '''
+        for tag in list(self.parallel):
+            low, proc, conn, run_num, length = self.parallel[tag]
+            if conn.poll():
+                try:
+                    ret = conn.recv()
+                except EOFError:
+                    ret = None
+            elif not proc.is_alive():
+                ret = None
+            else:
+                continue
+            proc.join()
+            conn.close()
+            del self.parallel[tag]
+            if ret is None:
+                ret = {'name': low['name'],
+                       'result': False,
+                       'changes': {},
+                       'comment': 'The process running this state exited '
+                                  'with code {0}'.format(proc.exitcode),
+                       '__id__': low['__id__']}
+            ret['__run_num__'] = run_num
+            ret['__sls__'] = low['__sls__']
+            running[tag] = ret
+            self.check_refresh(low, ret)
+            self.event(ret, length, fire_event=low.get('fire_event'))
+            if self.check_failhard(low, running):
+                running['__FAILHARD__'] = True
+        if tags is None:
+            return not self.parallel
+        return not any(tag in self.parallel for tag in tags)
+
+    def wait_parallel(self, running, tags=None):
+        '''
+        Wait for the parallel states in tags, or all of them, to finish
+        '''
+        while not self.reconcile_parallel(running, tags):
+            time.sleep(0.01)
+
     def check_requisite(self, low, running, chunks, pre=False):
         '''
         Look into the running data to check the status of all requisite
@@ -1771,26 +2016,16 @@ class State(object):
         for r_state in reqs:
             if r_state in low and low[r_state] is not None:
                 for req in low[r_state]:
-                    req = trim_req(req)
-                    found = False
-                    for chunk in chunks:
-                        req_key = next(iter(req))
-                        req_val = req[req_key]
-                        if req_val is None:
-                            continue
-                        if req_key == 'sls':
-                            # Allow requisite tracking of entire sls files
-                            if fnmatch.fnmatch(chunk['__sls__'], req_val):
-                                found = True
-                                reqs[r_state].append(chunk)
-                            continue
-                        if (fnmatch.fnmatch(chunk['name'], req_val) or
-                            fnmatch.fnmatch(chunk['__id__'], req_val)):
-                            if chunk['state'] == req_key:
-                                found = True
-                                reqs[r_state].append(chunk)
+                    found = self.find_requisites(trim_req(req), chunks)
                     if not found:
                         return 'unmet', ()
+                    reqs[r_state].extend(found)
+        # The requisites running in a separate process have to finish first
+        if self.parallel:
+            self.wait_parallel(
+                running,
+                [_gen_tag(chunk) for r_chunks in six.itervalues(reqs)
+                 for chunk in r_chunks])
         fun_stats = set()
         for r_state, chunks in six.iteritems(reqs):
             if r_state == 'prereq':
@@ -1904,29 +2139,14 @@ class State(object):
                     continue
                 for req in low[requisite]:
                     req = trim_req(req)
-                    found = False
-                    for chunk in chunks:
-                        req_key = next(iter(req))
-                        req_val = req[req_key]
-                        if req_val is None:
-                            continue
-                        if req_key == 'sls':
-                            # Allow requisite tracking of entire sls files
-                            if fnmatch.fnmatch(chunk['__sls__'], req_val):
-                                if requisite == 'prereq':
-                                    chunk['__prereq__'] = True
-                                reqs.append(chunk)
-                                found = True
-                            continue
-                        if (fnmatch.fnmatch(chunk['name'], req_val) or
-                            fnmatch.fnmatch(chunk['__id__'], req_val)):
-                            if chunk['state'] == req_key:
-                                if requisite == 'prereq':
-                                    chunk['__prereq__'] = True
-                                elif requisite == 'prerequired':
-                                    chunk['__prerequired__'] = True
-                                reqs.append(chunk)
-                                found = True
+                    found = self.find_requisites(req, chunks)
+                    is_sls = next(iter(req)) == 'sls'
+                    for chunk in found:
+                        if requisite == 'prereq':
+                            chunk['__prereq__'] = True
+                        elif requisite == 'prerequired' and not is_sls:
+                            chunk['__prerequired__'] = True
+                        reqs.append(chunk)
                     if not found:
                         lost[requisite].append(req)
             if lost['require'] or lost['watch'] or lost['prereq'] or lost['onfail'] or lost['onchanges'] or lost.get('prerequired'):
@@ -1992,6 +2212,8 @@ class State(object):
         elif status == 'met':
             if low.get('__prereq__'):
                 self.pre[tag] = self.call(low, chunks, running)
+            elif self._run_parallel(low):
+                running[tag] = self.call_parallel(low, chunks, running)
             else:
                 running[tag] = self.call(low, chunks, running)
         elif status == 'fail':
@@ -2068,9 +2290,11 @@ class State(object):
         else:
             if low.get('__prereq__'):
                 self.pre[tag] = self.call(low, chunks, running)
+            elif self._run_parallel(low):
+                running[tag] = self.call_parallel(low, chunks, running)
             else:
                 running[tag] = self.call(low, chunks, running)
-        if tag in running:
+        if tag in running and tag not in self.parallel:
             self.event(running[tag], len(chunks), fire_event=low.get('fire_event'))
         return running
 
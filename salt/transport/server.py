@@ -8,6 +8,9 @@ This includes server side transport, for the ReqServer and the Publisher
 # Import Python Libs
 from __future__ import absolute_import
 
+# Import Tornado Libs
+import tornado.gen
+
 
 class ReqServerChannel(object):
     '''
@@ -103,7 +106,22 @@ class PubServerChannel(object):
     def publish(self, load):
         '''
         Publish "load" to minions
+
+        The master adds the ids of the minions it resolved the target to as
+        ``minions``, which transports may use to only send the publication to
+        those minions. It is not part of the load the minions get.
         '''
         raise NotImplementedError()
 
+    @tornado.gen.coroutine
+    def publish_async(self, load):
+        '''
+        Publish "load" to minions without blocking the current IOLoop.
+
+        Returns a future which is resolved once the load has been handed over
+        to the publisher. Transports which can't do better fall back to
+        :py:meth:`publish`.
+        '''
+        self.publish(load)
+
 # EOF
@@ -23,6 +23,7 @@ import salt.utils
 import salt.utils.verify
 import salt.utils.event
 import salt.utils.async
+import salt.utils.minions
 import salt.payload
 import salt.exceptions
 import salt.transport.frame
@@ -42,6 +43,7 @@ import tornado.netutil
 
 # Import third party libs
 from Crypto.Cipher import PKCS1_OAEP
+import salt.ext.six as six
 
 log = logging.getLogger(__name__)
 
@@ -207,7 +209,8 @@ class AsyncTCPPubChannel(salt.transport.mixins.auth.AESPubClientMixin, salt.tran
                 yield self.auth.authenticate()
             self.message_client = SaltMessageClient(self.opts['master_ip'],
                                                     int(self.auth.creds['publish_port']),
-                                                    io_loop=self.io_loop)
+                                                    io_loop=self.io_loop,
+                                                    connect_callback=self.send_id)
             yield self.message_client.connect()  # wait for the client to be connected
             self.connected = True
         # TODO: better exception handling...
@@ -216,6 +219,22 @@ class AsyncTCPPubChannel(salt.transport.mixins.auth.AESPubClientMixin, salt.tran
         except:
             raise SaltClientError('Unable to sign_in to master')  # TODO: better error message
 
+    @tornado.gen.coroutine
+    def send_id(self):
+        '''
+        Identify this minion to the publisher, so that the master only sends
+        us the publications which target us
+        '''
+        load = {'id': self.opts['id'], 'tok': self.auth.gen_token('salt')}
+        try:
+            ret = yield self.message_client.send(load, timeout=self.opts['auth_timeout'])
+        except Exception as exc:
+            # Older masters do not answer, they send us every publication
+            log.debug('Unable to identify to the publisher: {0}'.format(exc))
+            return
+        if not ret:
+            log.debug('The publisher was unable to verify our identity')
+
     def on_recv(self, callback):
         '''
         Register an on_recv callback
@@ -381,9 +400,12 @@ class SaltMessageClient(object):
     '''
     Low-level message sending client
     '''
-    def __init__(self, host, port, io_loop=None, resolver=None):
+    def __init__(self, host, port, io_loop=None, resolver=None,
+                 connect_callback=None):
         self.host = host
         self.port = port
+        # Called every time a connection has been (re-)established
+        self.connect_callback = connect_callback
 
         self.io_loop = io_loop or tornado.ioloop.IOLoop.current()
 
@@ -452,6 +474,8 @@ class SaltMessageClient(object):
             try:
                 self._stream = yield self._tcp_client.connect(self.host, self.port)
                 self._connecting_future.set_result(True)
+                if self.connect_callback is not None:
+                    self.io_loop.spawn_callback(self.connect_callback)
                 break
             except Exception as e:
                 yield tornado.gen.sleep(1)  # TODO: backoff
@@ -577,38 +601,128 @@ class SaltMessageClient(object):
         return future
 
 
+class Subscriber(object):
+    '''
+    Client object for use with the TCP publisher server
+    '''
+    def __init__(self, stream, address):
+        self.stream = stream
+        self.address = address
+        # The minion id, once the subscriber has identified itself
+        self.id_ = None
+
+    def close(self):
+        self.stream.close()
+
+
 class PubServer(tornado.tcpserver.TCPServer, object):
     '''
     TCP publisher
     '''
-    def __init__(self, *args, **kwargs):
-        super(PubServer, self).__init__(*args, **kwargs)
-        self.clients = []
+    def __init__(self, opts, io_loop=None):
+        super(PubServer, self).__init__(io_loop=io_loop)
+        self.opts = opts
+        self.clients = set()
+        # minion id -> set of Subscribers which identified as that minion
+        self.present = {}
+
+    def _verify_id(self, id_, tok):
+        '''
+        Check that the token was signed by the accepted key of minion "id_"
+        '''
+        if not salt.utils.verify.valid_id(self.opts, id_):
+            return False
+        try:
+            # Subscribers reconnect all at once after a restart of the master,
+            # and parsing a key blocks the IOLoop, so parsed keys are reused
+            pub = salt.crypt.get_minion_pub(self.opts['pki_dir'], id_)
+            if pub is None:
+                return False
+            return salt.crypt.public_decrypt(pub, tok) == 'salt'
+        except (IOError, OSError, ValueError, IndexError, TypeError) as exc:
+            log.debug('Unable to verify subscriber {0}: {1}'.format(id_, exc))
+        return False
+
+    def _add_client_present(self, client):
+        self.present.setdefault(client.id_, set()).add(client)
+
+    def _remove_client(self, client):
+        self.clients.discard(client)
+        if client.id_ in self.present:
+            clients = self.present[client.id_]
+            clients.discard(client)
+            if not clients:
+                del self.present[client.id_]
+        client.close()
+
+    @tornado.gen.coroutine
+    def _stream_read(self, client):
+        '''
+        Read the messages sent by a subscriber, the only message a subscriber
+        sends is its minion id, which is used to target publications
+        '''
+        while True:
+            try:
+                framed_msg_len = yield client.stream.read_until(' ')
+                framed_msg_raw = yield client.stream.read_bytes(int(framed_msg_len.strip()))
+                framed_msg = msgpack.loads(framed_msg_raw)
+                body = msgpack.loads(framed_msg['body'])
+            except tornado.iostream.StreamClosedError:
+                log.debug('Subscriber at {0} has disconnected from publisher'.format(client.address))
+                self._remove_client(client)
+                break
+            except Exception as exc:
+                log.error('Exception parsing message from subscriber at {0}: {1}'.format(client.address, exc))
+                self._remove_client(client)
+                break
+
+            verified = False
+            if isinstance(body, dict) and client.id_ is None:
+                id_ = body.get('id')
+                if self._verify_id(id_, body.get('tok', '')):
+                    log.trace('Subscriber at {0} identified as {1}'.format(client.address, id_))
+                    client.id_ = id_
+                    self._add_client_present(client)
+                    verified = True
+            header = {'mid': framed_msg['head'].get('mid')}
+            try:
+                yield client.stream.write(salt.transport.frame.frame_msg(verified, header=header))
+            except tornado.iostream.StreamClosedError:
+                self._remove_client(client)
+                break
 
     def handle_stream(self, stream, address):
         log.trace('Subscriber at {0} connected'.format(address))
-        self.clients.append((stream, address))
+        client = Subscriber(stream, address)
+        self.clients.add(client)
+        self.io_loop.spawn_callback(self._stream_read, client)
 
     # TODO: ACK the publish through IPC
     @tornado.gen.coroutine
-    def publish_payload(self, payload, _):
-        log.debug('TCP PubServer sending payload: {0}'.format(payload))
-        payload = salt.transport.frame.frame_msg(payload['payload'], raw_body=True)
+    def publish_payload(self, package, _):
+        log.debug('TCP PubServer sending payload: {0}'.format(package))
+        payload = salt.transport.frame.frame_msg(package['payload'], raw_body=True)
+
+        if 'topic_lst' in package:
+            # Only send to the targeted minions, and to subscribers which did
+            # not identify themselves (they filter publications on their own)
+            clients = set(client for client in self.clients if client.id_ is None)
+            for topic in package['topic_lst']:
+                clients.update(self.present.get(topic, ()))
+        else:
+            clients = list(self.clients)
 
         to_remove = []
-        for item in self.clients:
-            client, address = item
+        for client in clients:
             try:
                 # Write the packed str
-                f = client.write(payload)
+                f = client.stream.write(payload)
                 self.io_loop.add_future(f, lambda f: True)
             except tornado.iostream.StreamClosedError:
-                to_remove.append(item)
-        for item in to_remove:
-            client, address = item
-            log.debug('Subscriber at {0} has disconnected from publisher'.format(address))
-            client.close()
-            self.clients.remove(item)
+                to_remove.append(client)
+        for client in to_remove:
+            log.debug('Subscriber at {0} has disconnected from publisher'.format(client.address))
+            self._remove_client(client)
         log.trace('TCP PubServer finished publishing payload')
 
 
@@ -617,6 +731,12 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
         self.opts = opts
         self.serial = salt.payload.Serial(self.opts)  # TODO: in init?
         self.io_loop = io_loop or tornado.ioloop.IOLoop.current()
+        # The IPC connection used by publish() is kept open for the life of
+        # the process which is publishing, see pub_sock
+        self._pub_pid = None
+        self._pub_sock = None
+        self._async_pub_sock = None
+        self._ckminions = None
 
     def __setstate__(self, state):
         self.__init__(state['opts'])
@@ -631,15 +751,11 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
         salt.utils.appendproctitle(self.__class__.__name__)
 
         # Spin up the publisher
-        pub_server = PubServer(io_loop=self.io_loop)
+        pub_server = PubServer(self.opts, io_loop=self.io_loop)
         pub_server.listen(int(self.opts['publish_port']), address=self.opts['interface'])
 
         # Set up Salt IPC server
-        if self.opts.get('ipc_mode', '') == 'tcp':
-            pull_uri = int(self.opts.get('tcp_master_publish_pull', 4514))
-        else:
-            pull_uri = os.path.join(self.opts['sock_dir'], 'publish_pull.ipc')
-
+        pull_uri = self.pull_uri
         pull_sock = salt.transport.ipc.IPCMessageServer(
             pull_uri,
             io_loop=self.io_loop,
@@ -665,10 +781,59 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
         '''
         process_manager.add_process(self._publish_daemon)
 
-    def publish(self, load):
+    @property
+    def pull_uri(self):
         '''
-        Publish "load" to minions
+        The IPC path (or port) the publisher daemon pulls publications from
+        '''
+        if self.opts.get('ipc_mode', '') == 'tcp':
+            return int(self.opts.get('tcp_master_publish_pull', 4514))
+        return os.path.join(self.opts['sock_dir'], 'publish_pull.ipc')
+
+    @property
+    def ckminions(self):
+        '''
+        The minion checker used to resolve the targets of a publication
+        '''
+        if self._ckminions is None:
+            self._ckminions = salt.utils.minions.CkMinions(self.opts)
+        return self._ckminions
+
+    @property
+    def pub_sock(self):
+        '''
+        The synchronous IPC client connected to the publisher daemon. The
+        connection is made on first use and reused by every later publish from
+        the same process.
+        '''
+        if self._pub_sock is None or self._pub_pid != os.getpid():
+            self._pub_pid = os.getpid()
+            self._pub_sock = salt.utils.async.SyncWrapper(
+                salt.transport.ipc.IPCMessageClient,
+                (self.pull_uri,)
+            )
+            self._pub_sock.connect()
+        return self._pub_sock
+
+    def close(self):
         '''
+        Close the connection to the publisher daemon
+        '''
+        if self._pub_sock is not None and self._pub_pid == os.getpid():
+            self._pub_sock.close()
+        self._pub_sock = None
+        if self._async_pub_sock is not None:
+            self._async_pub_sock.close()
+            self._async_pub_sock = None
+
+    def _package_publish(self, load):
+        '''
+        Encrypt and sign "load" and wrap it up for the publisher daemon
+        '''
+        minions = load.get('minions')
+        if minions is not None:
+            load = dict(load)
+            del load['minions']
         payload = {'enc': 'aes'}
 
         crypticle = salt.crypt.Crypticle(self.opts, salt.master.SMaster.secrets['aes']['secret'].value)
@@ -677,23 +842,58 @@ class TCPPubServerChannel(salt.transport.server.PubServerChannel):
             master_pem_path = os.path.join(self.opts['pki_dir'], 'master.pem')
             log.debug("Signing data packet")
             payload['sig'] = salt.crypt.sign_message(master_pem_path, payload['load'])
-        # Use the Salt IPC server
-        if self.opts.get('ipc_mode', '') == 'tcp':
-            pull_uri = int(self.opts.get('tcp_master_publish_pull', 4514))
-        else:
-            pull_uri = os.path.join(self.opts['sock_dir'], 'publish_pull.ipc')
-        # TODO: switch to the actual async interface
-        #pub_sock = salt.transport.ipc.IPCMessageClient(self.opts, io_loop=self.io_loop)
-        pub_sock = salt.utils.async.SyncWrapper(
-            salt.transport.ipc.IPCMessageClient,
-            (pull_uri,)
-        )
-        pub_sock.connect()
 
         int_payload = {'payload': self.serial.dumps(payload)}
 
-        # add some targeting stuff for lists only (for now)
-        if load['tgt_type'] == 'list':
-            int_payload['topic_lst'] = load['tgt']
+        # Resolve targets which only match on the minion id, so the publisher
+        # daemon only sends the publication to those minions. Syndics relay
+        # publications for minions which are not connected to this master.
+        if not self.opts.get('order_masters'):
+            if load['tgt_type'] == 'list':
+                tgt = load['tgt']
+                if isinstance(tgt, six.string_types):
+                    tgt = tgt.split(',')
+                int_payload['topic_lst'] = tgt
+            elif load['tgt_type'] in ('glob', 'pcre'):
+                if minions is None:
+                    minions = self.ckminions.check_minions(
+                        load['tgt'],
+                        load['tgt_type'])
+                int_payload['topic_lst'] = minions
+        return int_payload
+
+    def publish(self, load):
+        '''
+        Publish "load" to minions
+        '''
+        int_payload = self._package_publish(load)
         # Send it over IPC!
-        pub_sock.send(int_payload)
+        try:
+            self.pub_sock.send(int_payload)
+        except tornado.iostream.StreamClosedError:
+            # The publisher went away since we last published, reconnect
+            self._pub_sock.close()
+            self._pub_sock = None
+            self.pub_sock.send(int_payload)
+
+    @tornado.gen.coroutine
+    def publish_async(self, load):
+        '''
+        Publish "load" to minions through an IPC client running on the
+        current IOLoop
+        '''
+        int_payload = self._package_publish(load)
+        io_loop = tornado.ioloop.IOLoop.current()
+        if self._async_pub_sock is None or self._async_pub_sock.io_loop is not io_loop:
+            # IPC clients are only kept alive while they are referenced
+            self._async_pub_sock = salt.transport.ipc.IPCMessageClient(
+                self.pull_uri,
+                io_loop=io_loop
+            )
+        try:
+            yield self._async_pub_sock.send(int_payload)
+        except tornado.iostream.StreamClosedError:
+            # Drop the connection, the next publish will reconnect
+            self._async_pub_sock.close()
+            self._async_pub_sock = None
+            raise
@@ -546,10 +546,53 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
     def __init__(self, opts):
         self.opts = opts
         self.serial = salt.payload.Serial(self.opts)  # TODO: in init?
+        # The PUSH socket to the publisher is kept open for the life of
+        # the process which is publishing, see pub_sock
+        self._pub_pid = None
+        self._pub_context = None
+        self._pub_sock = None
 
     def connect(self):
         return tornado.gen.sleep(5)
 
+    @property
+    def pull_uri(self):
+        '''
+        The URI the publisher daemon pulls publications from
+        '''
+        if self.opts.get('ipc_mode', '') == 'tcp':
+            return 'tcp://127.0.0.1:{0}'.format(
+                self.opts.get('tcp_master_publish_pull', 4514)
+                )
+        return 'ipc://{0}'.format(
+            os.path.join(self.opts['sock_dir'], 'publish_pull.ipc')
+            )
+
+    @property
+    def pub_sock(self):
+        '''
+        The PUSH socket connected to the publisher daemon. The socket is
+        created on first use and reused by every later publish from the same
+        process.
+        '''
+        if self._pub_sock is None or self._pub_pid != os.getpid():
+            # Sockets and contexts must not be shared with forked children
+            self._pub_pid = os.getpid()
+            self._pub_context = zmq.Context(1)
+            self._pub_sock = self._pub_context.socket(zmq.PUSH)
+            self._pub_sock.connect(self.pull_uri)
+        return self._pub_sock
+
+    def close(self):
+        '''
+        Close the connection to the publisher daemon
+        '''
+        if self._pub_sock is not None and self._pub_pid == os.getpid():
+            self._pub_sock.close()
+            self._pub_context.term()
+        self._pub_sock = None
+        self._pub_context = None
+
     def _publish_daemon(self):
         '''
         Bind to the interface specified in the configuration file
@@ -574,15 +617,7 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
         pub_uri = 'tcp://{interface}:{publish_port}'.format(**self.opts)
         # Prepare minion pull socket
         pull_sock = context.socket(zmq.PULL)
-
-        if self.opts.get('ipc_mode', '') == 'tcp':
-            pull_uri = 'tcp://127.0.0.1:{0}'.format(
-                self.opts.get('tcp_master_publish_pull', 4514)
-                )
-        else:
-            pull_uri = 'ipc://{0}'.format(
-                os.path.join(self.opts['sock_dir'], 'publish_pull.ipc')
-                )
+        pull_uri = self.pull_uri
         salt.utils.zeromq.check_ipc_path_max_len(pull_uri)
 
         # Start the minion command publisher
@@ -653,6 +688,9 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
 
         :param dict load: A load to be sent across the wire to minions
         '''
+        if 'minions' in load:
+            load = dict(load)
+            del load['minions']
         payload = {'enc': 'aes'}
 
         crypticle = salt.crypt.Crypticle(self.opts, salt.master.SMaster.secrets['aes']['secret'].value)
@@ -661,25 +699,15 @@ class ZeroMQPubServerChannel(salt.transport.server.PubServerChannel):
             master_pem_path = os.path.join(self.opts['pki_dir'], 'master.pem')
             log.debug("Signing data packet")
             payload['sig'] = salt.crypt.sign_message(master_pem_path, payload['load'])
-        # Send 0MQ to the publisher
-        context = zmq.Context(1)
-        pub_sock = context.socket(zmq.PUSH)
-        if self.opts.get('ipc_mode', '') == 'tcp':
-            pull_uri = 'tcp://127.0.0.1:{0}'.format(
-                self.opts.get('tcp_master_publish_pull', 4514)
-                )
-        else:
-            pull_uri = 'ipc://{0}'.format(
-                os.path.join(self.opts['sock_dir'], 'publish_pull.ipc')
-                )
-        pub_sock.connect(pull_uri)
         int_payload = {'payload': self.serial.dumps(payload)}
 
         # add some targeting stuff for lists only (for now)
         if load['tgt_type'] == 'list':
             int_payload['topic_lst'] = load['tgt']
 
-        pub_sock.send(self.serial.dumps(int_payload))
+        # Send 0MQ to the publisher, the message is queued by zmq so this
+        # doesn't wait for the publisher to pick it up
+        self.pub_sock.send(self.serial.dumps(int_payload))
 
 
 # TODO: unit tests!
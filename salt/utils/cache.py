@@ -9,6 +9,7 @@ import time
 import salt.config
 import salt.payload
 import salt.utils.dictupdate
+from salt.utils.odict import OrderedDict
 
 # Import third party libs
 from salt.ext.six.moves import range  # pylint: disable=import-error,redefined-builtin
@@ -57,6 +58,26 @@ class CacheDict(dict):
         return dict.__contains__(self, key)
 
 
+class LRUCache(OrderedDict):
+    '''
+    Subclass of OrderedDict that holds at most size items, dropping the ones
+    set least recently
+    '''
+    def __init__(self, size, *args, **kwargs):
+        self._size = size
+        OrderedDict.__init__(self, *args, **kwargs)
+
+    def __setitem__(self, key, val):
+        '''
+        Move the key to the end and drop the oldest keys past size
+        '''
+        if key in self:
+            OrderedDict.__delitem__(self, key)
+        OrderedDict.__setitem__(self, key, val)
+        while len(self) > self._size:
+            self.popitem(last=False)
+
+
 class CacheCli(object):
     '''
     Connection client for the ConCache. Should be used by all
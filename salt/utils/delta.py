@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+'''
+    salt.utils.delta
+    ~~~~~~~~~~~~~~~~
+    Block signatures and deltas used to update a cached copy of a file by
+    transferring only the parts of it which changed.
+
+    The side holding the old copy sends the signatures of its blocks: the
+    first bytes of each block, used to find it again at another offset, and
+    its md5 digest. The side holding the new file answers with a list of
+    operations, the index of an old block to copy or a string of literal
+    data, which rebuild the new file from the old one.
+'''
+
+from __future__ import absolute_import
+
+# Import python libs
+import os
+import hashlib
+
+# Import salt libs
+import salt.utils
+
+# Import 3rd-party libs
+import salt.ext.six as six
+
+# The smallest block, and the most blocks a file is split into
+MIN_BLOCK_SIZE = 65536
+MAX_BLOCKS = 2048
+# The largest block accepted from the other side, the block size of a 32GB
+# file. Deltas are not used for larger files.
+MAX_BLOCK_SIZE = 16 * 1024 * 1024
+# The bytes of a block used to find it at another offset
+ANCHOR_SIZE = 16
+# The blocks following the last match looked for when the data differs
+SEARCH_BLOCKS = 8
+# The offsets at which an anchor is tried before giving up on it
+SEARCH_TRIES = 16
+
+
+def block_size(size):
+    '''
+    Return the block size to split a file of size bytes with
+    '''
+    return max(MIN_BLOCK_SIZE, -(-size // MAX_BLOCKS))
+
+
+def file_size(fp_):
+    '''
+    Return the size of the open file fp_, which can also be an in-memory
+    buffer
+    '''
+    try:
+        return os.fstat(fp_.fileno()).st_size
+    except (AttributeError, IOError, OSError, ValueError):
+        # No file descriptor behind it
+        return len(fp_.getvalue())
+
+
+def valid_signatures(sigs):
+    '''
+    Return True if sigs are well formed block signatures: split with a block
+    size between MIN_BLOCK_SIZE and MAX_BLOCK_SIZE, in at most MAX_BLOCKS
+    blocks, and expecting one of them. The signatures come from the other
+    side and bound the memory and time diff takes. The old copy of the file
+    does not need to have the size of the new one.
+    '''
+    if not isinstance(sigs, dict):
+        return False
+    blocks = sigs.get('blocks')
+    expect = sigs.get('expect', 0)
+    size = sigs.get('block_size')
+    if not isinstance(size, six.integer_types) \
+            or isinstance(size, bool) \
+            or not MIN_BLOCK_SIZE <= size <= MAX_BLOCK_SIZE \
+            or not isinstance(blocks, (list, tuple)) \
+            or len(blocks) > MAX_BLOCKS \
+            or not isinstance(expect, six.integer_types) \
+            or isinstance(expect, bool) \
+            or not 0 <= expect <= len(blocks):
+        return False
+    for block in blocks:
+        if not isinstance(block, (list, tuple)) or len(block) != 2:
+            return False
+        if not all(isinstance(part, six.binary_type) for part in block):
+            return False
+    return True
+
+
+def signatures(path):
+    '''
+    Return the signatures of the blocks of the file at path
+    '''
+    with salt.utils.fopen(path, 'rb') as fp_:
+        fp_.seek(0, 2)
+        size = block_size(fp_.tell())
+        fp_.seek(0)
+        blocks = []
+        while True:
+            block = fp_.read(size)
+            if not block:
+                break
+            blocks.append([block[:ANCHOR_SIZE], hashlib.md5(block).digest()])
+    return {'block_size': size, 'blocks': blocks}
+
+
+def diff(fp_, loc, sigs, limit, expect=0):
+    '''
+    Compare the data of the open file fp_ from loc on with the block
+    signatures of the old copy of it.
+
+    Returns the operations rebuilding the new data, the offset the next
+    comparison starts at, which block is expected to follow there and
+    whether the end of the file was reached. At most limit bytes of literal
+    data are returned, and at most 8 times that many bytes are compared.
+    '''
+    size = sigs['block_size']
+    blocks = sigs['blocks']
+    digests = {}
+    for index, (anchor, digest) in enumerate(blocks):
+        digests.setdefault(digest, index)
+    span = limit * 8
+    fp_.seek(loc)
+    buf = fp_.read(span + size)
+    end = min(span, len(buf))
+
+    ops = []
+    literal = 0
+    lit_start = pos = 0
+    searched = None
+    while pos < end:
+        block = buf[pos:pos + size]
+        index = digests.get(hashlib.md5(block).digest())
+        if index is not None:
+            if lit_start < pos:
+                ops.append(buf[lit_start:pos])
+                literal += pos - lit_start
+            ops.append(index)
+            pos += len(block)
+            lit_start = pos
+            expect = index + 1
+            continue
+        # Look for the next blocks of the old copy further on, which finds
+        # them again after data was inserted or removed. When they are not
+        # found the data is compared block by block.
+        found = None
+        if searched != expect:
+            searched = expect
+            found = _search(buf, pos + 1, end, blocks, expect, size)
+        next_pos = min(found if found is not None else pos + size, end)
+        if literal + next_pos - lit_start >= limit:
+            pos = min(next_pos, lit_start + limit - literal)
+            break
+        pos = next_pos
+    if lit_start < pos:
+        ops.append(buf[lit_start:pos])
+    loc += pos
+    return ops, loc, expect, loc >= file_size(fp_)
+
+
+def _search(buf, start, end, blocks, expect, size):
+    '''
+    Return the first offset from start on where one of the blocks following
+    expect starts, or None
+    '''
+    ret = None
+    for index in range(expect, min(expect + SEARCH_BLOCKS, len(blocks))):
+        anchor, digest = blocks[index]
+        if len(anchor) < ANCHOR_SIZE:
+            continue
+        pos = start
+        for _ in range(SEARCH_TRIES):
+            # Only offsets before the best one found so far are of interest
+            pos = buf.find(anchor,
+                           pos,
+                           (ret if ret is not None else end) + ANCHOR_SIZE - 1)
+            if pos < 0:
+                break
+            if hashlib.md5(buf[pos:pos + size]).digest() == digest:
+                ret = pos
+                break
+            pos += 1
+    return ret
+
+
+def patch(ops, old, new, size):
+    '''
+    Write the data rebuilt by the operations of a delta to the open file new,
+    reading the blocks referenced from the open file old
+    '''
+    for op_ in ops:
+        if isinstance(op_, six.integer_types):
+            old.seek(op_ * size)
+            new.write(old.read(size))
+        else:
+            new.write(op_)
@@ -40,6 +40,11 @@ padded with pipes "|" out to 20 characters as before.  When the tag is exactly
 The get_event method intelligently figures out if the tag is longer than 20
 characters.
 
+Since the tag always starts the message, the zeromq subscriptions can be used
+to filter events on their tag: a listener registering tag prefixes with
+add_tag_filter only gets sent the events starting with one of them, the others
+are dropped by the publisher. Without any tag filter every event is sent.
+
 
 The convention for namespacing is to use dot characters "." as the name space
 delimiter. The name space "salt" is reserved by SaltStack for internal events.
@@ -189,6 +194,8 @@ class SaltEvent(object):
         self.puburi, self.pulluri = self.__load_uri(sock_dir, node)
         self.pending_tags = []
         self.pending_events = []
+        # Tag filter prefix -> number of times it was added
+        self.tag_filters = {}
         if not self.cpub:
             self.connect_pub()
         self.__load_cache_regex()
@@ -291,6 +298,54 @@ class SaltEvent(object):
             if any(pmatch_func(evt['tag'], ptag) for ptag, pmatch_func in self.pending_tags):
                 self.pending_events.append(evt)
 
+    def add_tag_filter(self, prefix):
+        '''
+        Only receive the events with tags starting with prefix or with the
+        prefix of another tag filter.
+
+        The filters are registered with the publisher, which drops the events
+        matching none of them instead of sending them. Unlike subscribe() this
+        means the other events are never seen, not even by get_event calls
+        for their tags. Without any tag filter every event is received.
+
+        A prefix added several times is kept until it was removed as many
+        times.
+        '''
+        if not prefix:
+            return
+        if prefix in self.tag_filters:
+            self.tag_filters[prefix] += 1
+            return
+        self.tag_filters[prefix] = 1
+        if self.cpub:
+            self.sub.setsockopt_string(zmq.SUBSCRIBE, six.text_type(prefix))
+            if len(self.tag_filters) == 1:
+                self.sub.setsockopt_string(zmq.UNSUBSCRIBE, u'')
+
+    def remove_tag_filter(self, prefix):
+        '''
+        Remove a tag filter added with add_tag_filter, once the last one is
+        removed every event is received again
+        '''
+        if prefix not in self.tag_filters:
+            return
+        self.tag_filters[prefix] -= 1
+        if self.tag_filters[prefix] > 0:
+            return
+        del self.tag_filters[prefix]
+        if self.cpub:
+            if not self.tag_filters:
+                self.sub.setsockopt_string(zmq.SUBSCRIBE, u'')
+            self.sub.setsockopt_string(zmq.UNSUBSCRIBE, six.text_type(prefix))
+
+    def clear_tag_filters(self):
+        '''
+        Remove every tag filter, every event is received again
+        '''
+        for prefix in list(self.tag_filters):
+            self.tag_filters[prefix] = 1
+            self.remove_tag_filter(prefix)
+
     def connect_pub(self):
         '''
         Establish the publish connection
@@ -298,7 +353,8 @@ class SaltEvent(object):
         self.sub = self.context.socket(zmq.SUB)
         self.sub.connect(self.puburi)
         self.poller.register(self.sub, zmq.POLLIN)
-        self.sub.setsockopt_string(zmq.SUBSCRIBE, u'')
+        for prefix in list(self.tag_filters) or [u'']:
+            self.sub.setsockopt_string(zmq.SUBSCRIBE, six.text_type(prefix))
         self.sub.setsockopt(zmq.LINGER, 5000)
         self.cpub = True
 
@@ -418,7 +474,7 @@ class SaltEvent(object):
                 if socks.get(self.sub) != zmq.POLLIN:
                     continue
 
-                ret = self.get_event_block()
+                raw = self.sub.recv()
             except KeyboardInterrupt:
                 return {'tag': 'salt/event/exit', 'data': {}}
             except zmq.ZMQError as ex:
@@ -427,15 +483,19 @@ class SaltEvent(object):
                 else:
                     raise
 
-            if not match_func(ret['tag'], tag):
+            # Only unpack the data of the events which are kept
+            mtag, sep, mdata = raw.partition(TAGEND)
+            if not match_func(mtag, tag):
                 # tag not match
-                if any(pmatch_func(ret['tag'], ptag) for ptag, pmatch_func in self.pending_tags):
+                if any(pmatch_func(mtag, ptag) for ptag, pmatch_func in self.pending_tags):
+                    ret = {'data': self.serial.loads(mdata), 'tag': mtag}
                     log.trace('get_event() caching unwanted event = {0}'.format(ret))
                     self.pending_events.append(ret)
                 if wait:  # only update the wait timeout if we had one
                     wait = timeout_at - time.time()
                 continue
 
+            ret = {'data': self.serial.loads(mdata), 'tag': mtag}
             log.trace('get_event() received = {0}'.format(ret))
             return ret
         log.trace('_get_event() waited {0} seconds and received nothing'.format(wait * 1000))
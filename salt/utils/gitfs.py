@@ -3,12 +3,14 @@
 # Import python libs
 from __future__ import absolute_import
 import copy
+import binascii
 import distutils.version  # pylint: disable=import-error,no-name-in-module
 import errno
 import fnmatch
 import glob
 import hashlib
 import logging
+import multiprocessing.pool
 import os
 import re
 import shutil
@@ -22,6 +24,15 @@ VALID_PROVIDERS = ('gitpython', 'pygit2', 'dulwich')
 PER_REMOTE_ONLY = ('name',)
 SYMLINK_RECURSE_DEPTH = 100
 
+# Providers which can read a blob by its SHA, to serve files from memory
+SERVE_BLOB_PROVIDERS = ('gitpython', 'pygit2')
+# The most blobs kept in memory, and the size of the largest one served from
+# memory instead of the cache file
+BLOB_CACHE_SIZE = 128
+MAX_SERVED_BLOB_SIZE = 1048576
+# The file hashes kept in memory
+BLOB_HASH_CACHE_SIZE = 4096
+
 # Auth support (auth params can be global or per-remote, too)
 AUTH_PROVIDERS = ('pygit2',)
 AUTH_PARAMS = ('user', 'password', 'pubkey', 'privkey', 'passphrase',
@@ -54,7 +65,9 @@ _INVALID_REPO = (
 # Import salt libs
 import salt.utils
 import salt.utils.url
+import salt.utils.atomicfile
 import salt.fileserver
+from salt.utils.cache import LRUCache
 from salt.exceptions import FileserverConfigError
 from salt.utils.event import tagify
 
@@ -395,12 +408,30 @@ class GitProvider(object):
         '''
         raise NotImplementedError()
 
+    def blob_index(self, tgt_env):
+        '''
+        This function must be overridden in a sub-class
+        '''
+        raise NotImplementedError()
+
     def get_tree(self, tgt_env):
         '''
         This function must be overridden in a sub-class
         '''
         raise NotImplementedError()
 
+    def tree_sha(self, tgt_env):
+        '''
+        This function must be overridden in a sub-class
+        '''
+        raise NotImplementedError()
+
+    def read_blob(self, blob_sha):
+        '''
+        This function must be overridden in a sub-class
+        '''
+        raise NotImplementedError()
+
     def get_url(self):
         '''
         Examine self.id and assign self.url (and self.branch, for git_pillar)
@@ -635,6 +666,28 @@ class GitPython(GitProvider):
                 break
         return blob, blob.hexsha if blob is not None else blob
 
+    def blob_index(self, tgt_env):
+        '''
+        Return the SHA of the tree of the target environment, the SHA and size
+        of each of its blobs and the target of each of its symlinks, by path
+        '''
+        blobs = {}
+        symlinks = {}
+        tree = self.get_tree(tgt_env)
+        if not tree:
+            return None, blobs, symlinks
+        for file_blob in tree.traverse():
+            if not isinstance(file_blob, git.Blob):
+                continue
+            if stat.S_ISLNK(file_blob.mode):
+                stream = six.StringIO()
+                file_blob.stream_data(stream)
+                symlinks[file_blob.path] = stream.getvalue()
+                stream.close()
+            else:
+                blobs[file_blob.path] = (file_blob.hexsha, file_blob.size)
+        return tree.hexsha, blobs, symlinks
+
     def get_tree(self, tgt_env):
         '''
         Return a git.Tree object if the branch/tag/SHA is found, otherwise None
@@ -660,6 +713,19 @@ class GitPython(GitProvider):
         except gitdb.exc.ODBError:
             return None
 
+    def tree_sha(self, tgt_env):
+        '''
+        Return the SHA of the tree of the target environment, or None
+        '''
+        tree = self.get_tree(tgt_env)
+        return tree.hexsha if tree else None
+
+    def read_blob(self, blob_sha):
+        '''
+        Return the data of the blob with the given SHA
+        '''
+        return self.repo.odb.stream(binascii.unhexlify(blob_sha)).read()
+
     def write_file(self, blob, dest):
         '''
         Using the blob object, write the file to the destination path
@@ -992,6 +1058,35 @@ class Pygit2(GitProvider):
                 break
         return blob, blob.hex if blob is not None else blob
 
+    def blob_index(self, tgt_env):
+        '''
+        Return the SHA of the tree of the target environment, the SHA and size
+        of each of its blobs and the target of each of its symlinks, by path
+        '''
+        def _traverse(tree, blobs, symlinks, prefix):
+            '''
+            Traverse through a pygit2 Tree object recursively, adding its
+            blobs and symlinks
+            '''
+            for entry in iter(tree):
+                obj = self.repo[entry.oid]
+                repo_path = os.path.join(prefix, entry.name)
+                if isinstance(obj, pygit2.Blob):
+                    if stat.S_ISLNK(entry.filemode):
+                        symlinks[repo_path] = obj.data
+                    else:
+                        blobs[repo_path] = (obj.hex, obj.size)
+                elif isinstance(obj, pygit2.Tree):
+                    _traverse(obj, blobs, symlinks, repo_path)
+
+        blobs = {}
+        symlinks = {}
+        tree = self.get_tree(tgt_env)
+        if not tree:
+            return None, blobs, symlinks
+        _traverse(tree, blobs, symlinks, '')
+        return tree.hex, blobs, symlinks
+
     def get_tree(self, tgt_env):
         '''
         Return a pygit2.Tree object if the branch/tag/SHA is found, otherwise
@@ -1021,6 +1116,19 @@ class Pygit2(GitProvider):
             return commit.tree
         return None
 
+    def tree_sha(self, tgt_env):
+        '''
+        Return the SHA of the tree of the target environment, or None
+        '''
+        tree = self.get_tree(tgt_env)
+        return tree.hex if tree else None
+
+    def read_blob(self, blob_sha):
+        '''
+        Return the data of the blob with the given SHA
+        '''
+        return self.repo[blob_sha].data
+
     def verify_auth(self):
         '''
         Check the username and password/keypair info for validity. If valid,
@@ -1332,6 +1440,35 @@ class Dulwich(GitProvider):  # pylint: disable=abstract-method
                 break
         return blob, blob.sha().hexdigest() if blob is not None else blob
 
+    def blob_index(self, tgt_env):
+        '''
+        Return the SHA of the tree of the target environment, the SHA and size
+        of each of its blobs and the target of each of its symlinks, by path
+        '''
+        def _traverse(tree, blobs, symlinks, prefix):
+            '''
+            Traverse through a dulwich Tree object recursively, adding its
+            blobs and symlinks
+            '''
+            for item in six.iteritems(tree):
+                obj = self.repo.get_object(item.sha)
+                repo_path = os.path.join(prefix, item.path)
+                if isinstance(obj, dulwich.objects.Blob):
+                    if stat.S_ISLNK(item.mode):
+                        symlinks[repo_path] = obj.as_raw_string()
+                    else:
+                        blobs[repo_path] = (obj.id, obj.raw_length())
+                elif isinstance(obj, dulwich.objects.Tree):
+                    _traverse(obj, blobs, symlinks, repo_path)
+
+        blobs = {}
+        symlinks = {}
+        tree = self.get_tree(tgt_env)
+        if not isinstance(tree, dulwich.objects.Tree):
+            return None, blobs, symlinks
+        _traverse(tree, blobs, symlinks, '')
+        return tree.id, blobs, symlinks
+
     def get_conf(self):
         '''
         Returns a dulwich.config.ConfigFile object for the specified repo
@@ -1424,6 +1561,13 @@ class Dulwich(GitProvider):  # pylint: disable=abstract-method
             pass
         return None
 
+    def tree_sha(self, tgt_env):
+        '''
+        Return the SHA of the tree of the target environment, or None
+        '''
+        tree = self.get_tree(tgt_env)
+        return tree.id if isinstance(tree, dulwich.objects.Tree) else None
+
     def init_remote(self):
         '''
         Initialize/attach to a remote using dulwich. Return a boolean which
@@ -1507,6 +1651,7 @@ class GitBase(object):
         else:
             self.cache_root = os.path.join(self.opts['cachedir'], self.role)
         self.env_cache = os.path.join(self.cache_root, 'envs.p')
+        self.refs_cache = os.path.join(self.cache_root, 'refs.p')
         self.hash_cachedir = os.path.join(
             self.cache_root, 'hash')
         self.file_list_cachedir = os.path.join(
@@ -1676,46 +1821,64 @@ class GitBase(object):
     def fetch_remotes(self):
         '''
         Fetch all remotes and return a boolean to let the calling function know
-        whether or not any remotes were updated in the process of fetching
+        whether or not any remotes were updated in the process of fetching.
+
+        The remotes are fetched concurrently by up to ``{role}_fetch_workers``
+        threads.
         '''
-        changed = False
-        for repo in self.remotes:
-            if os.path.exists(repo.lockfile):
-                log.warning(
-                    'Update lockfile is present for {0} remote \'{1}\', '
-                    'skipping. If this warning persists, it is possible that '
-                    'the update process was interrupted. Removing {2} or '
-                    'running \'salt-run fileserver.clear_lock {0}\' will '
-                    'allow updates to continue for this remote.'
-                    .format(self.role, repo.id, repo.lockfile)
-                )
-                continue
-            _, errors = repo.lock()
-            if errors:
-                log.error('Unable to set update lock for {0} remote \'{1}\', '
-                          'skipping.'.format(self.role, repo.id))
-                continue
-            log.debug(
-                '{0} is fetching from \'{1}\''.format(self.role, repo.id)
-            )
+        workers = min(
+            self.opts.get('{0}_fetch_workers'.format(self.role), 1),
+            len(self.remotes)
+        )
+        if workers > 1:
+            pool = multiprocessing.pool.ThreadPool(workers)
             try:
-                if repo.fetch():
-                    # We can't just use the return value from repo.fetch()
-                    # because the data could still have changed if old remotes
-                    # were cleared above. Additionally, we're running this in a
-                    # loop and later remotes without changes would override
-                    # this value and make it incorrect.
-                    changed = True
-            except Exception as exc:
-                # Do not use {0} in the error message, as exc is not a string
-                log.error(
-                    'Exception \'{0}\' caught while fetching {1} remote '
-                    '\'{2}\''.format(exc, self.role, repo.id),
-                    exc_info_on_loglevel=logging.DEBUG
-                )
+                results = pool.map(self._fetch_remote, self.remotes)
             finally:
-                repo.clear_lock()
-        return changed
+                pool.close()
+                pool.join()
+        else:
+            results = [self._fetch_remote(repo) for repo in self.remotes]
+        # We can't just use the return value from repo.fetch() because the
+        # data could still have changed if old remotes were cleared above.
+        # Additionally, later remotes without changes must not override the
+        # result of the ones which were updated.
+        return any(results)
+
+    def _fetch_remote(self, repo):
+        '''
+        Lock and fetch a single remote, returning True if it was updated
+        '''
+        if os.path.exists(repo.lockfile):
+            log.warning(
+                'Update lockfile is present for {0} remote \'{1}\', '
+                'skipping. If this warning persists, it is possible that '
+                'the update process was interrupted. Removing {2} or '
+                'running \'salt-run fileserver.clear_lock {0}\' will '
+                'allow updates to continue for this remote.'
+                .format(self.role, repo.id, repo.lockfile)
+            )
+            return False
+        _, errors = repo.lock()
+        if errors:
+            log.error('Unable to set update lock for {0} remote \'{1}\', '
+                      'skipping.'.format(self.role, repo.id))
+            return False
+        log.debug(
+            '{0} is fetching from \'{1}\''.format(self.role, repo.id)
+        )
+        try:
+            return bool(repo.fetch())
+        except Exception as exc:
+            # Do not use {0} in the error message, as exc is not a string
+            log.error(
+                'Exception \'{0}\' caught while fetching {1} remote '
+                '\'{2}\''.format(exc, self.role, repo.id),
+                exc_info_on_loglevel=logging.DEBUG
+            )
+            return False
+        finally:
+            repo.clear_lock()
 
     def lock(self, remote=None):
         '''
@@ -1762,6 +1925,11 @@ class GitBase(object):
                 fp_.write(serial.dumps(new_envs))
                 log.trace('Wrote env cache data to {0}'.format(self.env_cache))
 
+        if self.opts.get('{0}_blob_index'.format(self.role), False) \
+                and (data['changed'] is True
+                     or not os.path.isfile(self.refs_cache)):
+            self.write_refs_cache()
+
         # if there is a change, fire an event
         if self.opts.get('fileserver_events', False):
             event = salt.utils.event.get_event(
@@ -1977,6 +2145,23 @@ class GitBase(object):
         log.debug('dulwich {0}_provider enabled'.format(self.role))
         return True
 
+    def write_refs_cache(self):
+        '''
+        Write the SHA of the tree of each environment of each remote to the
+        refs cache, from which the fileserver processes know when to rebuild
+        their blob index
+        '''
+        refs = {}
+        for repo in self.remotes:
+            refs[repo.id] = {}
+            for tgt_env in repo.envs():
+                refs[repo.id][tgt_env] = repo.tree_sha(tgt_env)
+        serial = salt.payload.Serial(self.opts)
+        # Written atomically, the fileserver processes read it at any time
+        with salt.utils.atomicfile.atomic_open(self.refs_cache, 'wb') as fp_:
+            fp_.write(serial.dumps(refs))
+        log.trace('Wrote refs cache data to {0}'.format(self.refs_cache))
+
     def write_remote_map(self):
         '''
         Write the remote_map.txt
@@ -2010,6 +2195,160 @@ class GitBase(object):
             )
 
 
+class BlobIndex(object):
+    '''
+    In-memory index of the SHA and size of the blobs of each environment of
+    each remote, by path.
+
+    The index of an environment is rebuilt from the object store only when
+    the SHA of its tree in the refs cache written by the update process
+    changed, so that finding, hashing and listing files only needs a stat of
+    the refs cache.
+    '''
+    def __init__(self, refs_cache):
+        self.refs_cache = refs_cache
+        self.stamp = None
+        self.refs = {}
+        # (repo.id, tgt_env) -> (tree SHA, blobs, symlinks)
+        self.indexes = {}
+        # tgt_env -> (tree SHAs of the remotes, file lists)
+        self.lists = {}
+        # Cache destination -> SHA of the blob this process wrote or found
+        # there
+        self.cached = {}
+
+    def refresh(self, opts):
+        '''
+        Read the refs cache again if it changed, return False if there is
+        none
+        '''
+        try:
+            fstat = os.stat(self.refs_cache)
+        except OSError:
+            return False
+        stamp = (fstat.st_ino, fstat.st_mtime, fstat.st_size)
+        if stamp == self.stamp:
+            return True
+        serial = salt.payload.Serial(opts)
+        try:
+            with salt.utils.fopen(self.refs_cache, 'rb') as fp_:
+                self.refs = serial.load(fp_)
+        except (IOError, OSError):
+            return False
+        except Exception:
+            log.error(
+                'Unable to read refs cache {0}'.format(self.refs_cache),
+                exc_info_on_loglevel=logging.DEBUG
+            )
+            return False
+        self.stamp = stamp
+        # The cache may have been cleared since the refs cache was written
+        self.cached.clear()
+        # Drop the indexes of the refs which moved or are gone
+        for key in list(self.indexes):
+            repo_id, tgt_env = key
+            tree_sha = self.refs.get(repo_id, {}).get(tgt_env)
+            if tree_sha is None or tree_sha != self.indexes[key][0]:
+                del self.indexes[key]
+        return True
+
+    def envs(self):
+        '''
+        Return the environments of all remotes
+        '''
+        ret = set()
+        for repo_envs in six.itervalues(self.refs):
+            ret.update(repo_envs)
+        return sorted(ret)
+
+    def tree_sha(self, repo, tgt_env):
+        '''
+        Return the SHA of the tree of the environment of the remote, or None
+        '''
+        return self.refs.get(repo.id, {}).get(tgt_env)
+
+    def get(self, repo, tgt_env):
+        '''
+        Return the blobs and symlinks of the environment of the remote,
+        building the index if the environment moved since it was last built
+        '''
+        tree_sha = self.tree_sha(repo, tgt_env)
+        if tree_sha is None:
+            return {}, {}
+        key = (repo.id, tgt_env)
+        index = self.indexes.get(key)
+        if index is None or index[0] != tree_sha:
+            log.debug(
+                'Building blob index of {0} for remote \'{1}\''
+                .format(tgt_env, repo.id)
+            )
+            index = repo.blob_index(tgt_env)
+            if index[0] is None:
+                return {}, {}
+            # Build and keep it under the SHA from the refs cache, the one
+            # the update process saw
+            index = (tree_sha,) + tuple(index[1:])
+            self.indexes[key] = index
+        return index[1], index[2]
+
+    def find(self, repo, repo_path, tgt_env):
+        '''
+        Return the path of the blob repo_path resolves to after following
+        symlinks, with its SHA and size, or (None, None, None)
+        '''
+        blobs, symlinks = self.get(repo, tgt_env)
+        for _ in range(SYMLINK_RECURSE_DEPTH):
+            if repo_path in blobs:
+                return (repo_path,) + tuple(blobs[repo_path])
+            if repo_path not in symlinks:
+                break
+            repo_path = os.path.normpath(
+                os.path.join(os.path.dirname(repo_path), symlinks[repo_path])
+            )
+        return None, None, None
+
+    def file_lists(self, remotes, tgt_env):
+        '''
+        Return the files, symlinks and dirs of the environment from all
+        remotes
+        '''
+        key = tuple((repo.id, self.tree_sha(repo, tgt_env)) for repo in remotes)
+        cached = self.lists.get(tgt_env)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        ret = {'files': set(), 'symlinks': {}, 'dirs': set()}
+        for repo in remotes:
+            blobs, symlinks = self.get(repo, tgt_env)
+            if repo.mountpoint:
+                ret['dirs'].add(repo.mountpoint)
+            for repo_path in list(blobs) + list(symlinks):
+                if repo.root:
+                    if not repo_path.startswith(repo.root + os.path.sep):
+                        continue
+                    rel_path = os.path.relpath(repo_path, repo.root)
+                else:
+                    rel_path = repo_path
+                file_path = os.path.join(repo.mountpoint, rel_path)
+                ret['files'].add(file_path)
+                if repo_path in symlinks:
+                    ret['symlinks'][file_path] = symlinks[repo_path]
+                rel_dir = os.path.dirname(rel_path)
+                while rel_dir:
+                    ret['dirs'].add(os.path.join(repo.mountpoint, rel_dir))
+                    rel_dir = os.path.dirname(rel_dir)
+        ret['files'] = sorted(ret['files'])
+        ret['dirs'] = sorted(ret['dirs'])
+        self.lists[tgt_env] = (key, ret)
+        return ret
+
+
+# The blob indexes of this process, by cache_root
+_BLOB_INDEXES = {}
+# The data of the blobs served from memory, and the file hashes, by blob SHA
+_BLOBS = LRUCache(BLOB_CACHE_SIZE)
+_BLOB_HASHES = LRUCache(BLOB_HASH_CACHE_SIZE)
+
+
 class GitFS(GitBase):
     '''
     Functionality specific to the git fileserver backend
@@ -2024,11 +2363,52 @@ class GitFS(GitBase):
         '''
         return self._file_lists(load, 'dirs')
 
+    def get_blob_index(self):
+        '''
+        Return the blob index of this process, or None if it is disabled or
+        the update process did not write the refs cache yet
+        '''
+        if not self.opts.get('gitfs_blob_index', False):
+            return None
+        index = _BLOB_INDEXES.get(self.cache_root)
+        if index is None:
+            index = _BLOB_INDEXES[self.cache_root] = \
+                BlobIndex(self.refs_cache)
+        return index if index.refresh(self.opts) else None
+
+    def _serve_blobs(self):
+        '''
+        Return True if files are served from the object store instead of
+        being written to the cache
+        '''
+        return self.opts.get('gitfs_serve_blobs', False) \
+            and self.provider in SERVE_BLOB_PROVIDERS
+
+    def _read_blob(self, fnd):
+        '''
+        Return the data of the blob of a file served from the object store
+        '''
+        blob_sha = fnd['blob_sha']
+        data = _BLOBS.get(blob_sha)
+        if data is None:
+            for repo in self.remotes:
+                if repo.id == fnd['remote']:
+                    data = repo.read_blob(blob_sha)
+                    break
+            else:
+                return None
+        # Set again so that the blobs served least recently are dropped first
+        _BLOBS[blob_sha] = data
+        return data
+
     def envs(self, ignore_cache=False):
         '''
         Return a list of refs that can be used as environments
         '''
         if not ignore_cache:
+            index = self.get_blob_index()
+            if index is not None:
+                return index.envs()
             cache_match = salt.fileserver.check_env_cache(
                 self.opts,
                 self.env_cache
@@ -2047,7 +2427,10 @@ class GitFS(GitBase):
         '''
         fnd = {'path': '',
                'rel': ''}
-        if os.path.isabs(path) or tgt_env not in self.envs():
+        index = self.get_blob_index()
+        serve_blobs = self._serve_blobs()
+        envs = index.envs() if index is not None else self.envs()
+        if os.path.isabs(path) or tgt_env not in envs:
             return fnd
 
         dest = os.path.join(self.cache_root, 'refs', tgt_env, path)
@@ -2062,20 +2445,6 @@ class GitFS(GitBase):
                              '{0}.lk'.format(path))
         destdir = os.path.dirname(dest)
         hashdir = os.path.dirname(blobshadest)
-        if not os.path.isdir(destdir):
-            try:
-                os.makedirs(destdir)
-            except OSError:
-                # Path exists and is a file, remove it and retry
-                os.remove(destdir)
-                os.makedirs(destdir)
-        if not os.path.isdir(hashdir):
-            try:
-                os.makedirs(hashdir)
-            except OSError:
-                # Path exists and is a file, remove it and retry
-                os.remove(hashdir)
-                os.makedirs(hashdir)
 
         for repo in self.remotes:
             if repo.mountpoint \
@@ -2085,18 +2454,60 @@ class GitFS(GitBase):
             if repo.root:
                 repo_path = os.path.join(repo.root, repo_path)
 
-            blob, blob_hexsha = repo.find_file(repo_path, tgt_env)
-            if blob is None:
-                continue
+            size = None
+            if index is not None:
+                # Look the file up in memory, the blob is only read from the
+                # object store when the cached copy is out of date
+                blob = None
+                repo_path, blob_hexsha, size = \
+                    index.find(repo, repo_path, tgt_env)
+                if blob_hexsha is None:
+                    continue
+                fnd['blob_sha'] = blob_hexsha
+                fnd['size'] = size
+                if index.cached.get(dest) == blob_hexsha:
+                    fnd['rel'] = path
+                    fnd['path'] = dest
+                    return fnd
+            else:
+                blob, blob_hexsha = repo.find_file(repo_path, tgt_env)
+                if blob is None:
+                    continue
+                if serve_blobs:
+                    size = blob.size
+
+            if serve_blobs and size <= MAX_SERVED_BLOB_SIZE:
+                # serve_file reads the blob from the object store, nothing is
+                # written to dest
+                fnd['rel'] = path
+                fnd['path'] = dest
+                fnd['blob_sha'] = blob_hexsha
+                fnd['size'] = size
+                fnd['remote'] = repo.id
+                return fnd
 
             salt.fileserver.wait_lock(lk_fn, dest)
             if os.path.isfile(blobshadest) and os.path.isfile(dest):
                 with salt.utils.fopen(blobshadest, 'r') as fp_:
                     sha = fp_.read()
                     if sha == blob_hexsha:
+                        if index is not None:
+                            index.cached[dest] = blob_hexsha
                         fnd['rel'] = path
                         fnd['path'] = dest
                         return fnd
+            if blob is None:
+                blob, blob_hexsha = repo.find_file(repo_path, tgt_env)
+                if blob is None:
+                    continue
+            for dirname in (destdir, hashdir):
+                if not os.path.isdir(dirname):
+                    try:
+                        os.makedirs(dirname)
+                    except OSError:
+                        # Path exists and is a file, remove it and retry
+                        os.remove(dirname)
+                        os.makedirs(dirname)
             with salt.utils.fopen(lk_fn, 'w+') as fp_:
                 fp_.write('')
             for filename in glob.glob(hashes_glob):
@@ -2112,6 +2523,8 @@ class GitFS(GitBase):
                 os.remove(lk_fn)
             except OSError:
                 pass
+            if index is not None:
+                index.cached[dest] = blob_hexsha
             fnd['rel'] = path
             fnd['path'] = dest
             return fnd
@@ -2145,15 +2558,17 @@ class GitFS(GitBase):
             return ret
         if not fnd['path']:
             return ret
+        if 'remote' in fnd:
+            data = self._read_blob(fnd)
+            if data is None:
+                return ret
+            ret['dest'] = fnd['rel']
+            ret.update(salt.fileserver.read_fp_chunk(six.BytesIO(data),
+                                                     load,
+                                                     self.opts))
+            return ret
         ret['dest'] = fnd['rel']
-        gzip = load.get('gzip', None)
-        with salt.utils.fopen(fnd['path'], 'rb') as fp_:
-            fp_.seek(load['loc'])
-            data = fp_.read(self.opts['file_buffer_size'])
-            if gzip and data:
-                data = salt.utils.gzip_util.compress(data, gzip)
-                ret['gzip'] = gzip
-            ret['data'] = data
+        ret.update(salt.fileserver.read_chunk(fnd['path'], load, self.opts))
         return ret
 
     def file_hash(self, load, fnd):
@@ -2171,6 +2586,27 @@ class GitFS(GitBase):
         if not all(x in load for x in ('path', 'saltenv')):
             return ''
         ret = {'hash_type': self.opts['hash_type']}
+        if 'blob_sha' in fnd:
+            # The hash of a blob never changes, it is computed once
+            hash_key = (fnd['blob_sha'], self.opts['hash_type'])
+            if hash_key not in _BLOB_HASHES:
+                if 'remote' in fnd:
+                    data = self._read_blob(fnd)
+                    if data is None:
+                        return ''
+                    hsum = getattr(hashlib, self.opts['hash_type'])(data)
+                    _BLOB_HASHES[hash_key] = hsum.hexdigest()
+                else:
+                    _BLOB_HASHES[hash_key] = self._file_hash(load, fnd)['hsum']
+            ret['hsum'] = _BLOB_HASHES[hash_key]
+            return ret
+        return self._file_hash(load, fnd)
+
+    def _file_hash(self, load, fnd):
+        '''
+        Return a file hash, from the hash cache or hashing the cached file
+        '''
+        ret = {'hash_type': self.opts['hash_type']}
         relpath = fnd['rel']
         path = fnd['path']
         hashdest = os.path.join(self.hash_cachedir,
@@ -2201,6 +2637,12 @@ class GitFS(GitBase):
             )
             load['saltenv'] = load.pop('env')
 
+        index = self.get_blob_index()
+        if index is not None:
+            if load['saltenv'] not in index.envs():
+                return {} if form == 'symlinks' else []
+            return index.file_lists(self.remotes, load['saltenv'])[form]
+
         if not os.path.isdir(self.file_list_cachedir):
             try:
                 os.makedirs(self.file_list_cachedir)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+'''
+A minimal ctypes binding to the Linux inotify API
+
+Only what is needed to watch directories for changes without blocking is
+exposed, :func:`available` tells whether inotify can be used at all.
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import sys
+import errno
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+log = logging.getLogger(__name__)
+
+# Events, see inotify(7)
+IN_ACCESS = 0x00000001
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_CLOSE_NOWRITE = 0x00000010
+IN_OPEN = 0x00000020
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_UNMOUNT = 0x00002000
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# Flags of inotify_init1
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+# wd, mask, cookie and length of the name of struct inotify_event
+_EVENT = struct.Struct('iIII')
+
+_LIBC = None
+
+
+def _libc():
+    '''
+    Return the C library, with the inotify functions set up, or None if it
+    does not have them
+    '''
+    global _LIBC
+    if _LIBC is None:
+        _LIBC = False
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                               use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int,
+                                               ctypes.c_char_p,
+                                               ctypes.c_uint32]
+            libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        except (OSError, AttributeError) as exc:
+            log.debug('inotify is not available: {0}'.format(exc))
+        else:
+            _LIBC = libc
+    return _LIBC or None
+
+
+def available():
+    '''
+    Return True if inotify can be used on this system
+    '''
+    return _libc() is not None
+
+
+def _error():
+    '''
+    Return an OSError for the last failed C library call
+    '''
+    err = ctypes.get_errno()
+    return OSError(err, os.strerror(err))
+
+
+class Inotify(object):
+    '''
+    A non-blocking inotify instance
+    '''
+    def __init__(self):
+        libc = _libc()
+        if libc is None:
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise _error()
+
+    def add_watch(self, path, mask):
+        '''
+        Watch path for the events in mask and return the watch descriptor
+        '''
+        if not isinstance(path, bytes):
+            path = path.encode(sys.getfilesystemencoding())
+        wd = self.libc.inotify_add_watch(self.fd, path, mask)
+        if wd < 0:
+            raise _error()
+        return wd
+
+    def rm_watch(self, wd):
+        '''
+        Stop watching a watch descriptor
+        '''
+        # The watch is already gone if the watched path was removed
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self):
+        '''
+        Return the pending events as (wd, mask, cookie, name) tuples, without
+        waiting for new events
+        '''
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError as exc:
+                if exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                if exc.errno == errno.EINTR:
+                    continue
+                raise
+            if not data:
+                break
+            pos = 0
+            while pos + _EVENT.size <= len(data):
+                wd, mask, cookie, length = _EVENT.unpack_from(data, pos)
+                pos += _EVENT.size
+                name = data[pos:pos + length].rstrip(b'\0')
+                pos += length
+                events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        '''
+        Close the inotify instance, this removes all the watches
+        '''
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
@@ -2,7 +2,10 @@
 
 # Import Python libs
 from __future__ import absolute_import
+import os
 import logging
+import threading
+import time
 
 # Import Salt libs
 import salt.minion
@@ -10,13 +13,25 @@ import salt.utils.verify
 import salt.utils.jid
 from salt.utils.event import tagify
 
+# Import 3rd-party libs
+import salt.ext.six as six
+from salt.ext.six.moves import queue  # pylint: disable=import-error
+
 
 log = logging.getLogger(__name__)
 
+# The seconds a master worker waits for its queued returns to be written
+# when it exits
+FLUSH_TIMEOUT = 30
+
 
-def store_job(opts, load, event=None, mminion=None):
+def store_job(opts, load, event=None, mminion=None, return_queue=None):
     '''
     Store job information using the configured master_job_cache
+
+    If a :class:`ReturnQueue` is passed, the return is handed to it once the
+    event has been fired and written to the job cache in the background. The
+    return is written right away if the queue is full.
     '''
     # Generate EndTime
     endtime = salt.utils.jid.jid_to_time(salt.utils.jid.gen_jid())
@@ -51,15 +66,17 @@ def store_job(opts, load, event=None, mminion=None):
             emsg = "Returner '{0}' does not support function save_load".format(job_cache)
             log.error(emsg)
             raise KeyError(emsg)
-    elif salt.utils.jid.is_jid(load['jid']):
+        prep_jid = False
+    else:
+        prep_jid = salt.utils.jid.is_jid(load['jid'])
+
+    # if you have a job_cache, or an ext_job_cache, don't write to
+    # the regular master cache
+    write_cache = opts['job_cache'] and not opts.get('ext_job_cache')
+    if prep_jid and (return_queue is None or not write_cache):
         # Store the jid
-        jidstore_fstr = '{0}.prep_jid'.format(job_cache)
-        try:
-            mminion.returners[jidstore_fstr](False, passed_jid=load['jid'])
-        except KeyError:
-            emsg = "Returner '{0}' does not support function prep_jid".format(job_cache)
-            log.error(emsg)
-            raise KeyError(emsg)
+        _prep_jid(opts, load['jid'], mminion)
+        prep_jid = False
 
     if event:
         # If the return data is invalid, just ignore it
@@ -67,21 +84,47 @@ def store_job(opts, load, event=None, mminion=None):
         event.fire_event(load, tagify([load['jid'], 'ret', load['id']], 'job'))
         event.fire_ret_load(load)
 
-    # if you have a job_cache, or an ext_job_cache, don't write to
-    # the regular master cache
-    if not opts['job_cache'] or opts.get('ext_job_cache'):
+    if not write_cache:
         return
 
-    # otherwise, write to the master cache
-    savefstr = '{0}.save_load'.format(job_cache)
-    getfstr = '{0}.get_load'.format(job_cache)
-    fstr = '{0}.returner'.format(job_cache)
     if 'fun' not in load and load.get('return', {}):
         ret_ = load.get('return', {})
         if 'fun' in ret_:
             load.update({'fun': ret_['fun']})
         if 'user' in ret_:
             load.update({'user': ret_['user']})
+
+    if return_queue is not None and return_queue.put(load, endtime):
+        return
+
+    # otherwise, write to the master cache
+    if prep_jid:
+        _prep_jid(opts, load['jid'], mminion)
+    _save_return(opts, load, endtime, mminion)
+
+
+def _prep_jid(opts, jid, mminion):
+    '''
+    Store a jid which was passed with a return
+    '''
+    job_cache = opts['master_job_cache']
+    jidstore_fstr = '{0}.prep_jid'.format(job_cache)
+    try:
+        mminion.returners[jidstore_fstr](False, passed_jid=jid)
+    except KeyError:
+        emsg = "Returner '{0}' does not support function prep_jid".format(job_cache)
+        log.error(emsg)
+        raise KeyError(emsg)
+
+
+def _save_return(opts, load, endtime, mminion):
+    '''
+    Write a single return to the master job cache
+    '''
+    job_cache = opts['master_job_cache']
+    savefstr = '{0}.save_load'.format(job_cache)
+    getfstr = '{0}.get_load'.format(job_cache)
+    fstr = '{0}.returner'.format(job_cache)
     try:
         if 'jid' in load and 'get_load' in mminion.returners and not mminion.returners[getfstr](load.get('jid', '')):
             mminion.returners[savefstr](load['jid'], load)
@@ -98,6 +141,206 @@ def store_job(opts, load, event=None, mminion=None):
         raise KeyError(emsg)
 
 
+class ReturnQueue(object):
+    '''
+    Write minion returns to the master job cache in batches from a background
+    thread, so that the master workers do not wait on the job cache
+
+    The queue holds at most ``job_cache_queue_size`` returns, returns which do
+    not fit are written by the caller of :func:`store_job` as before. Queued
+    returns reach the job cache after their return event was fired, and are
+    written before the worker exits by :meth:`close`.
+    '''
+    def __init__(self, opts, mminion):
+        self.opts = opts
+        self.mminion = mminion
+        self.batch_size = max(opts.get('job_cache_batch_size', 100), 1)
+        self.queue = queue.Queue(maxsize=opts['job_cache_queue_size'])
+        self.stats = {'queued': 0,
+                      'stored': 0,
+                      'batches': 0,
+                      'overflows': 0,
+                      'errors': 0,
+                      'max_depth': 0,
+                      'last_batch_time': 0.0}
+        self._overflowing = False
+        self._last_stats = (time.time(), dict(self.stats))
+        # Look up the returner functions now, the loader is not thread safe
+        # and a missing function makes it rescan the module directories
+        job_cache = opts['master_job_cache']
+        self._save_many = mminion.returners.get(
+            '{0}.save_many'.format(job_cache))
+        self._update_endtime = None
+        if opts.get('job_cache_store_endtime'):
+            self._update_endtime = mminion.returners.get(
+                '{0}.update_endtime'.format(job_cache))
+        self._thread = threading.Thread(target=self._run,
+                                        name='ReturnQueue')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, load, endtime):
+        '''
+        Queue a return, return False if the queue is full
+        '''
+        try:
+            self.queue.put_nowait((load, endtime))
+        except queue.Full:
+            self.stats['overflows'] += 1
+            if not self._overflowing:
+                self._overflowing = True
+                log.warning(
+                    'The job return queue is full ({0} returns), returns are '
+                    'written to the job cache directly until it drains. '
+                    'Consider raising job_cache_queue_size.'.format(
+                        self.queue.maxsize
+                    )
+                )
+            return False
+        self._overflowing = False
+        self.stats['queued'] += 1
+        depth = self.queue.qsize()
+        if depth > self.stats['max_depth']:
+            self.stats['max_depth'] = depth
+        return True
+
+    def depth(self):
+        '''
+        Return the number of returns waiting to be written
+        '''
+        return self.queue.qsize()
+
+    def flush(self, timeout=None):
+        '''
+        Block until every queued return has been written, or until timeout
+        seconds have passed. Return True if the queue was drained.
+        '''
+        if timeout is None:
+            self.queue.join()
+            return True
+        end = time.time() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout=FLUSH_TIMEOUT):
+        '''
+        Write the queued returns before the master worker exits, the writer
+        thread is a daemon thread and would drop them
+        '''
+        depth = self.depth()
+        if depth:
+            log.info('Writing {0} queued job returns to the job cache'.format(depth))
+        if not self.flush(timeout):
+            log.error(
+                'Could not write {0} queued job returns to the job cache '
+                'within {1} seconds, they are lost'.format(self.depth(), timeout)
+            )
+        log.debug('Job return queue stats: {0}'.format(self.stats))
+
+    def fire_stats(self, event):
+        '''
+        Fire the stats of the queue since the last stats event on event, at
+        most once every ``job_cache_stats_interval`` seconds. This is called
+        from the master worker, which owns event, and not from the writer
+        thread.
+        '''
+        interval = self.opts.get('job_cache_stats_interval', 60)
+        now = time.time()
+        last_time, last_stats = self._last_stats
+        if not interval or now - last_time < interval:
+            return
+        stats = dict(self.stats)
+        data = {'pid': os.getpid(),
+                'interval': now - last_time,
+                'depth': self.depth(),
+                'max_depth': stats['max_depth'],
+                'last_batch_time': stats['last_batch_time']}
+        for key in ('queued', 'stored', 'batches', 'overflows', 'errors'):
+            data[key] = stats[key] - last_stats[key]
+        self._last_stats = (now, stats)
+        event.fire_event(data, tagify('stats', 'job_cache'))
+
+    def _store(self, batch):
+        '''
+        Write a batch of ``(load, endtime)`` tuples to the job cache
+
+        The jid of every job in the batch is stored once, then the returns are
+        passed to the ``save_many`` function of the returner, if it has one,
+        or written one by one otherwise. Returns the number of returns which
+        could not be written.
+        '''
+        jids = set()
+        for load, _ in batch:
+            if load['jid'] not in jids and salt.utils.jid.is_jid(load['jid']):
+                jids.add(load['jid'])
+                _prep_jid(self.opts, load['jid'], self.mminion)
+
+        if self._save_many is None:
+            failed = 0
+            for load, endtime in batch:
+                try:
+                    _save_return(self.opts, load, endtime, self.mminion)
+                except Exception as exc:
+                    failed += 1
+                    log.error(
+                        'Could not store the return of {0} for job {1}: {2}'.format(
+                            load.get('id'), load['jid'], exc
+                        ),
+                        exc_info_on_loglevel=logging.DEBUG
+                    )
+            return failed
+
+        failed = self._save_many([load for load, _ in batch])
+        if self._update_endtime is not None:
+            endtimes = {}
+            for load, endtime in batch:
+                endtimes[load['jid']] = endtime
+            for jid, endtime in six.iteritems(endtimes):
+                self._update_endtime(jid, endtime)
+        return failed
+
+    def _run(self):
+        '''
+        Write the queued returns in batches of up to job_cache_batch_size
+        '''
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            start = time.time()
+            try:
+                failed = self._store(batch)
+                if not isinstance(failed, six.integer_types):
+                    # Returners do not have to count the failed returns
+                    failed = 0
+            except Exception as exc:
+                self.stats['errors'] += len(batch)
+                log.error(
+                    'Could not store {0} job returns: {1}'.format(len(batch), exc),
+                    exc_info_on_loglevel=logging.DEBUG
+                )
+            else:
+                self.stats['errors'] += failed
+                self.stats['stored'] += len(batch) - failed
+            self.stats['batches'] += 1
+            self.stats['last_batch_time'] = time.time() - start
+            log.trace(
+                'Stored {0} job returns in {1:.3f}s, {2} still queued'.format(
+                    len(batch), self.stats['last_batch_time'], self.queue.qsize()
+                )
+            )
+            for _ in batch:
+                self.queue.task_done()
+
+
 def get_retcode(ret):
     '''
     Determine a retcode for a given return
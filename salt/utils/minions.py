@@ -32,6 +32,9 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+# cachedir -> MinionDataIndex, see get_minion_data_index()
+_DATA_INDEXES = {}
+
 TARGET_REX = re.compile(
         r'''(?x)
         (
@@ -148,6 +151,312 @@ def nodegroup_comp(nodegroup, nodegroups, skip=None):
     return ret
 
 
+def get_minion_data_index(opts):
+    '''
+    Return the :py:class:`MinionDataIndex` for the minion data cache under
+    ``opts['cachedir']``. The index is shared by every ``CkMinions`` instance
+    in the current process.
+    '''
+    cachedir = opts['cachedir']
+    if cachedir not in _DATA_INDEXES:
+        _DATA_INDEXES[cachedir] = MinionDataIndex(opts)
+    return _DATA_INDEXES[cachedir]
+
+
+class MinionDataIndex(object):
+    '''
+    In-memory inverted index of the grains and pillar data kept in the
+    minion data cache
+
+    Key paths and values are mapped to the set of minion ids they were
+    seen for, so grain and pillar targets resolve with set operations
+    instead of loading every ``data.p`` in the cache. The result of
+    :py:meth:`match` is the same as running ``salt.utils.subdict_match``
+    against every cached minion: minions which cannot be decided from the
+    index alone (e.g. because the target walks into a list) are checked
+    against their cached data.
+
+    The index is refreshed from the cache on every lookup, reloading only
+    the ``data.p`` files which changed since they were last indexed, and
+    can be fed directly with :py:meth:`add` when the cache is written.
+    '''
+    # Characters which make fnmatch do more than a plain comparison
+    _GLOB_CHARS = frozenset('*?[/\\')
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.serial = salt.payload.Serial(opts)
+        self.cdir = os.path.join(opts['cachedir'], 'minions')
+        # minion id -> stat signature of the indexed data.p
+        self._stamps = {}
+        # minion id -> list of (search_type, table, path, key) added for it
+        self._entries = {}
+        # minion ids whose data could not be indexed
+        self._unindexed = set()
+        # search_type -> table -> path -> key -> set of minion ids
+        self._tables = {}
+
+    @property
+    def minions(self):
+        '''
+        The set of minion ids with data in the index
+        '''
+        return set(self._stamps)
+
+    def _stamp(self, minion_id):
+        '''
+        Return the stat signature of a minion's cached data, or None if the
+        minion has no cached data
+        '''
+        try:
+            stat = os.stat(os.path.join(self.cdir, minion_id, 'data.p'))
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime
+
+    def _load(self, minion_id):
+        '''
+        Load the cached data of a minion
+        '''
+        datap = os.path.join(self.cdir, minion_id, 'data.p')
+        with salt.utils.fopen(datap, 'rb') as fp_:
+            return self.serial.load(fp_)
+
+    def refresh(self):
+        '''
+        Bring the index up to date with the minion data cache
+        '''
+        try:
+            ids = os.listdir(self.cdir)
+        except OSError:
+            ids = []
+        seen = set()
+        for id_ in ids:
+            stamp = self._stamp(id_)
+            if stamp is None:
+                continue
+            seen.add(id_)
+            if self._stamps.get(id_) == stamp:
+                continue
+            try:
+                data = self._load(id_)
+            except (IOError, OSError):
+                seen.discard(id_)
+                continue
+            except Exception as exc:
+                log.error(
+                    'Unable to index cached data for minion {0}: {1}'
+                    .format(id_, exc)
+                )
+                data = None
+            self._add(id_, data, stamp)
+        for id_ in set(self._stamps).difference(seen):
+            self.remove(id_)
+
+    def add(self, minion_id, data):
+        '''
+        (Re)index the data just written to the cache for a minion
+
+        :param str minion_id: The minion ID
+        :param dict data: The cached data, with ``grains`` and ``pillar`` keys
+        '''
+        self._add(minion_id, data, self._stamp(minion_id))
+
+    def _add(self, minion_id, data, stamp):
+        self.remove(minion_id)
+        entries = []
+
+        def _index(search_type, table, path, key):
+            (self._tables.setdefault(search_type, {})
+                         .setdefault(table, {})
+                         .setdefault(path, {})
+                         .setdefault(key, set())
+                         .add(minion_id))
+            entries.append((search_type, table, path, key))
+
+        self._entries[minion_id] = entries
+        if not isinstance(data, dict):
+            self._unindexed.add(minion_id)
+            self._stamps[minion_id] = stamp
+            return
+        try:
+            for search_type in ('grains', 'pillar'):
+                if isinstance(data.get(search_type), dict):
+                    self._walk(search_type, (), data[search_type], _index)
+        except Exception:
+            # Usually a value which cannot be converted to str, leave the
+            # minion to subdict_match
+            self.remove(minion_id)
+            self._unindexed.add(minion_id)
+        self._stamps[minion_id] = stamp
+
+    def _walk(self, search_type, path, value, index):
+        '''
+        Index a value found at ``path`` in the grains or pillar of a minion.
+        Only dicts are descended into, targets going through a list are
+        matched against the cached data.
+        '''
+        if isinstance(value, dict):
+            index(search_type, 'dict', path, None)
+            if not value:
+                index(search_type, 'empty', path, None)
+            for key, val in six.iteritems(value):
+                index(search_type, 'rawkey', path, key)
+                index(search_type, 'key', path, str(key).lower())
+                self._walk(search_type, path + (key,), val, index)
+        elif isinstance(value, list):
+            index(search_type, 'list', path, None)
+            for item in value:
+                if isinstance(item, dict):
+                    index(search_type, 'dictitem', path, None)
+                index(search_type, 'item', path, str(item).lower())
+        else:
+            index(search_type, 'value', path, str(value).lower())
+
+    def remove(self, minion_id):
+        '''
+        Drop a minion from the index
+        '''
+        self._stamps.pop(minion_id, None)
+        self._unindexed.discard(minion_id)
+        for search_type, table, path, key in self._entries.pop(minion_id, ()):
+            paths = self._tables[search_type][table]
+            ids = paths[path][key]
+            ids.discard(minion_id)
+            if not ids:
+                del paths[path][key]
+                if not paths[path]:
+                    del paths[path]
+
+    def match(self,
+              search_type,
+              expr,
+              delimiter=DEFAULT_TARGET_DELIM,
+              regex_match=False,
+              exact_match=False):
+        '''
+        Return the set of indexed minions whose ``search_type`` data
+        (``grains`` or ``pillar``) matches ``expr``, as
+        ``salt.utils.subdict_match`` would
+        '''
+        self.refresh()
+        tables = self._tables.get(search_type, {})
+        memo = {}
+        matched, fallback = self._subdict_match(
+            tables, (), expr, delimiter, regex_match, exact_match, memo)
+        fallback = fallback.union(self._unindexed).difference(matched)
+        for id_ in fallback:
+            try:
+                data = self._load(id_).get(search_type)
+            except (IOError, OSError):
+                continue
+            if salt.utils.subdict_match(data,
+                                        expr,
+                                        delimiter=delimiter,
+                                        regex_match=regex_match,
+                                        exact_match=exact_match):
+                matched.add(id_)
+        return matched
+
+    @staticmethod
+    def _ids(tables, table, path, key=None):
+        return tables.get(table, {}).get(path, {}).get(key, set())
+
+    def _match_keys(self, tables, table, path, pattern, regex_match, exact_match):
+        '''
+        Return the minions for which one of the lowercased string keys of
+        ``table`` at ``path`` matches the pattern
+        '''
+        keys = tables.get(table, {}).get(path)
+        if not keys:
+            return set()
+        pattern = pattern.lower()
+        if exact_match or (not regex_match and
+                           not self._GLOB_CHARS.intersection(pattern)):
+            return set(keys.get(pattern, ()))
+        ret = set()
+        if regex_match:
+            try:
+                regex = re.compile(pattern)
+            except Exception:
+                log.error('Invalid regex \'{0}\' in match'.format(pattern))
+                return ret
+            for key, ids in six.iteritems(keys):
+                if regex.match(key):
+                    ret.update(ids)
+        else:
+            for key, ids in six.iteritems(keys):
+                if fnmatch.fnmatch(key, pattern):
+                    ret.update(ids)
+        return ret
+
+    def _subdict_match(self, tables, base, expr, delimiter, regex_match, exact_match, memo):
+        '''
+        Mirror of ``salt.utils.subdict_match`` for the data found at
+        ``base``. Returns a tuple of the minions which match and the
+        minions which have to be matched against their cached data.
+        '''
+        memo_key = ('subdict', base, expr, delimiter)
+        if memo_key in memo:
+            return memo[memo_key]
+        matched = set()
+        fallback = set()
+        splits = expr.split(delimiter)
+        for idx in range(1, len(splits)):
+            path = base + tuple(splits[:idx])
+            matchstr = delimiter.join(splits[idx:])
+            # Traversing a list on the way to the key
+            for pos in range(len(base) + 1, len(path)):
+                fallback.update(self._ids(tables, 'list', path[:pos]))
+            matched.update(self._match_keys(
+                tables, 'value', path, matchstr, regex_match, exact_match))
+            matched.update(self._match_keys(
+                tables, 'item', path, matchstr, regex_match, exact_match))
+            fallback.update(self._ids(tables, 'dictitem', path))
+            dicts = self._ids(tables, 'dict', path).difference(
+                self._ids(tables, 'empty', path))
+            if dicts:
+                dict_matched, dict_fallback = self._dict_match(
+                    tables, path, matchstr, regex_match, exact_match, memo)
+                matched.update(dicts.intersection(dict_matched))
+                fallback.update(dicts.intersection(dict_fallback))
+        memo[memo_key] = matched, fallback
+        return matched, fallback
+
+    def _dict_match(self, tables, path, pattern, regex_match, exact_match, memo):
+        '''
+        Mirror of the dict matching done by ``salt.utils.subdict_match`` for
+        the dicts found at ``path``
+        '''
+        if pattern.startswith('*:'):
+            pattern = pattern[2:]
+        memo_key = ('dict', path, pattern)
+        if memo_key in memo:
+            return memo[memo_key]
+        if pattern == '*':
+            memo[memo_key] = set(self._ids(tables, 'dict', path)), set()
+            return memo[memo_key]
+        matched = set(self._ids(tables, 'rawkey', path, pattern))
+        matched.update(self._match_keys(
+            tables, 'key', path, pattern, regex_match, exact_match))
+        sub_matched, fallback = self._subdict_match(
+            tables, path, pattern, DEFAULT_TARGET_DELIM,
+            regex_match, exact_match, memo)
+        matched.update(sub_matched)
+        fallback = set(fallback)
+        for key in list(tables.get('rawkey', {}).get(path, ())):
+            child = path + (key,)
+            if self._ids(tables, 'dict', child):
+                child_matched, child_fallback = self._dict_match(
+                    tables, child, pattern, regex_match, exact_match, memo)
+                matched.update(child_matched)
+                fallback.update(child_fallback)
+            matched.update(self._match_keys(
+                tables, 'item', child, pattern, regex_match, exact_match))
+        memo[memo_key] = matched, fallback
+        return matched, fallback
+
+
 class CkMinions(object):
     '''
     Used to check what minions should respond from a target
@@ -165,6 +474,11 @@ class CkMinions(object):
             self.acc = 'minions'
         else:
             self.acc = 'accepted'
+        if self.opts.get('minion_data_cache', False) \
+                and self.opts.get('minion_data_cache_index', False):
+            self.data_index = get_minion_data_index(self.opts)
+        else:
+            self.data_index = None
 
     def _check_glob_minions(self, expr, greedy):  # pylint: disable=unused-argument
         '''
@@ -233,6 +547,17 @@ class CkMinions(object):
             cdir = os.path.join(self.opts['cachedir'], 'minions')
             if not os.path.isdir(cdir):
                 return list(minions)
+            if self.data_index is not None:
+                matched = self.data_index.match(search_type,
+                                                expr,
+                                                delimiter=delimiter,
+                                                regex_match=regex_match,
+                                                exact_match=exact_match)
+                if greedy:
+                    # Minions without cached data are kept
+                    unmatched = self.data_index.minions.difference(matched)
+                    return list(minions.difference(unmatched))
+                return list(matched)
             for id_ in os.listdir(cdir):
                 if not greedy and id_ not in minions:
                     continue
@@ -2555,6 +2555,22 @@ class SaltSSHOptionParser(six.with_metaclass(OptionParserMeta,
                  'time to manage connections, the more running processes the '
                  'faster communication should be, default is %default'
         )
+        self.add_option(
+            '--event-loop',
+            dest='ssh_event_loop',
+            default=False,
+            action='store_true',
+            help='Drive all minions from a single event loop instead of a '
+                 'process per minion'
+        )
+        self.add_option(
+            '--multiplex',
+            dest='ssh_multiplex',
+            default=False,
+            action='store_true',
+            help='Share a single connection to each minion between the ssh '
+                 'commands, kept open for the following calls'
+        )
         self.add_option(
             '--extra-filerefs',
             dest='extra_filerefs',
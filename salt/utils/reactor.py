@@ -6,6 +6,10 @@ import fnmatch
 import glob
 import logging
 import multiprocessing
+import os
+import re
+import time
+import zlib
 
 import yaml
 
@@ -18,9 +22,68 @@ import salt.utils.event
 import salt.utils.process
 from salt.ext.six import string_types, iterkeys
 from salt._compat import string_types
+from salt.ext.six.moves import queue  # pylint: disable=import-error
 log = logging.getLogger(__name__)
 
 
+def _tag_prefix(tag):
+    '''
+    Return the part of a reactor tag before its first glob character, which
+    every matching event tag starts with
+    '''
+    return re.split(r'[*?[]', str(tag))[0]
+
+
+class TagMatcher(object):
+    '''
+    Find the reactors of an event tag in a reactor map. Tags without glob
+    characters are looked up directly, the others are kept in a trie of
+    their prefixes so only the ones whose prefix the event tag starts with
+    are matched with fnmatch.
+    '''
+    def __init__(self, react_map):
+        self.exact = {}
+        self.trie = {}
+        for index, ropt in enumerate(react_map):
+            if not isinstance(ropt, dict) or len(ropt) != 1:
+                continue
+            key = next(iterkeys(ropt))
+            val = ropt[key]
+            if isinstance(val, string_types):
+                val = [val]
+            elif not isinstance(val, list):
+                continue
+            prefix = _tag_prefix(key)
+            if prefix == str(key):
+                self.exact.setdefault(prefix, []).append((index, val))
+                continue
+            node = self.trie
+            for char in prefix:
+                node = node.setdefault(char, {})
+            # The None key of a node holds the tags ending their prefix there
+            node.setdefault(None, []).append((index, key, val))
+
+    def match(self, tag):
+        '''
+        Return the reactors of the tags matching tag, in the order of the map
+        '''
+        found = list(self.exact.get(tag, []))
+        node = self.trie
+        pos = 0
+        while node is not None:
+            for index, key, val in node.get(None, []):
+                if fnmatch.fnmatch(tag, key):
+                    found.append((index, val))
+            if pos == len(tag):
+                break
+            node = node.get(tag[pos])
+            pos += 1
+        reactors = []
+        for _, val in sorted(found, key=lambda item: item[0]):
+            reactors.extend(val)
+        return reactors
+
+
 class Reactor(multiprocessing.Process, salt.state.Compiler):
     '''
     Read in the reactor configuration variable and compare it to events
@@ -28,12 +91,34 @@ class Reactor(multiprocessing.Process, salt.state.Compiler):
     The reactor has the capability to execute pre-programmed executions
     as reactions to events
     '''
+    # The most compiled reaction templates kept
+    TEMPLATE_CACHE_SIZE = 256
+    # Log every this many events dropped by a render worker which is dead or
+    # has a full queue
+    DROP_LOG_INTERVAL = 1000
+
     def __init__(self, opts):
         multiprocessing.Process.__init__(self)
         local_minion_opts = opts.copy()
         local_minion_opts['file_client'] = 'local'
         self.minion = salt.minion.MasterMinion(local_minion_opts)
         salt.state.Compiler.__init__(self, opts, self.minion.rend)
+        self.filter_tags = False
+        # The reactor map and its compiled tags, only read again when the
+        # file of the map changes or the map is managed through events
+        self._react_map = None
+        self._react_map_stamp = None
+        self._tag_matcher = None
+        # The compiled templates of the reaction files
+        self.template_cache = salt.utils.cache.LRUCache(
+            self.TEMPLATE_CACHE_SIZE)
+        # The queues of the render workers and what they report back
+        self.worker_queues = []
+        self.worker_processes = []
+        self.worker_stats = None
+        self.dispatched = []
+        self.dropped = []
+        self.last_stats = None
 
     def render_reaction(self, glob_ref, tag, data):
         '''
@@ -50,7 +135,8 @@ class Reactor(multiprocessing.Process, salt.state.Compiler):
                 res = self.render_template(
                     fn_,
                     tag=tag,
-                    data=data)
+                    data=data,
+                    _jinja_cache=self.template_cache)
 
                 # for #20841, inject the sls name here since verify_high()
                 # assumes it exists in case there are any errors
@@ -62,70 +148,68 @@ class Reactor(multiprocessing.Process, salt.state.Compiler):
                 log.error('Failed to render "{0}": '.format(fn_), exc_info=True)
         return react
 
+    def get_react_map(self):
+        '''
+        Return the reactor map, reading it again only when its file changed
+        '''
+        if not isinstance(self.opts['reactor'], string_types):
+            if self._react_map is not self.opts['reactor']:
+                self._react_map = self.opts['reactor']
+                self._tag_matcher = None
+            return self._react_map
+        try:
+            stat = os.stat(self.opts['reactor'])
+            stamp = (stat.st_ino, stat.st_mtime, stat.st_size)
+        except OSError:
+            stamp = None
+        if stamp is not None and stamp == self._react_map_stamp:
+            return self._react_map
+        log.debug('Reading reactors from yaml {0}'.format(self.opts['reactor']))
+        react_map = []
+        try:
+            with salt.utils.fopen(self.opts['reactor']) as fp_:
+                react_map = yaml.safe_load(fp_.read()) or []
+        except (OSError, IOError):
+            log.error(
+                'Failed to read reactor map: "{0}"'.format(
+                    self.opts['reactor']
+                    )
+                )
+        except Exception:
+            log.error(
+                'Failed to parse YAML in reactor map: "{0}"'.format(
+                    self.opts['reactor']
+                    )
+                )
+        self._react_map = react_map
+        self._react_map_stamp = stamp
+        self._tag_matcher = None
+        return react_map
+
+    def reload_react_map(self):
+        '''
+        Drop the compiled reactor map, it is read again for the next event
+        '''
+        self._react_map = None
+        self._react_map_stamp = None
+        self._tag_matcher = None
+
     def list_reactors(self, tag):
         '''
         Take in the tag from an event and return a list of the reactors to
         process
         '''
         log.debug('Gathering reactors for tag {0}'.format(tag))
-        reactors = []
-        if isinstance(self.opts['reactor'], string_types):
-            try:
-                with salt.utils.fopen(self.opts['reactor']) as fp_:
-                    react_map = yaml.safe_load(fp_.read())
-            except (OSError, IOError):
-                log.error(
-                    'Failed to read reactor map: "{0}"'.format(
-                        self.opts['reactor']
-                        )
-                    )
-            except Exception:
-                log.error(
-                    'Failed to parse YAML in reactor map: "{0}"'.format(
-                        self.opts['reactor']
-                        )
-                    )
-        else:
-            react_map = self.opts['reactor']
-        for ropt in react_map:
-            if not isinstance(ropt, dict):
-                continue
-            if len(ropt) != 1:
-                continue
-            key = next(iterkeys(ropt))
-            val = ropt[key]
-            if fnmatch.fnmatch(tag, key):
-                if isinstance(val, string_types):
-                    reactors.append(val)
-                elif isinstance(val, list):
-                    reactors.extend(val)
-        return reactors
+        react_map = self.get_react_map()
+        if self._tag_matcher is None:
+            self._tag_matcher = TagMatcher(react_map)
+        return self._tag_matcher.match(tag)
 
     def list_all(self):
         '''
         Return a list of the reactors
         '''
-        if isinstance(self.minion.opts['reactor'], string_types):
-            log.debug('Reading reactors from yaml {0}'.format(self.opts['reactor']))
-            try:
-                with salt.utils.fopen(self.opts['reactor']) as fp_:
-                    react_map = yaml.safe_load(fp_.read())
-            except (OSError, IOError):
-                log.error(
-                    'Failed to read reactor map: "{0}"'.format(
-                        self.opts['reactor']
-                        )
-                    )
-            except Exception:
-                log.error(
-                    'Failed to parse YAML in reactor map: "{0}"'.format(
-                        self.opts['reactor']
-                        )
-                    )
-        else:
-            log.debug('Not reading reactors from yaml')
-            react_map = self.minion.opts['reactor']
-        return react_map
+        return self.get_react_map()
 
     def add_reactor(self, tag, reaction):
         '''
@@ -138,6 +222,8 @@ class Reactor(multiprocessing.Process, salt.state.Compiler):
                 return {'status': False, 'comment': 'Reactor already exists.'}
 
         self.minion.opts['reactor'].append({tag: reaction})
+        self.reload_react_map()
+        self.add_tag_filters([{tag: reaction}])
         return {'status': True, 'comment': 'Reactor added.'}
 
     def delete_reactor(self, tag):
@@ -149,10 +235,31 @@ class Reactor(multiprocessing.Process, salt.state.Compiler):
             _tag = next(iterkeys(reactor))
             if _tag == tag:
                 self.minion.opts['reactor'].remove(reactor)
+                self.reload_react_map()
+                if self.filter_tags:
+                    self.event.remove_tag_filter(_tag_prefix(tag))
                 return {'status': True, 'comment': 'Reactor deleted.'}
 
         return {'status': False, 'comment': 'Reactor does not exists.'}
 
+    def add_tag_filters(self, react_map):
+        '''
+        Have the event publisher only send the events which can match the tags
+        of the react_map, the part of a tag before its first glob character is
+        the prefix every matching event tag starts with
+        '''
+        for ropt in react_map:
+            if not isinstance(ropt, dict) or len(ropt) != 1:
+                continue
+            prefix = _tag_prefix(next(iterkeys(ropt)))
+            if not prefix:
+                # Every event can match, drop the filters
+                self.event.clear_tag_filters()
+                self.filter_tags = False
+            if not self.filter_tags:
+                return
+            self.event.add_tag_filter(prefix)
+
     def reactions(self, tag, data, reactors):
         '''
         Render a list of reactor files and returns a reaction struct
@@ -182,12 +289,168 @@ class Reactor(multiprocessing.Process, salt.state.Compiler):
         for chunk in chunks:
             self.wrap.run(chunk)
 
+    def react(self, tag, data, reactors):
+        '''
+        Render the reactors of an event and execute the reactions
+        '''
+        chunks = self.reactions(tag, data, reactors)
+        if chunks:
+            try:
+                self.call_reactions(chunks)
+            except SystemExit:
+                log.warning('Exit ignored by reactor')
+
+    def start_workers(self):
+        '''
+        Start the processes rendering the reactions of the events
+        '''
+        count = self.opts.get('reactor_render_workers', 0)
+        # Events handled and the sum of their latencies by worker
+        self.worker_stats = multiprocessing.Array('d', 2 * count)
+        self.dispatched = [0] * count
+        self.dropped = [0] * count
+        self.last_stats = (time.time(), [0] * count, [0.0] * count)
+        self.worker_queues = [None] * count
+        self.worker_processes = [None] * count
+        for index in range(count):
+            self._start_worker(index)
+
+    def _start_worker(self, index):
+        '''
+        Start the render worker index, with a new queue holding at most
+        reactor_worker_hwm events
+        '''
+        worker_queue = multiprocessing.Queue(self.opts.get('reactor_worker_hwm', 10000))
+        process = multiprocessing.Process(target=self.render_worker,
+                                          args=(index, worker_queue, os.getpid()))
+        process.daemon = True
+        process.start()
+        self.worker_queues[index] = worker_queue
+        self.worker_processes[index] = process
+
+    def _check_worker(self, index):
+        '''
+        Return True if the render worker index is alive. A worker which died
+        is not started again, as the reactor holds threads and sockets by then
+        and forking it is no longer safe: the events still queued for it and
+        all the events dispatched to it afterwards are dropped.
+        '''
+        process = self.worker_processes[index]
+        if process is None:
+            return False
+        if process.is_alive():
+            return True
+        with self.worker_stats.get_lock():
+            done = int(self.worker_stats[2 * index])
+        log.critical(
+            'Reactor render worker {0} died with exit code {1}, {2} queued '
+            'events are lost. The events of its minions are dropped until '
+            'the master is restarted.'.format(
+                index, process.exitcode, self.dispatched[index] - done))
+        process.join(0)
+        # Nothing reads the queue anymore, do not wait for it on exit
+        self.worker_queues[index].cancel_join_thread()
+        self.worker_queues[index].close()
+        self.worker_processes[index] = None
+        self.dropped[index] += self.dispatched[index] - done
+        self.dispatched[index] = done
+        return False
+
+    def render_worker(self, index, worker_queue, parent_pid):
+        '''
+        Render and execute the reactions dispatched to one worker, in order
+        '''
+        salt.utils.appendproctitle('{0}-Worker-{1}'.format(
+            self.__class__.__name__, index))
+        self.wrap = ReactWrap(self.opts)
+        while True:
+            try:
+                tag, data, reactors, queued = worker_queue.get(timeout=1)
+            except queue.Empty:
+                # Do not outlive the reactor
+                if os.getppid() != parent_pid:
+                    return
+                continue
+            try:
+                self.react(tag, data, reactors)
+            except Exception:
+                log.error('Failed to react to {0}'.format(tag), exc_info=True)
+            with self.worker_stats.get_lock():
+                self.worker_stats[2 * index] += 1
+                self.worker_stats[2 * index + 1] += time.time() - queued
+
+    def dispatch(self, tag, data, reactors):
+        '''
+        Hand the reactions of an event to a render worker. The events of a
+        minion, or of a tag when they are not from a minion, always go to
+        the same worker so they are handled in order.
+        '''
+        key = tag
+        if isinstance(data, dict) and data.get('id'):
+            key = data['id']
+        index = (zlib.crc32(salt.utils.to_bytes(key)) & 0xffffffff) % len(self.worker_queues)
+        if not self._check_worker(index):
+            if not self.dropped[index] % self.DROP_LOG_INTERVAL:
+                log.error(
+                    'Reactor render worker {0} is dead, dropping the event '
+                    '{1}. {2} events were dropped by this worker so far.'.format(
+                        index, tag, self.dropped[index] + 1))
+            self.dropped[index] += 1
+            return
+        try:
+            self.worker_queues[index].put_nowait((tag, data, reactors, time.time()))
+        except queue.Full:
+            if not self.dropped[index] % self.DROP_LOG_INTERVAL:
+                log.warning(
+                    'The queue of reactor render worker {0} is full '
+                    '(reactor_worker_hwm), dropping the event {1}. {2} events '
+                    'were dropped by this worker so far.'.format(
+                        index, tag, self.dropped[index] + 1))
+            self.dropped[index] += 1
+            return
+        self.dispatched[index] += 1
+
+    def fire_stats(self):
+        '''
+        Fire the queue depth, events handled and average latency of every
+        render worker since the last stats event
+        '''
+        interval = self.opts.get('reactor_stats_interval', 60)
+        now = time.time()
+        last_time, last_done, last_latency = self.last_stats
+        if not interval or now - last_time < interval:
+            return
+        with self.worker_stats.get_lock():
+            stats = self.worker_stats[:]
+        done = stats[0::2]
+        latency = stats[1::2]
+        workers = []
+        for index in range(len(self.worker_queues)):
+            alive = self._check_worker(index)
+            handled = done[index] - last_done[index]
+            workers.append({
+                'alive': alive,
+                'queued': self.dispatched[index] - int(done[index]),
+                'handled': int(handled),
+                'dropped': self.dropped[index],
+                'latency': (latency[index] - last_latency[index]) / handled if handled else 0.0,
+            })
+        self.last_stats = (now, done, latency)
+        self.event.fire_event({'user': ReactWrap.event_user,
+                               'interval': now - last_time,
+                               'workers': workers},
+                              'salt/reactor/stats')
+
     def run(self):
         '''
         Enter into the server loop
         '''
         salt.utils.appendproctitle(self.__class__.__name__)
 
+        # The workers are forked before any thread or socket is set up here
+        if self.opts.get('reactor_render_workers', 0) > 0:
+            self.start_workers()
+
         # instantiate some classes inside our new process
         self.event = salt.utils.event.get_event(
                 'master',
@@ -196,8 +459,21 @@ class Reactor(multiprocessing.Process, salt.state.Compiler):
                 opts=self.opts,
                 listen=True)
         self.wrap = ReactWrap(self.opts)
-
-        for data in self.event.iter_events(full=True):
+        # A reactor map read from a file can change at any time, only filter
+        # the events of a map set in the configuration
+        self.filter_tags = (isinstance(self.opts['reactor'], list) and
+                            self.opts['transport'] != 'raet')
+        if self.filter_tags:
+            # The reactor runner fires the manage events in its job namespace
+            self.event.add_tag_filter('salt/run/')
+            self.add_tag_filters(self.opts['reactor'])
+
+        while True:
+            data = self.event.get_event(full=True)
+            if self.worker_queues:
+                self.fire_stats()
+            if data is None:
+                continue
             # skip all events fired by ourselves
             if data['data'].get('user') == self.wrap.event_user:
                 continue
@@ -214,18 +490,17 @@ class Reactor(multiprocessing.Process, salt.state.Compiler):
                                        'result': res},
                                       'salt/reactors/manage/delete-complete')
             elif data['tag'].endswith('salt/reactors/manage/list'):
+                self.reload_react_map()
                 self.event.fire_event({'reactors': self.list_all()},
                                       'salt/reactors/manage/list-results')
             else:
                 reactors = self.list_reactors(data['tag'])
                 if not reactors:
                     continue
-                chunks = self.reactions(data['tag'], data['data'], reactors)
-                if chunks:
-                    try:
-                        self.call_reactions(chunks)
-                    except SystemExit:
-                        log.warning('Exit ignored by reactor')
+                if self.worker_queues:
+                    self.dispatch(data['tag'], data['data'], reactors)
+                else:
+                    self.react(data['tag'], data['data'], reactors)
 
 
 class ReactWrap(object):
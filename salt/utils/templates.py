@@ -290,18 +290,14 @@ def _get_jinja_error(trace, context=None):
     return line, out
 
 
-def render_jinja_tmpl(tmplstr, context, tmplpath=None):
+def _jinja_env(context, tmplpath=None):
+    '''
+    Return the Jinja environment to render a template of the given context
+    with
+    '''
     opts = context['opts']
     saltenv = context['saltenv']
     loader = None
-    newline = False
-
-    if tmplstr and not isinstance(tmplstr, six.text_type):
-        # http://jinja.pocoo.org/docs/api/#unicode
-        tmplstr = tmplstr.decode(SLS_ENCODING)
-
-    if tmplstr.endswith('\n'):
-        newline = True
 
     if not saltenv:
         if tmplpath:
@@ -353,6 +349,26 @@ def render_jinja_tmpl(tmplstr, context, tmplpath=None):
     jinja_env.globals['show_full_context'] = show_full_context
 
     jinja_env.tests['list'] = salt.utils.is_list
+    return jinja_env
+
+
+def render_jinja_tmpl(tmplstr, context, tmplpath=None):
+    newline = False
+
+    if tmplstr and not isinstance(tmplstr, six.text_type):
+        # http://jinja.pocoo.org/docs/api/#unicode
+        tmplstr = tmplstr.decode(SLS_ENCODING)
+
+    if tmplstr.endswith('\n'):
+        newline = True
+
+    # The caller can pass a dict in _jinja_cache to keep the compiled
+    # templates in, for templates rendered over and over with the same opts
+    # and saltenv
+    template_cache = context.get('_jinja_cache')
+    template = None
+    if template_cache is not None:
+        template = template_cache.get((tmplpath, tmplstr))
 
     decoded_context = {}
     for key, value in six.iteritems(context):
@@ -363,7 +379,10 @@ def render_jinja_tmpl(tmplstr, context, tmplpath=None):
         decoded_context[key] = salt.utils.locales.sdecode(value)
 
     try:
-        template = jinja_env.from_string(tmplstr)
+        if template is None:
+            template = _jinja_env(context, tmplpath).from_string(tmplstr)
+            if template_cache is not None:
+                template_cache[(tmplpath, tmplstr)] = template
         template.globals.update(decoded_context)
         output = template.render(**decoded_context)
     except jinja2.exceptions.TemplateSyntaxError as exc:
@@ -12,10 +12,12 @@ import inspect
 import tempfile
 import shutil
 import os
+import time
 import collections
 
 # Import Salt Testing libs
 from salttesting import TestCase
+from salttesting.mock import patch, MagicMock
 from salttesting.helpers import ensure_in_syspath
 
 ensure_in_syspath('../../')
@@ -29,6 +31,8 @@ from salt.ext.six.moves import range
 from salt.config import minion_config
 # pylint: enable=no-name-in-module,redefined-builtin
 
+import salt.loader
+import salt.utils
 from salt.loader import LazyLoader, _module_dirs, grains
 
 
@@ -291,6 +295,208 @@ class LazyLoaderReloadingTest(TestCase):
         self.loader.clear()
         self.assertNotIn(self.module_key, self.loader)
 
+
+class LazyLoaderIndexTest(TestCase):
+    '''
+    Test the loader index which is kept in the cachedir
+    '''
+    def setUp(self):
+        self.opts = minion_config(None)
+        self.opts['grains'] = grains(self.opts)
+        self.tmp_dir = tempfile.mkdtemp(dir=tests.integration.TMP)
+        self.cachedir = tempfile.mkdtemp(dir=tests.integration.TMP)
+        self.opts['cachedir'] = self.cachedir
+        self.opts['loader_index'] = True
+        salt.loader._LOADER_INDEXES.clear()
+        self.write_module('indexone')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        shutil.rmtree(self.cachedir)
+        salt.loader._LOADER_INDEXES.clear()
+
+    def write_module(self, name):
+        with salt.utils.fopen(os.path.join(self.tmp_dir, name + '.py'), 'w') as fh:
+            fh.write(module_template.format(count=1))
+        # The index is not written while a directory could still change in
+        # the same second
+        past = time.time() - 10
+        os.utime(self.tmp_dir, (past, past))
+
+    def loader(self):
+        return LazyLoader([self.tmp_dir], self.opts, tag='module')
+
+    def test_index(self):
+        self.assertEqual(self.loader().file_mapping['indexone'][0],
+                         os.path.join(self.tmp_dir, 'indexone.py'))
+        index_dir = os.path.join(self.cachedir, 'loader')
+        self.assertEqual(len(os.listdir(index_dir)), 1)
+
+        # A new process only reads the index
+        salt.loader._LOADER_INDEXES.clear()
+        with patch('os.listdir', MagicMock(side_effect=OSError)):
+            self.assertIn('indexone', self.loader().file_mapping)
+
+        # Adding a module changes the mtime of the directory
+        self.write_module('indextwo')
+        os.utime(self.tmp_dir, None)
+        self.assertIn('indextwo', self.loader().file_mapping)
+
+
+virtual_template = '''
+CALLS = {calls!r}
+__virtualname__ = 'vcache'
+
+def __virtual__():
+    with open(CALLS, 'a') as fp_:
+        fp_.write('x')
+    if __opts__.get('virtual_off') or __pillar__.get('virtual_off'):
+        return (False, 'virtual_off is set')
+    if __grains__.get('virtual_test') == 'yes':
+        return 'vcache'
+    return (False, 'virtual_test is {count}')
+
+def test():
+    return True
+'''
+
+
+class LazyLoaderVirtualCacheTest(TestCase):
+    '''
+    Test the cache of __virtual__ results which is kept in the cachedir
+    '''
+    def setUp(self):
+        self.opts = minion_config(None)
+        self.opts['grains'] = {'virtual_test': 'no', 'other': 1}
+        self.tmp_dir = tempfile.mkdtemp(dir=tests.integration.TMP)
+        self.cachedir = tempfile.mkdtemp(dir=tests.integration.TMP)
+        self.calls = os.path.join(self.cachedir, 'calls')
+        self.opts['cachedir'] = self.cachedir
+        self.opts['virtual_cache'] = True
+        salt.loader._VIRTUAL_CACHES.clear()
+        self.write_module(1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        shutil.rmtree(self.cachedir)
+        salt.loader._VIRTUAL_CACHES.clear()
+
+    def write_module(self, count, name='vcachemod'):
+        with salt.utils.fopen(os.path.join(self.tmp_dir, '{0}.py'.format(name)), 'w') as fh:
+            fh.write(virtual_template.format(calls=self.calls, count=count))
+
+    def loader(self):
+        # Every loader stands for a new process
+        salt.loader._VIRTUAL_CACHES.clear()
+        return LazyLoader([self.tmp_dir], self.opts, tag='module')
+
+    def call_count(self):
+        with salt.utils.fopen(self.calls) as fh:
+            return len(fh.read())
+
+    def test_failed(self):
+        self.assertNotIn('vcachemod.test', self.loader())
+        self.assertEqual(self.call_count(), 1)
+
+        # The cached reason is used without importing the module again
+        loader = self.loader()
+        self.assertNotIn('vcachemod.test', loader)
+        self.assertEqual(self.call_count(), 1)
+        self.assertEqual(loader.missing_fun_string('vcachemod.test'),
+                         '\'vcachemod\' __virtual__ returned False: virtual_test is 1')
+
+        # Grains which were not read do not matter
+        self.opts['grains']['other'] = 2
+        self.assertNotIn('vcachemod.test', self.loader())
+        self.assertEqual(self.call_count(), 1)
+
+        # A change of the module file does
+        self.write_module(2)
+        self.assertNotIn('vcachemod.test', self.loader())
+        self.assertEqual(self.call_count(), 2)
+
+        # So does a change of a grain which was read
+        self.opts['grains']['virtual_test'] = 'yes'
+        self.assertTrue(self.loader()['vcache.test']())
+        self.assertEqual(self.call_count(), 3)
+
+    def test_loaded(self):
+        self.opts['grains']['virtual_test'] = 'yes'
+        self.assertTrue(self.loader()['vcache.test']())
+        # A module which loaded is looked up by its virtual name and its
+        # __virtual__ still runs
+        loader = self.loader()
+        self.assertEqual(list(loader._iter_files('vcache'))[0], 'vcachemod')
+        self.assertTrue(loader['vcache.test']())
+        self.assertEqual(self.call_count(), 2)
+
+    def test_clear(self):
+        self.loader()._load_all()
+        self.assertEqual(os.listdir(os.path.join(self.cachedir, 'loader')),
+                         ['virtual.module.p'])
+        salt.loader.clear_virtual_cache(self.opts)
+        self.assertEqual(os.listdir(os.path.join(self.cachedir, 'loader')), [])
+        self.loader()._load_all()
+        self.assertEqual(self.call_count(), 2)
+
+    def test_opts_pillar(self):
+        self.opts['grains']['virtual_test'] = 'yes'
+        self.assertTrue(self.loader()['vcache.test']())
+        self.assertEqual(self.call_count(), 1)
+
+        # The opts and pillar data read by __virtual__ matter
+        self.opts['virtual_off'] = True
+        self.assertNotIn('vcachemod.test', self.loader())
+        self.assertNotIn('vcachemod.test', self.loader())
+        self.assertEqual(self.call_count(), 2)
+        self.opts['virtual_off'] = False
+        self.opts['pillar'] = {'virtual_off': True}
+        self.assertNotIn('vcachemod.test', self.loader())
+        self.assertEqual(self.call_count(), 3)
+
+        # The ones which were not read do not
+        self.opts['other'] = 1
+        self.opts['pillar']['other'] = 1
+        self.assertNotIn('vcachemod.test', self.loader())
+        self.assertEqual(self.call_count(), 3)
+
+    def test_write_interval(self):
+        loader = self.loader()
+        with patch.object(loader, '_write_virtual_cache',
+                          wraps=loader._write_virtual_cache) as write:
+            self.assertNotIn('vcachemod.test', loader)
+            # The results of the following lazy loads are written together
+            self.write_module(1, name='vcachemod2')
+            self.assertNotIn('vcachemod2.test', loader)
+            self.assertEqual(write.call_count, 1)
+            loader._load_all()
+            self.assertEqual(write.call_count, 2)
+        self.assertNotIn('vcachemod2.test', self.loader())
+        self.assertEqual(self.call_count(), 2)
+
+    def test_config_changed(self):
+        self.opts['conf_file'] = os.path.join(self.tmp_dir, 'minion')
+        with salt.utils.fopen(self.opts['conf_file'], 'w') as fh:
+            fh.write('id: web1\n')
+        os.mkdir(os.path.join(self.tmp_dir, 'minion.d'))
+        self.loader()._load_all()
+        self.loader()._load_all()
+        self.assertEqual(self.call_count(), 1)
+
+        # A file added to minion.d clears the cache
+        with salt.utils.fopen(os.path.join(self.tmp_dir, 'minion.d', 'foo.conf'), 'w') as fh:
+            fh.write('foo: bar\n')
+        self.loader()._load_all()
+        self.assertEqual(self.call_count(), 2)
+
+    def test_disabled(self):
+        self.opts['virtual_cache'] = False
+        self.loader()._load_all()
+        self.loader()._load_all()
+        self.assertEqual(self.call_count(), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.cachedir, 'loader')))
+
+
 submodule_template = '''
 import lib
 
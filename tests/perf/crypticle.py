@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+'''
+Time Crypticle encryption and decryption for payloads of 1KB to 10MB
+
+    python tests/perf/crypticle.py [iterations]
+'''
+
+from __future__ import absolute_import, print_function
+# Import system libs
+import os
+import sys
+import timeit
+
+# Import salt libs
+import salt.crypt
+
+SIZES = (1024, 64 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+
+
+def run(iterations=20):
+    '''
+    Print the mean time and throughput of encrypt and decrypt for every size
+    '''
+    crypticle = salt.crypt.Crypticle({}, salt.crypt.Crypticle.generate_key_string())
+    print('{0:>10} {1:>12} {2:>10} {3:>12} {4:>10}'.format(
+        'size', 'encrypt ms', 'MB/s', 'decrypt ms', 'MB/s'))
+    for size in SIZES:
+        data = os.urandom(size)
+        encrypted = crypticle.encrypt(data)
+        assert crypticle.decrypt(encrypted) == data
+        # Fewer rounds for the large payloads
+        number = max(1, iterations * 1024 * 1024 // max(size, 1024 * 1024) // 4)
+        enc = min(timeit.repeat(lambda: crypticle.encrypt(data),
+                                repeat=3, number=number)) / number
+        dec = min(timeit.repeat(lambda: crypticle.decrypt(encrypted),
+                                repeat=3, number=number)) / number
+        print('{0:>10} {1:>12.3f} {2:>10.1f} {3:>12.3f} {4:>10.1f}'.format(
+            size,
+            enc * 1000, size / enc / 1024 / 1024,
+            dec * 1000, size / dec / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:]])
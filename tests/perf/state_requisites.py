@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+'''
+Time the requisite handling of a synthetic highstate, 20000 states by default
+
+    python tests/perf/state_requisites.py [states]
+
+Every state requires the state before it, every tenth state is required by
+name through require_in and every hundredth state requires a whole sls.
+'''
+
+from __future__ import absolute_import, print_function
+# Import system libs
+import sys
+import time
+import shutil
+import tempfile
+
+# Import salt libs
+import salt.config
+import salt.loader
+import salt.state
+
+
+def high_data(count):
+    '''
+    Return the high data of count test states in count / 100 sls files
+    '''
+    high = {}
+    for num in range(count):
+        args = ['succeed_without_changes',
+                {'name': 'name{0}'.format(num)},
+                {'order': num}]
+        if num:
+            args.append({'require': [{'test': 'state{0}'.format(num - 1)}]})
+        if num % 10 == 9:
+            args.append({'require_in': [{'test': 'name{0}'.format(num - 5)}]})
+        if num % 100 == 99:
+            args.append({'require': [{'sls': 'sls{0}'.format(num // 100 - 1)}]})
+        high['state{0}'.format(num)] = {'test': args,
+                                        '__sls__': 'sls{0}'.format(num // 100),
+                                        '__env__': 'base'}
+    return high
+
+
+def run(count=20000):
+    root_dir = tempfile.mkdtemp()
+    try:
+        opts = salt.config.minion_config(None)
+        opts['root_dir'] = root_dir
+        opts['cachedir'] = root_dir
+        opts['file_client'] = 'local'
+        opts['file_roots'] = {'base': [root_dir]}
+        opts['pillar_roots'] = {'base': [root_dir]}
+        opts['state_events'] = False
+        opts['grains'] = salt.loader.grains(opts)
+        state = salt.state.State(opts)
+        # The state functions are not what is measured
+        state.call = lambda low, chunks=None, running=None: {
+            'result': True, 'changes': {}, 'comment': '', 'name': low['name'],
+            '__run_num__': 0}
+        high = high_data(count)
+
+        start = time.time()
+        high, errors = state.requisite_in(high)
+        assert not errors, errors
+        chunks = state.compile_high_data(high)
+        compiled = time.time()
+        running = state.call_chunks(chunks)
+        done = time.time()
+        assert len(running) == count, len(running)
+        print('{0} states: requisite_in and compile {1:.2f}s, '
+              'call_chunks {2:.2f}s'.format(count, compiled - start, done - compiled))
+    finally:
+        shutil.rmtree(root_dir)
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:]])
@@ -5,17 +5,24 @@
 
 # Import python libs
 from __future__ import absolute_import
+import os
+import time
 
 # Import Salt Testing libs
 from salttesting import TestCase, skipIf
 from salttesting.helpers import ensure_in_syspath
-from salttesting.mock import patch, NO_MOCK, NO_MOCK_REASON
+from salttesting.mock import MagicMock, patch, NO_MOCK, NO_MOCK_REASON
 ensure_in_syspath('../')
 
+# Import 3rd-party libs
+from tornado.testing import AsyncTestCase
+
 # Import Salt libs
 import integration
 from salt import client
+from salt.utils import event
 from salt.exceptions import EauthAuthenticationError, SaltInvocationError, SaltClientError
+from unit.utils.event_test import eventpublisher_process, eventsender_process, SOCK_DIR  # pylint: disable=import-error
 
 
 @skipIf(NO_MOCK, NO_MOCK_REASON)
@@ -76,6 +83,162 @@ class LocalClientTestCase(TestCase,
                                   'non_existent_group', 'test.ping', expr_form='nodegroup')
 
 
+class ReturnCollectorTestCase(AsyncTestCase):
+    '''
+    Test collecting the returns of a job from events
+    '''
+    def setUp(self):
+        super(ReturnCollectorTestCase, self).setUp()
+        self.opts = {'timeout': 0.1, 'gather_job_timeout': 0.1}
+        self.batches = []
+        self.find_jobs = []
+
+    def _find_job(self, jid):
+        self.find_jobs.append(jid)
+        return {'jid': '2{0}'.format(len(self.find_jobs)), 'minions': ['m1', 'm2']}
+
+    def _collector(self, minions, **kwargs):
+        collector = client.ReturnCollector(self.opts,
+                                           '1',
+                                           minions,
+                                           self.batches.append,
+                                           find_job=self._find_job,
+                                           io_loop=self.io_loop,
+                                           **kwargs)
+        collector.future.add_done_callback(self.stop)
+        collector.start()
+        return collector
+
+    def _ret(self, jid, id_, ret=True):
+        return ('salt/job/{0}/ret/{1}'.format(jid, id_),
+                {'jid': jid, 'id': id_, 'return': ret, 'retcode': 0})
+
+    def test_all_returned(self):
+        self.opts['timeout'] = 10
+        collector = self._collector(['m1', 'm2', 'm3'], batch_size=2)
+        self.assertFalse(collector.handle_event('salt/job/2/ret/m1', {'id': 'm1', 'return': 1}))
+        self.assertTrue(collector.handle_event(*self._ret('1', 'm1')))
+        self.assertEqual(self.batches, [])
+        collector.handle_event(*self._ret('1', 'm2'))
+        self.assertEqual(len(self.batches), 1)
+        collector.handle_event(*self._ret('1', 'm3', ret=False))
+        self.wait()
+        self.assertEqual(collector.future.result(), set())
+        self.assertEqual(self.batches[1], [{'m3': {'ret': False, 'retcode': 0}}])
+        self.assertEqual(self.find_jobs, [])
+
+    def test_batch_wait(self):
+        self.opts['timeout'] = 10
+        self._collector(['m1', 'm2'], batch_size=10).handle_event(*self._ret('1', 'm1'))
+        self.io_loop.call_later(0.2, self.stop)
+        self.wait()
+        self.assertEqual(self.batches, [[{'m1': {'ret': True, 'retcode': 0}}]])
+
+    def test_not_running(self):
+        collector = self._collector(['m1', 'm2'])
+        self.wait()
+        self.assertEqual(collector.future.result(), set(['m1', 'm2']))
+        self.assertEqual(self.find_jobs, ['1'])
+
+    def test_running(self):
+        collector = self._collector(['m1', 'm2'])
+        # m2 runs the job each time it is asked, then returns
+        running = [self._ret('21', 'm2', {'jid': '1'}), self._ret('22', 'm2', {'jid': '1'})]
+
+        def find_job(jid):
+            ret = self._find_job(jid)
+            if running:
+                self.io_loop.add_callback(collector.handle_event, *running.pop(0))
+            else:
+                collector.handle_event(*self._ret('1', 'm2'))
+            return ret
+        collector.find_job = find_job
+        self.wait()
+        self.assertEqual(collector.future.result(), set(['m1']))
+        self.assertEqual(self.find_jobs, ['1', '1', '1'])
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class CollectedReturnsTestCase(TestCase):
+    '''
+    Test LocalClient.get_collected_returns with the events of a publisher
+    '''
+    def setUp(self):
+        if not os.path.exists(SOCK_DIR):
+            os.makedirs(SOCK_DIR)
+
+    def _client(self):
+        local = client.LocalClient.__new__(client.LocalClient)
+        local.opts = {'transport': 'zeromq', 'timeout': 5, 'gather_job_timeout': 1}
+        local.event = event.MasterEvent(SOCK_DIR)
+        local.event.subscribe('salt/job/2')
+        local._job_filters = {}
+        return local
+
+    def test_collected_returns(self):
+        with eventpublisher_process():
+            local = self._client()
+            # Read by get_event while waiting for another job
+            local.event.pending_events.append(
+                {'tag': 'salt/job/1/ret/m1', 'data': {'id': 'm1', 'return': 1}})
+            with eventsender_process({'id': 'm2', 'return': 2}, 'salt/job/1/ret/m2', 1):
+                with eventsender_process({'id': 'm1', 'return': 3}, 'salt/job/2/ret/m1', 0.5):
+                    start = time.time()
+                    rets = list(local.get_collected_returns('1', ['m1', 'm2']))
+                    self.assertLess(time.time() - start, 5)
+            self.assertEqual(rets, [{'m1': {'ret': 1}}, {'m2': {'ret': 2}}])
+            # The return of the other job is kept for it
+            self.assertEqual([(evt['tag'], evt['data']['return'])
+                              for evt in local.event.pending_events],
+                             [('salt/job/2/ret/m1', 3)])
+
+    def test_expect_minions(self):
+        with eventpublisher_process():
+            local = self._client()
+            local.opts['timeout'] = 0.5
+            with patch.object(local, 'gather_job_info', return_value={}):
+                rets = list(local.get_collected_returns('1', ['m1'], timeout=0.5,
+                                                        expect_minions=True))
+            self.assertEqual(rets, [{'m1': {'failed': True}}])
+
+    def test_job_filters(self):
+        with eventpublisher_process():
+            local = self._client()
+            local.opts.update({'order_masters': True, 'syndic_wait': 0})
+            # Added by pub for two jobs
+            local._add_job_filters('1')
+            local._add_job_filters('3')
+            self.assertEqual(local.event.tag_filters,
+                             {'salt/job/1': 1, '1': 1, 'salt/job/3': 1, '3': 1,
+                              'syndic/': 2})
+            with eventsender_process({'id': 'm1', 'return': 1}, 'salt/job/1/ret/m1', 0.5):
+                rets = list(local.get_collected_returns('1', ['m1']))
+            self.assertEqual(rets, [{'m1': {'ret': 1}}])
+            # Only the filters of the other job are left
+            self.assertEqual(local.event.tag_filters,
+                             {'salt/job/3': 1, '3': 1, 'syndic/': 1})
+
+    def test_listen(self):
+        with eventpublisher_process():
+            local = self._client()
+            local.opts.update({'client_event_filter': True,
+                               'sock_dir': SOCK_DIR,
+                               'interface': '127.0.0.1',
+                               'ret_port': 4506})
+            channel = MagicMock()
+            channel.send.side_effect = lambda load, **kwargs: {
+                'load': {'jid': load['jid'], 'minions': ['m1']}}
+            with patch('os.path.exists', return_value=True), \
+                    patch.object(local, '_prep_pub', lambda *args, **kwargs: {'jid': args[5]}), \
+                    patch('salt.transport.Channel.factory', return_value=channel):
+                # Nothing collects the returns of a job only published
+                local.run_job('m1', 'test.ping', jid='1')
+                self.assertEqual(local.event.tag_filters, {})
+                local.run_job('m1', 'test.ping', jid='2', listen=True)
+            self.assertEqual(local.event.tag_filters, {'salt/job/2': 1, '2': 1})
+
+
 if __name__ == '__main__':
     from integration import run_tests
-    run_tests(LocalClientTestCase, needs_daemon=False)
+    run_tests([LocalClientTestCase, ReturnCollectorTestCase, CollectedReturnsTestCase],
+              needs_daemon=False)
@@ -2,6 +2,12 @@
 
 # python libs
 from __future__ import absolute_import
+import os
+import hmac
+import shutil
+import pickle
+import hashlib
+import tempfile
 
 # salt testing libs
 from salttesting import TestCase, skipIf
@@ -13,10 +19,12 @@ ensure_in_syspath('../')
 # salt libs
 import salt.utils
 from salt import crypt
+from salt.exceptions import AuthenticationError
 
 # third-party libs
 try:
     import Crypto.PublicKey.RSA  # pylint: disable=unused-import
+    from Crypto.Cipher import AES
     HAS_PYCRYPTO_RSA = True
 except ImportError:
     HAS_PYCRYPTO_RSA = False
@@ -103,11 +111,86 @@ class CryptTestCase(TestCase):
         with patch('salt.utils.fopen', mock_open(read_data=PRIVKEY_DATA)):
             self.assertEqual(SIG, crypt.sign_message('/keydir/keyname.pem', MSG))
 
+    def test_get_rsa_key_cached(self):
+        with patch.dict(crypt._RSA_KEYS, clear=True):
+            with patch('salt.utils.fopen', mock_open(read_data=PRIVKEY_DATA)):
+                key = crypt.get_rsa_key('/keydir/keyname.pem')
+                self.assertIs(crypt.get_rsa_key('/keydir/keyname.pem'), key)
+                self.assertEqual(salt.utils.fopen.call_count, 1)
+
+    def test_get_minion_pub(self):
+        pki_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pki_dir)
+        os.makedirs(os.path.join(pki_dir, 'minions'))
+        pub_path = os.path.join(pki_dir, 'minions', 'minion1')
+        with salt.utils.fopen(pub_path, 'w') as fp_:
+            fp_.write(PUBKEY_DATA)
+        with patch.dict(crypt._MINION_PUBS, clear=True):
+            with patch('salt.crypt.RSA.importKey', wraps=crypt.RSA.importKey) as import_key:
+                # The key is parsed once
+                key = crypt.get_minion_pub(pki_dir, 'minion1')
+                self.assertIs(crypt.get_minion_pub(pki_dir, 'minion1'), key)
+                self.assertEqual(import_key.call_count, 1)
+
+                # and again once the key file changed
+                stat = os.stat(pub_path)
+                os.utime(pub_path, (stat.st_atime, stat.st_mtime + 10))
+                crypt.get_minion_pub(pki_dir, 'minion1')
+                self.assertEqual(import_key.call_count, 2)
+                with salt.utils.fopen(pub_path, 'a') as fp_:
+                    fp_.write('\n')
+                os.utime(pub_path, (stat.st_atime, stat.st_mtime + 10))
+                crypt.get_minion_pub(pki_dir, 'minion1')
+                self.assertEqual(import_key.call_count, 3)
+
+            # A deleted key is dropped
+            os.remove(pub_path)
+            self.assertRaises(OSError, crypt.get_minion_pub, pki_dir, 'minion1')
+            self.assertNotIn(pub_path, crypt._MINION_PUBS)
+
     def test_verify_signature(self):
         with patch('salt.utils.fopen', mock_open(read_data=PUBKEY_DATA)):
             self.assertTrue(crypt.verify_signature('/keydir/keyname.pub', MSG, SIG))
 
 
+@skipIf(not HAS_PYCRYPTO_RSA, 'pycrypto >= 2.6 is not available')
+class CrypticleTestCase(TestCase):
+    '''
+    Test that Crypticle keeps its wire format: IV + AES-CBC + HMAC-SHA256
+    '''
+    def setUp(self):
+        self.crypticle = crypt.Crypticle({}, crypt.Crypticle.generate_key_string())
+        self.aes_key, self.hmac_key = self.crypticle.keys
+
+    def _encrypt(self, data):
+        pad = 16 - len(data) % 16
+        iv_bytes = '\x01' * 16
+        data = iv_bytes + AES.new(self.aes_key, AES.MODE_CBC, iv_bytes).encrypt(data + pad * chr(pad))
+        return data + hmac.new(self.hmac_key, data, hashlib.sha256).digest()
+
+    def test_decrypt(self):
+        for data in ('', 'x' * 15, 'x' * 16, 'x' * 4097):
+            self.assertEqual(self.crypticle.decrypt(self._encrypt(data)), data)
+
+    def test_encrypt(self):
+        data = self.crypticle.encrypt('foo' * 100)
+        iv_bytes, sig = data[:16], data[-32:]
+        self.assertEqual(hmac.new(self.hmac_key, data[:-32], hashlib.sha256).digest(), sig)
+        plain = AES.new(self.aes_key, AES.MODE_CBC, iv_bytes).decrypt(data[16:-32])
+        self.assertEqual(plain[:-ord(plain[-1])], 'foo' * 100)
+
+    def test_tampered(self):
+        data = self.crypticle.encrypt('foo')
+        tampered = data[:20] + chr(ord(data[20]) ^ 1) + data[21:]
+        self.assertRaises(AuthenticationError, self.crypticle.decrypt, tampered)
+        self.assertRaises(AuthenticationError, self.crypticle.decrypt, data[:40])
+
+    def test_pickle(self):
+        crypticle = pickle.loads(pickle.dumps(self.crypticle))
+        self.assertEqual(crypticle.loads(self.crypticle.dumps({'foo': 'bar'})),
+                         {'foo': 'bar'})
+
+
 if __name__ == '__main__':
     from integration import run_tests
-    run_tests(CryptTestCase, needs_daemon=False)
+    run_tests([CryptTestCase, CrypticleTestCase], needs_daemon=False)
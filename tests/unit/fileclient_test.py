@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.fileclient_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test fetching files from the master in windows of several chunks or as
+    deltas of the cached copy, and caching directories with file manifests
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import os
+import shutil
+import hashlib
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+
+ensure_in_syspath('../')
+
+# Import salt libs
+import salt.fileclient
+import salt.fileserver
+import salt.utils
+
+
+class FakeChannel(object):
+    '''
+    Serve a single file like the master does, with or without support for
+    windows of chunks and deltas
+    '''
+    def __init__(self, path, windows=True, deltas=True):
+        self.path = path
+        self.windows = windows
+        self.deltas = deltas
+        self.opts = {'file_buffer_size': 1024}
+        self.loads = []
+
+    def send(self, load):
+        self.loads.append(dict(load))
+        if load['cmd'] == '_file_hash':
+            return {'hsum': salt.utils.get_hash(self.path, 'md5'),
+                    'hash_type': 'md5'}
+        if not self.windows:
+            load = dict(load)
+            load.pop('window', None)
+        if not self.deltas:
+            load = dict(load)
+            load.pop('delta', None)
+        ret = {'dest': 'foo.tar'}
+        ret.update(salt.fileserver.read_chunk(self.path, load, self.opts))
+        return ret
+
+
+class RemoteClientTestCase(TestCase):
+    '''
+    Test RemoteClient.get_file with and without windows
+    '''
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp, 'source')
+        self.dest = os.path.join(self.tmp, 'dest')
+        self.data = os.urandom(10 * 1024 + 10)
+        with salt.utils.fopen(self.source, 'wb') as fp_:
+            fp_.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _get_file(self, window, windows=True):
+        client = salt.fileclient.RemoteClient.__new__(salt.fileclient.RemoteClient)
+        client.opts = {'file_transfer_window': window}
+        client.channel = FakeChannel(self.source, windows)
+        self.assertEqual(client.get_file('salt://foo.tar', self.dest), self.dest)
+        with salt.utils.fopen(self.dest, 'rb') as fp_:
+            self.assertEqual(hashlib.md5(fp_.read()).hexdigest(),
+                             hashlib.md5(self.data).hexdigest())
+        os.remove(self.dest)
+        # Leave out the hash request
+        return [load for load in client.channel.loads if load['cmd'] == '_serve_file']
+
+    def test_window(self):
+        loads = self._get_file(4)
+        # 11 chunks in windows of 4, the last one ends the file
+        self.assertEqual([load['loc'] for load in loads], [0, 4096, 8192])
+        self.assertTrue(all(load['window'] == 4 for load in loads))
+
+    def test_no_window(self):
+        loads = self._get_file(1)
+        self.assertEqual(len(loads), 12)
+        self.assertNotIn('window', loads[0])
+
+    def test_old_master(self):
+        # A master ignoring the window sends a chunk per request
+        loads = self._get_file(4, windows=False)
+        self.assertEqual([load['loc'] for load in loads],
+                         [num * 1024 for num in range(11)] + [len(self.data)])
+
+    def test_bad_download(self):
+        client = salt.fileclient.RemoteClient.__new__(salt.fileclient.RemoteClient)
+        client.opts = {'file_transfer_window': 32}
+        client.channel = FakeChannel(self.source)
+        send = client.channel.send
+        sent = []
+
+        def corrupt(load):
+            ret = send(load)
+            if load['cmd'] == '_serve_file' and not sent:
+                ret['data'] = b'x' + ret['data'][1:]
+            sent.append(load)
+            return ret
+        client.channel.send = corrupt
+        client.get_file('salt://foo.tar', self.dest)
+        with salt.utils.fopen(self.dest, 'rb') as fp_:
+            self.assertEqual(fp_.read(), self.data)
+
+
+class DeltaTestCase(TestCase):
+    '''
+    Test updating a changed file in the cache with a delta
+    '''
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp, 'source')
+        self.dest = os.path.join(self.tmp, 'dest')
+        self.data = os.urandom(1024 * 1024)
+        with salt.utils.fopen(self.dest, 'wb') as fp_:
+            fp_.write(self.data)
+        self.data = self.data[:100000] + b'changed' + self.data[100000:]
+        with salt.utils.fopen(self.source, 'wb') as fp_:
+            fp_.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _get_file(self, channel):
+        client = salt.fileclient.RemoteClient.__new__(salt.fileclient.RemoteClient)
+        client.opts = {'file_transfer_window': 1, 'file_delta_min_size': 1024}
+        client.channel = channel
+        self.assertEqual(client.get_file('salt://foo.tar', self.dest), self.dest)
+        with salt.utils.fopen(self.dest, 'rb') as fp_:
+            self.assertEqual(fp_.read(), self.data)
+        # No temporary file is left behind
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['dest', 'source'])
+        return [load for load in channel.loads if load['cmd'] == '_serve_file']
+
+    def test_delta(self):
+        channel = FakeChannel(self.source)
+        channel.opts['file_buffer_size'] = 128 * 1024
+        loads = self._get_file(channel)
+        self.assertTrue(all('delta' in load for load in loads))
+        # The unchanged blocks are not sent, so a single round covers the file
+        self.assertEqual(len(loads), 1)
+
+    def test_delta_gzip(self):
+        channel = FakeChannel(self.source)
+        client = salt.fileclient.RemoteClient.__new__(salt.fileclient.RemoteClient)
+        client.opts = {'file_transfer_window': 1, 'file_delta_min_size': 1024}
+        client.channel = channel
+        client.get_file('salt://foo.tar', self.dest, gzip=1)
+        with salt.utils.fopen(self.dest, 'rb') as fp_:
+            self.assertEqual(fp_.read(), self.data)
+
+    def test_old_master(self):
+        loads = self._get_file(FakeChannel(self.source, deltas=False))
+        self.assertIn('delta', loads[0])
+        self.assertNotIn('delta', loads[1])
+
+    def test_bad_delta(self):
+        channel = FakeChannel(self.source)
+        send = channel.send
+
+        def corrupt(load):
+            ret = send(load)
+            if 'delta' in ret:
+                ret['delta'] = [0] + ret['delta']
+            return ret
+        channel.send = corrupt
+        loads = self._get_file(channel)
+        self.assertNotIn('delta', loads[-1])
+
+
+class ManifestTestCase(TestCase):
+    '''
+    Test that cache_dir and cache_master only fetch the changed files listed
+    in the manifest
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.files = {'foo/a.txt': b'a', 'foo/b.txt': b'b', 'bar/c.txt': b'c'}
+        self.client = salt.fileclient.RemoteClient.__new__(salt.fileclient.RemoteClient)
+        self.client.opts = {'cachedir': self.cachedir}
+        self.client.channel = self
+        self.fetched = []
+        self.manifests = True
+        self.client.cache_file = self._cache_file
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def send(self, load):
+        if load['cmd'] == '_file_list':
+            return sorted(self.files)
+        if load['cmd'] == '_file_manifest' and self.manifests:
+            return dict(
+                (path, {'hsum': hashlib.md5(data).hexdigest(),
+                        'hash_type': 'md5',
+                        'size': len(data)})
+                for path, data in self.files.items()
+                if path.startswith(load['prefix']))
+        return False
+
+    def _cache_file(self, path, saltenv):
+        path = path[len('salt://'):]
+        self.fetched.append(path)
+        dest = os.path.join(self.cachedir, 'files', saltenv, path)
+        if not os.path.isdir(os.path.dirname(dest)):
+            os.makedirs(os.path.dirname(dest))
+        with salt.utils.fopen(dest, 'wb') as fp_:
+            fp_.write(self.files[path])
+        return dest
+
+    def test_cache_dir(self):
+        self.assertEqual(len(self.client.cache_dir('salt://foo')), 2)
+        self.assertEqual(self.fetched, ['foo/a.txt', 'foo/b.txt'])
+        del self.fetched[:]
+        self.files['foo/b.txt'] = b'bb'
+        ret = self.client.cache_dir('salt://foo')
+        self.assertEqual(ret, [os.path.join(self.cachedir, 'files', 'base', 'foo', name)
+                               for name in ('a.txt', 'b.txt')])
+        self.assertEqual(self.fetched, ['foo/b.txt'])
+
+    def test_cache_master(self):
+        self.client.cache_master()
+        del self.fetched[:]
+        self.files['bar/c.txt'] = b'd'
+        self.assertEqual(len(self.client.cache_master()), 3)
+        self.assertEqual(self.fetched, ['bar/c.txt'])
+
+    def test_old_master(self):
+        self.manifests = False
+        self.client.cache_dir('salt://foo')
+        self.client.cache_dir('salt://foo')
+        self.assertEqual(self.fetched, ['foo/a.txt', 'foo/b.txt'] * 2)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests([RemoteClientTestCase, DeltaTestCase, ManifestTestCase], needs_daemon=False)
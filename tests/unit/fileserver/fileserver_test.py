@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.fileserver.fileserver_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the file manifests of the fileserver
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import os
+import shutil
+import hashlib
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.config
+import salt.fileserver
+import salt.utils
+
+
+class FileManifestTestCase(TestCase):
+    '''
+    Test Fileserver.file_manifest with the roots backend
+    '''
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cachedir = tempfile.mkdtemp()
+        for path in ('top.sls', 'foo/init.sls', 'foo/bar.txt'):
+            self._write(path, path)
+        opts = salt.config.master_config(None)
+        opts['cachedir'] = self.cachedir
+        opts['file_roots'] = {'base': [self.root]}
+        opts['fileserver_backend'] = ['roots']
+        self.fs_ = salt.fileserver.Fileserver(opts)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        shutil.rmtree(self.cachedir)
+
+    def _write(self, path, data):
+        path = os.path.join(self.root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with salt.utils.fopen(path, 'w') as fp_:
+            fp_.write(data)
+
+    def test_file_manifest(self):
+        manifest = self.fs_.file_manifest({'saltenv': 'base', 'prefix': 'foo/'})
+        self.assertEqual(sorted(manifest), ['foo/bar.txt', 'foo/init.sls'])
+        self.assertEqual(manifest['foo/bar.txt'],
+                         {'hsum': hashlib.md5(b'foo/bar.txt').hexdigest(),
+                          'hash_type': 'md5',
+                          'size': len('foo/bar.txt')})
+        self.assertEqual(len(self.fs_.file_manifest({'saltenv': 'base'})), 3)
+        self.assertEqual(self.fs_.file_manifest({'saltenv': 'dev'}), {})
+
+    def test_file_manifest_cache(self):
+        load = {'saltenv': 'base', 'prefix': 'foo'}
+        manifest = self.fs_.file_manifest(load)
+        self.assertIs(self.fs_.file_manifest(load), manifest)
+        # A new file list cache makes a new manifest
+        os.remove(os.path.join(self.cachedir, 'file_lists', 'roots', 'base.p'))
+        self._write('foo/baz.txt', 'baz')
+        self.assertIn('foo/baz.txt', self.fs_.file_manifest(load))
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(FileManifestTestCase, needs_daemon=False)
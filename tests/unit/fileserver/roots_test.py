@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.fileserver.roots_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the roots watcher of the roots fileserver
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.mock import patch
+from salttesting.helpers import ensure_in_syspath
+
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.utils
+import salt.utils.inotify
+import salt.fileserver
+from salt.fileserver import roots
+
+roots.__opts__ = {}
+
+
+class RootsWatcherTestCase(TestCase):
+    '''
+    Test that the roots watcher keeps the same file lists as walking the
+    file_roots
+    '''
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cachedir = tempfile.mkdtemp()
+        for path in ('top.sls', 'foo/init.sls', 'foo/bar/baz.txt'):
+            self._write(path)
+        os.makedirs(os.path.join(self.root, 'empty'))
+        self.opts = {'cachedir': self.cachedir,
+                     'file_roots': {'base': [self.root]},
+                     'fileserver_ignoresymlinks': False,
+                     'fileserver_followsymlinks': False,
+                     'file_ignore_regex': False,
+                     'file_ignore_glob': False}
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        shutil.rmtree(self.cachedir)
+
+    def _write(self, path, data='foo'):
+        path = os.path.join(self.root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with salt.utils.fopen(path, 'w') as fp_:
+            fp_.write(data)
+
+    def _walk(self):
+        '''
+        Return the file lists from walking the file_roots
+        '''
+        ret = {}
+        with patch.dict(roots.__opts__, self.opts):
+            for form in ('files', 'dirs', 'empty_dirs', 'links'):
+                ret[form] = sorted(roots._file_lists({'saltenv': 'base'}, form))
+            shutil.rmtree(os.path.join(self.cachedir, 'file_lists'))
+        return ret
+
+    def _check(self, watcher):
+        lists = watcher.file_lists('base')
+        for form in lists:
+            lists[form] = sorted(lists[form])
+        self.assertEqual(lists, self._walk())
+        self.assertEqual(watcher.mtime_map(), salt.fileserver.generate_mtime_map(
+            self.opts['file_roots'],
+            followlinks=self.opts['fileserver_followsymlinks']))
+
+    def _check_changes(self, watcher):
+        self._check(watcher)
+        self.assertEqual(watcher.refresh(), [])
+
+        self._write('new/file.sls')
+        self.assertEqual(watcher.refresh(), ['base'])
+        self._check(watcher)
+
+        os.rename(os.path.join(self.root, 'foo'),
+                  os.path.join(self.root, 'moved'))
+        self.assertEqual(watcher.refresh(), ['base'])
+        self._check(watcher)
+
+        os.remove(os.path.join(self.root, 'top.sls'))
+        shutil.rmtree(os.path.join(self.root, 'empty'))
+        self.assertEqual(watcher.refresh(), ['base'])
+        self._check(watcher)
+        self.assertNotIn(os.path.join(self.root, 'top.sls'), watcher.mtime_map())
+        self.assertIn(os.path.join(self.root, 'moved', 'bar', 'baz.txt'),
+                      watcher.mtime_map())
+
+    def test_inotify(self):
+        if not salt.utils.inotify.available():
+            self.skipTest('inotify is not available')
+        watcher = roots._RootsWatcher(self.opts)
+        self.assertIsNotNone(watcher.inotify)
+        try:
+            self._check_changes(watcher)
+        finally:
+            watcher.close()
+
+    def test_polling(self):
+        with patch('salt.utils.inotify.available', lambda: False):
+            watcher = roots._RootsWatcher(self.opts)
+        self.assertIsNone(watcher.inotify)
+        self._check_changes(watcher)
+
+    def test_symlinks(self):
+        linked = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, linked)
+        with salt.utils.fopen(os.path.join(linked, 'linked.sls'), 'w') as fp_:
+            fp_.write('foo')
+        os.symlink(linked, os.path.join(self.root, 'linked'))
+        for followlinks in (False, True):
+            self.opts['fileserver_followsymlinks'] = followlinks
+            with patch('salt.utils.inotify.available', lambda: False):
+                watcher = roots._RootsWatcher(self.opts)
+            self._check(watcher)
+            self.assertEqual(
+                os.path.join(self.root, 'linked', 'linked.sls') in watcher.mtime_map(),
+                followlinks)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(RootsWatcherTestCase, needs_daemon=False)
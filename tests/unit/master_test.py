@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.master_test
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Test sending publications from ClearFuncs
+'''
+
+# Import python libs
+from __future__ import absolute_import
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, MagicMock, patch
+
+ensure_in_syspath('../')
+
+# Import 3rd-party libs
+import tornado.concurrent
+
+# Import salt libs
+import salt.master
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class ClearFuncsTestCase(TestCase):
+    '''
+    Test that ClearFuncs publishes through its channels without waiting
+    '''
+    def _channel(self, exc=None):
+        future = tornado.concurrent.Future()
+        if exc is None:
+            future.set_result(None)
+        else:
+            future.set_exception(exc)
+        chan = MagicMock()
+        chan.publish_async.return_value = future
+        return chan
+
+    def test_send_pub(self):
+        clear_funcs = salt.master.ClearFuncs.__new__(salt.master.ClearFuncs)
+        clear_funcs.channels = [self._channel(IOError('closed')), self._channel()]
+        load = {'fun': 'test.ping'}
+        with patch('salt.master.log') as log:
+            clear_funcs._send_pub(load)
+        # Every channel is used, and a failed one is only logged
+        for chan in clear_funcs.channels:
+            chan.publish_async.assert_called_once_with(load)
+        self.assertEqual(log.error.call_count, 1)
+        self.assertIn('closed', log.error.call_args[0][0])
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(ClearFuncsTestCase, needs_daemon=False)
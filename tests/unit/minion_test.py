@@ -6,13 +6,20 @@
 # Import python libs
 from __future__ import absolute_import
 import os
+import time
+import shutil
+import signal
+import tempfile
 
 # Import Salt Testing libs
 from salttesting import TestCase, skipIf
 from salttesting.helpers import ensure_in_syspath
-from salttesting.mock import NO_MOCK, NO_MOCK_REASON, patch
+from salttesting.mock import NO_MOCK, NO_MOCK_REASON, MagicMock, patch
 
 # Import salt libs
+import salt.payload
+import salt.utils
+import salt.utils.cache
 from salt import minion
 from salt.utils import event
 from salt.exceptions import SaltSystemExit
@@ -53,6 +60,170 @@ class MinionTestCase(TestCase):
         self.assertTrue(result)
 
 
+class JobWorkerPoolTestCase(TestCase):
+    '''
+    Test the pre-forked job workers of the minion
+    '''
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.pool = minion.JobWorkerPool(
+            {'job_pool_size': 2, 'job_pool_max_jobs': 2}, self._target)
+
+    def tearDown(self):
+        self.pool.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _target(self, data):
+        time.sleep(data.get('sleep', 0))
+        with salt.utils.fopen(os.path.join(self.tmp_dir, data['jid']), 'w') as fp_:
+            fp_.write(str(os.getpid()))
+
+    def _wait(self, jid):
+        path = os.path.join(self.tmp_dir, jid)
+        for _ in range(100):
+            if os.path.isfile(path):
+                # Let the worker report back
+                time.sleep(0.1)
+                self.pool.reap()
+                with salt.utils.fopen(path) as fp_:
+                    return int(fp_.read())
+            time.sleep(0.05)
+        self.fail('job {0} did not run'.format(jid))
+
+    def test_run(self):
+        self.assertTrue(self.pool.run({'jid': '1'}))
+        pid = self._wait('1')
+        self.assertIn(pid, [worker['process'].pid for worker in self.pool.workers])
+        self.assertTrue(self.pool.run({'jid': '2'}))
+        self.assertEqual(self._wait('2'), pid)
+
+        # Recycled after job_pool_max_jobs jobs
+        self.assertTrue(self.pool.run({'jid': '3'}))
+        self.assertNotEqual(self._wait('3'), pid)
+        self.assertNotIn(pid, [worker['process'].pid for worker in self.pool.workers])
+
+    def test_busy(self):
+        self.assertTrue(self.pool.run({'jid': '1', 'sleep': 1}))
+        self.assertTrue(self.pool.run({'jid': '2', 'sleep': 1}))
+        self.assertFalse(self.pool.run({'jid': '3'}))
+
+    def test_killed(self):
+        self.assertTrue(self.pool.run({'jid': '1', 'sleep': 10}))
+        busy = [worker['process'] for worker in self.pool.workers if worker['busy']]
+        os.kill(busy[0].pid, signal.SIGKILL)
+        busy[0].join()
+        self.pool.reap()
+        self.assertNotIn(busy[0], [worker['process'] for worker in self.pool.workers])
+        self.assertTrue(self.pool.run({'jid': '2'}))
+        self._wait('2')
+        self.assertEqual(len(self.pool.workers), 2)
+
+    def test_new_state(self):
+        state = object()
+        self.assertTrue(self.pool.run({'jid': '1'}, state=state))
+        pid = self._wait('1')
+        self.assertTrue(self.pool.run({'jid': '2'}, state=object()))
+        self.assertNotEqual(self._wait('2'), pid)
+
+
+class FakeEvent(object):
+    '''
+    Hand the syndic the events as they are
+    '''
+    serial = None
+
+    @staticmethod
+    def unpack(raw, serial):
+        return raw
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class SyndicForwardTestCase(TestCase):
+    '''
+    Test the aggregation of the returns forwarded by the syndic
+    '''
+    def setUp(self):
+        self.syndic = minion.Syndic.__new__(minion.Syndic)
+        self.syndic.opts = {'id': 'syndic',
+                            'master_job_cache': 'local_cache',
+                            'syndic_forward_batch_size': 1048576,
+                            'timeout': 5,
+                            'syndic_jid_forward_cache_hwm': 100}
+        self.syndic.serial = salt.payload.Serial(self.syndic.opts)
+        self.syndic.functions = {}
+        self.syndic.jid_forward_cache = salt.utils.cache.LRUCache(100)
+        self.syndic.batch_returns = True
+        self.syndic.local = type('FakeLocal', (object, ), {'event': FakeEvent})
+        self.loaded = []
+        self.syndic.mminion = type('FakeMinion', (object, ), {
+            'returners': {'local_cache.get_load': self._get_load}})
+        self.syndic.syndic_cmd = lambda data: None
+        self.sent = []
+        self.batches = True
+        self.syndic._reset_event_aggregation()
+
+    def _get_load(self, jid):
+        self.loaded.append(jid)
+        return {'fun': 'test.ping', 'jid': jid}
+
+    def send(self, load, timeout=60):
+        if load['cmd'] == '_syndic_returns' and not self.batches:
+            return False
+        self.sent.append(load)
+        return True
+
+    def _returns(self, jid, minions):
+        for num in range(minions):
+            data = {'jid': jid, 'id': 'minion{0}'.format(num), 'return': True,
+                    'fun': 'test.ping'}
+            self.syndic._process_event([('salt/job/{0}/ret/{1}'.format(jid, data['id']),
+                                         data)])
+
+    def _forward(self):
+        with patch('salt.transport.Channel.factory', MagicMock(return_value=self)):
+            self.syndic._return_pubs(list(self.syndic.jids.values()))
+        self.syndic._reset_event_aggregation()
+
+    def test_forward(self):
+        # A job published from above, and one published on the syndic's master
+        self.syndic._handle_decoded_payload(
+            {'jid': '20150101000000000000', 'fun': 'test.ping', 'tgt': '*', 'to': 5})
+        self._returns('20150101000000000000', 2)
+        self._returns('20150101000000000001', 2)
+        self._forward()
+        self.assertEqual(self.loaded, ['20150101000000000001'])
+        self.assertEqual([load['cmd'] for load in self.sent], ['_syndic_returns'])
+        rets = dict((ret['jid'], ret) for ret in self.sent[0]['returns'])
+        self.assertEqual(rets['20150101000000000000']['load']['tgt'], '*')
+        self.assertEqual(rets['20150101000000000001']['load']['fun'], 'test.ping')
+        self.assertEqual(sorted(rets['20150101000000000000']['return']),
+                         ['minion0', 'minion1'])
+
+        # The loads are forwarded once
+        del self.sent[:]
+        self._returns('20150101000000000000', 1)
+        self._forward()
+        self.assertEqual(self.loaded, ['20150101000000000001'])
+        self.assertFalse(self.sent[0]['returns'][0]['load'])
+
+    def test_batch_size(self):
+        self.syndic.opts['syndic_forward_batch_size'] = 500
+        for num in range(10):
+            self._returns('2015010100000000000{0}'.format(num), 1)
+        self._forward()
+        self.assertTrue(1 < len(self.sent) < 10)
+        self.assertEqual(sum(len(load['returns']) for load in self.sent), 10)
+
+    def test_old_master(self):
+        self.batches = False
+        self._returns('20150101000000000000', 1)
+        self._returns('20150101000000000001', 1)
+        self._forward()
+        self.assertEqual([load['cmd'] for load in self.sent], ['_syndic_return'] * 2)
+        self.assertFalse(self.syndic.batch_returns)
+
+
 if __name__ == '__main__':
     from integration import run_tests
-    run_tests(MinionTestCase, needs_daemon=False)
+    run_tests([MinionTestCase, JobWorkerPoolTestCase, SyndicForwardTestCase],
+              needs_daemon=False)
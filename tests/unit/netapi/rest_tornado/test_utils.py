@@ -28,6 +28,7 @@ from salt.ext.six.moves import range  # pylint: disable=redefined-builtin
 # pylint: enable=import-error
 
 try:
+    import salt.client
     from salt.netapi.rest_tornado import saltnado
     HAS_TORNADO = True
 except ImportError:
@@ -131,6 +132,43 @@ class TestEventListener(AsyncTestCase):
             with self.assertRaises(saltnado.TimeoutException):
                 event_future.result()
 
+    def test_collector(self):
+        '''
+        Test handing the events of a job to a return collector
+        '''
+        with eventpublisher_process():
+            me = event.MasterEvent(SOCK_DIR)
+            event_listener = saltnado.EventListener({},  # we don't use mod_opts, don't save?
+                                                    {'sock_dir': SOCK_DIR,
+                                                     'transport': 'zeromq'})
+            request = type('FakeRequest', (object, ), {'_finished': False})()
+            batches = []
+            collector = salt.client.ReturnCollector({'timeout': 10},
+                                                    '1',
+                                                    ['m1', 'm2'],
+                                                    batches.append,
+                                                    batch_size=2,
+                                                    io_loop=self.io_loop)
+            collector.future.add_done_callback(self.stop)
+            event_listener.add_collector(request, collector)
+            me.fire_event({'id': 'm1', 'return': 1}, 'salt/job/1/ret/m1')
+            me.fire_event({'id': 'm1', 'return': 2}, 'salt/job/2/ret/m1')
+            me.fire_event({'id': 'm2', 'return': 3}, 'salt/job/1/ret/m2')
+            self.wait()
+            self.assertEqual(batches, [[{'m1': {'ret': 1}}, {'m2': {'ret': 3}}]])
+            self.assertEqual(event_listener.collector_map, {})
+
+            # Stopped when the request finishes
+            collector = salt.client.ReturnCollector({'timeout': 10},
+                                                    '1',
+                                                    ['m1'],
+                                                    batches.append,
+                                                    io_loop=self.io_loop)
+            event_listener.add_collector(request, collector)
+            event_listener.clean_timeout_futures(request)
+            with self.assertRaises(saltnado.TimeoutException):
+                collector.future.result()
+
 if __name__ == '__main__':
     from integration import run_tests  # pylint: disable=import-error
     run_tests(TestUtils, needs_daemon=False)
@@ -9,7 +9,9 @@
 
 # Import python libs
 from __future__ import absolute_import
+import shutil
 import tempfile
+import time
 
 # Import Salt Testing libs
 from salttesting import skipIf, TestCase
@@ -176,6 +178,62 @@ ssh:
         client.get_state.side_effect = get_state
 
 
+class PillarCacheTestCase(TestCase):
+    '''
+    Test the compiled pillar cache of the master
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.opts = {'cachedir': self.cachedir,
+                     'pki_dir': self.cachedir,
+                     'pillar_cache_ttl': 3600}
+        self.grains = {'os': 'Ubuntu', 'id': 'minion'}
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def _check_cache(self, backend):
+        self.opts['pillar_cache_backend'] = backend
+        cache = salt.pillar.PillarCache(self.opts)
+        fingerprint = cache.fingerprint(self.grains, {}, None)
+        self.assertIsNone(cache.get('minion', 'base', None, fingerprint))
+
+        cache.store('minion', 'base', None, fingerprint, {'foo': 'bar'},
+                    time.time())
+        self.assertEqual(cache.get('minion', 'base', None, fingerprint),
+                         {'foo': 'bar'})
+        # Other environments and other grains are not served from the cache
+        self.assertIsNone(cache.get('minion', 'dev', None, fingerprint))
+        other = cache.fingerprint({'os': 'CentOS', 'id': 'minion'}, {}, None)
+        self.assertIsNone(cache.get('minion', 'base', None, other))
+
+        # Invalidating another minion keeps the entry
+        salt.pillar.clear_pillar_cache(self.opts, ['other'])
+        self.assertEqual(cache.get('minion', 'base', None, fingerprint),
+                         {'foo': 'bar'})
+        salt.pillar.clear_pillar_cache(self.opts, ['minion'])
+        self.assertIsNone(cache.get('minion', 'base', None, fingerprint))
+
+        cache.store('minion', 'base', None, fingerprint, {'foo': 'bar'},
+                    time.time())
+        salt.pillar.clear_pillar_cache(self.opts)
+        self.assertIsNone(cache.get('minion', 'base', None, fingerprint))
+
+    def test_memory_cache(self):
+        self._check_cache('memory')
+
+    def test_disk_cache(self):
+        self._check_cache('disk')
+
+    def test_ttl(self):
+        self.opts['pillar_cache_backend'] = 'disk'
+        cache = salt.pillar.PillarCache(self.opts)
+        fingerprint = cache.fingerprint(self.grains)
+        cache.store('minion', 'base', None, fingerprint, {'foo': 'bar'},
+                    time.time() - 3601)
+        self.assertIsNone(cache.get('minion', 'base', None, fingerprint))
+
+
 if __name__ == '__main__':
     from integration import run_tests
-    run_tests(PillarTestCase, needs_daemon=False)
+    run_tests([PillarTestCase, PillarCacheTestCase], needs_daemon=False)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.returners.local_cache_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the job index of the local_cache returner
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.mock import MagicMock, patch
+from salttesting.helpers import ensure_in_syspath
+
+ensure_in_syspath('../../')
+
+# Import salt libs
+# local_cache relies on these being imported by the master
+import salt.utils.minions  # pylint: disable=unused-import
+import salt.utils.atomicfile  # pylint: disable=unused-import
+from salt.returners import local_cache
+
+local_cache.__opts__ = {}
+
+
+@skipIf(not local_cache.HAS_SQLITE3, 'sqlite3 is not available')
+class LocalCacheIndexTestCase(TestCase):
+    '''
+    Test that the job index gives the same results as walking the jobs
+    directory
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        local_cache.__opts__ = {'cachedir': self.cachedir,
+                                'pki_dir': self.cachedir,
+                                'hash_type': 'md5',
+                                'keep_jobs': 24,
+                                'job_cache_index': True}
+        self.jids = []
+        for fun in ('test.ping', 'saltutil.find_job', 'state.sls'):
+            jid = local_cache.prep_jid()
+            local_cache.save_load(jid, {'jid': jid,
+                                        'fun': fun,
+                                        'arg': [],
+                                        'tgt': '*',
+                                        'tgt_type': 'glob',
+                                        'user': 'root',
+                                        'kwargs': {'metadata': {'foo': 'bar'}}})
+            self.jids.append(jid)
+        # A job which was prepared but never published
+        self.jids.append(local_cache.prep_jid())
+
+    def tearDown(self):
+        local_cache._INDEX_CONNS.clear()
+        local_cache._INDEX_CHECKED.clear()
+        shutil.rmtree(self.cachedir)
+
+    def _walk(self, fun, *args):
+        '''
+        Call fun without the help of the job index
+        '''
+        local_cache.__opts__['job_cache_index'] = False
+        try:
+            return fun(*args)
+        finally:
+            local_cache.__opts__['job_cache_index'] = True
+
+    def test_get_jids(self):
+        # The index is only used once it has been built
+        self.assertIsNone(local_cache._index_ready())
+        local_cache.rebuild_index()
+        self.assertIsNotNone(local_cache._index_ready())
+        self.assertEqual(local_cache.get_jids(),
+                         self._walk(local_cache.get_jids))
+        self.assertEqual(len(local_cache.get_jids()), 3)
+
+    def test_get_jids_filter(self):
+        local_cache.rebuild_index()
+        for count in (1, 2, 5):
+            for filter_find_job in (True, False):
+                self.assertEqual(
+                    local_cache.get_jids_filter(count, filter_find_job),
+                    self._walk(local_cache.get_jids_filter, count, filter_find_job))
+
+    def test_clean_old_jobs(self):
+        # The first cleanup builds the index
+        local_cache.clean_old_jobs()
+        self.assertIsNotNone(local_cache._index_ready())
+        self.assertEqual(len(local_cache.get_jids()), 3)
+
+        conn = local_cache._index_conn()
+        with conn:
+            conn.execute('UPDATE jobs SET ctime = ? WHERE jid = ?',
+                         (time.time() - 25 * 3600, self.jids[0]))
+        local_cache.clean_old_jobs()
+        self.assertFalse(os.path.exists(local_cache._jid_dir(self.jids[0])))
+        self.assertTrue(os.path.exists(local_cache._jid_dir(self.jids[1])))
+        self.assertNotIn(self.jids[0], local_cache.get_jids())
+        self.assertEqual(local_cache.get_jids(),
+                         self._walk(local_cache.get_jids))
+
+    def test_invalidate(self):
+        local_cache.rebuild_index()
+        # A job written while the index is turned off
+        jid = self._walk(local_cache.prep_jid)
+        self.assertIsNone(local_cache._index_ready())
+        # which only looks for the marker once
+        with patch.object(local_cache, '_index_invalidate') as invalidate:
+            self._walk(local_cache.prep_jid)
+        self.assertFalse(invalidate.called)
+        local_cache.clean_old_jobs()
+        self.assertIn(jid, [row[0] for row in local_cache._index_conn().execute(
+            'SELECT jid FROM jobs')])
+
+        # A job which could not be added to the index
+        with patch.object(local_cache, '_index_conn',
+                          side_effect=local_cache.sqlite3.Error('locked')):
+            local_cache.prep_jid()
+        self.assertIsNone(local_cache._index_ready())
+
+    def test_prune(self):
+        thread = threading.Thread(target=lambda: None)
+        thread.start()
+        thread.join()
+        path = os.path.join(self.cachedir, local_cache.INDEX_DB)
+        local_cache._INDEX_CONNS.clear()
+        # One of a finished thread and one inherited from another process
+        finished = MagicMock()
+        inherited = MagicMock()
+        local_cache._INDEX_CONNS[(os.getpid(), thread.ident, path)] = finished
+        local_cache._INDEX_CONNS[(os.getpid() + 1,
+                                  threading.current_thread().ident,
+                                  path)] = inherited
+        local_cache._index_conn()
+        self.assertEqual(list(local_cache._INDEX_CONNS),
+                         [(os.getpid(), threading.current_thread().ident, path)])
+        finished.close.assert_called_once_with()
+        self.assertFalse(inherited.close.called)
+
+    def test_sweep(self):
+        local_cache.clean_old_jobs()
+        # A directory left behind by update_endtime
+        local_cache.update_endtime('20150101010101010101', 'now')
+        path = local_cache._jid_dir('20150101010101010101')
+        local_cache.clean_old_jobs()
+        self.assertTrue(os.path.isdir(path))
+
+        conn = local_cache._index_conn()
+        with conn:
+            conn.execute('UPDATE meta SET value = ? WHERE key = ?',
+                         (str(time.time() - 25 * 3600), 'swept'))
+        local_cache.clean_old_jobs()
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(len(local_cache.get_jids()), 3)
+
+    def test_save_many(self):
+        loads = [{'jid': self.jids[0], 'id': 'one', 'return': True},
+                 # A return without a minion id
+                 {'jid': self.jids[0], 'return': True},
+                 {'jid': self.jids[1], 'id': 'two', 'return': True}]
+        self.assertEqual(local_cache.save_many(loads), 1)
+        self.assertEqual(sorted(local_cache.get_jid(self.jids[0])), ['one'])
+        self.assertEqual(sorted(local_cache.get_jid(self.jids[1])), ['two'])
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(LocalCacheIndexTestCase, needs_daemon=False)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.ssh_test
+    ~~~~~~~~~~~~~~~~~~~
+
+    Test multiplexing the ssh commands of salt-ssh and driving its targets
+    from a single event loop
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import time
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch, NO_MOCK, NO_MOCK_REASON
+ensure_in_syspath('../')
+
+# Import 3rd-party libs
+import tornado.gen
+import tornado.ioloop
+
+# Import salt libs
+import salt.client.ssh
+import salt.client.ssh.shell
+import salt.defaults.exitcodes
+from salt.client.ssh import RSTR
+
+
+class ShellTestCase(TestCase):
+    '''
+    Test the options and the non-blocking commands of Shell
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.opts = {'cachedir': self.cachedir, '_ssh_version': (7, 2)}
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def _shell(self, **kwargs):
+        return salt.client.ssh.shell.Shell(self.opts, 'web1', **kwargs)
+
+    def test_control_opts(self):
+        self.assertNotIn('ControlPath', self._shell(priv='/key')._key_opts())
+        self.opts['ssh_multiplex'] = True
+        key_opts = self._shell(priv='/key')._key_opts()
+        self.assertIn('-o ControlMaster=auto ', key_opts)
+        self.assertIn('-o ControlPath={0}/ssh_control/%C '.format(self.cachedir), key_opts)
+        self.assertIn('-o ControlPersist=60 ', key_opts)
+        passwd_opts = self._shell(passwd='secret')._passwd_opts()
+        self.assertEqual(passwd_opts.count('ControlMaster=auto'), 1)
+        self.assertIn('ControlPath=', passwd_opts)
+
+        self.opts['_ssh_version'] = (5, 3)
+        key_opts = self._shell(priv='/key')._key_opts()
+        self.assertIn('/ssh_control/%r@%h:%p ', key_opts)
+        self.assertNotIn('ControlPersist', key_opts)
+
+    def test_ssh_version(self):
+        for output, version in (
+                (b'OpenSSH_6.7p1 Debian-5, OpenSSL 1.0.1k 8 Jan 2015\n', (6, 7, 1)),
+                (b'OpenSSH_10.0p2, OpenSSL 3.5.0 8 Apr 2025\n', (10, 0, 2)),
+                (b'OpenSSH_7.4, LibreSSL 2.5.0\n', (7, 4)),
+                (b'ssh: command not found\n', (2, 0))):
+            self.assertEqual(salt.client.ssh._parse_ssh_version(output), version)
+
+    def test_exec_cmd_async(self):
+        shell = self._shell(priv='/key')
+        with patch.object(shell, '_cmd_str', lambda cmd, **kwargs: cmd):
+            ret = tornado.ioloop.IOLoop().run_sync(
+                lambda: shell.exec_cmd_async('echo out; echo err >&2; exit 3'))
+        self.assertEqual(ret, ('out\n', 'err\n', 3))
+
+
+class FakeShell(object):
+    '''
+    Answer the shim like a target without salt-thin
+    '''
+    def __init__(self):
+        self.calls = []
+
+    def exec_cmd(self, cmd):
+        self.calls.append('shim')
+        if 'send' not in self.calls:
+            return ('{0}\ndeploy\n'.format(RSTR), '',
+                    salt.defaults.exitcodes.EX_THIN_DEPLOY)
+        return '{0}\n{{"local": true}}'.format(RSTR), '{0}\n'.format(RSTR), 0
+
+    def send(self, local, remote):
+        self.calls.append('send')
+        return '', '', 0
+
+    @tornado.gen.coroutine
+    def exec_cmd_async(self, cmd):
+        raise tornado.gen.Return(self.exec_cmd(cmd))
+
+    @tornado.gen.coroutine
+    def send_async(self, local, remote):
+        raise tornado.gen.Return(self.send(local, remote))
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class EventLoopTestCase(TestCase):
+    '''
+    Test running the routines of the targets on an IOLoop
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.opts = {'cachedir': self.cachedir,
+                     'argv': ['echo', 'hi'],
+                     'raw_shell': True,
+                     'ssh_event_loop': True,
+                     'ssh_loop_max_hosts': 256,
+                     '_ssh_version': (7, 2)}
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def _single(self):
+        return salt.client.ssh.Single(
+            self.opts, ['test.ping'], 'web1', 'web1', thin='/tmp/thin.tgz',
+            wfuncs={})
+
+    def test_cmd_block(self):
+        for run in ('sync', 'async'):
+            single = self._single()
+            single.shell = FakeShell()
+            with patch('salt.utils.thin.thin_sum', return_value='abc'):
+                if run == 'sync':
+                    ret = single.cmd_block()
+                else:
+                    ret = tornado.ioloop.IOLoop().run_sync(single.cmd_block_async)
+            self.assertEqual(ret, ('{"local": true}', '', 0))
+            self.assertEqual(single.shell.calls, ['shim', 'send', 'shim'])
+
+    def _ssh(self, hosts):
+        ssh = salt.client.ssh.SSH.__new__(salt.client.ssh.SSH)
+        ssh.opts = self.opts
+        ssh.targets = dict((host, {'host': host}) for host in hosts)
+        ssh.defaults = {'user': 'root', 'passwd': '', 'priv': '/key', 'tty': False}
+        ssh.mods = {}
+        ssh.fsclient = None
+        ssh.thin = '/tmp/thin.tgz'
+        ssh._wfuncs = {}
+        return ssh
+
+    def test_handle_ssh_loop(self):
+        hosts = ['web{0}'.format(num) for num in range(20)]
+        ssh = self._ssh(hosts)
+
+        def _cmd_str(shell, cmd, **kwargs):
+            return 'sleep 0.5; echo {0}'.format(shell.host)
+        start = time.time()
+        with patch.object(salt.client.ssh.shell.Shell, '_cmd_str', _cmd_str):
+            rets = list(ssh.handle_ssh())
+        # The targets ran at the same time
+        self.assertLess(time.time() - start, 5)
+        self.assertEqual(len(rets), 20)
+        for ret in rets:
+            host = list(ret)[0]
+            self.assertEqual(ret[host], {'stdout': '{0}\n'.format(host),
+                                         'stderr': '',
+                                         'retcode': 0})
+
+    def test_use_event_loop(self):
+        ssh = self._ssh(['web1', 'web2'])
+        self.assertTrue(ssh.use_event_loop())
+        self.assertFalse(ssh.use_event_loop(mine=True))
+        ssh.targets['web2']['passwd'] = 'secret'
+        self.assertFalse(ssh.use_event_loop())
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests([ShellTestCase, EventLoopTestCase], needs_daemon=False)
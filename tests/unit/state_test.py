@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.state_test
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Test the lookup of requisites and the execution of states in separate
+    processes
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import os
+import time
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+
+ensure_in_syspath('../')
+
+# Import Salt libs
+import integration
+import salt.config
+import salt.loader
+import salt.state
+import salt.utils
+
+
+class RequisiteIndexTestCase(TestCase):
+    '''
+    Test that the indexes find the same states as scanning for them
+    '''
+    def setUp(self):
+        self.chunks = [
+            {'state': 'file', '__id__': 'conf', 'name': '/etc/foo.conf', '__sls__': 'foo'},
+            {'state': 'pkg', '__id__': 'foo', 'name': 'foo', '__sls__': 'foo'},
+            {'state': 'file', '__id__': 'log', 'name': '/var/log/foo', '__sls__': 'foo.log'},
+            {'state': 'service', '__id__': 'foo', 'name': 'food', '__sls__': 'bar'},
+        ]
+        self.state = salt.state.State.__new__(salt.state.State)
+        self.state._chunk_index = (None, 0, None)
+
+    def _find(self, req):
+        return [chunk['__id__'] for chunk in self.state.find_requisites(req, self.chunks)]
+
+    def test_find_requisites(self):
+        self.assertEqual(self._find({'file': 'conf'}), ['conf'])
+        self.assertEqual(self._find({'file': '/var/log/foo'}), ['log'])
+        self.assertEqual(self._find({'pkg': 'conf'}), [])
+        self.assertEqual(self._find({'file': '*'}), ['conf', 'log'])
+        self.assertEqual(self._find({'service': 'foo*'}), ['foo'])
+        self.assertEqual(self._find({'sls': 'foo'}), ['conf', 'foo'])
+        self.assertEqual(self._find({'sls': 'foo*'}), ['conf', 'foo', 'log'])
+        self.assertEqual(self._find({'file': None}), [])
+
+    def test_index_rebuilt(self):
+        index = self.state.index_chunks(self.chunks)
+        self.assertIs(self.state.index_chunks(self.chunks), index)
+        self.chunks.append({'state': 'file', '__id__': 'new', 'name': 'new', '__sls__': 'new'})
+        self.assertEqual(self._find({'file': 'new'}), ['new'])
+
+    def test_find_name(self):
+        high = {'foo': {'pkg': ['installed', {'name': 'foo-pkg'}]},
+                'bar': {'pkg': ['installed', {'name': 'bar-pkg'}]}}
+        index = salt.state.index_names(high)
+        self.assertEqual(salt.state.find_name('foo-pkg', 'pkg', high, index), 'foo')
+        self.assertEqual(salt.state.find_name('bar', 'pkg', high, index), 'bar')
+        self.assertEqual(salt.state.find_name('bar-pkg', 'file', high, index), '')
+        # Arguments changed after indexing are still found
+        high['bar']['pkg'][1] = {'name': 'baz-pkg'}
+        self.assertEqual(salt.state.find_name('bar-pkg', 'pkg', high, index), '')
+        self.assertEqual(salt.state.find_name('baz-pkg', 'pkg', high, index), 'bar')
+
+
+@skipIf(salt.utils.is_windows(), 'States are not run in parallel on Windows')
+class ParallelStateTestCase(TestCase):
+    '''
+    Test the parallel state keyword
+    '''
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp(dir=integration.TMP)
+        opts = salt.config.minion_config(None)
+        opts['root_dir'] = self.root_dir
+        opts['cachedir'] = os.path.join(self.root_dir, 'cachedir')
+        opts['state_events'] = False
+        opts['file_client'] = 'local'
+        opts['file_roots'] = {'base': [self.root_dir]}
+        opts['pillar_roots'] = {'base': [self.root_dir]}
+        opts['test'] = False
+        opts['grains'] = salt.loader.grains(opts)
+        self.state = salt.state.State(opts)
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def _high(self, states):
+        high = {}
+        for id_, args in states:
+            high[id_] = {'cmd': ['run'] + args,
+                         '__sls__': 'parallel',
+                         '__env__': 'base'}
+        return high
+
+    def _ret(self, ret, id_, name):
+        return ret['cmd_|-{0}_|-{1}_|-run'.format(id_, name)]
+
+    def test_parallel(self):
+        high = self._high([
+            ('one', [{'name': 'sleep 2'}, {'parallel': True}, {'order': 1}]),
+            ('two', [{'name': 'sleep 2'}, {'parallel': True}, {'order': 2}]),
+            ('three', [{'name': 'echo three'},
+                       {'require': [{'cmd': 'one'}]},
+                       {'order': 3}]),
+        ])
+        start = time.time()
+        ret = self.state.call_high(high)
+        self.assertLess(time.time() - start, 4)
+        one = self._ret(ret, 'one', 'sleep 2')
+        two = self._ret(ret, 'two', 'sleep 2')
+        three = self._ret(ret, 'three', 'echo three')
+        for state in (one, two, three):
+            self.assertTrue(state['result'])
+        # The returns are numbered in the order the states were started
+        self.assertEqual([one['__run_num__'], two['__run_num__'], three['__run_num__']],
+                         [0, 1, 2])
+        self.assertEqual(three['changes']['stdout'], 'three')
+        self.assertEqual(self.state.parallel, {})
+
+    def test_failed_requisite(self):
+        high = self._high([
+            ('one', [{'name': 'exit 1'}, {'parallel': True}, {'order': 1}]),
+            ('two', [{'name': 'echo two'},
+                     {'require': [{'cmd': 'one'}]},
+                     {'order': 2}]),
+        ])
+        ret = self.state.call_high(high)
+        self.assertFalse(self._ret(ret, 'one', 'exit 1')['result'])
+        two = self._ret(ret, 'two', 'echo two')
+        self.assertFalse(two['result'])
+        self.assertIn('One or more requisite failed', two['comment'])
+
+    def test_failhard(self):
+        high = self._high([
+            ('one', [{'name': 'exit 1'}, {'parallel': True},
+                     {'failhard': True}, {'order': 1}]),
+            ('two', [{'name': 'sleep 1'}, {'order': 2}]),
+            ('three', [{'name': 'echo three'}, {'order': 3}]),
+        ])
+        ret = self.state.call_high(high)
+        self.assertFalse(self._ret(ret, 'one', 'exit 1')['result'])
+        self.assertNotIn('cmd_|-three_|-echo three_|-run', ret)
+        self.assertNotIn('__FAILHARD__', ret)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests([RequisiteIndexTestCase, ParallelStateTestCase], needs_daemon=False)
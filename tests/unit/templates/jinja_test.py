@@ -13,6 +13,7 @@ import pprint
 from salttesting.unit import skipIf, TestCase
 from salttesting.case import ModuleCase
 from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch
 ensure_in_syspath('../../')
 
 # Import salt libs
@@ -311,6 +312,26 @@ class TestGetTemplate(TestCase):
         self.assertEqual(fc.requests[0]['path'], 'salt://macro')
         SaltCacheLoader.file_client = _fc
 
+    def test_template_cache(self):
+        '''
+        A template found in the cache passed in _jinja_cache is not compiled
+        again
+        '''
+        cache = {}
+        for data in ('a', 'b'):
+            out = render_jinja_tmpl('{{ data }}',
+                                    dict(opts=self.local_opts, saltenv='test',
+                                         data=data, _jinja_cache=cache))
+            self.assertEqual(out, data)
+        template = cache[(None, u'{{ data }}')]
+        with patch('jinja2.Environment.from_string') as from_string:
+            out = render_jinja_tmpl('{{ data }}',
+                                    dict(opts=self.local_opts, saltenv='test',
+                                         data='c', _jinja_cache=cache))
+        self.assertEqual(out, 'c')
+        self.assertFalse(from_string.called)
+        self.assertEqual(list(cache.values()), [template])
+
     @skipIf(HAS_TIMELIB is False, 'The `timelib` library is not installed.')
     def test_strftime(self):
         response = render_jinja_tmpl('{{ "2002/12/25"|strftime }}',
@@ -6,20 +6,28 @@
 # Import python libs
 from __future__ import absolute_import
 import os
+import shutil
+import tempfile
 import threading
 
+import tornado.concurrent
 import tornado.gen
 import tornado.ioloop
+import tornado.iostream
 from tornado.testing import AsyncTestCase
 
 import salt.config
+import salt.crypt
+import salt.master
 import salt.utils
 import salt.transport.server
 import salt.transport.client
+import salt.transport.tcp
 import salt.exceptions
 
 # Import Salt Testing libs
 from salttesting import TestCase, skipIf
+from salttesting.mock import MagicMock, patch
 from salttesting.helpers import ensure_in_syspath
 ensure_in_syspath('../')
 import integration
@@ -184,7 +192,161 @@ class AsyncPubChannelTest(BaseTCPPubCase, PubChannelMixin):
     Tests around the publish system
     '''
 
+
+class PubServerTargetingTest(TestCase):
+    '''
+    Test that the publisher only sends targeted publications to the
+    subscribers they target
+    '''
+    def setUp(self):
+        self.pki_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.pki_dir, 'minions'))
+        self.io_loop = tornado.ioloop.IOLoop()
+        self.pub_server = salt.transport.tcp.PubServer(
+            {'pki_dir': self.pki_dir},
+            io_loop=self.io_loop)
+
+    def tearDown(self):
+        self.io_loop.close()
+        shutil.rmtree(self.pki_dir)
+
+    def _subscriber(self, id_=None):
+        stream = MagicMock()
+        stream.write.return_value = tornado.concurrent.Future()
+        client = salt.transport.tcp.Subscriber(stream, ('127.0.0.1', 0))
+        client.id_ = id_
+        self.pub_server.clients.add(client)
+        if id_ is not None:
+            self.pub_server._add_client_present(client)
+        return client
+
+    def test_publish_payload_topic_lst(self):
+        minion1 = self._subscriber('minion1')
+        minion2 = self._subscriber('minion2')
+        anonymous = self._subscriber()
+
+        self.pub_server.publish_payload({'payload': 'x', 'topic_lst': ['minion1']}, None)
+        self.assertEqual(minion1.stream.write.call_count, 1)
+        self.assertEqual(minion2.stream.write.call_count, 0)
+        self.assertEqual(anonymous.stream.write.call_count, 1)
+
+        self.pub_server.publish_payload({'payload': 'x'}, None)
+        self.assertEqual(minion1.stream.write.call_count, 2)
+        self.assertEqual(minion2.stream.write.call_count, 1)
+        self.assertEqual(anonymous.stream.write.call_count, 2)
+
+    def test_remove_client(self):
+        minion1 = self._subscriber('minion1')
+        self.pub_server._remove_client(minion1)
+        self.assertEqual(self.pub_server.clients, set())
+        self.assertEqual(self.pub_server.present, {})
+
+    def test_verify_id(self):
+        key_path = salt.crypt.gen_keys(self.pki_dir, 'minion1', 1024)
+        shutil.copy(key_path.replace('.pem', '.pub'),
+                    os.path.join(self.pki_dir, 'minions', 'minion1'))
+        with salt.utils.fopen(key_path) as fp_:
+            key = salt.crypt.RSA.importKey(fp_.read())
+        tok = salt.crypt.private_encrypt(key, 'salt')
+        self.assertTrue(self.pub_server._verify_id('minion1', tok))
+        self.assertFalse(self.pub_server._verify_id('minion2', tok))
+        self.assertFalse(self.pub_server._verify_id('../minion1', tok))
+
+        # The parsed key is reused until the key file changes
+        with patch('salt.crypt.RSA.importKey') as import_key:
+            self.assertTrue(self.pub_server._verify_id('minion1', tok))
+            self.assertFalse(import_key.called)
+        os.remove(os.path.join(self.pki_dir, 'minions', 'minion1'))
+        self.assertFalse(self.pub_server._verify_id('minion1', tok))
+        self.assertNotIn(os.path.join(self.pki_dir, 'minions', 'minion1'),
+                         salt.crypt._MINION_PUBS)
+
+
+class PubServerChannelTest(TestCase):
+    '''
+    Test that the publisher channel reuses its connections to the publisher
+    '''
+    def setUp(self):
+        self.sock_dir = tempfile.mkdtemp()
+        self.io_loop = tornado.ioloop.IOLoop()
+        self.channel = salt.transport.tcp.TCPPubServerChannel(
+            {'sock_dir': self.sock_dir,
+             'pki_dir': self.sock_dir,
+             'sign_pub_messages': False},
+            io_loop=self.io_loop)
+        self.load = {'tgt_type': 'glob', 'tgt': '*', 'fun': 'test.ping'}
+        secret = MagicMock(value=salt.crypt.Crypticle.generate_key_string())
+        self.secrets = patch.dict(salt.master.SMaster.secrets,
+                                  {'aes': {'secret': secret}})
+        self.secrets.start()
+
+    def tearDown(self):
+        self.secrets.stop()
+        self.io_loop.close()
+        shutil.rmtree(self.sock_dir)
+
+    def _sent(self, exc=None):
+        future = tornado.concurrent.Future()
+        if exc is None:
+            future.set_result(None)
+        else:
+            future.set_exception(exc)
+        return future
+
+    def test_resolved_minions(self):
+        load = dict(self.load, minions=['minion1'])
+        with patch('salt.utils.minions.CkMinions.check_minions') as check_minions:
+            int_payload = self.channel._package_publish(load)
+        # The target resolved by the master is used, but not sent on
+        self.assertFalse(check_minions.called)
+        self.assertEqual(int_payload['topic_lst'], ['minion1'])
+        payload = self.channel.serial.loads(int_payload['payload'])
+        crypticle = salt.crypt.Crypticle(
+            {}, salt.master.SMaster.secrets['aes']['secret'].value)
+        self.assertEqual(crypticle.loads(payload['load']), self.load)
+        self.assertIn('minions', load)
+
+    def test_pub_sock(self):
+        with patch('salt.utils.async.SyncWrapper') as wrapper:
+            self.channel.publish(self.load)
+            self.channel.publish(self.load)
+            self.assertEqual(wrapper.call_count, 1)
+            self.assertEqual(wrapper.return_value.send.call_count, 2)
+
+            # A closed connection is made again
+            wrapper.return_value.send.side_effect = [
+                tornado.iostream.StreamClosedError(), None]
+            self.channel.publish(self.load)
+            self.assertEqual(wrapper.call_count, 2)
+            wrapper.return_value.send.side_effect = None
+
+            # A forked child does not use the connection of its parent
+            with patch('os.getpid', return_value=os.getpid() + 1):
+                self.channel.publish(self.load)
+            self.assertEqual(wrapper.call_count, 3)
+
+    def test_publish_async(self):
+        with patch('salt.transport.ipc.IPCMessageClient') as client:
+            client.return_value.io_loop = self.io_loop
+            client.return_value.send.side_effect = lambda payload: self._sent()
+            for _ in range(2):
+                self.io_loop.run_sync(lambda: self.channel.publish_async(self.load))
+            self.assertEqual(client.call_count, 1)
+            self.assertEqual(client.return_value.send.call_count, 2)
+
+            # A closed connection is dropped and made again by the next one
+            client.return_value.send.side_effect = lambda payload: self._sent(
+                tornado.iostream.StreamClosedError())
+            self.assertRaises(tornado.iostream.StreamClosedError,
+                              self.io_loop.run_sync,
+                              lambda: self.channel.publish_async(self.load))
+            self.assertTrue(client.return_value.close.called)
+            self.assertIsNone(self.channel._async_pub_sock)
+
+
 if __name__ == '__main__':
     from integration import run_tests
     run_tests(ClearReqTestCases, needs_daemon=False)
     run_tests(AESReqTestCases, needs_daemon=False)
+    run_tests(PubServerTargetingTest, needs_daemon=False)
+    run_tests(PubServerChannelTest, needs_daemon=False)
@@ -6,6 +6,8 @@
 # Import python libs
 from __future__ import absolute_import
 import os
+import shutil
+import tempfile
 import threading
 import time
 
@@ -18,13 +20,17 @@ from tornado.testing import AsyncTestCase
 import tornado.gen
 
 import salt.config
+import salt.crypt
+import salt.master
 import salt.utils
 import salt.transport.server
+import salt.transport.zeromq
 import salt.transport.client
 import salt.exceptions
 
 # Import Salt Testing libs
 from salttesting import TestCase, skipIf
+from salttesting.mock import MagicMock, patch
 from salttesting.helpers import ensure_in_syspath
 ensure_in_syspath('../')
 
@@ -192,7 +198,46 @@ class AsyncPubChannelTest(BaseZMQPubCase, PubChannelMixin):
         return zmq.eventloop.ioloop.ZMQIOLoop()
 
 
+class PubServerChannelTest(TestCase):
+    '''
+    Test that the publisher channel reuses its socket to the publisher
+    '''
+    def setUp(self):
+        self.sock_dir = tempfile.mkdtemp()
+        self.channel = salt.transport.zeromq.ZeroMQPubServerChannel(
+            {'sock_dir': self.sock_dir, 'sign_pub_messages': False})
+
+    def tearDown(self):
+        self.channel.close()
+        shutil.rmtree(self.sock_dir)
+
+    def test_pub_sock(self):
+        sock = self.channel.pub_sock
+        context = self.channel._pub_context
+        self.assertIs(self.channel.pub_sock, sock)
+
+        # A forked child does not use the socket of its parent
+        with patch('os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(self.channel.pub_sock, sock)
+            self.channel.close()
+        sock.close()
+        context.term()
+
+    def test_publish(self):
+        self.channel._pub_pid = os.getpid()
+        self.channel._pub_sock = MagicMock()
+        secret = MagicMock(value=salt.crypt.Crypticle.generate_key_string())
+        load = {'tgt_type': 'glob', 'tgt': '*', 'fun': 'test.ping'}
+        with patch.dict(salt.master.SMaster.secrets, {'aes': {'secret': secret}}):
+            self.channel.publish(load)
+            # Without an asynchronous send publish_async falls back to publish
+            self.assertTrue(self.channel.publish_async(load).done())
+        self.assertEqual(self.channel._pub_sock.send.call_count, 2)
+        self.channel._pub_sock = None
+
+
 if __name__ == '__main__':
     from integration import run_tests
     run_tests(ClearReqTestCases, needs_daemon=False)
     run_tests(AESReqTestCases, needs_daemon=False)
+    run_tests(PubServerChannelTest, needs_daemon=False)
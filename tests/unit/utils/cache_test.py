@@ -47,6 +47,18 @@ class CacheDictTestCase(TestCase):
         self.assertRaises(KeyError, cd.__getitem__, 'foo')
 
 
+class LRUCacheTestCase(TestCase):
+
+    def test_size(self):
+        lru = cache.LRUCache(2)
+        lru['foo'] = 1
+        lru['bar'] = 2
+        lru['foo'] = 3
+        lru['baz'] = 4
+        # bar was set least recently
+        self.assertEqual(list(lru.items()), [('foo', 3), ('baz', 4)])
+
+
 if __name__ == '__main__':
     from integration import run_tests
-    run_tests(CacheDictTestCase, needs_daemon=False)
+    run_tests([CacheDictTestCase, LRUCacheTestCase], needs_daemon=False)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.delta_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test rebuilding files from block signatures and deltas
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.utils
+import salt.fileserver
+from salt.utils import delta
+
+
+class DeltaTestCase(TestCase):
+    '''
+    Test diff and patch with changed copies of a file
+    '''
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.old = os.urandom(delta.MIN_BLOCK_SIZE * 20 + 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _rebuild(self, new, limit=delta.MIN_BLOCK_SIZE):
+        '''
+        Rebuild new from the old data, returning the bytes of literal data
+        '''
+        path = os.path.join(self.tmp, 'old')
+        with salt.utils.fopen(path, 'wb') as fp_:
+            fp_.write(self.old)
+        sigs = delta.signatures(path)
+        path = os.path.join(self.tmp, 'new')
+        with salt.utils.fopen(path, 'wb') as fp_:
+            fp_.write(new)
+        old = io.BytesIO(self.old)
+        ret = io.BytesIO()
+        literal = 0
+        loc = expect = 0
+        with salt.utils.fopen(path, 'rb') as fp_:
+            while True:
+                ops, loc, expect, eof = delta.diff(fp_, loc, sigs, limit, expect)
+                literal += sum(len(op_) for op_ in ops if not isinstance(op_, int))
+                delta.patch(ops, old, ret, sigs['block_size'])
+                if eof:
+                    break
+        self.assertEqual(ret.getvalue(), new)
+        return literal
+
+    def test_unchanged(self):
+        self.assertEqual(self._rebuild(self.old), 0)
+
+    def test_modified(self):
+        new = self.old[:300000] + b'x' * 10 + self.old[300010:]
+        self.assertEqual(self._rebuild(new), delta.MIN_BLOCK_SIZE)
+
+    def test_inserted(self):
+        new = self.old[:300000] + os.urandom(1000) + self.old[300000:]
+        self.assertLessEqual(self._rebuild(new), delta.MIN_BLOCK_SIZE + 1000)
+
+    def test_deleted(self):
+        new = self.old[:300000] + self.old[301000:]
+        self.assertLess(self._rebuild(new), delta.MIN_BLOCK_SIZE)
+
+    def test_appended(self):
+        new = self.old + os.urandom(5000)
+        self.assertLess(self._rebuild(new), 5100 + delta.MIN_BLOCK_SIZE)
+
+    def test_unrelated(self):
+        new = os.urandom(len(self.old) // 2)
+        # The literal data is sent over several rounds
+        self.assertEqual(self._rebuild(new, limit=100000), len(new))
+
+    def test_empty(self):
+        self.old = b''
+        self.assertEqual(self._rebuild(b'foo'), 3)
+
+    def test_malformed_signatures(self):
+        sigs = {'block_size': delta.MIN_BLOCK_SIZE,
+                'blocks': [[b'a' * delta.ANCHOR_SIZE, b'd' * 16]]}
+        self.assertTrue(delta.valid_signatures(sigs))
+        for bad in ({'block_size': 0, 'blocks': []},
+                    {'block_size': delta.MAX_BLOCK_SIZE + 1, 'blocks': []},
+                    {'block_size': True, 'blocks': []},
+                    {'block_size': float(delta.MIN_BLOCK_SIZE), 'blocks': []},
+                    {'block_size': delta.MIN_BLOCK_SIZE,
+                     'blocks': [[b'a', b'd']] * (delta.MAX_BLOCKS + 1)},
+                    {'block_size': delta.MIN_BLOCK_SIZE, 'blocks': [[1, 2]]},
+                    {'block_size': delta.MIN_BLOCK_SIZE, 'blocks': [b'ad']},
+                    {'block_size': delta.MIN_BLOCK_SIZE, 'blocks': {}},
+                    dict(sigs, expect=-1),
+                    dict(sigs, expect=2),
+                    None):
+            self.assertFalse(delta.valid_signatures(bad))
+
+        # The master sends a plain chunk instead of a delta
+        fp_ = io.BytesIO(b'x' * 100000)
+        load = {'path': 'foo', 'loc': 0,
+                'delta': {'block_size': 0, 'blocks': []}}
+        ret = salt.fileserver.read_fp_chunk(fp_, load, {'file_buffer_size': 1024})
+        self.assertEqual(ret, {'data': b'x' * 1024})
+
+    def test_large_file_resized(self):
+        # Above MAX_BLOCKS * MIN_BLOCK_SIZE the block size follows the size
+        # of the file, the old copy was split with another one
+        size = 200 * 1024 * 1024
+        old_size = delta.block_size(size)
+        block = b'\0' * old_size
+        sigs = {'block_size': old_size,
+                'blocks': [[block[:delta.ANCHOR_SIZE], hashlib.md5(block).digest()]] *
+                          (size // old_size)}
+        self.assertNotEqual(delta.block_size(size + 4096), old_size)
+        path = os.path.join(self.tmp, 'new')
+        with salt.utils.fopen(path, 'wb') as fp_:
+            # A sparse file of zeros
+            fp_.truncate(size + 4096)
+        with salt.utils.fopen(path, 'rb') as fp_:
+            ret = salt.fileserver.read_fp_chunk(
+                fp_,
+                {'path': 'foo', 'loc': 0, 'delta': sigs},
+                {'file_buffer_size': 1024})
+        # The first block matched instead of the data being sent
+        self.assertEqual(ret['delta'], [0])
+        self.assertEqual(ret['loc'], old_size)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(DeltaTestCase, needs_daemon=False)
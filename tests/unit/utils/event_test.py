@@ -279,6 +279,36 @@ class TestSaltEvent(TestCase):
             self.assertGotEvent(evt2, {'data': 'foo2'})
             self.assertGotEvent(evt1, {'data': 'foo1'})
 
+    def test_event_tag_filter(self):
+        '''Test only the events matching a tag filter are sent'''
+        with eventpublisher_process():
+            me = event.MasterEvent(SOCK_DIR, listen=True)
+            me.add_tag_filter('salt/job/')
+            me.add_tag_filter('evt2')
+            me.add_tag_filter('evt2')
+            # The filters reach the publisher asynchronously
+            time.sleep(0.5)
+            me.fire_event({'data': 'foo1'}, 'evt1')
+            me.fire_event({'data': 'foo2'}, 'evt2')
+            me.fire_event({'data': 'foo3'}, 'salt/job/1/ret/foo')
+            evt2 = me.get_event(tag='')
+            evt3 = me.get_event(tag='')
+            self.assertGotEvent(evt2, {'data': 'foo2'})
+            self.assertGotEvent(evt3, {'data': 'foo3'})
+            self.assertIsNone(me.get_event(wait=1, tag='evt1'))
+
+            # A filter added twice is kept until removed twice, without any
+            # filter every event is sent again
+            me.remove_tag_filter('salt/job/')
+            me.remove_tag_filter('evt2')
+            self.assertEqual(me.tag_filters, {'evt2': 1})
+            me.remove_tag_filter('evt2')
+            self.assertEqual(me.tag_filters, {})
+            time.sleep(0.5)
+            me.fire_event({'data': 'foo1'}, 'evt1')
+            evt1 = me.get_event(tag='evt1')
+            self.assertGotEvent(evt1, {'data': 'foo1'})
+
     def test_event_multiple_clients(self):
         '''Test event is received by multiple clients'''
         with eventpublisher_process():
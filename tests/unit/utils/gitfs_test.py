@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.gitfs_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test fetching gitfs remotes concurrently and serving files from the blob
+    index and the object store
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.utils
+import salt.utils.gitfs
+
+
+class FakeBlob(str):
+    '''
+    The data of a blob, with its size
+    '''
+    @property
+    def size(self):
+        return len(self)
+
+
+class FakeRemote(object):
+    '''
+    A remote holding the files of its environments in dicts, counting the
+    reads from its object store
+    '''
+    def __init__(self, id_, refs, mountpoint='', root=''):
+        self.id = id_
+        self.refs = refs
+        self.mountpoint = mountpoint
+        self.root = root
+        self.lockfile = os.path.join(tempfile.gettempdir(), 'missing.lk')
+        self.reads = []
+        self.fetches = []
+
+    def envs(self):
+        return set(self.refs)
+
+    def tree_sha(self, tgt_env):
+        return hashlib.sha1(repr(sorted(self.refs[tgt_env].items()))).hexdigest()
+
+    def blob_index(self, tgt_env):
+        self.reads.append(('index', tgt_env))
+        blobs = {}
+        symlinks = {}
+        for path, data in self.refs[tgt_env].items():
+            if data.startswith('link:'):
+                symlinks[path] = data[len('link:'):]
+            else:
+                blobs[path] = (hashlib.sha1(data).hexdigest(), len(data))
+        return self.tree_sha(tgt_env), blobs, symlinks
+
+    def find_file(self, path, tgt_env):
+        self.reads.append(('find', path))
+        data = self.refs.get(tgt_env, {}).get(path)
+        while data is not None and data.startswith('link:'):
+            path = os.path.join(os.path.dirname(path), data[len('link:'):])
+            data = self.refs[tgt_env].get(path)
+        if data is None:
+            return None, None
+        return FakeBlob(data), hashlib.sha1(data).hexdigest()
+
+    def read_blob(self, blob_sha):
+        self.reads.append(('read', blob_sha))
+        for files in self.refs.values():
+            for data in files.values():
+                if hashlib.sha1(data).hexdigest() == blob_sha:
+                    return data
+
+    def write_file(self, blob, dest):
+        with salt.utils.fopen(dest, 'w+') as fp_:
+            fp_.write(blob)
+
+    def lock(self):
+        return [self.id], []
+
+    def clear_lock(self):
+        pass
+
+    def fetch(self):
+        self.fetches.append(threading.current_thread().name)
+        time.sleep(0.2)
+        return self.id == 'changed'
+
+
+class GitFSTestCase(TestCase):
+    '''
+    Test GitFS with fake remotes
+    '''
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.opts = {'cachedir': self.cachedir,
+                     'hash_type': 'md5',
+                     'file_buffer_size': 4,
+                     'gitfs_blob_index': True,
+                     'fileserver_events': False}
+        self.remotes = [
+            FakeRemote('one', {'base': {'top.sls': 'base:\n',
+                                        'web/init.sls': 'pkg: []\n',
+                                        'web/alias.sls': 'link:init.sls'}}),
+            FakeRemote('two', {'base': {'srv/top.sls': 'other\n',
+                                        'srv/files/motd': 'hello\n'},
+                               'dev': {'srv/top.sls': 'dev\n'}},
+                       mountpoint='two', root='srv'),
+        ]
+
+    def tearDown(self):
+        salt.utils.gitfs._BLOB_INDEXES.clear()
+        salt.utils.gitfs._BLOBS.clear()
+        salt.utils.gitfs._BLOB_HASHES.clear()
+        shutil.rmtree(self.cachedir)
+
+    def _gitfs(self):
+        gitfs = salt.utils.gitfs.GitFS.__new__(salt.utils.gitfs.GitFS)
+        gitfs.opts = self.opts
+        gitfs.role = 'gitfs'
+        gitfs.cache_root = os.path.join(self.cachedir, 'gitfs')
+        gitfs.env_cache = os.path.join(gitfs.cache_root, 'envs.p')
+        gitfs.refs_cache = os.path.join(gitfs.cache_root, 'refs.p')
+        gitfs.hash_cachedir = os.path.join(gitfs.cache_root, 'hash')
+        gitfs.file_list_cachedir = os.path.join(
+            self.cachedir, 'file_lists', 'gitfs')
+        gitfs.remotes = self.remotes
+        gitfs.provider = 'pygit2'
+        return gitfs
+
+    def _update(self):
+        gitfs = self._gitfs()
+        gitfs.clear_old_remotes = lambda: False
+        gitfs.fetch_remotes = lambda: True
+        gitfs.update()
+
+    def test_fetch_workers(self):
+        self.remotes = [FakeRemote(id_, {}) for id_ in ('a', 'changed', 'b', 'c')]
+        gitfs = self._gitfs()
+        self.opts['gitfs_fetch_workers'] = 4
+        start = time.time()
+        self.assertTrue(gitfs.fetch_remotes())
+        self.assertLess(time.time() - start, 0.6)
+        self.assertEqual(
+            len(set(remote.fetches[0] for remote in self.remotes)), 4)
+
+        self.opts['gitfs_fetch_workers'] = 1
+        self.remotes.pop(1)
+        self.assertFalse(gitfs.fetch_remotes())
+
+    def test_find_file(self):
+        self._update()
+        gitfs = self._gitfs()
+        self.assertEqual(gitfs.envs(), ['base', 'dev'])
+        fnd = gitfs.find_file('web/alias.sls')
+        self.assertEqual(fnd['rel'], 'web/alias.sls')
+        with salt.utils.fopen(fnd['path']) as fp_:
+            self.assertEqual(fp_.read(), 'pkg: []\n')
+        self.assertEqual(gitfs.find_file('two/files/motd', 'base')['rel'],
+                         'two/files/motd')
+        self.assertEqual(gitfs.find_file('files/motd', 'base')['path'], '')
+        self.assertEqual(gitfs.find_file('top.sls', 'qa')['path'], '')
+
+        # A file found again is neither read from git nor checked on disk
+        del self.remotes[0].reads[:]
+        gitfs = self._gitfs()
+        with salt.utils.fopen(fnd['path'], 'w') as fp_:
+            fp_.write('stale')
+        self.assertEqual(gitfs.find_file('web/alias.sls')['path'], fnd['path'])
+        self.assertEqual(self.remotes[0].reads, [])
+
+        ret = gitfs.file_hash({'path': 'web/alias.sls', 'saltenv': 'base'}, fnd)
+        self.assertEqual(ret['hsum'], hashlib.md5('stale').hexdigest())
+        os.remove(fnd['path'])
+        # The hash of a blob is kept in memory
+        ret = gitfs.file_hash({'path': 'web/alias.sls', 'saltenv': 'base'}, fnd)
+        self.assertEqual(ret['hsum'], hashlib.md5('stale').hexdigest())
+
+        # The index of a moved ref is rebuilt and the file written again
+        self.remotes[0].refs['base']['web/init.sls'] = 'pkg: [nginx]\n'
+        self._update()
+        fnd = gitfs.find_file('web/alias.sls')
+        with salt.utils.fopen(fnd['path']) as fp_:
+            self.assertEqual(fp_.read(), 'pkg: [nginx]\n')
+        self.assertEqual(self.remotes[0].reads,
+                         [('index', 'base'), ('find', 'web/init.sls')])
+
+    def test_file_lists(self):
+        self._update()
+        gitfs = self._gitfs()
+        load = {'saltenv': 'base'}
+        self.assertEqual(gitfs.file_list(load),
+                         ['top.sls', 'two/files/motd', 'two/top.sls',
+                          'web/alias.sls', 'web/init.sls'])
+        self.assertEqual(gitfs.dir_list(load), ['two', 'two/files', 'web'])
+        self.assertEqual(gitfs.symlink_list(load), {'web/alias.sls': 'init.sls'})
+        self.assertEqual(gitfs.file_list({'saltenv': 'dev'}), ['two/top.sls'])
+        self.assertEqual(gitfs.file_list({'saltenv': 'qa'}), [])
+
+    def test_no_index(self):
+        self.opts['gitfs_blob_index'] = False
+        self._update()
+        gitfs = self._gitfs()
+        self.assertFalse(os.path.exists(gitfs.refs_cache))
+        fnd = gitfs.find_file('web/init.sls')
+        self.assertNotIn('blob_sha', fnd)
+        with salt.utils.fopen(fnd['path']) as fp_:
+            self.assertEqual(fp_.read(), 'pkg: []\n')
+        self.assertEqual(self.remotes[0].reads, [('find', 'web/init.sls')])
+
+    def _serve(self, gitfs, path):
+        fnd = gitfs.find_file(path)
+        load = {'path': path, 'saltenv': 'base', 'loc': 0, 'window': 1}
+        data = ''
+        while True:
+            ret = gitfs.serve_file(load, fnd)
+            self.assertEqual(ret['dest'], path)
+            data += ret['data']
+            load['loc'] += len(ret['data'])
+            if ret['eof']:
+                return fnd, data
+
+    def test_serve_blobs(self):
+        self.opts['gitfs_serve_blobs'] = True
+        for blob_index in (True, False):
+            self.opts['gitfs_blob_index'] = blob_index
+            self._update()
+            gitfs = self._gitfs()
+            fnd, data = self._serve(gitfs, 'web/alias.sls')
+            self.assertEqual(data, 'pkg: []\n')
+            self.assertEqual(fnd['size'], len(data))
+            self.assertFalse(os.path.exists(fnd['path']))
+            self.assertEqual(
+                gitfs.file_hash({'path': 'web/alias.sls', 'saltenv': 'base'}, fnd)['hsum'],
+                hashlib.md5(data).hexdigest())
+            # The blob was read once from the object store
+            self.assertEqual(
+                [read for read in self.remotes[0].reads if read[0] == 'read'],
+                [('read', fnd['blob_sha'])])
+            salt.utils.gitfs._BLOBS.clear()
+            del self.remotes[0].reads[:]
+
+        # Blobs too large to keep in memory, and the providers which cannot
+        # read blobs, use the cache file
+        with patch('salt.utils.gitfs.MAX_SERVED_BLOB_SIZE', 4):
+            fnd, data = self._serve(self._gitfs(), 'web/init.sls')
+        self.assertEqual(data, 'pkg: []\n')
+        self.assertTrue(os.path.isfile(fnd['path']))
+        gitfs = self._gitfs()
+        gitfs.provider = 'dulwich'
+        self.assertNotIn('remote', gitfs.find_file('top.sls'))
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(GitFSTestCase, needs_daemon=False)
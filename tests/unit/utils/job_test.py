@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.job_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the batched storage of job returns
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import threading
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.mock import MagicMock
+from salttesting.helpers import ensure_in_syspath
+
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.utils.job
+
+
+class FakeMasterMinion(object):
+    '''
+    A master minion with a mocked job cache
+    '''
+    def __init__(self, save_many=True):
+        self.returners = {'fake.prep_jid': MagicMock(),
+                          'fake.save_load': MagicMock(),
+                          'fake.get_load': MagicMock(return_value={}),
+                          'fake.returner': MagicMock()}
+        if save_many:
+            self.returners['fake.save_many'] = MagicMock()
+
+
+class ReturnQueueTestCase(TestCase):
+    '''
+    Test salt.utils.job.ReturnQueue
+    '''
+    def setUp(self):
+        self.opts = {'id': 'master',
+                     'pki_dir': '/etc/salt/pki/master',
+                     'master_job_cache': 'fake',
+                     'job_cache': True,
+                     'job_cache_queue_size': 10,
+                     'job_cache_batch_size': 100}
+
+    def _load(self, minion, jid='20150101010101010101'):
+        return {'jid': jid, 'id': minion, 'return': True, 'fun': 'test.ping'}
+
+    def test_batched(self):
+        mminion = FakeMasterMinion()
+        return_queue = salt.utils.job.ReturnQueue(self.opts, mminion)
+        for minion in ('one', 'two', 'three'):
+            salt.utils.job.store_job(self.opts, self._load(minion),
+                                     mminion=mminion, return_queue=return_queue)
+        return_queue.flush()
+
+        stored = []
+        for call in mminion.returners['fake.save_many'].call_args_list:
+            stored.extend(load['id'] for load in call[0][0])
+        self.assertEqual(stored, ['one', 'two', 'three'])
+        # The jid is only stored once per batch
+        self.assertLessEqual(mminion.returners['fake.prep_jid'].call_count,
+                             mminion.returners['fake.save_many'].call_count)
+        self.assertFalse(mminion.returners['fake.returner'].called)
+        self.assertEqual(return_queue.stats['stored'], 3)
+        self.assertEqual(return_queue.depth(), 0)
+
+    def test_without_save_many(self):
+        mminion = FakeMasterMinion(save_many=False)
+        return_queue = salt.utils.job.ReturnQueue(self.opts, mminion)
+        for minion in ('one', 'two'):
+            salt.utils.job.store_job(self.opts, self._load(minion),
+                                     mminion=mminion, return_queue=return_queue)
+        return_queue.flush()
+        self.assertEqual(mminion.returners['fake.returner'].call_count, 2)
+
+    def test_overflow(self):
+        mminion = FakeMasterMinion()
+        return_queue = salt.utils.job.ReturnQueue(self.opts, mminion)
+        return_queue.put = MagicMock(return_value=False)
+        salt.utils.job.store_job(self.opts, self._load('one'),
+                                 mminion=mminion, return_queue=return_queue)
+        # A return which does not fit in the queue is written right away
+        mminion.returners['fake.prep_jid'].assert_called_once_with(
+            False, passed_jid='20150101010101010101')
+        self.assertEqual(mminion.returners['fake.returner'].call_count, 1)
+
+    def test_failed_returns(self):
+        mminion = FakeMasterMinion(save_many=False)
+        mminion.returners['fake.returner'].side_effect = [IOError('full'), None]
+        return_queue = salt.utils.job.ReturnQueue(self.opts, mminion)
+        for minion in ('one', 'two'):
+            return_queue.put(self._load(minion), None)
+        return_queue.flush()
+        # Only the bad return is lost
+        self.assertEqual(return_queue.stats['errors'], 1)
+        self.assertEqual(return_queue.stats['stored'], 1)
+
+        mminion = FakeMasterMinion()
+        mminion.returners['fake.save_many'].return_value = 1
+        return_queue = salt.utils.job.ReturnQueue(self.opts, mminion)
+        for minion in ('one', 'two'):
+            return_queue.put(self._load(minion), None)
+        return_queue.flush()
+        self.assertEqual(return_queue.stats['errors'], 1)
+        self.assertEqual(return_queue.stats['stored'], 1)
+
+    def test_close(self):
+        mminion = FakeMasterMinion()
+        blocked = threading.Event()
+        mminion.returners['fake.save_many'].side_effect = lambda loads: blocked.wait() and 0
+        return_queue = salt.utils.job.ReturnQueue(self.opts, mminion)
+        return_queue.put(self._load('one'), None)
+        self.assertFalse(return_queue.flush(timeout=0.1))
+        blocked.set()
+        return_queue.close()
+        self.assertEqual(return_queue.depth(), 0)
+        self.assertEqual(return_queue.stats['stored'], 1)
+
+    def test_fire_stats(self):
+        mminion = FakeMasterMinion()
+        event = MagicMock()
+        self.opts['job_cache_stats_interval'] = 60
+        return_queue = salt.utils.job.ReturnQueue(self.opts, mminion)
+        for minion in ('one', 'two'):
+            salt.utils.job.store_job(self.opts, self._load(minion),
+                                     mminion=mminion, return_queue=return_queue)
+        return_queue.flush()
+        return_queue.fire_stats(event)
+        self.assertFalse(event.fire_event.called)
+
+        return_queue._last_stats = (0, return_queue._last_stats[1])
+        return_queue.fire_stats(event)
+        data, tag = event.fire_event.call_args[0]
+        self.assertEqual(tag, 'salt/job_cache/stats')
+        self.assertEqual((data['queued'], data['stored'], data['depth']), (2, 2, 0))
+
+        # The next event only counts the returns since this one
+        return_queue._last_stats = (0, return_queue._last_stats[1])
+        return_queue.fire_stats(event)
+        self.assertEqual(event.fire_event.call_args[0][0]['stored'], 0)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(ReturnQueueTestCase, needs_daemon=False)
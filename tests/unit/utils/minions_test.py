@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.minions_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the minion data cache index used by CkMinions
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing libs
+from salttesting import TestCase
+from salttesting.helpers import ensure_in_syspath
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.payload
+import salt.utils
+from salt.utils import minions
+
+MINION_DATA = {
+    'web1': {'grains': {'os': 'Ubuntu',
+                        'roles': ['web', 'db'],
+                        'ec2': {'tags': {'env': 'prod', 'team': 'a:b'}},
+                        'num_cpus': 4},
+             'pillar': {'users': {'alice': {'shell': '/bin/bash'}}}},
+    'web2': {'grains': {'os': 'CentOS',
+                        'roles': ['web'],
+                        'ec2': {'tags': {'env': 'dev'}},
+                        'num_cpus': 2},
+             'pillar': {'users': {}}},
+    'db1': {'grains': {'os': 'Ubuntu',
+                       'roles': [{'db': {'replica': 'primary'}}],
+                       'ec2': {},
+                       'num_cpus': 16},
+            'pillar': {'users': {'bob': {'shell': '/bin/zsh'}}}},
+    'bare': {'grains': {'os': None}, 'pillar': {}},
+}
+
+EXPRESSIONS = (
+    'os:Ubuntu', 'os:ubu*', 'os:*', 'os:none', 'roles:web', 'roles:d*',
+    'roles:db:replica:primary', 'roles:0:db:replica:primary',
+    'ec2:tags:env:prod', 'ec2:tags:env:*', 'ec2:tags:team:a:b', 'ec2:*',
+    'ec2:env', 'ec2:prod', 'ec2:*:*', 'ec2:tags:*', 'num_cpus:1*',
+    'users:alice:shell:/bin/bash', 'users:*', 'users:alice', 'users:*sh*',
+    'missing:key', 'os:[uc]*',
+)
+
+
+class MinionDataIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+        self.opts = {'cachedir': self.cachedir}
+        self.serial = salt.payload.Serial(self.opts)
+        for minion_id, data in MINION_DATA.items():
+            self._write(minion_id, data)
+        self.index = minions.MinionDataIndex(self.opts)
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def _write(self, minion_id, data):
+        cdir = os.path.join(self.cachedir, 'minions', minion_id)
+        if not os.path.isdir(cdir):
+            os.makedirs(cdir)
+        with salt.utils.fopen(os.path.join(cdir, 'data.p'), 'w+b') as fp_:
+            fp_.write(self.serial.dumps(data))
+
+    def _expected(self, search_type, expr, **kwargs):
+        return set(
+            minion_id for minion_id, data in MINION_DATA.items()
+            if salt.utils.subdict_match(data[search_type], expr, **kwargs)
+        )
+
+    def test_match_same_as_subdict_match(self):
+        '''
+        The index must return exactly what subdict_match would
+        '''
+        for search_type in ('grains', 'pillar'):
+            for expr in EXPRESSIONS:
+                for kwargs in ({},
+                               {'regex_match': True},
+                               {'exact_match': True}):
+                    self.assertEqual(
+                        self.index.match(search_type, expr, **kwargs),
+                        self._expected(search_type, expr, **kwargs),
+                        '{0} {1} {2}'.format(search_type, expr, kwargs)
+                    )
+
+    def test_match_custom_delimiter(self):
+        self.assertEqual(self.index.match('grains', 'ec2|tags|env|prod', '|'),
+                         set(['web1']))
+
+    def test_refresh(self):
+        '''
+        Changed, added and removed cache entries are picked up
+        '''
+        self.assertEqual(self.index.match('grains', 'os:Ubuntu'),
+                         set(['web1', 'db1']))
+        self.assertEqual(self.index.minions, set(MINION_DATA))
+
+        self._write('web2', {'grains': {'os': 'Ubuntu'}})
+        # Make sure the stat signature changes, even on coarse filesystems
+        os.utime(os.path.join(self.cachedir, 'minions', 'web2', 'data.p'),
+                 (1, 1))
+        self._write('new', {'grains': {'os': 'Ubuntu'}})
+        shutil.rmtree(os.path.join(self.cachedir, 'minions', 'db1'))
+
+        self.assertEqual(self.index.match('grains', 'os:Ubuntu'),
+                         set(['web1', 'web2', 'new']))
+        self.assertEqual(self.index.minions,
+                         set(['web1', 'web2', 'bare', 'new']))
+
+    def test_add(self):
+        '''
+        Data added directly is used without reading the cache again
+        '''
+        self.index.refresh()
+        self._write('web2', {'grains': {'os': 'Debian'}})
+        self.index.add('web2', {'grains': {'os': 'Debian'}})
+        self.assertEqual(self.index.match('grains', 'os:Debian'),
+                         set(['web2']))
+        self.assertEqual(self.index.match('grains', 'roles:web'),
+                         set(['web1']))
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests(MinionDataIndexTestCase, needs_daemon=False)
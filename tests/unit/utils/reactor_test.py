@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+'''
+    tests.unit.utils.reactor_test
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test matching event tags with the compiled reactor map
+'''
+
+# Import python libs
+from __future__ import absolute_import
+import os
+import fnmatch
+import shutil
+import time
+import tempfile
+import multiprocessing
+
+# Import Salt Testing libs
+from salttesting import TestCase, skipIf
+from salttesting.helpers import ensure_in_syspath
+from salttesting.mock import patch, MagicMock, NO_MOCK, NO_MOCK_REASON
+ensure_in_syspath('../../')
+
+# Import salt libs
+import salt.utils
+import salt.utils.event
+from salt.utils import reactor
+
+REACT_MAP = [
+    {'salt/minion/*/start': ['/srv/reactor/start.sls']},
+    {'salt/job/*/ret/*': '/srv/reactor/ret.sls'},
+    {'salt/beacon/web1/inotify/': ['/srv/reactor/inotify.sls']},
+    {'salt/minion/web?/start': ['/srv/reactor/web.sls']},
+    {'*': ['/srv/reactor/all.sls']},
+    {'salt/minion/[ab]*': ['/srv/reactor/ab.sls']},
+    {'salt/beacon/web1/inotify/': ['/srv/reactor/inotify2.sls']},
+    'not a reactor',
+    {'salt/auth': None},
+]
+
+TAGS = [
+    'salt/minion/web1/start',
+    'salt/minion/alpha/start',
+    'salt/job/20150101/ret/web1',
+    'salt/beacon/web1/inotify/',
+    'salt/beacon/web1/inotify/etc',
+    'salt/auth',
+    '',
+]
+
+
+class TagMatcherTestCase(TestCase):
+    '''
+    Test TagMatcher
+    '''
+    def _fnmatch(self, tag):
+        # Matching every tag of the map like the reactor used to
+        reactors = []
+        for ropt in REACT_MAP:
+            if not isinstance(ropt, dict):
+                continue
+            key, val = list(ropt.items())[0]
+            if fnmatch.fnmatch(tag, key):
+                if isinstance(val, list):
+                    reactors.extend(val)
+                elif val is not None:
+                    reactors.append(val)
+        return reactors
+
+    def test_match(self):
+        matcher = reactor.TagMatcher(REACT_MAP)
+        for tag in TAGS:
+            self.assertEqual(matcher.match(tag), self._fnmatch(tag))
+        self.assertEqual(matcher.match('salt/minion/web1/start'),
+                         ['/srv/reactor/start.sls',
+                          '/srv/reactor/web.sls',
+                          '/srv/reactor/all.sls'])
+
+    def test_empty(self):
+        self.assertEqual(reactor.TagMatcher([]).match('salt/auth'), [])
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class ReactMapTestCase(TestCase):
+    '''
+    Test that the reactor map is only read again when it changed
+    '''
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.map_path = os.path.join(self.tmp, 'reactor.conf')
+        self.write_map('salt/auth')
+        with patch('salt.minion.MasterMinion', MagicMock()):
+            self.reactor = reactor.Reactor({'reactor': self.map_path})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write_map(self, tag):
+        with salt.utils.fopen(self.map_path, 'w') as fp_:
+            fp_.write('- {0}:\n  - /srv/reactor/{1}.sls\n'.format(
+                tag, tag.replace('/', '_')))
+
+    def test_reload(self):
+        self.assertEqual(self.reactor.list_reactors('salt/auth'),
+                         ['/srv/reactor/salt_auth.sls'])
+        with patch('yaml.safe_load') as safe_load:
+            self.reactor.list_reactors('salt/auth')
+            self.assertFalse(safe_load.called)
+
+        self.write_map('salt/key')
+        self.assertEqual(self.reactor.list_reactors('salt/auth'), [])
+        self.assertEqual(self.reactor.list_reactors('salt/key'),
+                         ['/srv/reactor/salt_key.sls'])
+
+        # A manage event reads the map again
+        with patch('yaml.safe_load', MagicMock(return_value=[])) as safe_load:
+            self.reactor.reload_react_map()
+            self.assertEqual(self.reactor.list_all(), [])
+            self.assertTrue(safe_load.called)
+
+    def test_missing_map(self):
+        os.remove(self.map_path)
+        self.assertEqual(self.reactor.list_reactors('salt/auth'), [])
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class TagFilterTestCase(TestCase):
+    '''
+    Test the event tag filters of the reactors managed through events
+    '''
+    def test_add_delete(self):
+        opts = {'reactor': [{'salt/minion/*/start': ['/srv/reactor/start.sls']}],
+                'transport': 'zeromq'}
+        with patch('salt.minion.MasterMinion', MagicMock()):
+            react = reactor.Reactor(opts)
+        react.minion.opts = opts
+        react.event = salt.utils.event.SaltEvent.__new__(salt.utils.event.SaltEvent)
+        react.event.cpub = False
+        react.event.tag_filters = {}
+        react.filter_tags = True
+        react.add_tag_filters(opts['reactor'])
+        react.add_reactor('salt/minion/web?/start', ['/srv/reactor/web.sls'])
+        react.add_reactor('salt/key', ['/srv/reactor/key.sls'])
+        self.assertEqual(react.event.tag_filters,
+                         {'salt/minion/': 1, 'salt/minion/web': 1, 'salt/key': 1})
+
+        react.delete_reactor('salt/key')
+        react.delete_reactor('salt/minion/web?/start')
+        self.assertEqual(react.event.tag_filters, {'salt/minion/': 1})
+
+        # A reactor matching every event drops the filters
+        react.add_reactor('*', ['/srv/reactor/all.sls'])
+        self.assertEqual(react.event.tag_filters, {})
+        self.assertFalse(react.filter_tags)
+
+
+@skipIf(NO_MOCK, NO_MOCK_REASON)
+class RenderWorkerTestCase(TestCase):
+    '''
+    Test rendering reactions in worker processes
+    '''
+    def setUp(self):
+        opts = {'reactor': [],
+                'reactor_render_workers': 2,
+                'reactor_stats_interval': 1,
+                'reactor_refresh_interval': 60,
+                'reactor_worker_threads': 1,
+                'reactor_worker_hwm': 100}
+        with patch('salt.minion.MasterMinion', MagicMock()):
+            self.reactor = reactor.Reactor(opts)
+        self.handled = multiprocessing.Queue()
+
+        def react(tag, data, reactors):
+            if data.get('sleep'):
+                time.sleep(data['sleep'])
+            self.handled.put((os.getpid(), data['id'], data['seq']))
+        self.reactor.react = react
+
+    def tearDown(self):
+        for process in self.reactor.worker_processes:
+            if process is not None:
+                process.terminate()
+                process.join()
+
+    def test_dispatch(self):
+        self.reactor.start_workers()
+        for seq in range(10):
+            for id_ in ('m1', 'm2', 'm3'):
+                self.reactor.dispatch('salt/beacon/{0}/load/'.format(id_),
+                                      {'id': id_, 'seq': seq},
+                                      ['/srv/reactor/load.sls'])
+        handled = [self.handled.get(timeout=10) for _ in range(30)]
+        for id_ in ('m1', 'm2', 'm3'):
+            # The events of a minion are handled in order by one worker
+            self.assertEqual([seq for _, hid, seq in handled if hid == id_], list(range(10)))
+            self.assertEqual(len(set(pid for pid, hid, _ in handled if hid == id_)), 1)
+
+        # The workers count an event once it was handled
+        deadline = time.time() + 10
+        while sum(self.reactor.worker_stats[0::2]) < 30 and time.time() < deadline:
+            time.sleep(0.01)
+        self.reactor.event = MagicMock()
+        self.reactor.last_stats = (0, [0, 0], [0.0, 0.0])
+        self.reactor.fire_stats()
+        data, tag = self.reactor.event.fire_event.call_args[0]
+        self.assertEqual(tag, 'salt/reactor/stats')
+        self.assertEqual(len(data['workers']), 2)
+        self.assertEqual(sum(worker['handled'] for worker in data['workers']), 30)
+        self.assertTrue(all(worker['queued'] == 0 for worker in data['workers']))
+
+        # Not again before the interval passed
+        self.reactor.fire_stats()
+        self.assertEqual(self.reactor.event.fire_event.call_count, 1)
+
+    def test_dead_worker(self):
+        self.reactor.start_workers()
+        for process in self.reactor.worker_processes:
+            process.terminate()
+            process.join()
+        with patch('salt.utils.reactor.log') as log:
+            for seq in range(3):
+                for id_ in ('m1', 'm2', 'm3'):
+                    self.reactor.dispatch('salt/beacon/{0}/load/'.format(id_),
+                                          {'id': id_, 'seq': seq},
+                                          ['/srv/reactor/load.sls'])
+            self.reactor.event = MagicMock()
+            self.reactor.last_stats = (0, [0, 0], [0.0, 0.0])
+            self.reactor.fire_stats()
+        # The dead workers are not started again, their events are dropped
+        self.assertEqual(self.reactor.worker_processes, [None, None])
+        self.assertEqual(log.critical.call_count, 2)
+        data = self.reactor.event.fire_event.call_args[0][0]
+        self.assertFalse(any(worker['alive'] for worker in data['workers']))
+        self.assertEqual(sum(self.reactor.dropped), 9)
+        self.assertEqual(sum(self.reactor.dispatched), 0)
+        self.assertTrue(self.handled.empty())
+
+    def test_hwm(self):
+        self.reactor.opts['reactor_worker_hwm'] = 2
+        self.reactor.start_workers()
+        for seq in range(10):
+            self.reactor.dispatch('salt/beacon/m1/load/',
+                                  {'id': 'm1', 'seq': seq, 'sleep': 1},
+                                  ['/srv/reactor/load.sls'])
+        # One event is being handled and two are queued, the others dropped
+        self.assertEqual(sum(self.reactor.dispatched) + sum(self.reactor.dropped), 10)
+        self.assertGreaterEqual(sum(self.reactor.dropped), 7)
+
+
+if __name__ == '__main__':
+    from integration import run_tests
+    run_tests([TagMatcherTestCase, ReactMapTestCase, TagFilterTestCase,
+               RenderWorkerTestCase],
+              needs_daemon=False)